@@ -13,7 +13,16 @@ print(f"[STARTUP] DATABASE_URI: {os.getenv('DATABASE_URI', 'NOT SET')}")
 # Add src directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
+# --profile-startup: đo thời gian import từng module và từng phase của create_app
+from startup_profiler import startup_profiler, profiling_requested
+if profiling_requested():
+    startup_profiler.enable()
+
 from app import app
 
+if startup_profiler.enabled:
+    startup_profiler.disable()
+    print(startup_profiler.report())
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=9999, debug=False, threaded=False, use_reloader=False)
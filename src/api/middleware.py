@@ -1,48 +1,90 @@
-from flask import request, g
-from datetime import datetime
+from flask import request, g, current_app
 import logging
 import time
+import uuid
+
+from infrastructure.databases.timing import request_db_stats
 
 logger = logging.getLogger(__name__)
+request_logger = logging.getLogger("aura.request")
 
 
 def setup_request_logging(app):
     """
     Thiết lập request/response logging middleware
     
-    Ghi log các thông tin:
-    - Request ID
-    - Origin (để debug CORS)
-    - Request method, path, status
-    - Response time
+    Mỗi request (theo tỉ lệ sampling của RequestLogSampler, xem app_logging)
+    ghi một record có các field:
+    - request_id (nhận từ header X-Request-ID hoặc tự sinh, trả lại trong response)
+    - method, route, endpoint, status
+    - latency_ms, db_ms, db_queries
     """
     
     @app.before_request
     def before_request():
         # Lưu thời gian bắt đầu request
-        g.start_time = time.time()
+        g.start_time = time.perf_counter()
+        g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
         
         # Log CORS origin nếu có
-        origin = request.headers.get('Origin', 'No origin')
-        logger.debug(f"[REQUEST] {request.method} {request.path} | Origin: {origin}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[REQUEST] %s %s | Origin: %s", request.method, request.path,
+                         request.headers.get('Origin', 'No origin'))
     
     @app.after_request
     def after_request(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        
         # Tính thời gian xử lý request
-        if hasattr(g, 'start_time'):
-            elapsed = time.time() - g.start_time
-            logger.debug(f"[RESPONSE] {request.method} {request.path} | Status: {response.status_code} | Time: {elapsed:.3f}s")
+        start_time = g.get('start_time')
+        if start_time is not None and request_logger.isEnabledFor(logging.INFO):
+            latency_ms = (time.perf_counter() - start_time) * 1000
+            sampler = current_app.extensions.get('request_log_sampler')
+            if sampler is None or sampler.should_log(request.endpoint, response.status_code, latency_ms):
+                db_queries, db_time = request_db_stats()
+                request_logger.info(
+                    "%s %s %s", request.method, request.path, response.status_code,
+                    extra={
+                        "request_id": request_id,
+                        "method": request.method,
+                        "route": request.url_rule.rule if request.url_rule else None,
+                        "endpoint": request.endpoint,
+                        "status": response.status_code,
+                        "latency_ms": round(latency_ms, 2),
+                        "db_ms": round(db_time * 1000, 2),
+                        "db_queries": db_queries,
+                    },
+                )
         
         # Log CORS headers nếu có
-        if 'Access-Control-Allow-Origin' in response.headers:
-            logger.debug(f"[CORS] Allowed origin: {response.headers.get('Access-Control-Allow-Origin')}")
+        if logger.isEnabledFor(logging.DEBUG) and 'Access-Control-Allow-Origin' in response.headers:
+            logger.debug("[CORS] Allowed origin: %s", response.headers.get('Access-Control-Allow-Origin'))
         
         return response
 
 
+# Route nhận body dạng stream (upload ảnh) thay vì JSON; chỉ đọc header, không đụng tới body
+STREAMING_CONTENT_TYPES = {
+    '/api/images': ('multipart/form-data', 'application/offset+octet-stream'),
+}
+
+
+def _is_streaming_upload(path: str, mimetype: str) -> bool:
+    """Content-Type upload chỉ hợp lệ dưới đúng prefix của nó"""
+    return any(
+        (path == prefix or path.startswith(prefix + '/')) and mimetype in types
+        for prefix, types in STREAMING_CONTENT_TYPES.items()
+    )
+
+
 def validate_content_type(app):
     """
     Kiểm tra Content-Type header cho POST/PUT requests
+    
+    JSON cho mọi API; thêm multipart/form-data, application/offset+octet-stream
+    cho upload ảnh, chỉ dưới các prefix trong STREAMING_CONTENT_TYPES
     """
     
     @app.before_request
@@ -50,7 +92,9 @@ def validate_content_type(app):
         if request.method in ['POST', 'PUT', 'PATCH']:
             if request.content_length and request.content_length > 0:
                 content_type = request.headers.get('Content-Type', '')
-                if not content_type.startswith('application/json'):
+                # JSON: application/json* (vd. json-patch+json) và application/*+json
+                is_json = content_type.startswith('application/json') or request.is_json
+                if not is_json and not _is_streaming_upload(request.path, request.mimetype):
                     logger.warning(
                         f"[VALIDATION] Invalid Content-Type for {request.method} {request.path}: {content_type}"
                     )
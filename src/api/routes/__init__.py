@@ -1,6 +1,21 @@
-from .health_routes import health_bp
+from .health_routes import health_bp, probes_bp
 from .auth_routes import auth_bp
+from .metrics_routes import metrics_bp
+from .image_routes import images_bp
+from .lazy import register_lazy_routes
+
+# Route ít dùng: module chỉ được import ở request đầu tiên
+EMAIL_ROUTES = [
+    ("/send-verification-email", "send_verification_email_endpoint", ["POST"]),
+    ("/verify-email", "verify_email_endpoint", ["POST"]),
+    ("/resend-verification-email", "resend_verification_email_endpoint", ["POST"]),
+]
 
 def register_routes(app):
     app.register_blueprint(health_bp, url_prefix="/api")
+    app.register_blueprint(probes_bp)
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
+    app.register_blueprint(images_bp, url_prefix="/api/images")
+    if app.config.get("METRICS_ENABLED", True):
+        app.register_blueprint(metrics_bp)
+    register_lazy_routes(app, "email", "api.routes.email_routes", "/api/auth", EMAIL_ROUTES)
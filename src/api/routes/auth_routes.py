@@ -1,37 +1,43 @@
 from flask import Blueprint, request, jsonify, g
 from infrastructure.repositories.user_repository import UserRepository
-from infrastructure.repositories.email_verification_token_repository import EmailVerificationTokenRepository
-from infrastructure.databases.mssql import get_request_db_session, SessionFactory, init_mssql
-from api.validators import validate_email, validate_password, validate_login_request, validate_register_request, validate_email_verification_token, validate_resend_verification_email_request
-from services.email_service import email_service
+from infrastructure.databases.mssql import get_request_db_session, SessionFactory
+from api.validators import validate_email, validate_password, validate_login_request, validate_register_request
+from services.password_hasher import password_hasher, PasswordHasherBusy
+from services.password_policy import password_policy
+from services.token_service import get_token_service
+from services.refresh_token_store import get_refresh_token_store, RefreshTokenError, RefreshTokenReused
 import jwt
-import os
-import bcrypt
-from datetime import datetime, timedelta
+import logging
 
 auth_bp = Blueprint("auth", __name__)
+logger = logging.getLogger(__name__)
 
 def hash_password(password: str) -> str:
-    """Băm mật khẩu"""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    """Băm mật khẩu (chạy trong password hashing pool, cost theo password_policy)"""
+    return password_hasher.hash_password(password, password_policy.rounds)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Kiểm tra mật khẩu"""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    """Kiểm tra mật khẩu (chạy trong password hashing pool)"""
+    return password_hasher.verify_password(plain_password, hashed_password)
 
-def get_secret_key() -> str:
+def rehash_password_if_needed(user_repo: UserRepository, user_data: dict, password: str):
     """
-    Get JWT secret key from environment
-    Raises error if not set in production
+    Băm lại mật khẩu sau khi đăng nhập thành công nếu cost của hash cũ khác policy.
+    Bỏ qua (để lần đăng nhập sau) khi hashing pool đang bận.
     """
-    secret_key = os.getenv("SECRET_KEY")
-    if not secret_key:
-        env = os.getenv("FLASK_ENV", "development")
-        if env == "production":
-            raise ValueError("SECRET_KEY must be set in environment for production")
-        secret_key = "your-secret-key-change-in-production"  # Default for dev
-    return secret_key
+    if not password_policy.needs_rehash(user_data["password_hash"]):
+        return
+    try:
+        user_repo.update_password(user_data["id"], hash_password(password))
+    except PasswordHasherBusy:
+        pass
+
+def password_hasher_busy_response(error: PasswordHasherBusy):
+    """Trả về 503 + Retry-After khi hàng đợi băm mật khẩu đã đầy"""
+    return jsonify({
+        "success": False,
+        "error": "Hệ thống đang bận, vui lòng thử lại sau"
+    }), 503, {"Retry-After": str(error.retry_after)}
 
 def verify_token_from_header(auth_header: str) -> tuple:
     """
@@ -53,9 +59,9 @@ def verify_token_from_header(auth_header: str) -> tuple:
             return None, "Invalid authorization header format", 400
         
         token = parts[1]
-        secret_key = get_secret_key()
         
-        payload = jwt.decode(token, secret_key, algorithms=["HS256"])
+        # TokenService tra cache trước, chỉ decode đầy đủ khi chưa xác minh
+        payload = get_token_service().verify(token)
         return payload, None, 200
         
     except jwt.ExpiredSignatureError:
@@ -65,12 +71,6 @@ def verify_token_from_header(auth_header: str) -> tuple:
     except Exception as e:
         return None, f"Lỗi xác minh token: {str(e)}", 500
 
-# Khởi tạo database (tạo bảng nếu chưa có)
-try:
-    init_mssql()
-except Exception as e:
-    print(f"Database initialization warning: {e}")
-
 # Seed dữ liệu mẫu khi khởi động
 def seed_demo_users():
     """Thêm dữ liệu demo vào database"""
@@ -104,9 +104,9 @@ def seed_demo_users():
             session.add(doctor)
             
             session.commit()
-            print("✓ Demo users seeded successfully")
+            logger.info("✓ Demo users seeded successfully")
     except Exception as e:
-        print(f"Seed users warning: {e}")
+        logger.warning("Seed users warning: %s", e)
 
 # Seed dữ liệu lần đầu (disabled - use login with demo accounts instead)
 # Demo accounts are seeded when first registered
@@ -173,17 +173,13 @@ def login():
                 "error": "Email hoặc mật khẩu không đúng"
             }), 401
         
-        # Tạo JWT token
-        secret_key = get_secret_key()
-        payload = {
-            "user_id": user_data["id"],
-            "email": user_data["email"],
-            "iat": datetime.utcnow().timestamp(),
-            "exp": (datetime.utcnow() + timedelta(hours=24)).timestamp()
-        }
+        # Nâng/hạ bcrypt cost của hash cũ theo policy hiện tại
+        rehash_password_if_needed(user_repo, user_data, password)
         
-        access_token = jwt.encode(payload, secret_key, algorithm="HS256")
-        refresh_token = jwt.encode({**payload, "exp": (datetime.utcnow() + timedelta(days=7)).timestamp()}, secret_key, algorithm="HS256")
+        # Tạo JWT token
+        token_service = get_token_service()
+        access_token = token_service.issue_access_token(user_data["id"], user_data["email"])
+        refresh_token = get_refresh_token_store().issue(session, user_data["id"], user_data["email"])
         
         # Xác định role dựa trên email
         role = "PATIENT"
@@ -213,6 +209,9 @@ def login():
             }
         }), 200
     
+    except PasswordHasherBusy as e:
+        return password_hasher_busy_response(e)
+    
     except Exception as e:
         return jsonify({
             "success": False,
@@ -223,8 +222,36 @@ def login():
 def logout():
     """
     Endpoint đăng xuất
+    
+    Request body (optional):
+    {
+        "refreshToken": "refresh_token_value",
+        "allDevices": false
+    }
+    
+    Thu hồi refresh token family của phiên hiện tại; allDevices=true thu hồi
+    mọi phiên của user.
     """
+    session = get_request_db_session()
+    
     try:
+        data = request.get_json(silent=True) or {}
+        refresh_token = data.get("refreshToken")
+        
+        if refresh_token:
+            try:
+                payload = get_token_service().decode(refresh_token)
+            except jwt.InvalidTokenError:
+                # Token hết hạn/không hợp lệ thì không còn gì để thu hồi
+                payload = None
+            
+            if payload:
+                store = get_refresh_token_store()
+                if data.get("allDevices"):
+                    store.revoke_user(session, payload.get("user_id"))
+                elif payload.get("fam"):
+                    store.revoke_family(session, payload["fam"])
+        
         return jsonify({
             "success": True,
             "message": "Đã đăng xuất thành công"
@@ -306,16 +333,9 @@ def register():
         )
         
         # Tạo JWT token
-        secret_key = get_secret_key()
-        payload = {
-            "user_id": new_user["id"],
-            "email": new_user["email"],
-            "iat": datetime.utcnow().timestamp(),
-            "exp": (datetime.utcnow() + timedelta(hours=24)).timestamp()
-        }
-        
-        access_token = jwt.encode(payload, secret_key, algorithm="HS256")
-        refresh_token = jwt.encode({**payload, "exp": (datetime.utcnow() + timedelta(days=7)).timestamp()}, secret_key, algorithm="HS256")
+        token_service = get_token_service()
+        access_token = token_service.issue_access_token(new_user["id"], new_user["email"])
+        refresh_token = get_refresh_token_store().issue(session, new_user["id"], new_user["email"])
         
         # Xác định role mặc định là PATIENT
         role = "PATIENT"
@@ -341,6 +361,9 @@ def register():
             }
         }), 201
     
+    except PasswordHasherBusy as e:
+        return password_hasher_busy_response(e)
+    
     except Exception as e:
         return jsonify({
             "success": False,
@@ -484,12 +507,15 @@ def refresh_access_token():
         "success": true,
         "data": {
             "accessToken": "new_access_token",
+            "refreshToken": "new_refresh_token",
             "expiresIn": 86400
         }
     }
+    
+    Refresh token được rotate: token cũ chỉ dùng được một lần, dùng lại sẽ
+    thu hồi toàn bộ family.
     """
     session = get_request_db_session()
-    user_repo = UserRepository(session)
     
     try:
         data = request.get_json() or {}
@@ -502,9 +528,9 @@ def refresh_access_token():
             }), 400
         
         # Verify refresh token
-        secret_key = get_secret_key()
+        token_service = get_token_service()
         try:
-            payload = jwt.decode(refresh_token, secret_key, algorithms=["HS256"])
+            payload = token_service.decode(refresh_token)
         except jwt.ExpiredSignatureError:
             return jsonify({
                 "success": False,
@@ -516,262 +542,43 @@ def refresh_access_token():
                 "error": "Refresh token không hợp lệ"
             }), 401
         
-        # Verify user still exists
-        user_id = payload.get("user_id")
-        email = payload.get("email")
-        user_data = user_repo.find_by_email(email)
-        
-        if not user_data:
-            return jsonify({
-                "success": False,
-                "error": "Người dùng không tồn tại"
-            }), 404
-        
-        # Generate new access token
-        new_payload = {
-            "user_id": user_id,
-            "email": email,
-            "iat": datetime.utcnow().timestamp(),
-            "exp": (datetime.utcnow() + timedelta(hours=24)).timestamp()
-        }
-        
-        new_access_token = jwt.encode(new_payload, secret_key, algorithm="HS256")
-        
-        return jsonify({
-            "success": True,
-            "data": {
-                "accessToken": new_access_token,
-                "expiresIn": 86400  # 24 hours in seconds
-            }
-        }), 200
-    
-    except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 500
-
-
-@auth_bp.post("/send-verification-email")
-def send_verification_email_endpoint():
-    """
-    Send verification email to user after registration
-    
-    Request body:
-    {
-        "userId": "uuid"
-    }
-    
-    Response:
-    {
-        "success": true,
-        "message": "Email xác nhận đã được gửi"
-    }
-    """
-    session = get_request_db_session()
-    user_repo = UserRepository(session)
-    token_repo = EmailVerificationTokenRepository(session)
-    
-    try:
-        data = request.get_json() or {}
-        user_id = data.get("userId")
-        
-        if not user_id:
-            return jsonify({
-                "success": False,
-                "error": "userId là bắt buộc"
-            }), 400
-        
-        # Find user
-        user_data = user_repo.find_by_id(user_id)
+        # User phải còn tồn tại và còn hoạt động (lookup theo khóa chính)
+        user_data = UserRepository(session).find_by_id(payload.get("user_id"))
         if not user_data:
             return jsonify({
                 "success": False,
                 "error": "Người dùng không tồn tại"
             }), 404
-        
-        # Check if email already verified
-        if user_data.get("email_verified"):
-            return jsonify({
-                "success": False,
-                "error": "Email đã được xác nhận"
-            }), 400
-        
-        # Invalidate previous tokens
-        token_repo.invalidate_user_tokens(user_id)
-        
-        # Create verification token
-        verification_token = token_repo.create_token(user_id)
-        
-        # Send verification email
-        email_sent = email_service.send_verification_email(
-            recipient_email=user_data["email"],
-            verification_token=verification_token,
-            full_name=user_data.get("full_name")
-        )
-        
-        if not email_sent:
+        if not user_data.get("is_active", True):
             return jsonify({
                 "success": False,
-                "error": "Không thể gửi email xác nhận"
-            }), 500
+                "error": "Tài khoản đã bị vô hiệu hóa"
+            }), 403
         
-        return jsonify({
-            "success": True,
-            "message": "Email xác nhận đã được gửi"
-        }), 200
-    
-    except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 500
-
-
-@auth_bp.post("/verify-email")
-def verify_email_endpoint():
-    """
-    Verify email address with verification token
-    
-    Request body:
-    {
-        "token": "verification_token"
-    }
-    
-    Response:
-    {
-        "success": true,
-        "message": "Email đã được xác nhận thành công"
-    }
-    """
-    session = get_request_db_session()
-    user_repo = UserRepository(session)
-    token_repo = EmailVerificationTokenRepository(session)
-    
-    try:
-        data = request.get_json() or {}
-        
-        # Validate request
-        is_valid, error = validate_email_verification_token(data)
-        if not is_valid:
-            return jsonify({
-                "success": False,
-                "error": error
-            }), 400
-        
-        token = data.get("token")
-        
-        # Get token record
-        token_record = token_repo.get_token_by_token(token)
-        if not token_record:
-            return jsonify({
-                "success": False,
-                "error": "Token xác nhận không hợp lệ"
-            }), 400
-        
-        # Check if token is valid
-        if not token_record.is_valid():
-            if token_record.is_used:
-                return jsonify({
-                    "success": False,
-                    "error": "Token xác nhận đã được sử dụng"
-                }), 400
-            else:
-                return jsonify({
-                    "success": False,
-                    "error": "Token xác nhận đã hết hạn"
-                }), 400
-        
-        # Update user email_verified
-        user_id = token_record.user_id
-        user_repo.update_email_verified(user_id)
-        
-        # Mark token as used
-        token_repo.verify_token(token)
-        
-        return jsonify({
-            "success": True,
-            "message": "Email đã được xác nhận thành công"
-        }), 200
-    
-    except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 500
-
-
-@auth_bp.post("/resend-verification-email")
-def resend_verification_email_endpoint():
-    """
-    Resend verification email to user
-    
-    Request body:
-    {
-        "email": "user@example.com"
-    }
-    
-    Response:
-    {
-        "success": true,
-        "message": "Email xác nhận đã được gửi lại"
-    }
-    """
-    session = get_request_db_session()
-    user_repo = UserRepository(session)
-    token_repo = EmailVerificationTokenRepository(session)
-    
-    try:
-        data = request.get_json() or {}
-        
-        # Validate request
-        is_valid, error = validate_resend_verification_email_request(data)
-        if not is_valid:
+        # Rotate refresh token (kiểm tra revoke/reuse qua refresh token store)
+        try:
+            new_refresh_token = get_refresh_token_store().rotate(session, payload)
+        except RefreshTokenReused:
             return jsonify({
                 "success": False,
-                "error": error
-            }), 400
-        
-        email = data.get("email").strip()
-        
-        # Find user by email
-        user_data = user_repo.find_by_email(email)
-        if not user_data:
-            # Don't reveal if email exists for security
-            return jsonify({
-                "success": True,
-                "message": "Nếu email tồn tại, email xác nhận sẽ được gửi"
-            }), 200
-        
-        # Check if email already verified
-        if user_data.get("email_verified"):
+                "error": "Refresh token đã được sử dụng, vui lòng đăng nhập lại"
+            }), 401
+        except RefreshTokenError:
             return jsonify({
                 "success": False,
-                "error": "Email đã được xác nhận"
-            }), 400
-        
-        # Invalidate previous tokens
-        token_repo.invalidate_user_tokens(user_data["id"])
-        
-        # Create verification token
-        verification_token = token_repo.create_token(user_data["id"])
-        
-        # Send verification email
-        email_sent = email_service.send_verification_email(
-            recipient_email=user_data["email"],
-            verification_token=verification_token,
-            full_name=user_data.get("full_name")
-        )
+                "error": "Refresh token không hợp lệ"
+            }), 401
         
-        if not email_sent:
-            return jsonify({
-                "success": True,
-                "message": "Nếu email tồn tại, email xác nhận sẽ được gửi"
-            }), 200
+        # Generate new access token
+        new_access_token = token_service.issue_access_token(payload.get("user_id"), payload.get("email"))
         
         return jsonify({
             "success": True,
-            "message": "Email xác nhận đã được gửi lại"
+            "data": {
+                "accessToken": new_access_token,
+                "refreshToken": new_refresh_token,
+                "expiresIn": token_service.access_token_ttl  # seconds
+            }
         }), 200
     
     except Exception as e:
@@ -803,6 +610,8 @@ def change_password():
         "success": true,
         "message": "Mật khẩu đã được thay đổi thành công"
     }
+    
+    Mọi refresh token của user bị thu hồi: các thiết bị phải đăng nhập lại.
     """
     session = get_request_db_session()
     user_repo = UserRepository(session)
@@ -864,12 +673,17 @@ def change_password():
         # Update password
         new_password_hash = hash_password(new_password)
         user_repo.update_password(user_id, new_password_hash)
+        # Đăng xuất mọi phiên: refresh token bị lộ không còn dùng được sau khi đổi mật khẩu
+        get_refresh_token_store().revoke_user(session, user_id)
         
         return jsonify({
             "success": True,
             "message": "Mật khẩu đã được thay đổi thành công"
         }), 200
     
+    except PasswordHasherBusy as e:
+        return password_hasher_busy_response(e)
+    
     except Exception as e:
         return jsonify({
             "success": False,
@@ -894,6 +708,8 @@ def reset_password():
         "success": true,
         "message": "Mật khẩu đã được đặt lại thành công"
     }
+    
+    Mọi refresh token của user bị thu hồi.
     """
     session = get_request_db_session()
     user_repo = UserRepository(session)
@@ -942,12 +758,16 @@ def reset_password():
         # Update password
         new_password_hash = hash_password(new_password)
         user_repo.update_password(user_data["id"], new_password_hash)
+        get_refresh_token_store().revoke_user(session, user_data["id"])
         
         return jsonify({
             "success": True,
             "message": "Mật khẩu đã được đặt lại thành công. Vui lòng đăng nhập với mật khẩu mới."
         }), 200
     
+    except PasswordHasherBusy as e:
+        return password_hasher_busy_response(e)
+    
     except Exception as e:
         return jsonify({
             "success": False,
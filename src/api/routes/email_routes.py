@@ -0,0 +1,229 @@
+"""
+Email verification routes (/api/auth/*-verification-email, /api/auth/verify-email)
+Registered lazily (see api/routes/lazy.py): this module is only imported on
+the first request to one of these endpoints. Emails are queued in the outbox
+(services/email_outbox.py) and sent in the background.
+"""
+
+from flask import request, jsonify
+from infrastructure.repositories.user_repository import UserRepository
+from infrastructure.repositories.email_verification_token_repository import EmailVerificationTokenRepository
+from infrastructure.databases.mssql import get_request_db_session
+from api.validators import validate_email_verification_token, validate_resend_verification_email_request
+from services.email_outbox import get_email_outbox
+
+
+def send_verification_email_endpoint():
+    """
+    Send verification email to user after registration
+    
+    Request body:
+    {
+        "userId": "uuid"
+    }
+    
+    Response:
+    {
+        "success": true,
+        "message": "Email xác nhận đã được gửi"
+    }
+    """
+    session = get_request_db_session()
+    user_repo = UserRepository(session)
+    token_repo = EmailVerificationTokenRepository(session)
+    
+    try:
+        data = request.get_json() or {}
+        user_id = data.get("userId")
+        
+        if not user_id:
+            return jsonify({
+                "success": False,
+                "error": "userId là bắt buộc"
+            }), 400
+        
+        # Find user
+        user_data = user_repo.find_by_id(user_id)
+        if not user_data:
+            return jsonify({
+                "success": False,
+                "error": "Người dùng không tồn tại"
+            }), 404
+        
+        # Check if email already verified
+        if user_data.get("email_verified"):
+            return jsonify({
+                "success": False,
+                "error": "Email đã được xác nhận"
+            }), 400
+        
+        # Invalidate previous tokens
+        token_repo.invalidate_user_tokens(user_id)
+        
+        # Create verification token
+        verification_token = token_repo.create_token(user_id)
+        
+        # Queue verification email (gửi nền, không chờ SMTP)
+        get_email_outbox().enqueue_verification_email(
+            session,
+            recipient_email=user_data["email"],
+            verification_token=verification_token,
+            full_name=user_data.get("full_name")
+        )
+        
+        return jsonify({
+            "success": True,
+            "message": "Email xác nhận đã được gửi"
+        }), 200
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+def verify_email_endpoint():
+    """
+    Verify email address with verification token
+    
+    Request body:
+    {
+        "token": "verification_token"
+    }
+    
+    Response:
+    {
+        "success": true,
+        "message": "Email đã được xác nhận thành công"
+    }
+    """
+    session = get_request_db_session()
+    user_repo = UserRepository(session)
+    token_repo = EmailVerificationTokenRepository(session)
+    
+    try:
+        data = request.get_json() or {}
+        
+        # Validate request
+        is_valid, error = validate_email_verification_token(data)
+        if not is_valid:
+            return jsonify({
+                "success": False,
+                "error": error
+            }), 400
+        
+        token = data.get("token")
+        
+        # Get token record
+        token_record = token_repo.get_token_by_token(token)
+        if not token_record:
+            return jsonify({
+                "success": False,
+                "error": "Token xác nhận không hợp lệ"
+            }), 400
+        
+        # Check if token is valid
+        if not token_record.is_valid():
+            if token_record.is_used:
+                return jsonify({
+                    "success": False,
+                    "error": "Token xác nhận đã được sử dụng"
+                }), 400
+            else:
+                return jsonify({
+                    "success": False,
+                    "error": "Token xác nhận đã hết hạn"
+                }), 400
+        
+        # Update user email_verified
+        user_id = token_record.user_id
+        user_repo.update_email_verified(user_id)
+        
+        # Mark token as used
+        token_repo.verify_token(token)
+        
+        return jsonify({
+            "success": True,
+            "message": "Email đã được xác nhận thành công"
+        }), 200
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+def resend_verification_email_endpoint():
+    """
+    Resend verification email to user
+    
+    Request body:
+    {
+        "email": "user@example.com"
+    }
+    
+    Response:
+    {
+        "success": true,
+        "message": "Email xác nhận đã được gửi lại"
+    }
+    """
+    session = get_request_db_session()
+    user_repo = UserRepository(session)
+    token_repo = EmailVerificationTokenRepository(session)
+    
+    try:
+        data = request.get_json() or {}
+        
+        # Validate request
+        is_valid, error = validate_resend_verification_email_request(data)
+        if not is_valid:
+            return jsonify({
+                "success": False,
+                "error": error
+            }), 400
+        
+        email = data.get("email").strip()
+        
+        # Find user by email
+        user_data = user_repo.find_by_email(email)
+        if not user_data:
+            # Don't reveal if email exists for security
+            return jsonify({
+                "success": True,
+                "message": "Nếu email tồn tại, email xác nhận sẽ được gửi"
+            }), 200
+        
+        # Check if email already verified
+        if user_data.get("email_verified"):
+            return jsonify({
+                "success": False,
+                "error": "Email đã được xác nhận"
+            }), 400
+        
+        # Invalidate previous tokens
+        token_repo.invalidate_user_tokens(user_data["id"])
+        
+        # Create verification token
+        verification_token = token_repo.create_token(user_data["id"])
+        
+        # Queue verification email (gửi nền, không chờ SMTP)
+        get_email_outbox().enqueue_verification_email(
+            session,
+            recipient_email=user_data["email"],
+            verification_token=verification_token,
+            full_name=user_data.get("full_name")
+        )
+        
+        return jsonify({
+            "success": True,
+            "message": "Email xác nhận đã được gửi lại"
+        }), 200
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
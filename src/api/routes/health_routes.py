@@ -1,8 +1,11 @@
-from flask import Blueprint, jsonify, g
-from sqlalchemy import text
-from infrastructure.databases.mssql import get_request_db_session
+from flask import Blueprint, current_app, jsonify
+from api.routes.metrics_routes import metrics_authorized
+from services.health import get_health_checker
+from services.request_profiler import get_request_profiler
 
 health_bp = Blueprint("health", __name__)
+# Probe cho orchestrator, đăng ký ở gốc (/livez, /readyz)
+probes_bp = Blueprint("probes", __name__)
 
 
 @health_bp.get("/")
@@ -12,25 +15,51 @@ def index():
 
 @health_bp.get("/health")
 def health_check():
-    """Basic healthcheck endpoint.
+    """Healthcheck endpoint (cached dependency checks, no DB query per call).
 
-    - Returns overall status
-    - Attempts a lightweight DB check and reports `db_status`
+    - Returns overall status and `db_status`
+    - 503 with `success: false` when a critical check (DB, disk) fails
     """
-    db_ok = False
-    db_error = None
-    try:
-        session = get_request_db_session()
-        session.execute(text("SELECT 1"))
-        db_ok = True
-    except Exception as e:
-        db_error = str(e)
-
+    result = get_health_checker().status()
+    db = result["checks"].get("db", {})
     return jsonify({
-        "success": True,
+        "success": result["ready"],
         "data": {
-            "status": "ok",
-            "db_status": db_ok,
-            "db_error": db_error,
+            "status": result["status"],
+            "db_status": db.get("ok", False),
+            "db_error": db.get("error"),
         },
-    }), 200
\ No newline at end of file
+    }), 200 if result["ready"] else 503
+
+
+@probes_bp.get("/livez")
+def livez():
+    """Liveness: the worker answers requests. No I/O."""
+    return jsonify({"status": "ok"}), 200
+
+
+@probes_bp.get("/readyz")
+def readyz():
+    """Readiness: last result of the DB/SMTP/disk checks, 503 when not ready."""
+    result = get_health_checker().status()
+    return jsonify(result), 200 if result["ready"] else 503
+
+
+@health_bp.get("/health/perf")
+def perf_stats():
+    """Rolling per-endpoint latency histogram of this worker.
+
+    - p50/p95/p99 are bucket upper bounds (ms)
+    - mean_queries/max_queries help spot N+1 queries
+    - Same `Authorization: Bearer <METRICS_TOKEN>` as /metrics; without a
+      METRICS_TOKEN only served when PERF_SERVER_TIMING is on (dev/test)
+    """
+    # Latency theo endpoint cũng lộ thông tin như Server-Timing (vd. login có chạy bcrypt hay không)
+    if not current_app.config.get("METRICS_TOKEN") and not current_app.config.get("PERF_SERVER_TIMING"):
+        return jsonify({"success": False, "error": "Not found"}), 404
+    if not metrics_authorized():
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+    return jsonify({
+        "success": True,
+        "data": get_request_profiler().histogram.snapshot(),
+    }), 200
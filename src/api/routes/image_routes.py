@@ -0,0 +1,280 @@
+"""
+Retinal image upload routes (/api/images)
+
+POST /api/images                          multipart/form-data: one or more image files
+                                          + imageType, patientId, clinicId, profileId fields
+POST /api/images/uploads                  start a resumable upload {"size", "checksum"?}
+GET  /api/images/uploads/<id>             current offset (Upload-Offset header)
+PATCH /api/images/uploads/<id>            bytes at Upload-Offset (application/offset+octet-stream)
+POST /api/images/uploads/<id>/complete    finish; body: the same fields as above (JSON)
+DELETE /api/images/uploads/<id>           abort
+
+Files are streamed into the image store (services/image_upload.py); the
+retinal_images rows and their analysis request are then created in one
+transaction and the request is queued for the analysis workers, unless the
+same images were already analysed with the deployed model and thresholds:
+then the cached result is copied and the request is done at once
+(services/result_cache.py).
+"""
+
+import json
+import logging
+
+from flask import Blueprint, jsonify, request
+from infrastructure.databases.mssql import get_request_db_session
+from infrastructure.repositories.analysis_request_repository import AnalysisRequestRepository
+from infrastructure.repositories.retinal_image_repository import RetinalImageRepository
+from api.routes.auth_routes import verify_token_from_header
+from api.validators import validate_image_upload_fields, validate_resumable_upload_request
+from services.image_upload import UploadBusy, UploadError, get_image_uploads
+from services.result_cache import get_result_cache
+
+images_bp = Blueprint("images", __name__)
+logger = logging.getLogger(__name__)
+
+
+def _error(message: str, status: int, headers=None):
+    return jsonify({"success": False, "error": message}), status, headers or {}
+
+
+def _authenticate():
+    """Returns (payload, error response)"""
+    payload, error, status_code = verify_token_from_header(request.headers.get("Authorization", ""))
+    if error:
+        return None, _error(error, status_code)
+    return payload, None
+
+
+def _optional_int(value):
+    return int(value) if value not in (None, "") else None
+
+
+def _create_analysis_request(fields: dict, files: list):
+    """
+    Create the analysis request and its retinal_images rows in one transaction
+
+    Args:
+        fields: Validated upload fields
+        files: (StoredBlob, metadata dict) per image
+    """
+    session = get_request_db_session()
+    image_type = str(fields.get("imageType") or "FUNDUS").strip().upper()
+    profile_id = _optional_int(fields.get("profileId"))
+    result_id = None
+    try:
+        request_repo = AnalysisRequestRepository(session)
+        request_id = request_repo.enqueue(
+            patient_id=_optional_int(fields.get("patientId")),
+            clinic_id=_optional_int(fields.get("clinicId")),
+            profile_id=profile_id,
+            commit=False,
+        )
+        image_repo = RetinalImageRepository(session)
+        images = [
+            image_repo.create(image_type, blob.url, blob.checksum, request_id,
+                              json.dumps(dict(metadata, size=blob.size)), commit=False)
+            for blob, metadata in files
+        ]
+        # Ảnh đã phân tích với model + ngưỡng hiện tại (tái khám): dùng lại kết quả, không xếp hàng inference
+        cache = get_result_cache()
+        cached = cache.lookup_upload(session, [blob.checksum for blob, _ in files], profile_id) if cache else None
+        if cached is not None:
+            [result_id] = cache.apply(session, [(request_id, cached)])
+            request_repo.complete_from_cache(request_id, cached.model_version, commit=False)
+            image_repo.mark_checked([image.id for image in images])
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Creating analysis request for upload failed: {e}")
+        return _error("Không thể tạo yêu cầu phân tích", 500)
+
+    return jsonify({
+        "success": True,
+        "data": {
+            "requestId": request_id,
+            "status": "done" if result_id else "queued",
+            "resultId": result_id,
+            "cached": result_id is not None,
+            "images": [
+                {
+                    "id": image.id,
+                    "checksum": blob.checksum,
+                    "size": blob.size,
+                    # Cùng nội dung đã có trong kho ảnh: không tốn thêm dung lượng
+                    "duplicate": not blob.created,
+                }
+                for image, (blob, _) in zip(images, files)
+            ],
+        },
+    }), 201
+
+
+@images_bp.post("")
+def upload_images():
+    """
+    Upload retinal images (multipart/form-data, streamed)
+
+    Response (201):
+    {
+        "success": true,
+        "data": {
+            "requestId": 1,
+            "status": "queued",          # "done" khi kết quả lấy từ result cache
+            "resultId": null,
+            "cached": false,
+            "images": [{"id": 1, "checksum": "sha256 hex", "size": 123, "duplicate": false}]
+        }
+    }
+    """
+    payload, error = _authenticate()
+    if error:
+        return error
+
+    boundary = request.mimetype_params.get("boundary")
+    if request.mimetype != "multipart/form-data" or not boundary:
+        return _error("Content-Type phải là multipart/form-data", 415)
+
+    uploads = get_image_uploads()
+    # Từ chối trước khi đọc body nếu Content-Length đã vượt giới hạn
+    if request.content_length and request.content_length > uploads.max_request_size:
+        return _error(f"Upload vượt quá {uploads.max_request_size} bytes", 413)
+
+    try:
+        with uploads.gate.slot():
+            fields, files = uploads.receive_multipart(request.stream, boundary.encode("latin-1"))
+    except UploadBusy as e:
+        return _error("Hệ thống đang bận, vui lòng thử lại sau", 503, {"Retry-After": str(e.retry_after)})
+    except UploadError as e:
+        return _error(str(e), e.status)
+
+    if not files:
+        return _error("Không có file ảnh nào", 400)
+    is_valid, error = validate_image_upload_fields(fields)
+    if not is_valid:
+        return _error(error, 400)
+
+    return _create_analysis_request(fields, [
+        (f.blob, {"filename": f.filename, "contentType": f.content_type}) for f in files
+    ])
+
+
+@images_bp.post("/uploads")
+def create_resumable_upload():
+    """
+    Start a resumable upload (large OCT volumes)
+
+    Request body:
+    {
+        "size": 734003200,
+        "checksum": "sha256 hex (optional, verified on completion)"
+    }
+
+    Response (201): {"success": true, "data": {"uploadId": "...", "offset": 0, "size": 734003200}}
+    """
+    payload, error = _authenticate()
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    is_valid, error = validate_resumable_upload_request(data)
+    if not is_valid:
+        return _error(error, 400)
+
+    try:
+        upload = get_image_uploads().resumable.create(data["size"], payload.get("user_id"), data.get("checksum"))
+    except UploadError as e:
+        return _error(str(e), e.status)
+    return jsonify({"success": True, "data": upload}), 201, {
+        "Location": f"/api/images/uploads/{upload['uploadId']}",
+        "Upload-Offset": "0",
+    }
+
+
+@images_bp.get("/uploads/<upload_id>")
+def resumable_upload_status(upload_id):
+    """Offset to resume from (also in the Upload-Offset header)"""
+    payload, error = _authenticate()
+    if error:
+        return error
+    try:
+        status = get_image_uploads().resumable.status(upload_id, payload.get("user_id"))
+    except UploadError as e:
+        return _error(str(e), e.status)
+    return jsonify({"success": True, "data": status}), 200, {"Upload-Offset": str(status["offset"])}
+
+
+@images_bp.patch("/uploads/<upload_id>")
+def append_resumable_upload(upload_id):
+    """
+    Append bytes to a resumable upload
+
+    Headers:
+    {
+        "Upload-Offset": "current offset (from the previous response or GET)",
+        "Content-Type": "application/offset+octet-stream"
+    }
+    """
+    payload, error = _authenticate()
+    if error:
+        return error
+
+    offset = request.headers.get("Upload-Offset", "")
+    if not offset.isdigit():
+        return _error("Upload-Offset header là bắt buộc", 400)
+
+    uploads = get_image_uploads()
+    try:
+        with uploads.gate.slot():
+            new_offset = uploads.resumable.append(upload_id, payload.get("user_id"), int(offset), request.stream)
+    except UploadBusy as e:
+        return _error("Hệ thống đang bận, vui lòng thử lại sau", 503, {"Retry-After": str(e.retry_after)})
+    except UploadError as e:
+        return _error(str(e), e.status)
+    return jsonify({"success": True, "data": {"uploadId": upload_id, "offset": new_offset}}), 200, {
+        "Upload-Offset": str(new_offset)
+    }
+
+
+@images_bp.post("/uploads/<upload_id>/complete")
+def complete_resumable_upload(upload_id):
+    """
+    Finish a resumable upload and queue its analysis
+
+    Request body:
+    {
+        "imageType": "OCT",
+        "patientId": 1,
+        "clinicId": 1,
+        "profileId": 1,
+        "filename": "volume.dcm"
+    }
+
+    Response (201): same as POST /api/images
+    """
+    payload, error = _authenticate()
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    is_valid, error = validate_image_upload_fields(data)
+    if not is_valid:
+        return _error(error, 400)
+
+    try:
+        blob = get_image_uploads().resumable.complete(upload_id, payload.get("user_id"))
+    except UploadError as e:
+        return _error(str(e), e.status)
+    return _create_analysis_request(data, [(blob, {"filename": data.get("filename"), "resumable": True})])
+
+
+@images_bp.delete("/uploads/<upload_id>")
+def abort_resumable_upload(upload_id):
+    """Abort a resumable upload and delete the bytes received"""
+    payload, error = _authenticate()
+    if error:
+        return error
+    try:
+        get_image_uploads().resumable.abort(upload_id, payload.get("user_id"))
+    except UploadError as e:
+        return _error(str(e), e.status)
+    return jsonify({"success": True}), 200
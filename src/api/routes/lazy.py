@@ -0,0 +1,50 @@
+"""
+Lazy route registration
+URL rules are registered at startup, but the module that implements them is
+imported on the first request. Used for rarely called subsystems (email,
+later admin/report routes) so they don't add to worker boot time.
+"""
+
+import threading
+
+from werkzeug.utils import import_string
+
+
+class LazyView:
+    """View function that imports its target ("module:function") on first call"""
+
+    def __init__(self, import_name: str):
+        self.import_name = import_name.replace(":", ".")
+        self._view = None
+        self._lock = threading.Lock()
+
+    @property
+    def view(self):
+        if self._view is None:
+            with self._lock:
+                if self._view is None:
+                    self._view = import_string(self.import_name)
+        return self._view
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+def register_lazy_routes(app, name: str, module: str, url_prefix: str, rules):
+    """
+    Register URL rules whose views live in a module imported on demand
+
+    Args:
+        app: Flask application instance
+        name: Endpoint prefix (endpoints are "<name>.<function>")
+        module: Module that implements the views
+        url_prefix: Prefix for every rule
+        rules: Iterable of (rule, function_name, methods)
+    """
+    for rule, function_name, methods in rules:
+        app.add_url_rule(
+            url_prefix + rule,
+            endpoint=f"{name}.{function_name}",
+            view_func=LazyView(f"{module}:{function_name}"),
+            methods=methods,
+        )
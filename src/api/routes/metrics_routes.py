@@ -0,0 +1,28 @@
+import hmac
+
+from flask import Blueprint, Response, current_app, request
+
+from services.metrics import get_metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+def metrics_authorized() -> bool:
+    """True if METRICS_TOKEN is unset or the request carries it as a Bearer token"""
+    token = current_app.config.get("METRICS_TOKEN")
+    if not token:
+        return True
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    return hmac.compare_digest(supplied, token)
+
+
+@metrics_bp.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint (text exposition format).
+
+    - Requires `Authorization: Bearer <METRICS_TOKEN>` when METRICS_TOKEN is set
+    - With METRICS_MULTIPROC_DIR, aggregates every gunicorn worker
+    """
+    if not metrics_authorized():
+        return {"success": False, "error": "Unauthorized"}, 401
+    return Response(get_metrics().render(), mimetype="text/plain; version=0.0.4")
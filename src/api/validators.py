@@ -201,4 +201,58 @@ def validate_resend_verification_email_request(data: dict) -> Tuple[bool, Option
     if not is_valid:
         return False, error
     
-    return True, None
\ No newline at end of file
+    return True, None
+
+IMAGE_TYPES = ("FUNDUS", "OCT")
+ID_FIELDS = ("patientId", "clinicId", "profileId")
+
+
+def validate_image_upload_fields(data: dict) -> Tuple[bool, Optional[str]]:
+    """
+    Validate the fields of an image upload (multipart form fields or JSON body)
+    
+    Args:
+        data: imageType (FUNDUS/OCT, default FUNDUS), optional patientId/clinicId/profileId
+        
+    Returns:
+        Tuple of (is_valid, error_message)
+    """
+    if data is None or not isinstance(data, dict):
+        return False, "Request body không hợp lệ"
+    
+    image_type = str(data.get("imageType") or "FUNDUS").strip().upper()
+    if image_type not in IMAGE_TYPES:
+        return False, "imageType phải là FUNDUS hoặc OCT"
+    
+    for field in ID_FIELDS:
+        value = data.get(field)
+        if value in (None, ""):
+            continue
+        if not str(value).isdigit() or int(value) <= 0:
+            return False, f"{field} không hợp lệ"
+    
+    return True, None
+
+
+def validate_resumable_upload_request(data: dict) -> Tuple[bool, Optional[str]]:
+    """
+    Validate the body that starts a resumable upload
+    
+    Args:
+        data: {"size": bytes, "checksum": optional SHA-256 hex}
+        
+    Returns:
+        Tuple of (is_valid, error_message)
+    """
+    if not data or not isinstance(data, dict):
+        return False, "Request body không hợp lệ"
+    
+    size = data.get("size")
+    if isinstance(size, bool) or not isinstance(size, int) or size <= 0:
+        return False, "size (số byte) là bắt buộc"
+    
+    checksum = data.get("checksum")
+    if checksum is not None and not re.match(r'^[0-9a-fA-F]{64}$', str(checksum)):
+        return False, "checksum phải là SHA-256 (64 ký tự hex)"
+    
+    return True, None
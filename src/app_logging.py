@@ -1,13 +1,177 @@
+"""
+Logging pipeline for AURA System
+
+Application threads only put records on an in-memory queue (QueueHandler);
+a QueueListener thread formats them and does the file/stdout I/O. Records
+can be rendered as one JSON object per line, including the ``extra=`` fields
+(request_id, route, status, latency_ms, db_ms, ...).
+"""
+
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
+import traceback
+from datetime import datetime, timezone
+from typing import Dict, Optional
 
-def setup_logging(): # create a funcion to setup logging 
-    logging.basicConfig( #Hàm cấu hình logging toàn cục
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler("app.log"),
-            logging.StreamHandler()# log hiện trực tiếp trên màn hình 
-        ]
-    )
+# Thuộc tính chuẩn của LogRecord; mọi thuộc tính khác là field truyền qua extra=
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps records structured
+
+    The stock prepare() formats the message (traceback included) into
+    ``msg`` on the calling thread; here only the arguments are merged and the
+    traceback is kept in exc_text, so the listener's formatter decides the layout.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+
+class RequestLogSampler:
+    """
+    Decides which request log lines are written
+
+    Rates are looked up by endpoint (``auth.login``), then blueprint
+    (``auth``), then the default. Server errors and slow requests are
+    always logged.
+
+    Args:
+        default_rate: Share of requests logged (0.0 - 1.0)
+        rates: {endpoint or blueprint: rate}
+        slow_ms: Requests slower than this are always logged (0 = off)
+    """
+
+    def __init__(self, default_rate: float = 1.0, rates: Optional[Dict[str, float]] = None, slow_ms: float = 0):
+        self.default_rate = default_rate
+        self.rates = rates or {}
+        self.slow_ms = slow_ms
+
+    @staticmethod
+    def parse_rates(value: str) -> Dict[str, float]:
+        """Parse ``"static=0.01,health=0.1,auth.login=1"``"""
+        rates = {}
+        for item in (value or "").split(","):
+            if "=" in item:
+                name, rate = item.split("=", 1)
+                rates[name.strip()] = float(rate)
+        return rates
+
+    def rate_for(self, endpoint: Optional[str]) -> float:
+        if endpoint:
+            if endpoint in self.rates:
+                return self.rates[endpoint]
+            blueprint = endpoint.split(".", 1)[0]
+            if blueprint in self.rates:
+                return self.rates[blueprint]
+        return self.default_rate
 
-setup_logging() # gọi hàm setup_logging để thiết lập logging khi module được import  
\ No newline at end of file
+    def should_log(self, endpoint: Optional[str], status: int, latency_ms: float) -> bool:
+        if status >= 500 or (self.slow_ms and latency_ms >= self.slow_ms):
+            return True
+        rate = self.rate_for(endpoint)
+        return rate >= 1.0 or (rate > 0 and random.random() < rate)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+
+
+def setup_logging(level=logging.INFO, log_file: Optional[str] = "app.log", json_format: bool = False):
+    """
+    Route the root logger through a queue to a background listener
+
+    Calling it again replaces the previous pipeline (e.g. one create_app per test).
+
+    Args:
+        level: Root log level
+        log_file: File written by the listener, None/"" for stdout only
+        json_format: JSON lines instead of the text layout
+    """
+    global _listener, _queue_handler
+    shutdown_logging()
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]  # log hiện trực tiếp trên màn hình
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = _QueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_queue_handler)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def init_logging(app):
+    """
+    Configure logging and the request log sampler from app.config
+
+    Args:
+        app: Flask application instance
+    """
+    setup_logging(
+        level=app.config.get("LOG_LEVEL", "INFO"),
+        log_file=app.config.get("LOG_FILE", "app.log"),
+        json_format=app.config.get("LOG_FORMAT", "text") == "json",
+    )
+    app.extensions["request_log_sampler"] = RequestLogSampler(
+        default_rate=app.config.get("LOG_SAMPLE_RATE", 1.0),
+        rates=RequestLogSampler.parse_rates(app.config.get("LOG_SAMPLE_RATES", "")),
+        slow_ms=app.config.get("LOG_SLOW_REQUEST_MS", 0),
+    )
@@ -0,0 +1 @@
+"""Benchmarks for AURA System (not run by the test suite)"""
@@ -0,0 +1,434 @@
+"""
+Load test for the AURA auth API
+
+Starts ``create_app`` on a local port against one database target and drives
+it with concurrent virtual users. Each user runs the auth flow
+
+    register -> login -> me (x N) -> refresh -> send/verify-email -> static
+
+over its own keep-alive connection. The report has, per scenario, the request
+count, errors, throughput, p50/p95/p99 latency and DB queries per request
+(read from the ``Server-Timing`` header of the request profiler; the
+started server has PERF_SERVER_TIMING on, a --url server needs it set).
+
+Targets:
+    sqlite-memory   sqlite:///:memory: (one shared connection; concurrent
+                    requests on it can fail and show up as errors)
+    sqlite-file     a fresh SQLite file in a temp directory
+    postgres        BENCH_POSTGRES_URI (empty database; the schema is created)
+
+The database URI is read when ``config`` is imported, so every target runs in
+its own process. Config comes from the environment as usual (FLASK_ENV,
+PASSWORD_HASH_ROUNDS, ...).
+
+Usage:
+    python -m benchmarks.load_test --target sqlite-file --concurrency 8 --users 100
+    python -m benchmarks.load_test --target all --save-baseline benchmarks/baseline.json
+    python -m benchmarks.load_test --target all --baseline benchmarks/baseline.json --tolerance 0.25
+    python -m benchmarks.load_test --url http://localhost:5000   # server đang chạy, bỏ qua verify-email
+
+Exit code 1 when a scenario regresses against the baseline (p95 or throughput
+beyond the tolerance, or more DB queries per request), so CI can fail the job.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+SCENARIOS = ("register", "login", "me", "refresh", "send_verification", "verify_email", "static")
+TARGETS = ("sqlite-memory", "sqlite-file", "postgres")
+PASSWORD = "Password123"
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of values (0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(q * len(ordered))))
+    return ordered[rank - 1]
+
+
+def parse_db_queries(server_timing: Optional[str]) -> Optional[int]:
+    """Query count from ``db;dur=1.23;desc="4 queries"``, None without the header"""
+    for metric in (server_timing or "").split(","):
+        name, _, params = metric.strip().partition(";")
+        if name == "db":
+            for param in params.split(";"):
+                key, _, value = param.partition("=")
+                if key == "desc":
+                    return int(value.strip('"').split()[0])
+    return None
+
+
+class ScenarioStats:
+    """Latencies, errors and DB query counts of one scenario (thread-safe)"""
+
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.queries: List[int] = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms: float, ok: bool, queries: Optional[int]):
+        with self._lock:
+            self.latencies_ms.append(latency_ms)
+            if not ok:
+                self.errors += 1
+            if queries is not None:
+                self.queries.append(queries)
+
+    def summary(self, elapsed: float) -> dict:
+        count = len(self.latencies_ms)
+        return {
+            "count": count,
+            "errors": self.errors,
+            "rps": round(count / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": round(sum(self.latencies_ms) / count, 2) if count else 0.0,
+            "p50_ms": round(percentile(self.latencies_ms, 0.50), 2),
+            "p95_ms": round(percentile(self.latencies_ms, 0.95), 2),
+            "p99_ms": round(percentile(self.latencies_ms, 0.99), 2),
+            "db_queries": round(sum(self.queries) / len(self.queries), 2) if self.queries else None,
+        }
+
+
+class _Client:
+    """One keep-alive HTTP connection of a virtual user"""
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        url = urlsplit(base_url)
+        conn_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self.conn = conn_class(url.hostname, url.port, timeout=timeout)
+
+    def request(self, stats: ScenarioStats, method: str, path: str, body: Optional[dict] = None,
+                token: Optional[str] = None, expect: Sequence[int] = (200,)) -> Optional[dict]:
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, path, payload, headers)
+            resp = self.conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException):
+            # Kết nối hỏng: tính là lỗi, request sau mở kết nối mới
+            self.conn.close()
+            stats.record((time.perf_counter() - start) * 1000, False, None)
+            return None
+        latency_ms = (time.perf_counter() - start) * 1000
+        ok = resp.status in expect
+        stats.record(latency_ms, ok, parse_db_queries(resp.getheader("Server-Timing")))
+        if not ok or not data or "json" not in (resp.getheader("Content-Type") or ""):
+            return None
+        return json.loads(data)
+
+    def close(self):
+        self.conn.close()
+
+
+def run_user(base_url: str, stats: Dict[str, ScenarioStats], me_calls: int = 3,
+             static_paths: Sequence[str] = ("/",), token_lookup: Optional[Callable[[str], Optional[str]]] = None):
+    """
+    One virtual user's auth flow
+
+    Args:
+        base_url: Server base URL
+        stats: {scenario: ScenarioStats}
+        me_calls: GET /me requests after login
+        static_paths: Paths fetched in the static scenario
+        token_lookup: user_id -> pending email verification token; without it
+            the send/verify-email scenarios are skipped
+    """
+    client = _Client(base_url)
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    try:
+        registered = client.request(stats["register"], "POST", "/api/auth/register",
+                                    {"email": email, "password": PASSWORD, "fullName": "Bench User"}, expect=(201,))
+        if registered is None:
+            return
+        user_id = registered["data"]["user"]["id"]
+
+        logged_in = client.request(stats["login"], "POST", "/api/auth/login", {"email": email, "password": PASSWORD})
+        if logged_in is None:
+            return
+        access_token = logged_in["data"]["accessToken"]
+        refresh_token = logged_in["data"]["refreshToken"]
+
+        for _ in range(me_calls):
+            client.request(stats["me"], "GET", "/api/auth/me", token=access_token)
+
+        client.request(stats["refresh"], "POST", "/api/auth/refresh", {"refreshToken": refresh_token})
+
+        if token_lookup is not None:
+            sent = client.request(stats["send_verification"], "POST", "/api/auth/send-verification-email",
+                                  {"userId": user_id})
+            verification_token = token_lookup(user_id) if sent is not None else None
+            if verification_token:
+                client.request(stats["verify_email"], "POST", "/api/auth/verify-email", {"token": verification_token})
+
+        for path in static_paths:
+            client.request(stats["static"], "GET", path, expect=(200, 304))
+    finally:
+        client.close()
+
+
+def run_load(base_url: str, concurrency: int = 8, users: int = 50, me_calls: int = 3,
+             static_paths: Sequence[str] = ("/",), token_lookup: Optional[Callable[[str], Optional[str]]] = None,
+             scenarios: Sequence[str] = SCENARIOS) -> dict:
+    """
+    Run ``users`` flows with ``concurrency`` flows in flight
+
+    Returns:
+        dict: {"elapsed_s", "total": summary, "scenarios": {name: summary}}
+    """
+    stats = {name: ScenarioStats() for name in SCENARIOS}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-user") as pool:
+        futures = [
+            pool.submit(run_user, base_url, stats, me_calls, static_paths, token_lookup)
+            for _ in range(users)
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    total = ScenarioStats()
+    for name in scenarios:
+        total.latencies_ms += stats[name].latencies_ms
+        total.queries += stats[name].queries
+        total.errors += stats[name].errors
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "total": total.summary(elapsed),
+        "scenarios": {name: stats[name].summary(elapsed) for name in scenarios if stats[name].latencies_ms},
+    }
+
+
+@contextmanager
+def serve_app(app, host: str = "127.0.0.1"):
+    """Serve a WSGI app on a free port in a background thread; yields the base URL"""
+    from werkzeug.serving import make_server
+
+    # Log truy cập của werkzeug cho mỗi request làm sai số đo
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server(host, 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="bench-server", daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_port}"
+    finally:
+        server.shutdown()
+        thread.join(5)
+
+
+def verification_token_lookup(user_id: str) -> Optional[str]:
+    """Read the pending verification token from the database (in-process runs only)"""
+    from infrastructure.databases.mssql import SessionFactory
+    from infrastructure.models.email_verification_token_model import EmailVerificationTokenModel
+
+    session = SessionFactory()
+    try:
+        row = (
+            session.query(EmailVerificationTokenModel.token)
+            .filter_by(user_id=user_id, is_used=False)
+            .order_by(EmailVerificationTokenModel.created_at.desc())
+            .first()
+        )
+        return row.token if row else None
+    finally:
+        session.close()
+
+
+def target_uri(target: str, workdir: str) -> str:
+    if target == "sqlite-memory":
+        return "sqlite:///:memory:"
+    if target == "sqlite-file":
+        return f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    if target == "postgres":
+        uri = os.environ.get("BENCH_POSTGRES_URI")
+        if not uri:
+            raise SystemExit("postgres target cần BENCH_POSTGRES_URI (vd. postgresql://postgres:pw@localhost/aura_bench)")
+        return uri
+    raise SystemExit(f"Unknown target: {target}")
+
+
+def run_target(target: str, options) -> dict:
+    """Start the app against one target in this process and load it"""
+    with tempfile.TemporaryDirectory(prefix="aura-bench-") as workdir:
+        # Phải set trước khi import config/mssql: engine được tạo lúc import
+        os.environ["DATABASE_URI"] = target_uri(target, workdir)
+        os.environ.setdefault("LOG_FILE", "")
+        os.environ.setdefault("LOG_SAMPLE_RATE", "0")
+        os.environ.setdefault("SCHEMA_AUTO_UPGRADE", "True")
+        # db_queries của báo cáo đọc từ header Server-Timing (mặc định tắt ở production)
+        os.environ.setdefault("PERF_SERVER_TIMING", "True")
+        from create_app import create_app
+
+        app = create_app()
+        with serve_app(app) as base_url:
+            return run_load(
+                base_url,
+                concurrency=options.concurrency,
+                users=options.users,
+                me_calls=options.me_calls,
+                static_paths=options.static_paths,
+                token_lookup=verification_token_lookup,
+                scenarios=options.scenarios,
+            )
+
+
+def _run_target_subprocess(target: str, options) -> dict:
+    """Run one target in a child process (fresh config and engines)"""
+    cmd = [
+        sys.executable, "-m", "benchmarks.load_test", "--target", target, "--json",
+        "--concurrency", str(options.concurrency), "--users", str(options.users),
+        "--me-calls", str(options.me_calls),
+        "--static-paths", ",".join(options.static_paths), "--scenarios", ",".join(options.scenarios),
+    ]
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(cmd, cwd=src_dir, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"[{target}] benchmark failed:\n{result.stderr[-4000:]}")
+    return json.loads(result.stdout)["targets"][target]
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.2) -> List[str]:
+    """
+    Regressions of report against baseline
+
+    A scenario regresses when its p95 grows or its throughput drops by more
+    than ``tolerance`` (0.2 = 20%), or when it runs more DB queries per
+    request (query counts are deterministic, so no tolerance). Scenarios or
+    targets missing on either side are ignored.
+
+    Returns:
+        list: One message per regression (empty = pass)
+    """
+    regressions = []
+    for target, result in report.get("targets", {}).items():
+        base_target = baseline.get("targets", {}).get(target)
+        if not base_target:
+            continue
+        for name, current in result["scenarios"].items():
+            base = base_target["scenarios"].get(name)
+            if not base:
+                continue
+            label = f"{target}/{name}"
+            if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{label}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms")
+            if base["rps"] and current["rps"] < base["rps"] * (1 - tolerance):
+                regressions.append(f"{label}: {current['rps']} req/s < baseline {base['rps']} req/s")
+            if base.get("db_queries") is not None and current.get("db_queries") is not None \
+                    and current["db_queries"] > base["db_queries"]:
+                regressions.append(f"{label}: {current['db_queries']} queries/request > baseline {base['db_queries']}")
+            if current["errors"] > base["errors"]:
+                regressions.append(f"{label}: {current['errors']} errors > baseline {base['errors']}")
+    return regressions
+
+
+def format_report(report: dict) -> str:
+    lines = []
+    for target, result in report["targets"].items():
+        rows = list(result["scenarios"].items())
+        if "total" in result:
+            rows.append(("total", result["total"]))
+        width = max([len(name) for name, _ in rows] + [16]) + 2
+        lines.append(f"== {target} ({result['elapsed_s']}s)")
+        lines.append(f"{'scenario':<{width}}{'count':>7}{'err':>5}{'req/s':>11}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}")
+        for name, s in rows:
+            queries = "-" if s["db_queries"] is None else s["db_queries"]
+            lines.append(
+                f"{name:<{width}}{s['count']:>7}{s['errors']:>5}{s['rps']:>11}"
+                f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{queries:>9}"
+            )
+    return "\n".join(lines)
+
+
+def _csv(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the AURA auth API")
+    parser.add_argument("--target", default="sqlite-file", help=f"{', '.join(TARGETS)} or all")
+    parser.add_argument("--url", help="Load an already running server instead of starting one")
+    parser.add_argument("--concurrency", type=int, default=8, help="Virtual users in flight")
+    parser.add_argument("--users", type=int, default=50, help="Virtual users (flows) in total")
+    parser.add_argument("--me-calls", type=int, default=3, help="GET /me requests per user")
+    parser.add_argument("--static-paths", type=_csv, default=["/"], help="Comma separated static paths")
+    parser.add_argument("--scenarios", type=_csv, default=list(SCENARIOS), help="Scenarios included in the report")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95/throughput drift (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", help="Write the report as the new baseline")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    options = parser.parse_args(argv)
+
+    unknown = set(options.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = {
+        "meta": {
+            "concurrency": options.concurrency,
+            "users": options.users,
+            "me_calls": options.me_calls,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "targets": {},
+    }
+    if options.url:
+        # Server ngoài: không đọc được token xác nhận email từ DB
+        report["targets"]["url"] = run_load(
+            options.url.rstrip("/"), options.concurrency, options.users, options.me_calls,
+            options.static_paths, token_lookup=None, scenarios=options.scenarios,
+        )
+    else:
+        targets = list(TARGETS) if options.target == "all" else _csv(options.target)
+        if len(targets) == 1:
+            report["targets"][targets[0]] = run_target(targets[0], options)
+        else:
+            for target in targets:
+                report["targets"][target] = _run_target_subprocess(target, options)
+
+    if options.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+
+    if options.save_baseline:
+        with open(options.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if options.baseline:
+        with open(options.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), options.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
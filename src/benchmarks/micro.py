@@ -0,0 +1,312 @@
+"""
+Micro-benchmarks for the repository and serialization hot paths
+
+Seeds a database with N users (10k - 1M) and times single calls of the
+repository methods, JWT encode/decode, the request validators and JSON
+response building. Each benchmark reports the same fields as the load test
+(p50/p95/p99, calls per second, DB queries per call), so the reports and
+baselines share one format and ``benchmarks.load_test.compare``.
+
+The database is a fresh SQLite file per user count (``--db-uri`` for another
+database, e.g. PostgreSQL; it must be empty). Seeding 1M users takes a few
+minutes.
+
+Usage:
+    python -m benchmarks.micro --users 10000,100000
+    python -m benchmarks.micro --users 10000 --only repo. --iterations 2000
+    python -m benchmarks.micro --users 10000 --save-baseline benchmarks/micro-baseline.json
+    python -m benchmarks.micro --users 10000 --baseline benchmarks/micro-baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from sqlalchemy import event, insert
+
+from benchmarks.load_test import ScenarioStats, compare, format_report
+
+# Hash bcrypt cố định: micro-benchmark không đo bcrypt (đã có span "bcrypt" trong profiler)
+PASSWORD_HASH = "$2b$04$zv8DaD0Jqq0bHuK3Z1eF6eL9m7OQ3cvbK1pLcbhEv3Rz1m7fV7N5S"
+SEED_CHUNK = 10000
+
+
+class Benchmark:
+    """
+    One timed operation
+
+    Args:
+        name: Report name (``repo.find_by_email``)
+        fn: Called with the iteration index; only this call is timed
+        reset: Called after each timed call, untimed (e.g. clear the session)
+    """
+
+    def __init__(self, name: str, fn: Callable[[int], object], reset: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.fn = fn
+        self.reset = reset
+
+
+class QueryCounter:
+    """Counts cursor executions on an engine"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def measure(benchmark: Benchmark, iterations: int, warmup: int = 10,
+            counter: Optional[QueryCounter] = None) -> dict:
+    """
+    Time ``iterations`` calls after ``warmup`` untimed ones
+
+    Returns:
+        dict: Summary as in the load test; ``rps`` is calls per second of
+            pure call time
+    """
+    for i in range(warmup):
+        benchmark.fn(i)
+        if benchmark.reset:
+            benchmark.reset()
+
+    stats = ScenarioStats()
+    busy = 0.0
+    for i in range(warmup, warmup + iterations):
+        before = counter.count if counter else 0
+        start = time.perf_counter()
+        benchmark.fn(i)
+        elapsed = time.perf_counter() - start
+        busy += elapsed
+        stats.record(elapsed * 1000, True, counter.count - before if counter else None)
+        if benchmark.reset:
+            benchmark.reset()
+    return stats.summary(busy)
+
+
+def seed_users(engine, count: int, verified_share: float = 0.5) -> List[str]:
+    """
+    Bulk insert ``count`` users (``user<i>@bench.local``)
+
+    Returns:
+        list: The user ids, in insert order
+    """
+    from infrastructure.models.user_model import UserModel
+
+    ids = []
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for offset in range(0, count, SEED_CHUNK):
+            rows = []
+            for i in range(offset, min(offset + SEED_CHUNK, count)):
+                user_id = str(uuid.uuid4())
+                ids.append(user_id)
+                rows.append({
+                    "id": user_id,
+                    "email": f"user{i}@bench.local",
+                    "password_hash": PASSWORD_HASH,
+                    "full_name": f"Bench User {i}",
+                    "email_verified": i < count * verified_share,
+                    "is_active": True,
+                    "created_at": now,
+                })
+            conn.execute(insert(UserModel), rows)
+    return ids
+
+
+def seed_verification_tokens(engine, user_ids: List[str]) -> List[str]:
+    """One unused verification token per user id; returns the tokens"""
+    from infrastructure.models.email_verification_token_model import EmailVerificationTokenModel
+
+    tokens = [uuid.uuid4().hex for _ in user_ids]
+    expires_at = datetime.utcnow() + timedelta(hours=24)
+    with engine.begin() as conn:
+        for offset in range(0, len(user_ids), SEED_CHUNK):
+            conn.execute(insert(EmailVerificationTokenModel), [
+                {"id": str(uuid.uuid4()), "user_id": user_id, "token": token,
+                 "expires_at": expires_at, "is_used": False, "created_at": datetime.utcnow()}
+                for user_id, token in zip(user_ids[offset:offset + SEED_CHUNK], tokens[offset:offset + SEED_CHUNK])
+            ])
+    return tokens
+
+
+def repository_benchmarks(session, user_ids: List[str], token_pool: List[str], seed: int = 0) -> List[Benchmark]:
+    """Benchmarks of UserRepository and EmailVerificationTokenRepository on a seeded database"""
+    from infrastructure.repositories.email_verification_token_repository import EmailVerificationTokenRepository
+    from infrastructure.repositories.user_repository import UserRepository
+
+    users = UserRepository(session)
+    tokens = EmailVerificationTokenRepository(session)
+    rng = random.Random(seed)
+    count = len(user_ids)
+    # Mỗi request mở session mới: không để identity map giữ object giữa các lần gọi
+    reset = session.expunge_all
+    run_id = uuid.uuid4().hex[:8]
+
+    return [
+        Benchmark("repo.find_by_email", lambda i: users.find_by_email(f"user{rng.randrange(count)}@bench.local"), reset),
+        Benchmark("repo.find_by_email_miss", lambda i: users.find_by_email(f"missing{i}@bench.local"), reset),
+        Benchmark("repo.find_by_id", lambda i: users.find_by_id(user_ids[rng.randrange(count)]), reset),
+        Benchmark("repo.create", lambda i: users.create(f"new-{run_id}-{i}@bench.local", PASSWORD_HASH, "New User"), reset),
+        Benchmark("repo.update_email_verified", lambda i: users.update_email_verified(user_ids[rng.randrange(count)]), reset),
+        Benchmark("token.create_token", lambda i: tokens.create_token(user_ids[rng.randrange(count)]), reset),
+        Benchmark("token.get_token_by_user_id", lambda i: tokens.get_token_by_user_id(user_ids[rng.randrange(count)]), reset),
+        # token_pool có đủ token chưa dùng cho warmup + iterations
+        Benchmark("token.verify_token", lambda i: tokens.verify_token(token_pool[i]), reset),
+        Benchmark("token.invalidate_user_tokens", lambda i: tokens.invalidate_user_tokens(user_ids[rng.randrange(count)]), reset),
+    ]
+
+
+def cpu_benchmarks() -> List[Benchmark]:
+    """Benchmarks without database: JWT, validators, JSON responses"""
+    from flask import Flask, jsonify
+
+    from api.validators import validate_email, validate_login_request, validate_register_request
+    from services.token_service import TokenService
+
+    token_service = TokenService({"default": "bench-secret-key-with-enough-length"}, "default")
+    access_token = token_service.issue_access_token(str(uuid.uuid4()), "user@bench.local")
+    register_body = {"email": "user@bench.local", "password": "Password123", "fullName": "Nguyễn Văn An"}
+    login_body = {"email": "user@bench.local", "password": "Password123"}
+
+    app = Flask(__name__)
+    user = {
+        "id": str(uuid.uuid4()),
+        "email": "user@bench.local",
+        "fullName": "Nguyễn Văn An",
+        "avatar": "https://api.dicebear.com/7.x/avataaars/svg?seed=user@bench.local",
+    }
+    login_response = {
+        "success": True,
+        "data": {
+            "accessToken": access_token,
+            "refreshToken": access_token,
+            "user": user,
+            "roles": [{"id": user["id"], "name": "PATIENT"}],
+        },
+    }
+    user_list = {"success": True, "data": [dict(user, id=str(i)) for i in range(100)]}
+
+    def jsonify_in_app(payload):
+        with app.app_context():
+            return jsonify(payload).get_data()
+
+    return [
+        Benchmark("jwt.encode", lambda i: token_service.issue_access_token(user["id"], user["email"])),
+        Benchmark("jwt.decode", lambda i: token_service.decode(access_token)),
+        Benchmark("validators.email", lambda i: validate_email("user@bench.local")),
+        Benchmark("validators.login_request", lambda i: validate_login_request(login_body)),
+        Benchmark("validators.register_request", lambda i: validate_register_request(register_body)),
+        Benchmark("json.login_response", lambda i: jsonify_in_app(login_response)),
+        Benchmark("json.user_list_100", lambda i: jsonify_in_app(user_list)),
+    ]
+
+
+def run_suite(user_count: int, iterations: int = 1000, warmup: int = 10, db_uri: Optional[str] = None,
+              only: Optional[List[str]] = None) -> dict:
+    """
+    Seed a database with ``user_count`` users and run every benchmark
+
+    Args:
+        user_count: Users in the database
+        iterations: Timed calls per benchmark
+        warmup: Untimed calls per benchmark
+        db_uri: Empty database to use instead of a temporary SQLite file
+        only: Name prefixes to run (e.g. ``["repo.", "jwt."]``)
+
+    Returns:
+        dict: {"elapsed_s", "scenarios": {name: summary}}
+    """
+    from sqlalchemy.orm import sessionmaker
+
+    from infrastructure.databases.mssql import _create_engine
+    from infrastructure.databases.schema import ensure_schema
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="aura-micro-") as workdir:
+        engine = _create_engine(db_uri or f"sqlite:///{os.path.join(workdir, 'micro.db')}")
+        try:
+            ensure_schema(engine, auto_upgrade=True)
+            user_ids = seed_users(engine, user_count)
+            token_pool = seed_verification_tokens(
+                engine, [user_ids[i % user_count] for i in range(warmup + iterations)]
+            )
+            counter = QueryCounter(engine)
+            session = sessionmaker(bind=engine)()
+
+            benchmarks = repository_benchmarks(session, user_ids, token_pool) + cpu_benchmarks()
+            if only:
+                benchmarks = [b for b in benchmarks if any(b.name.startswith(prefix) for prefix in only)]
+            results = {b.name: measure(b, iterations, warmup, counter) for b in benchmarks}
+            session.close()
+        finally:
+            engine.dispose()
+    return {"elapsed_s": round(time.perf_counter() - started, 3), "scenarios": results}
+
+
+def _csv(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for repository and serialization hot paths")
+    parser.add_argument("--users", type=lambda v: [int(n) for n in _csv(v)], default=[10000],
+                        help="Comma separated user counts, e.g. 10000,100000,1000000")
+    parser.add_argument("--iterations", type=int, default=1000, help="Timed calls per benchmark")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed calls per benchmark")
+    parser.add_argument("--only", type=_csv, help="Comma separated name prefixes (repo., token., jwt., ...)")
+    parser.add_argument("--db-uri", help="Empty database to seed instead of a temporary SQLite file")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95/throughput drift (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", help="Write the report as the new baseline")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    options = parser.parse_args(argv)
+    if options.db_uri and len(options.users) > 1:
+        parser.error("--db-uri takes a single user count (the database must be empty)")
+
+    report = {
+        "meta": {
+            "iterations": options.iterations,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "targets": {},
+    }
+    for user_count in options.users:
+        report["targets"][f"users-{user_count}"] = run_suite(
+            user_count, options.iterations, options.warmup, options.db_uri, options.only,
+        )
+
+    if options.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+
+    if options.save_baseline:
+        with open(options.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if options.baseline:
+        with open(options.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), options.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,10 @@
 # Configuration settings for the Flask application
 
+import logging
 import os
+import tempfile
+
+logger = logging.getLogger(__name__)
 
 def build_database_uri():
     """Build database URI from environment variables."""
@@ -26,7 +30,7 @@ def build_database_uri():
 
 class Config:
     """Base configuration."""
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'a_default_secret_key'
+    SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-change-in-production'
     DEBUG = os.environ.get('DEBUG', 'False').lower() in ['true', '1']
     TESTING = os.environ.get('TESTING', 'False').lower() in ['true', '1']
     
@@ -36,15 +40,178 @@ class Config:
     SQLALCHEMY_POOL_SIZE = 10
     SQLALCHEMY_POOL_RECYCLE = 3600
     SQLALCHEMY_POOL_PRE_PING = True  # Verify connections before using
+    # Worker tự chạy migration khi schema lệch version (production: chạy CLI schema upgrade trước)
+    SCHEMA_AUTO_UPGRADE = os.environ.get('SCHEMA_AUTO_UPGRADE', 'True').lower() in ['true', '1']
+    # Read replicas (phân tách bằng dấu phẩy): SELECT đi qua replica, ghi/commit đi qua primary
+    DATABASE_REPLICA_URIS = [uri.strip() for uri in os.environ.get('DATABASE_REPLICA_URIS', '').split(',') if uri.strip()]
+    # SQLite file (WAL): pool kết nối đọc + một kết nối ghi duy nhất
+    SQLITE_READ_POOL_SIZE = int(os.environ.get('SQLITE_READ_POOL_SIZE', 5))
+    SQLITE_WRITER_TIMEOUT = float(os.environ.get('SQLITE_WRITER_TIMEOUT', 30))  # giây chờ tới lượt ghi
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 30000))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
     CORS_HEADERS = 'Content-Type'
     
     # CORS Configuration
     CORS_ALLOWED_ORIGINS = os.environ.get('CORS_ALLOWED_ORIGINS', 'http://localhost:5173,http://localhost:3000').split(',')
     CORS_ALLOWED_METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'PATCH', 'HEAD']
-    CORS_ALLOWED_HEADERS = ['Content-Type', 'Authorization', 'X-Requested-With']
+    CORS_ALLOWED_HEADERS = ['Content-Type', 'Authorization', 'X-Requested-With', 'Upload-Offset']
     CORS_MAX_AGE = int(os.environ.get('CORS_MAX_AGE', 3600))
     CORS_ALLOW_CREDENTIALS = True
 
+    # Password hashing executor (bcrypt runs in a bounded process pool)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 32))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+    PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 1))
+    # bcrypt cost: cố định qua PASSWORD_HASH_ROUNDS, hoặc tự đo máy để vừa PASSWORD_HASH_TARGET_MS
+    PASSWORD_HASH_ROUNDS = int(os.environ.get('PASSWORD_HASH_ROUNDS', 0)) or None
+    PASSWORD_HASH_TARGET_MS = float(os.environ.get('PASSWORD_HASH_TARGET_MS', 250))
+    PASSWORD_HASH_MIN_ROUNDS = int(os.environ.get('PASSWORD_HASH_MIN_ROUNDS', 12))
+    PASSWORD_HASH_MAX_ROUNDS = int(os.environ.get('PASSWORD_HASH_MAX_ROUNDS', 15))
+    # Kết quả đo chia sẻ giữa các worker; thư mục của app (không dùng /tmp, ai cũng ghi được)
+    PASSWORD_HASH_CALIBRATION_FILE = os.environ.get(
+        'PASSWORD_HASH_CALIBRATION_FILE',
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'bcrypt_calibration.json')
+    )
+
+    # JWT - TokenService được tạo một lần trong create_app
+    # JWT_SIGNING_KEYS="kid1:secret1,kid2:secret2" cho phép xoay vòng key qua header `kid`;
+    # SECRET_KEY là kid "default" (token đã phát hành trước đây); JWT_SECRET_KEY (nếu khác) là kid "jwt"
+    # và ký token mới, SECRET_KEY chỉ còn để xác minh cho tới khi tắt JWT_ACCEPT_SECRET_KEY
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
+    # Tắt sau khi refresh token ký bằng SECRET_KEY đã hết hạn (JWT_REFRESH_TOKEN_EXPIRES_DAYS)
+    JWT_ACCEPT_SECRET_KEY = os.environ.get('JWT_ACCEPT_SECRET_KEY', 'True').lower() in ['true', '1']
+    JWT_SIGNING_KEYS = os.environ.get('JWT_SIGNING_KEYS', '')
+    JWT_ACTIVE_KID = os.environ.get('JWT_ACTIVE_KID')
+    JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
+    JWT_EXPIRATION_HOURS = int(os.environ.get('JWT_EXPIRATION_HOURS', 24))
+    JWT_REFRESH_TOKEN_EXPIRES_DAYS = int(os.environ.get('JWT_REFRESH_TOKEN_EXPIRES_DAYS', 7))
+    # Số family/user đã thu hồi được nhớ trong RAM để từ chối nhanh không cần query DB
+    REFRESH_TOKEN_REVOCATION_CACHE_SIZE = int(os.environ.get('REFRESH_TOKEN_REVOCATION_CACHE_SIZE', 100000))
+
+    # Email outbox: route chỉ ghi vào hàng đợi, sender nền gửi với retry/backoff
+    # EMAIL_OUTBOX_WORKER=False khi chạy sender riêng (python -m services.email_outbox)
+    EMAIL_OUTBOX_WORKER = os.environ.get('EMAIL_OUTBOX_WORKER', 'True').lower() in ['true', '1']
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 20))
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 6))
+    EMAIL_OUTBOX_BACKOFF_BASE = float(os.environ.get('EMAIL_OUTBOX_BACKOFF_BASE', 30))
+    EMAIL_OUTBOX_BACKOFF_MAX = float(os.environ.get('EMAIL_OUTBOX_BACKOFF_MAX', 3600))
+    EMAIL_OUTBOX_POLL_INTERVAL = float(os.environ.get('EMAIL_OUTBOX_POLL_INTERVAL', 5))
+
+    # Analysis job queue (bảng analysis_requests): worker riêng claim batch với lease + heartbeat
+    # python -m services.analysis_queue --processes N
+    ANALYSIS_JOB_HANDLER = os.environ.get('ANALYSIS_JOB_HANDLER', 'services.inference:handle_batch')
+    ANALYSIS_WORKER_PROCESSES = int(os.environ.get('ANALYSIS_WORKER_PROCESSES', 1))
+    # Thread claim mỗi process: nhiều batch job cùng đổ ảnh vào micro-batcher của model
+    ANALYSIS_WORKER_THREADS = int(os.environ.get('ANALYSIS_WORKER_THREADS', 2))
+    ANALYSIS_QUEUE_BATCH_SIZE = int(os.environ.get('ANALYSIS_QUEUE_BATCH_SIZE', 10))
+    ANALYSIS_QUEUE_LEASE_SECONDS = int(os.environ.get('ANALYSIS_QUEUE_LEASE_SECONDS', 300))
+    # 0 = lease/3
+    ANALYSIS_QUEUE_HEARTBEAT_INTERVAL = float(os.environ.get('ANALYSIS_QUEUE_HEARTBEAT_INTERVAL', 0))
+    # Sau N lần claim không thành công job bị cách ly (quarantined)
+    ANALYSIS_QUEUE_MAX_ATTEMPTS = int(os.environ.get('ANALYSIS_QUEUE_MAX_ATTEMPTS', 5))
+    ANALYSIS_QUEUE_BACKOFF_BASE = float(os.environ.get('ANALYSIS_QUEUE_BACKOFF_BASE', 30))
+    ANALYSIS_QUEUE_BACKOFF_MAX = float(os.environ.get('ANALYSIS_QUEUE_BACKOFF_MAX', 1800))
+    ANALYSIS_QUEUE_POLL_INTERVAL = float(os.environ.get('ANALYSIS_QUEUE_POLL_INTERVAL', 2))
+
+    # Inference ảnh võng mạc (services/inference.py): onnx (onnxruntime CPU) hoặc stub (test/dev, không phải kết quả thật)
+    INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'onnx').lower()
+    INFERENCE_MODEL_PATH = os.environ.get('INFERENCE_MODEL_PATH', '')
+    # Trống = tên file model
+    INFERENCE_MODEL_VERSION = os.environ.get('INFERENCE_MODEL_VERSION', '')
+    INFERENCE_LABELS = os.environ.get(
+        'INFERENCE_LABELS', 'diabetic_retinopathy,hypertensive_retinopathy,glaucoma_suspect,macular_degeneration'
+    )
+    INFERENCE_INPUT_SIZE = int(os.environ.get('INFERENCE_INPUT_SIZE', 512))
+    INFERENCE_OUTPUT_LOGITS = os.environ.get('INFERENCE_OUTPUT_LOGITS', 'False').lower() in ['true', '1']
+    # Số thread ONNX mỗi process (0 = mặc định của onnxruntime); nên = số core / số worker process
+    INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', 0))
+    # Micro-batching: chạy model khi đủ N ảnh hoặc ảnh đầu đã chờ quá N ms
+    INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 16))
+    INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 25))
+    INFERENCE_DEFAULT_THRESHOLD = float(os.environ.get('INFERENCE_DEFAULT_THRESHOLD', 0.5))
+    INFERENCE_HIGH_RISK_THRESHOLD = float(os.environ.get('INFERENCE_HIGH_RISK_THRESHOLD', 0.8))
+    # Thư mục gốc cho storage_url tương đối
+    INFERENCE_IMAGE_ROOT = os.environ.get('INFERENCE_IMAGE_ROOT', '')
+
+    # Cache kết quả phân tích theo (checksum ảnh, version model, ngưỡng): LRU trong process + bảng analysis_result_cache
+    RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'True').lower() in ['true', '1']
+    RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 4096))
+    # Version model đang deploy (ai_models) được cache N giây: process khác nhận model mới sau tối đa N giây
+    RESULT_CACHE_VERSION_TTL = float(os.environ.get('RESULT_CACHE_VERSION_TTL', 30))
+
+    # Kho ảnh theo nội dung (services/image_store.py): <root>/sha256/ab/cd/<sha256>, upload trùng chỉ lưu một blob
+    IMAGE_STORE_ROOT = os.environ.get(
+        'IMAGE_STORE_ROOT', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'images')
+    )
+    IMAGE_STORE_CHUNK_SIZE = int(os.environ.get('IMAGE_STORE_CHUNK_SIZE', 1024 * 1024))
+    IMAGE_STORE_FSYNC = os.environ.get('IMAGE_STORE_FSYNC', 'True').lower() in ['true', '1']
+    # Scrubber nền băm lại từng blob (0 = tắt; python -m services.image_store scrub để chạy tay)
+    IMAGE_SCRUB_INTERVAL = float(os.environ.get('IMAGE_SCRUB_INTERVAL', 24 * 3600))
+    # Giới hạn tốc độ đọc của scrubber (MB/s) để không tranh I/O với upload
+    IMAGE_SCRUB_RATE_MB = float(os.environ.get('IMAGE_SCRUB_RATE_MB', 20))
+
+    # Upload ảnh /api/images (multipart stream): giới hạn mỗi file / mỗi request, kiểm tra ngay khi đọc
+    IMAGE_UPLOAD_MAX_FILE_MB = float(os.environ.get('IMAGE_UPLOAD_MAX_FILE_MB', 50))
+    IMAGE_UPLOAD_MAX_REQUEST_MB = float(os.environ.get('IMAGE_UPLOAD_MAX_REQUEST_MB', 200))
+    IMAGE_UPLOAD_MAX_FILES = int(os.environ.get('IMAGE_UPLOAD_MAX_FILES', 10))
+    # Số upload đồng thời mỗi process; vượt quá trả 503 + Retry-After
+    IMAGE_UPLOAD_MAX_CONCURRENT = int(os.environ.get('IMAGE_UPLOAD_MAX_CONCURRENT', 8))
+    # Upload resumable (volume OCT lớn): kích thước tối đa, xoá upload bỏ dở sau N giây
+    IMAGE_UPLOAD_RESUMABLE_MAX_MB = float(os.environ.get('IMAGE_UPLOAD_RESUMABLE_MAX_MB', 4096))
+    IMAGE_UPLOAD_RESUMABLE_TTL = float(os.environ.get('IMAGE_UPLOAD_RESUMABLE_TTL', 24 * 3600))
+
+    # Cache payload của JWT đã xác minh (key = SHA-256 của token, không sống quá exp)
+    JWT_CACHE_SIZE = int(os.environ.get('JWT_CACHE_SIZE', 4096))
+    JWT_CACHE_TTL = float(os.environ.get('JWT_CACHE_TTL', 300))
+
+    # Logging qua QueueHandler (listener thread ghi file/stdout); LOG_FORMAT=json: mỗi dòng một JSON object
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_FILE = os.environ.get('LOG_FILE', 'app.log')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    # Sampling log request: tỉ lệ mặc định và theo endpoint/blueprint ("serve_static=0.01,health=0.1");
+    # lỗi 5xx và request chậm hơn LOG_SLOW_REQUEST_MS luôn được log
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', 'index=0.01,serve_static=0.01,health=0.1')
+    LOG_SLOW_REQUEST_MS = float(os.environ.get('LOG_SLOW_REQUEST_MS', 1000))
+
+    # Đo từng request: header Server-Timing (db/bcrypt/jwt/email/total), histogram theo endpoint
+    # (GET /api/health/perf, cần METRICS_TOKEN; không có token thì chỉ mở khi PERF_SERVER_TIMING bật), cảnh báo khi một request chạy quá PERF_QUERY_WARN_THRESHOLD query
+    # Mặc định tắt: span bcrypt chỉ có khi email tồn tại, header sẽ lộ tài khoản đã đăng ký (bật ở dev/test/load test)
+    PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', 'False').lower() in ['true', '1']
+    PERF_QUERY_WARN_THRESHOLD = int(os.environ.get('PERF_QUERY_WARN_THRESHOLD', 20))
+    PERF_HISTOGRAM_WINDOW = float(os.environ.get('PERF_HISTOGRAM_WINDOW', 300))
+
+    # Health: /livez (không I/O), /readyz + /api/health trả kết quả cache của các check DB/SMTP/disk
+    # (thread nền chạy mỗi HEALTH_CHECK_INTERVAL giây; không có thread thì làm mới khi cũ hơn HEALTH_CACHE_TTL)
+    HEALTH_CHECK_INTERVAL = float(os.environ.get('HEALTH_CHECK_INTERVAL', 5))
+    HEALTH_CACHE_TTL = float(os.environ.get('HEALTH_CACHE_TTL', 10))
+    HEALTH_BACKGROUND_CHECKS = os.environ.get('HEALTH_BACKGROUND_CHECKS', 'True').lower() in ['true', '1']
+    HEALTH_CHECK_SMTP = os.environ.get('HEALTH_CHECK_SMTP', 'True').lower() in ['true', '1']
+    # Check bắt buộc để ready; SMTP lỗi chỉ báo "degraded" (outbox tự retry)
+    HEALTH_CRITICAL_CHECKS = os.environ.get('HEALTH_CRITICAL_CHECKS', 'db,disk').split(',')
+    HEALTH_DISK_PATH = os.environ.get('HEALTH_DISK_PATH', '.')
+    HEALTH_MIN_FREE_DISK_MB = float(os.environ.get('HEALTH_MIN_FREE_DISK_MB', 100))
+
+    # Prometheus /metrics; METRICS_TOKEN: bắt buộc header "Authorization: Bearer <token>"
+    # METRICS_MULTIPROC_DIR: thư mục chung để cộng số liệu của các worker gunicorn
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() in ['true', '1']
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR', '')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+    # Frontend dist/: file có hash trong tên luôn cache immutable; các file khác (index.html)
+    # dùng max-age này, 0 = no-cache (trình duyệt revalidate bằng ETag)
+    STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 0))
+    # File nhỏ hơn ngưỡng này (bytes) giữ trong RAM, file lớn gửi qua wsgi.file_wrapper (sendfile)
+    STATIC_MEMORY_MAX_SIZE = int(os.environ.get('STATIC_MEMORY_MAX_SIZE', 64 * 1024))
+    # Route phía client (/dashboard, không có đuôi file) trả về index.html
+    STATIC_SPA_FALLBACK = os.environ.get('STATIC_SPA_FALLBACK', 'True').lower() in ['true', '1']
+    # Dev: theo dõi dist/ và index lại khi build mới (polling mỗi STATIC_WATCH_INTERVAL giây)
+    STATIC_WATCH = os.environ.get('STATIC_WATCH', 'False').lower() in ['true', '1']
+    STATIC_WATCH_INTERVAL = float(os.environ.get('STATIC_WATCH_INTERVAL', 1.0))
+
 class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
@@ -54,26 +221,44 @@ class DevelopmentConfig(Config):
     if not _db_uri:
         # Default to in-memory for development
         SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
-        print("[CONFIG] Using in-memory SQLite database for development")
+        logger.info("[CONFIG] Using in-memory SQLite database for development")
     else:
         SQLALCHEMY_DATABASE_URI = _db_uri
-        print(f"[CONFIG] Using DATABASE_URI from environment: {_db_uri}")
+        logger.info("[CONFIG] Using DATABASE_URI from environment: %s", _db_uri)
     # Cho phép tất cả localhost origins trong development
     CORS_ALLOWED_ORIGINS = os.environ.get(
         'CORS_ALLOWED_ORIGINS', 
         'http://localhost:5173,http://localhost:3000,http://localhost:8000,http://127.0.0.1:5173,http://127.0.0.1:3000'
     ).split(',')
+    PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', 'True').lower() in ['true', '1']
 
 class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     CORS_ALLOWED_ORIGINS = ['http://localhost:5173', 'http://localhost:3000']
+    # Hash inline so tests don't spawn worker processes
+    PASSWORD_HASH_WORKERS = 0
+    PASSWORD_HASH_ROUNDS = 4
+    # Test gọi drain_once() trực tiếp thay vì chạy sender nền
+    EMAIL_OUTBOX_WORKER = False
+    LOG_FILE = ''
+    HEALTH_BACKGROUND_CHECKS = False
+    INFERENCE_BACKEND = 'stub'
+    PERF_SERVER_TIMING = True
+    IMAGE_STORE_ROOT = os.path.join(tempfile.gettempdir(), 'aura-test-images')
+    IMAGE_STORE_FSYNC = False
+    IMAGE_SCRUB_INTERVAL = 0
 
 class ProductionConfig(Config):
     """Production configuration."""
     DEBUG = False
+    # Production bắt buộc phải có SECRET_KEY (hoặc JWT_SECRET_KEY/JWT_SIGNING_KEYS) trong environment
+    SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URI') or 'sqlite:///aura.db'
+    # Schema do `python -m infrastructure.databases.schema upgrade` tạo, worker chỉ kiểm tra version
+    SCHEMA_AUTO_UPGRADE = os.environ.get('SCHEMA_AUTO_UPGRADE', 'False').lower() in ['true', '1']
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
     # Production: Chỉ cho phép specific domains từ environment variable
     CORS_ALLOWED_ORIGINS = os.environ.get(
         'CORS_ALLOWED_ORIGINS', 
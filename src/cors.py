@@ -58,7 +58,7 @@ def init_cors(app: Flask):
             'allow_headers': Config.CORS_ALLOWED_HEADERS,
             'supports_credentials': Config.CORS_ALLOW_CREDENTIALS,
             'max_age': Config.CORS_MAX_AGE,
-            'expose_headers': ['Content-Type', 'X-Total-Count'],  # Header để expose cho client
+            'expose_headers': ['Content-Type', 'X-Total-Count', 'Upload-Offset', 'Retry-After'],  # Header để expose cho client
         }
         
         CORS(app, resources={r"/api/*": cors_config})
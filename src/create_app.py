@@ -1,23 +1,32 @@
-from flask import Flask, send_from_directory
+from flask import Flask
 from config import Config, DevelopmentConfig, ProductionConfig, TestingConfig
 from cors import init_cors
 from error_handler import register_error_handlers
-from infrastructure.databases.mssql import init_mssql
 from api.routes import register_routes
 from api.middleware import setup_request_logging, validate_content_type
+from services.password_hasher import init_password_hasher
+from services.password_policy import init_password_policy
+from services.token_service import init_token_service
+from services.refresh_token_store import init_refresh_token_store
+from services.email_outbox import init_email_outbox
+from services.image_store import init_image_store
+from services.image_upload import init_image_uploads
+from services.result_cache import init_result_cache
+from services.metrics import init_metrics
+from services.health import init_health_checker
+from static_assets import init_static_assets, get_static_assets
+from startup_profiler import startup_profiler
+from app_logging import init_logging
+from services.request_profiler import init_request_profiler
 import logging
 import os
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Tính path tới dist folder
 _src_dir = os.path.dirname(os.path.abspath(__file__))
 FRONTEND_BUILD_PATH = os.path.abspath(os.path.join(_src_dir, '..', 'src', 'Web Interface for AURA Clinic (1)', 'dist'))
 
-# Debug: print path
-print(f"Frontend path: {FRONTEND_BUILD_PATH}")
-print(f"Frontend exists: {os.path.exists(FRONTEND_BUILD_PATH)}")
 
 def create_app(config_name='development'):
     """
@@ -30,36 +39,66 @@ def create_app(config_name='development'):
         Flask application instance
     """
     
-    # Tạo Flask app với frontend static files
-    app = Flask(__name__, static_folder=FRONTEND_BUILD_PATH, static_url_path='')
-    
-    # Chọn config dựa vào environment
-    env = os.environ.get('FLASK_ENV', 'development')
-    if env == 'testing':
-        app.config.from_object(TestingConfig)
-        logger.info("🧪 Loading TestingConfig")
-    elif env == 'production':
-        app.config.from_object(ProductionConfig)
-        logger.info("🚀 Loading ProductionConfig")
-    else:
-        app.config.from_object(DevelopmentConfig)
-        logger.info("🔧 Loading DevelopmentConfig")
+    # Tạo Flask app; frontend static files do static_assets phục vụ (xem cuối hàm)
+    with startup_profiler.phase("flask app + config"):
+        app = Flask(__name__, static_folder=None)
 
+        # Chọn config dựa vào environment
+        env = os.environ.get('FLASK_ENV', 'development')
+        if env == 'testing':
+            config_class, banner = TestingConfig, "🧪 Loading TestingConfig"
+        elif env == 'production':
+            config_class, banner = ProductionConfig, "🚀 Loading ProductionConfig"
+        else:
+            config_class, banner = DevelopmentConfig, "🔧 Loading DevelopmentConfig"
+        app.config.from_object(config_class)
+
+        # Log qua QueueHandler: ghi file/stdout ở thread riêng, không chặn request
+        init_logging(app)
+        logger.info(banner)
     
-    import app_logging
-    
-    # Khởi tạo CORS trước các routes
-    init_cors(app)
-    logger.info("✅ CORS initialized")
-    
-    # Thiết lập middleware
-    setup_request_logging(app)
-    validate_content_type(app)
-    logger.info("✅ Middleware initialized")
+    with startup_profiler.phase("cors + middleware"):
+        # Khởi tạo CORS trước các routes
+        init_cors(app)
+        logger.info("✅ CORS initialized")
+
+        # Thiết lập middleware (profiler trước tiên: before_request đầu, after_request cuối)
+        init_request_profiler(app)
+        setup_request_logging(app)
+        validate_content_type(app)
+        logger.info("✅ Middleware initialized")
                 
-    # Khởi tạo database với request-scoped session management
-    from infrastructure.databases.mssql import init_app as init_db_app
-    init_db_app(app)
+    with startup_profiler.phase("database"):
+        # Khởi tạo database với request-scoped session management
+        from infrastructure.databases.mssql import init_app as init_db_app
+        init_db_app(app)
+
+    with startup_profiler.phase("security services"):
+        # Giới hạn số job bcrypt chạy song song
+        init_password_hasher(app)
+        init_password_policy(app)
+        # Secret/algorithm/thời hạn JWT chỉ đọc một lần khi tạo app
+        init_token_service(app)
+        init_refresh_token_store(app)
+
+    with startup_profiler.phase("email outbox"):
+        init_email_outbox(app)
+
+    with startup_profiler.phase("image store"):
+        # Kho ảnh theo SHA-256 + scrubber kiểm tra toàn vẹn (thread nền)
+        init_image_store(app)
+        # Upload ảnh dạng stream: giới hạn kích thước, số upload đồng thời, upload resumable
+        init_image_uploads(app)
+        # Kết quả đã có cho ảnh trùng (checksum + version model + ngưỡng): không chạy lại inference
+        init_result_cache(app)
+
+    with startup_profiler.phase("health checks"):
+        # /readyz, /api/health trả kết quả cache; thread nền kiểm tra DB/SMTP/disk
+        init_health_checker(app)
+
+    with startup_profiler.phase("metrics"):
+        # Request counter/histogram + gauge pool DB, bcrypt, JWT cache, outbox, analysis queue cho /metrics
+        init_metrics(app)
     
     try:
         register_error_handlers(app)   
@@ -69,34 +108,35 @@ def create_app(config_name='development'):
     # init DB (tái sử dụng databases ) -
     # init_db(app)
     
-    try:
-        # register routes mới (health/auth/... về sau)
-        register_routes(app)
-        logger.info("✅ Routes registered")
-    except Exception as e:
-        logger.error(f"Error registering routes: {e}")
+    with startup_profiler.phase("routes"):
+        try:
+            # register routes mới (health/auth/... về sau)
+            register_routes(app)
+            logger.info("✅ Routes registered")
+        except Exception as e:
+            logger.error(f"Error registering routes: {e}")
+
+    with startup_profiler.phase("static assets"):
+        # Index dist/ một lần: variant br/gzip, ETag, cache immutable cho file có hash
+        init_static_assets(app, FRONTEND_BUILD_PATH)
 
     # Serve frontend - PHẢI SAU API routes
     @app.route('/')
     def index():
-        try:
-            print(f"Serving index.html from {FRONTEND_BUILD_PATH}")
-            return send_from_directory(FRONTEND_BUILD_PATH, 'index.html')
-        except Exception as e:
-            print(f"Error serving index.html: {e}")
-            return f"Error: {str(e)}", 500
+        response = get_static_assets().response('index.html')
+        if response is None:
+            return f"Frontend build not found: {FRONTEND_BUILD_PATH}", 404
+        return response
     
     @app.route('/<path:filename>')
     def serve_static(filename):
-        try:
-            # Không serve API routes - để cho API xử lý
-            if filename.startswith('api/'):
-                return {"error": "API route not found"}, 404
-            print(f"Serving static file: {filename}")
-            return send_from_directory(FRONTEND_BUILD_PATH, filename)
-        except Exception as e:
-            print(f"Error serving {filename}: {e}")
+        # Không serve API routes - để cho API xử lý
+        if filename.startswith('api/'):
+            return {"error": "API route not found"}, 404
+        response = get_static_assets().response(filename)
+        if response is None:
             return f"File not found: {filename}", 404
+        return response
     
     return app
 
@@ -6,12 +6,13 @@ DEFAULT_HASH_ROUNDS = 12  # Số vòng hash - càng cao càng bảo mật nhưng
 ENCODING = 'utf-8'  # Mã hóa ký tự
 
 
-def hash_password(password: str) -> str:
+def hash_password(password: str, rounds: int = DEFAULT_HASH_ROUNDS) -> str:
     """
     Mã hóa mật khẩu bằng bcrypt với salt ngẫu nhiên.
     
     Args:
         password: Mật khẩu dạng text cần được mã hóa.
+        rounds: Cost factor của bcrypt (mặc định: DEFAULT_HASH_ROUNDS).
         
     Returns:
         Mật khẩu đã được mã hóa dưới dạng chuỗi UTF-8.
@@ -29,7 +30,7 @@ def hash_password(password: str) -> str:
         raise ValueError("Mật khẩu không được để trống")
     
     # Tạo salt ngẫu nhiên với số vòng mã hóa
-    salt = bcrypt.gensalt(rounds=DEFAULT_HASH_ROUNDS)
+    salt = bcrypt.gensalt(rounds=rounds)
     # Mã hóa mật khẩu bằng bcrypt
     hashed_password = bcrypt.hashpw(password.encode(ENCODING), salt)
     
@@ -66,6 +67,27 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     )
 
 
+def get_hash_rounds(hashed_password: str) -> Optional[int]:
+    """
+    Đọc cost factor từ chuỗi hash bcrypt (dạng "$2b$12$...").
+    
+    Args:
+        hashed_password: Mật khẩu đã mã hóa.
+        
+    Returns:
+        Cost factor, hoặc None nếu chuỗi không phải hash bcrypt.
+    """
+    if not isinstance(hashed_password, str):
+        return None
+    
+    parts = hashed_password.split('$')
+    # ['', '2b', '12', 'salt+hash']
+    if len(parts) != 4 or not parts[2].isdigit():
+        return None
+    
+    return int(parts[2])
+
+
 def is_password_strong(password: str, min_length: int = 8) -> bool:
     """
     Kiểm tra mật khẩu có đủ mạnh theo tiêu chuẩn bảo mật.
@@ -2,6 +2,9 @@ from domain.interface.user_repository import UserRepositoryInterface
 from domain.interface.role_repository import RoleRepositoryInterface
 from domain.model.user import User
 import bcrypt
+import logging
+
+logger = logging.getLogger(__name__)
 
 # đây là class thông báo lỗi khi không tìm thấy user theo email 
 class UserNotFound(Exception):
@@ -62,7 +65,7 @@ class AuthService:
     #def create_user(self, user: User):
 
     def create_user(self, user:User):
-        print(f"[AUTH SERVICE] Đang xử lý logic đăng ký cho email: {user.email}")
+        logger.debug("[AUTH SERVICE] Đang xử lý logic đăng ký cho email: %s", user.email)
         if not user.email:
             raise ValueError("Email cannot be empty")
         if not user.password:
@@ -75,7 +78,7 @@ class AuthService:
         return self.user_repository.create(user)
     
     def password_hash(self,password:str):
-        print("[SECURITY] Đang thực hiện băm (hashing) mật khẩu mới...")
+        logger.debug("[SECURITY] Đang thực hiện băm (hashing) mật khẩu mới...")
         # Tạo một salt ngẫu nhiên
         salt = bcrypt.gensalt()
         # Băm mật khẩu với salt
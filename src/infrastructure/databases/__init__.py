@@ -4,10 +4,18 @@ Note: Model imports are intentionally avoided here to prevent circular imports.
 Models should be imported directly from infrastructure.models when needed.
 """
 
-from infrastructure.databases.mssql import init_mssql
-
 __all__ = ['init_mssql']
 
+
+def __getattr__(name):
+    # Import mssql lazily: every model imports infrastructure.databases.base, and an
+    # eager import here would make mssql (which imports all models) run while the
+    # first model module is still half-initialized.
+    if name == 'init_mssql':
+        from infrastructure.databases.mssql import init_mssql
+        return init_mssql
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # Models should be imported explicitly where needed:
 # from infrastructure.models.user_model import UserModel
 # from infrastructure.models.email_verification_token_model import EmailVerificationTokenModel
@@ -1,10 +1,13 @@
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
-import os
+import logging
 from config import Config
 from infrastructure.databases.base import Base
+from infrastructure.databases.routing import ReaderSelector, RoutingSession
 from flask import g
 
+logger = logging.getLogger(__name__)
+
 # Import all models to register them with Base.metadata BEFORE create_all()
 # This is necessary so SQLAlchemy knows about all relationships and foreign keys
 try:
@@ -15,50 +18,156 @@ try:
     from infrastructure.models.notification_template_model import NotificationTemplateModel
     from infrastructure.models.auth_identity_model import AuthIdentityModel
     from infrastructure.models.email_verification_token_model import EmailVerificationTokenModel
+    from infrastructure.models.refresh_token_model import RefreshTokenModel
+    from infrastructure.models.email_outbox_model import EmailOutboxModel
 except Exception as e:
     # Models might have circular import issues, but we'll handle it gracefully
-    print(f"Warning: Could not import all models: {e}")
+    logger.warning(f"Could not import all models: {e}")
 
 DATABASE_URI = Config.SQLALCHEMY_DATABASE_URI
-print(f"[DB CONFIG] Reading Config.SQLALCHEMY_DATABASE_URI: {Config.SQLALCHEMY_DATABASE_URI}")
-print(f"[DB CONFIG] os.environ.get('DATABASE_URI'): {os.environ.get('DATABASE_URI')}")
-print(f"[DB CONFIG] Final DATABASE_URI being used: {DATABASE_URI}")  
-
-# Create engine with database-specific options
-if 'sqlite' in DATABASE_URI:
-    if '/:memory:' in DATABASE_URI:
-        # For in-memory SQLite, use StaticPool - single persistent connection
-        from sqlalchemy.pool import StaticPool
-        engine = create_engine(
-            DATABASE_URI, 
-            connect_args={"check_same_thread": False},
-            poolclass=StaticPool,
+
+def _sqlite_connect_args():
+    # check_same_thread=False: kết nối trong pool được dùng lại bởi nhiều thread (Waitress)
+    return {"check_same_thread": False, "timeout": Config.SQLITE_BUSY_TIMEOUT_MS / 1000}
+
+
+def _apply_sqlite_pragmas(engine):
+    """
+    Tune every new connection of a file-based SQLite engine.
+
+    WAL lets readers run while a write is in progress, synchronous=NORMAL is
+    safe with WAL and avoids an fsync per commit, and busy_timeout makes a
+    connection wait for a lock instead of failing with "database is locked".
+    """
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(Config.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(Config.SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute(f"PRAGMA mmap_size={int(Config.SQLITE_MMAP_SIZE)}")
+        cursor.close()
+
+
+def _is_sqlite_file(uri):
+    return 'sqlite' in uri and '/:memory:' not in uri
+
+
+def _create_sqlite_file_engine(uri, pool_size, pool_timeout=30):
+    from sqlalchemy.pool import QueuePool
+    engine = create_engine(
+        uri,
+        connect_args=_sqlite_connect_args(),
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=0 if pool_size == 1 else pool_size,
+        pool_timeout=pool_timeout,
+        echo=False
+    )
+    _apply_sqlite_pragmas(engine)
+    return engine
+
+
+def create_sqlite_engines(uri, read_pool_size=None):
+    """
+    Build the writer and reader engines for a file-based SQLite database.
+
+    The writer holds exactly one connection, so writes from all request
+    threads of this process queue up for it instead of racing for the file
+    lock. Readers share a small pool of WAL connections that are kept open
+    between requests.
+
+    Args:
+        uri: sqlite:/// URI of a database file
+        read_pool_size: Reader pool size (default SQLITE_READ_POOL_SIZE)
+
+    Returns:
+        tuple: (writer_engine, reader_engine)
+    """
+    writer = _create_sqlite_file_engine(uri, 1, pool_timeout=Config.SQLITE_WRITER_TIMEOUT)
+    reader = _create_sqlite_file_engine(uri, read_pool_size or Config.SQLITE_READ_POOL_SIZE)
+    return writer, reader
+
+
+def _create_engine(uri):
+    """Engine for one database URI (file SQLite gets a WAL read pool)"""
+    if 'sqlite' in uri:
+        if '/:memory:' in uri:
+            # For in-memory SQLite, use StaticPool - single persistent connection
+            from sqlalchemy.pool import StaticPool
+            return create_engine(
+                uri,
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool,
+                echo=False
+            )
+        return _create_sqlite_file_engine(uri, Config.SQLITE_READ_POOL_SIZE)
+    if 'postgresql' in uri:
+        return create_engine(
+            uri,
+            pool_size=10,
+            pool_recycle=3600,
+            pool_pre_ping=True,
             echo=False
         )
+    return create_engine(uri, echo=False)
+
+
+def create_engines(primary_uri, replica_uris=()):
+    """
+    Build the primary (writer) engine and the reader engines.
+
+    Without replicas, file-based SQLite gets a single-connection writer plus
+    a local read pool (see create_sqlite_engines); other databases use the
+    primary engine for reads too. With replicas, reads go to the replicas.
+
+    Args:
+        primary_uri: URI of the primary database
+        replica_uris: URIs of read replicas (may be empty)
+
+    Returns:
+        tuple: (writer_engine, list of reader engines)
+    """
+    if _is_sqlite_file(primary_uri):
+        writer, local_reader = create_sqlite_engines(primary_uri)
+        readers = [local_reader]
     else:
-        # For file-based SQLite in Waitress/Gunicorn multi-threading:
-        # Use NullPool to avoid database locking issues
-        # Each request gets a new connection that's immediately closed
-        from sqlalchemy.pool import NullPool
-        engine = create_engine(
-            DATABASE_URI, 
-            connect_args={"check_same_thread": False, "timeout": 30},
-            poolclass=NullPool,  # Critical: dispose connection after each use
-            echo=False
-        )
-elif 'postgresql' in DATABASE_URI:
-    engine = create_engine(
-        DATABASE_URI,
-        pool_size=10,
-        pool_recycle=3600,
-        pool_pre_ping=True,
-        echo=False
+        writer = _create_engine(primary_uri)
+        readers = [writer]
+
+    if replica_uris:
+        readers = [_create_engine(uri) for uri in replica_uris]
+    return writer, readers
+
+
+def create_session_factory(writer, readers, sticky_session=False):
+    """
+    Session factory for a writer and its readers
+
+    Args:
+        writer: Primary engine (flush/commit)
+        readers: Reader engines, used round-robin
+        sticky_session: Keep a session on the primary after its first write
+            until it is closed (needed when readers are lagging replicas)
+    """
+    if list(readers) == [writer]:
+        return sessionmaker(autocommit=False, autoflush=False, bind=writer)
+    return sessionmaker(
+        class_=RoutingSession, autocommit=False, autoflush=False,
+        writer=writer, readers=ReaderSelector(readers), sticky_session=sticky_session
     )
-else:
-    engine = create_engine(DATABASE_URI, echo=False)
+
+
+# `engine` là primary (ghi); `read_engines` phục vụ các câu SELECT
+# (pool đọc SQLite cục bộ hoặc các replica trong DATABASE_REPLICA_URIS)
+engine, read_engines = create_engines(DATABASE_URI, Config.DATABASE_REPLICA_URIS)
 
 # Create session factory with scoped_session for thread-local storage
-SessionFactory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Replica có thể trễ so với primary nên sau khi ghi, cả request đọc từ primary
+SessionFactory = create_session_factory(
+    engine, read_engines, sticky_session=bool(Config.DATABASE_REPLICA_URIS)
+)
 scoped_session_factory = scoped_session(SessionFactory)
 
 def get_db_session():
@@ -87,7 +196,8 @@ def get_request_db_session(app=None):
 def init_app(app):
     """
     Initialize database for Flask application.
-    Sets up request-scoped session management.
+    Sets up request-scoped session management and checks the schema version
+    (DDL only runs here when SCHEMA_AUTO_UPGRADE is enabled).
     """
     @app.teardown_appcontext
     def shutdown_session(exception=None):
@@ -95,33 +205,20 @@ def init_app(app):
         from flask import g
         session = g.pop('db_session', None)
         if session is not None:
-            print(f"[DB TEARDOWN] Closing session {id(session)}")
             session.close()
-            print(f"[DB TEARDOWN] Session closed")
-    
-    # Also initialize database tables
-    init_mssql()
+
+    from infrastructure.databases.schema import ensure_schema
+    ensure_schema(engine, auto_upgrade=app.config.get("SCHEMA_AUTO_UPGRADE", False))
+
+    # Số query và thời gian DB của từng request (log request, Server-Timing)
+    from infrastructure.databases.timing import instrument_engine
+    for bound in {engine, *read_engines}:
+        instrument_engine(bound)
 
 def init_mssql(app=None):
     """
-    Tạo bảng dựa trên Base.metadata.
-    Chỉ tạo được bảng nếu các file model đã được import (ở __init__.py).
+    Tạo/cập nhật bảng dựa trên Base.metadata.
+    Gọi schema manager (có khóa, ghi version stamp); xem infrastructure/databases/schema.py.
     """
-    try:
-        Base.metadata.create_all(bind=engine)
-    except Exception as e:
-        # If there are foreign key issues, try to create only the essential tables
-        print(f"[DB INIT] Warning: Could not create all tables: {e}")
-        print("[DB INIT] Attempting to create essential tables only...")
-        try:
-            # Create tables for basic auth and email verification
-            from infrastructure.models.user_model import UserModel
-            from infrastructure.models.email_verification_token_model import EmailVerificationTokenModel
-            UserModel.__table__.create(bind=engine, checkfirst=True)
-            EmailVerificationTokenModel.__table__.create(bind=engine, checkfirst=True)
-            print("[DB INIT] Essential tables created successfully")
-        except Exception as e2:
-            print(f"[DB INIT] Could not create essential tables: {e2}")
-            # Continue anyway - the tables might already exist or will be created on first use
-
-
+    from infrastructure.databases.schema import upgrade
+    return upgrade(engine)
@@ -0,0 +1,68 @@
+"""
+Session routing between the primary (writer) engine and reader engines
+(a local read pool or read replicas)
+"""
+
+import itertools
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import Insert, Update, Delete
+
+
+class ReaderSelector:
+    """Round-robin choice among reader engines"""
+
+    def __init__(self, engines):
+        self.engines = list(engines)
+        if not self.engines:
+            raise ValueError("At least one reader engine is required")
+        self._counter = itertools.count()
+
+    def next(self):
+        return self.engines[next(self._counter) % len(self.engines)]
+
+
+class RoutingSession(Session):
+    """
+    Session that sends writes to ``writer`` and plain reads to a reader.
+
+    Flushes and INSERT/UPDATE/DELETE statements always use the writer. A
+    session picks one reader (round-robin) on its first read and keeps it,
+    so the reads of one request see a single consistent replica.
+
+    After a write, reads stick to the writer so the caller sees its own
+    changes. With ``sticky_session=False`` (readers share the primary's data,
+    e.g. a SQLite file) the stickiness ends with the transaction; with
+    ``sticky_session=True`` (asynchronous replicas that may lag) it lasts
+    until the session is closed, i.e. for the rest of the request.
+    """
+
+    def __init__(self, writer=None, readers=None, sticky_session=False, **kwargs):
+        super().__init__(**kwargs)
+        self.writer = writer
+        if not isinstance(readers, ReaderSelector):
+            readers = ReaderSelector(readers or [writer])
+        self.readers = readers
+        self.sticky_session = sticky_session
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get("wrote") or self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self.info["wrote"] = True
+            return self.writer
+        reader = self.info.get("reader")
+        if reader is None:
+            reader = self.info["reader"] = self.readers.next()
+        return reader
+
+    def close(self):
+        super().close()
+        self.info.pop("wrote", None)
+        self.info.pop("reader", None)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+@event.listens_for(RoutingSession, "after_rollback")
+def _reset_write_stickiness(session):
+    if not session.sticky_session:
+        session.info.pop("wrote", None)
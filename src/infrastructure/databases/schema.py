@@ -0,0 +1,486 @@
+"""
+Schema Manager for AURA System
+Creates/migrates the database schema once, behind a lock, and records a
+version stamp. Worker boot only compares the stamp with the version of the
+models in this build (one SELECT, cached per process).
+
+Only additive changes are applied automatically: new tables, columns and
+indexes. Widening an existing string column or changing unique constraints
+is detected and fails the upgrade (no stamp is written) until the change is
+migrated explicitly (a step in MIGRATIONS); other column type changes are
+not detected and always need an explicit migration.
+
+Usage:
+    python -m infrastructure.databases.schema upgrade   # chạy trước khi start gunicorn
+    python -m infrastructure.databases.schema status
+"""
+
+import hashlib
+import importlib
+import logging
+import os
+import pkgutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Enum, Integer, MetaData, String, Table, UniqueConstraint, inspect, text
+from sqlalchemy.schema import AddConstraint, CreateColumn, CreateTable
+
+from infrastructure.databases.base import Base
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Bảng stamp nằm ngoài Base.metadata để không ảnh hưởng tới hash của schema
+_stamp_metadata = MetaData()
+schema_version_table = Table(
+    "schema_version",
+    _stamp_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("version", String(64), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Khóa advisory của PostgreSQL (số bất kỳ, cố định cho AURA)
+PG_ADVISORY_LOCK_KEY = 0x41555241
+
+
+class SchemaUpgradeError(RuntimeError):
+    """The schema could not be brought up to the models; the stamp was not written"""
+
+    def __init__(self, failed):
+        self.failed = list(failed)
+        super().__init__("Schema upgrade failed: " + ", ".join(self.failed))
+
+
+# engine url -> version đã xác minh trong process này
+_verified = {}
+_models_version = None
+
+
+def import_all_models():
+    """Import every module of infrastructure/models so Base.metadata is complete"""
+    models_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+    for module in pkgutil.iter_modules([models_dir]):
+        if not module.name.startswith("_"):
+            importlib.import_module(f"infrastructure.models.{module.name}")
+
+
+def expected_version(metadata=None) -> str:
+    """
+    Version of the schema described by the models
+
+    A hash of table names, columns (type, nullability, primary key) and
+    indexes, so any model change produces a new version.
+    """
+    metadata = metadata if metadata is not None else Base.metadata
+    digest = hashlib.sha256()
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        digest.update(table.name.encode())
+        for column in table.columns:
+            digest.update(f"|{column.name}:{column.type}:{column.nullable}:{column.primary_key}".encode())
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            digest.update(f"|ix:{index.name}:{index.unique}".encode())
+        digest.update(b"\n")
+    return digest.hexdigest()[:16]
+
+
+def models_version() -> str:
+    """expected_version() of all models, computed once per process"""
+    global _models_version
+    if _models_version is None:
+        import_all_models()
+        _models_version = expected_version()
+    return _models_version
+
+
+def current_version(engine):
+    """
+    Version stamp stored in the database
+
+    Returns:
+        str or None: None if the schema was never stamped
+    """
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(
+                schema_version_table.select().where(schema_version_table.c.id == 1)
+            ).first()
+    except Exception:
+        # Bảng schema_version chưa tồn tại
+        return None
+    return row.version if row else None
+
+
+def _lock_path(engine):
+    database = engine.url.database
+    if engine.dialect.name == "sqlite" and database and database != ":memory:":
+        return os.path.abspath(database) + ".schema.lock"
+    name = hashlib.sha256(str(engine.url).encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"aura_schema_{name}.lock")
+
+
+@contextmanager
+def _file_lock(path, timeout=300):
+    with open(path, "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            return
+
+        # Windows
+        import msvcrt
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Could not acquire schema lock {path}")
+                time.sleep(0.1)
+        try:
+            yield
+        finally:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def schema_lock(engine):
+    """
+    Serialize schema changes between processes
+
+    PostgreSQL uses a session advisory lock (works across hosts); other
+    databases use a lock file next to the SQLite file or in the temp dir.
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": PG_ADVISORY_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PG_ADVISORY_LOCK_KEY})
+    else:
+        with _file_lock(_lock_path(engine)):
+            yield
+
+
+def _create_tables(engine, metadata):
+    """create_all, falling back to one table at a time; returns failed table names"""
+    try:
+        metadata.create_all(bind=engine)
+        return []
+    except Exception as e:
+        logger.warning(f"create_all failed ({e}); creating tables one by one")
+
+    failed = []
+    for table in metadata.sorted_tables:
+        try:
+            table.create(bind=engine, checkfirst=True)
+        except Exception as e:
+            logger.error(f"Could not create table {table.name}: {e}")
+            failed.append(table.name)
+    return failed
+
+
+def _migrate_tables(engine, metadata):
+    """
+    Add columns and indexes that exist in the models but not in the database
+
+    Returns:
+        list: Descriptions of the changes that failed
+    """
+    failed = []
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            ddl = CreateColumn(column).compile(dialect=engine.dialect)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                logger.info(f"Added column {table.name}.{column.name}")
+            except Exception as e:
+                logger.error(f"Could not add column {table.name}.{column.name}: {e}")
+                failed.append(f"{table.name}.{column.name}")
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            try:
+                index.create(bind=engine, checkfirst=True)
+                logger.info(f"Created index {index.name}")
+            except Exception as e:
+                logger.error(f"Could not create index {index.name}: {e}")
+                failed.append(index.name)
+    return failed
+
+
+def _unique_sets(table):
+    """Column sets with a unique constraint or unique index in the models"""
+    sets = {tuple(sorted(c.name for c in constraint.columns))
+            for constraint in table.constraints if isinstance(constraint, UniqueConstraint)}
+    sets |= {tuple(sorted(c.name for c in index.columns)) for index in table.indexes if index.unique}
+    sets |= {(column.name,) for column in table.columns if column.unique}
+    return sets
+
+
+def _reflected_unique_sets(inspector, table_name):
+    sets = {tuple(sorted(u["column_names"])) for u in inspector.get_unique_constraints(table_name)}
+    sets |= {tuple(sorted(i["column_names"])) for i in inspector.get_indexes(table_name) if i.get("unique")}
+    return sets
+
+
+def _string_widened(model_type, db_type) -> bool:
+    """
+    String column that is longer in the model than in the database
+
+    Reflection is only reliable enough for string lengths (SQLite reports
+    unknown types such as UUID as NUMERIC), so other type changes are not
+    detected and must be migrated explicitly.
+    """
+    if not isinstance(model_type, String) or isinstance(model_type, Enum) or not isinstance(db_type, String):
+        return False
+    db_length = db_type.length
+    return db_length is not None and (model_type.length is None or model_type.length > db_length)
+
+
+def _detect_unmigrated(engine, metadata):
+    """
+    Changes to existing columns that _migrate_tables cannot apply
+
+    Returns:
+        list: Descriptions of widened string columns and unique constraint differences
+    """
+    changes = []
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        db_columns = {column["name"]: column for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            db_column = db_columns.get(column.name)
+            if db_column is not None and _string_widened(column.type, db_column["type"]):
+                changes.append(f"{table.name}.{column.name}: type {db_column['type']} -> {column.type}")
+
+        model_unique = _unique_sets(table)
+        db_unique = _reflected_unique_sets(inspector, table.name)
+        for columns in sorted(model_unique - db_unique):
+            changes.append(f"{table.name}: missing unique ({', '.join(columns)})")
+        for columns in sorted(db_unique - model_unique):
+            changes.append(f"{table.name}: unique ({', '.join(columns)}) no longer in the model")
+    return changes
+
+
+def _quote(engine, name):
+    return engine.dialect.identifier_preparer.quote(name)
+
+
+def _rebuild_sqlite_table(engine, table):
+    """
+    Recreate a SQLite table from its model, keeping the rows
+
+    SQLite cannot alter column types or drop inline constraints. The new
+    table is created under a temporary name and renamed over the old one,
+    so foreign keys of other tables still point at the original name.
+    """
+    temp_name = f"{table.name}__new"
+    temp_table = table.to_metadata(MetaData(), name=temp_name)
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    columns = ", ".join(_quote(engine, c.name) for c in table.columns if c.name in existing)
+    with engine.begin() as conn:
+        conn.execute(CreateTable(temp_table))
+        conn.execute(text(f"INSERT INTO {temp_name} ({columns}) SELECT {columns} FROM {table.name}"))
+        conn.execute(text(f"DROP TABLE {table.name}"))
+        conn.execute(text(f"ALTER TABLE {temp_name} RENAME TO {table.name}"))
+        for index in table.indexes:
+            index.create(bind=conn)
+
+
+def _migrate_notification_templates_locale(engine) -> bool:
+    """
+    notification_templates: unique template_code -> unique (template_code, locale),
+    body_tpl VARCHAR(255) -> TEXT
+
+    Runs after _migrate_tables has added the locale column.
+    """
+    from infrastructure.models.notification_template_model import NotificationTemplateModel
+
+    table = NotificationTemplateModel.__table__
+    inspector = inspect(engine)
+    if table.name not in inspector.get_table_names():
+        return False
+
+    body_type = {c["name"]: c["type"] for c in inspector.get_columns(table.name)}["body_tpl"]
+    narrow_body = isinstance(body_type, String) and body_type.length is not None
+    old_constraints = [u["name"] for u in inspector.get_unique_constraints(table.name)
+                       if u["column_names"] == ["template_code"]]
+    old_indexes = [i["name"] for i in inspector.get_indexes(table.name)
+                   if i.get("unique") and i["column_names"] == ["template_code"] and i["name"] not in old_constraints]
+    composite = ("locale", "template_code") in _reflected_unique_sets(inspector, table.name)
+    if not (narrow_body or old_constraints or old_indexes or not composite):
+        return False
+
+    if engine.dialect.name == "sqlite":
+        _rebuild_sqlite_table(engine, table)
+        return True
+
+    body_column = table.c.body_tpl
+    with engine.begin() as conn:
+        for name in old_constraints:
+            conn.execute(text(f"ALTER TABLE {table.name} DROP CONSTRAINT {_quote(engine, name)}"))
+        for name in old_indexes:
+            on_table = f" ON {table.name}" if engine.dialect.name == "mssql" else ""
+            conn.execute(text(f"DROP INDEX {_quote(engine, name)}{on_table}"))
+        if narrow_body:
+            body_ddl = body_column.type.compile(dialect=engine.dialect)
+            if engine.dialect.name == "postgresql":
+                conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN body_tpl TYPE {body_ddl}"))
+            else:
+                conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN body_tpl {body_ddl} NOT NULL"))
+        if not composite:
+            [constraint] = [c for c in table.constraints
+                            if isinstance(c, UniqueConstraint) and c.name == "uq_notification_templates_code_locale"]
+            conn.execute(AddConstraint(constraint))
+    return True
+
+
+# Migration tường minh cho thay đổi mà _migrate_tables không tự làm được (kiểu cột, unique).
+# Mỗi bước tự kiểm tra database trước, chạy lại hoặc chạy trên database mới tạo thì không làm gì.
+MIGRATIONS = [
+    ("notification_templates_locale", _migrate_notification_templates_locale),
+]
+
+
+def _run_migrations(engine):
+    """Run the MIGRATIONS steps; returns the names of the steps that failed"""
+    failed = []
+    for name, step in MIGRATIONS:
+        try:
+            if step(engine):
+                logger.info(f"Applied migration {name}")
+        except Exception as e:
+            logger.error(f"Migration {name} failed: {e}")
+            failed.append(f"migration {name}")
+    return failed
+
+
+def _write_stamp(engine, version):
+    _stamp_metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(schema_version_table.delete())
+        conn.execute(schema_version_table.insert().values(id=1, version=version, applied_at=datetime.utcnow()))
+
+
+def upgrade(engine) -> dict:
+    """
+    Bring the database schema up to the models of this build
+
+    Runs under schema_lock; if another process already upgraded to the same
+    version while we waited, nothing is done. The stamp is only written when
+    every change was applied, so a failed upgrade is retried on the next run
+    and workers keep refusing the schema.
+
+    Returns:
+        dict: {"version", "changed", "failed"}
+
+    Raises:
+        SchemaUpgradeError: A table, column or index could not be created, or
+            an existing string column/unique constraint differs from the models
+    """
+    version = models_version()
+    with schema_lock(engine):
+        if current_version(engine) == version:
+            _verified[str(engine.url)] = version
+            return {"version": version, "changed": False, "failed": []}
+
+        started = time.perf_counter()
+        failed = _migrate_tables(engine, Base.metadata)
+        failed += _run_migrations(engine)
+        failed += _create_tables(engine, Base.metadata)
+        failed += _detect_unmigrated(engine, Base.metadata)
+        if failed:
+            # Không ghi stamp: schema chưa khớp model, upgrade phải chạy lại sau khi sửa
+            raise SchemaUpgradeError(failed)
+        _write_stamp(engine, version)
+        _verified[str(engine.url)] = version
+        logger.info(f"Schema upgraded to {version} in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return {"version": version, "changed": True, "failed": []}
+
+
+def ensure_schema(engine, auto_upgrade=False) -> bool:
+    """
+    Check the schema at worker boot
+
+    Compares the stored stamp with the models' version (cached per process).
+    On mismatch, upgrades when ``auto_upgrade`` is set (development, tests,
+    in-memory databases), otherwise only logs a warning.
+
+    Returns:
+        bool: True if the schema matches this build
+    """
+    key = str(engine.url)
+    version = models_version()
+    if _verified.get(key) == version:
+        return True
+
+    stored = current_version(engine)
+    if stored == version:
+        _verified[key] = version
+        return True
+
+    if auto_upgrade or engine.url.database in (None, "", ":memory:"):
+        upgrade(engine)
+        return True
+
+    logger.warning(
+        f"Database schema version {stored} does not match {version}; "
+        "run `python -m infrastructure.databases.schema upgrade`"
+    )
+    return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AURA database schema manager")
+    parser.add_argument("command", choices=["upgrade", "status"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from infrastructure.databases.mssql import engine
+
+    if args.command == "upgrade":
+        try:
+            result = upgrade(engine)
+        except SchemaUpgradeError as e:
+            print("Schema upgrade failed, database not stamped:")
+            for name in e.failed:
+                print(f"  failed: {name}")
+            raise SystemExit(1)
+        print(f"Schema version: {result['version']} ({'upgraded' if result['changed'] else 'up to date'})")
+    else:
+        stored = current_version(engine)
+        version = models_version()
+        print(f"Database: {stored or 'not stamped'}")
+        print(f"Models:   {version}")
+        print("Up to date" if stored == version else "Upgrade required")
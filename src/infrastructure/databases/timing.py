@@ -0,0 +1,58 @@
+"""
+Per-request database timing
+
+Cursor execute events on the engines add the query count and the time spent
+in the database to ``flask.g`` (db_queries, db_time in seconds). Queries run
+outside an app context (e.g. the email outbox thread) are not counted.
+"""
+
+import time
+import weakref
+
+from flask import g, has_app_context
+from sqlalchemy import event
+
+_instrumented = weakref.WeakSet()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if has_app_context():
+        g.db_queries = g.get("db_queries", 0) + 1
+        g.db_time = g.get("db_time", 0.0) + elapsed
+
+
+def _handle_error(exception_context):
+    # Query lỗi không tới after_cursor_execute: bỏ mốc thời gian của nó
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def instrument_engine(engine):
+    """Attach the timing listeners to an engine (idempotent)"""
+    if engine in _instrumented:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    _instrumented.add(engine)
+
+
+def request_db_stats():
+    """
+    Database usage of the current request
+
+    Returns:
+        tuple: (query count, seconds)
+    """
+    if not has_app_context():
+        return 0, 0.0
+    return g.get("db_queries", 0), g.get("db_time", 0.0)
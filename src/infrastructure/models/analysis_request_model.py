@@ -1,20 +1,38 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 from infrastructure.databases.base import Base
 
 class AnalysisRequestModel(Base):
+    """
+    Screening analysis request, also the row of the analysis job queue
+
+    Status flow: queued -> processing -> done, or back to queued (retry with
+    backoff) until max attempts; failed for permanent errors, quarantined
+    for poison jobs (attempts exhausted, e.g. a job that keeps crashing its
+    worker).
+    """
     __tablename__ = "analysis_requests"
 
     id = Column(Integer, primary_key=True)
     queue_id = Column(String(64), nullable=True)
-    status = Column(String(50), default="queued")  # queued/processing/done/failed
+    status = Column(String(50), default="queued", index=True)  # queued/processing/done/failed/quarantined
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
 
     model_version = Column(String(50), nullable=True)
 
+    # Job queue: worker giữ job tới locked_until (lease), gia hạn bằng heartbeat
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime, nullable=True, default=datetime.utcnow, index=True)
+    locked_by = Column(String(100), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    # Mỗi lần claim có token riêng: worker mất lease không ghi đè kết quả của worker sau
+    lease_token = Column(String(36), nullable=True, index=True)
+    started_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
     profile_id = Column(Integer, ForeignKey("ai_threshold_profiles.id"), nullable=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=True)
     clinic_id = Column(Integer, ForeignKey("clinics.id"), nullable=True)
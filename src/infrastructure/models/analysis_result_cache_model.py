@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime
+
+from infrastructure.databases.base import Base
+
+class AnalysisResultCacheModel(Base):
+    """
+    Durable tier of the analysis result cache (services/result_cache.py)
+
+    cache_key = SHA-256 of (image checksums, model version, thresholds);
+    result_id is the analysis_results row computed for that key. Rows of
+    other model versions are purged when a new AI model is deployed.
+    """
+    __tablename__ = "analysis_result_cache"
+
+    cache_key = Column(String(64), primary_key=True)
+    result_id = Column(Integer, ForeignKey("analysis_results.id"), nullable=False)
+    model_version = Column(String(50), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
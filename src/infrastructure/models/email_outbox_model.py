@@ -0,0 +1,34 @@
+import uuid
+from sqlalchemy import Column, String, DateTime, Integer, Text
+from datetime import datetime
+
+from infrastructure.databases.base import Base
+
+
+class EmailOutboxModel(Base):
+    """
+    Outgoing email waiting to be sent by the outbox sender
+
+    Status flow: pending -> sending -> sent, or back to pending (retry with
+    backoff) until max attempts, then dead. A message whose lease expired on
+    its last attempt goes straight to dead.
+    """
+    __tablename__ = "email_outbox"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    text_body = Column(Text, nullable=False)
+    html_body = Column(Text, nullable=True)
+
+    status = Column(String(20), nullable=False, default="pending", index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    # Sender đang giữ message tới thời điểm này; quá hạn thì sender khác được nhận lại
+    locked_until = Column(DateTime, nullable=True)
+    # Token của lần claim hiện tại; chỉ sender giữ token mới được ghi kết quả
+    lease_token = Column(String(36), nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
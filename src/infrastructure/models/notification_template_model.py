@@ -1,13 +1,18 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import Column, Integer, String, Boolean, Text, UniqueConstraint
 
 from infrastructure.databases.base import Base
 
 class NotificationTemplateModel(Base):
     __tablename__ = "notification_templates"
+    __table_args__ = (
+        UniqueConstraint("template_code", "locale", name="uq_notification_templates_code_locale"),
+    )
 
     id = Column(Integer, primary_key=True)
-    template_code = Column(String(100), unique=True, nullable=False)
+    template_code = Column(String(100), nullable=False, index=True)
+    locale = Column(String(10), nullable=False, default="vi", server_default="vi")
     title_tpl = Column(String(255), nullable=False)
-    body_tpl = Column(String(255), nullable=False)
+    body_tpl = Column(Text, nullable=False)   # bản text (email) / nội dung push, inapp
+    html_tpl = Column(Text, nullable=True)    # bản HTML, chỉ dùng cho channel email
     channel = Column(String(50), nullable=False)  # email/push/inapp
     active = Column(Boolean, default=True)
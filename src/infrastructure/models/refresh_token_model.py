@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey
+from datetime import datetime
+
+from infrastructure.databases.base import Base
+
+
+class RefreshTokenModel(Base):
+    __tablename__ = "refresh_tokens"
+
+    # jti của refresh token; mỗi lần refresh sinh token mới trong cùng family
+    jti = Column(String(36), primary_key=True)
+    family_id = Column(String(36), nullable=False, index=True)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False, index=True)
+
+    issued_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)      # đã được rotate
+    revoked_at = Column(DateTime, nullable=True)   # logout / phát hiện reuse
@@ -10,7 +10,8 @@ class RetinalImageModel(Base):
     id = Column(Integer, primary_key=True)
     image_type = Column(String(20), nullable=False)   # FUNDUS/OCT
     storage_url = Column(String(500), nullable=False)
-    checksum = Column(String(255), nullable=True)
+    # SHA-256 của nội dung (kho ảnh services/image_store.py); index để tìm ảnh upload trùng
+    checksum = Column(String(255), nullable=True, index=True)
 
     uploaded_at = Column(DateTime, default=datetime.utcnow)
     checked_at = Column(DateTime, nullable=True)
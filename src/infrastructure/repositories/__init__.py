@@ -1,4 +1,6 @@
 from .user_repository import UserRepository
 from .email_verification_token_repository import EmailVerificationTokenRepository
+from .refresh_token_repository import RefreshTokenRepository
+from .email_outbox_repository import EmailOutboxRepository
 
-__all__ = ['UserRepository', 'EmailVerificationTokenRepository']
+__all__ = ['UserRepository', 'EmailVerificationTokenRepository', 'RefreshTokenRepository', 'EmailOutboxRepository']
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""
+AIModel Repository
+Handles database operations for AI model versions and their deployment
+"""
+
+from typing import Optional
+from sqlalchemy.orm import Session
+from infrastructure.models.ai_model_model import AIModelModel
+from infrastructure.repositories.analysis_result_cache_repository import AnalysisResultCacheRepository
+
+
+class AIModelRepository:
+    """Repository for AI models"""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def deployed_version(self) -> Optional[str]:
+        """Version of the deployed model (latest if several are flagged), None if none"""
+        model = self.session.query(AIModelModel.version).filter(
+            AIModelModel.deployed.is_(True)
+        ).order_by(AIModelModel.id.desc()).first()
+        return model.version if model else None
+
+    def deploy(self, version: str, ip_address: Optional[str] = None) -> AIModelModel:
+        """
+        Make ``version`` the only deployed model
+
+        Cached analysis results of other versions are purged in the same
+        transaction, so re-screenings are analysed again by the new model.
+        """
+        self.session.query(AIModelModel).filter(
+            AIModelModel.deployed.is_(True), AIModelModel.version != version
+        ).update({"deployed": False}, synchronize_session=False)
+        model = self.session.query(AIModelModel).filter(AIModelModel.version == version).first()
+        if model is None:
+            model = AIModelModel(version=version, ip_address=ip_address)
+            self.session.add(model)
+        model.deployed = True
+        AnalysisResultCacheRepository(self.session).purge_other_versions(version, commit=False)
+        self.session.commit()
+        return model
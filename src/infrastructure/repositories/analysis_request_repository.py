@@ -0,0 +1,247 @@
+"""
+AnalysisRequest Repository
+Handles database operations for analysis requests and their job queue
+"""
+
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+from infrastructure.models.analysis_request_model import AnalysisRequestModel
+
+QUEUED = "queued"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+QUARANTINED = "quarantined"
+STATUSES = (QUEUED, PROCESSING, DONE, FAILED, QUARANTINED)
+
+
+class AnalysisRequestRepository:
+    """Repository for analysis requests (the analysis job queue)"""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def enqueue(self, patient_id: Optional[int] = None, clinic_id: Optional[int] = None,
+                model_version: Optional[str] = None, profile_id: Optional[int] = None,
+                queue_id: Optional[str] = None, commit: bool = True) -> int:
+        """
+        Queue an analysis request for the workers
+
+        Args:
+            commit: False to leave the commit to the caller (e.g. together
+                with the retinal_images rows)
+
+        Returns:
+            int: Analysis request id
+        """
+        request = AnalysisRequestModel(
+            patient_id=patient_id,
+            clinic_id=clinic_id,
+            model_version=model_version,
+            profile_id=profile_id,
+            queue_id=queue_id,
+            status=QUEUED,
+            attempts=0,
+            next_attempt_at=datetime.utcnow()
+        )
+        self.session.add(request)
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
+        return request.id
+
+    def _claimable(self, now: datetime, max_attempts: int):
+        # Đến hạn chạy, hoặc worker trước đó giữ quá lease (process bị kill) và còn lượt thử
+        return or_(
+            and_(
+                AnalysisRequestModel.status == QUEUED,
+                or_(AnalysisRequestModel.next_attempt_at.is_(None), AnalysisRequestModel.next_attempt_at <= now)
+            ),
+            and_(
+                AnalysisRequestModel.status == PROCESSING,
+                AnalysisRequestModel.locked_until < now,
+                AnalysisRequestModel.attempts < max_attempts
+            )
+        )
+
+    def quarantine_expired(self, max_attempts: int, now: Optional[datetime] = None) -> int:
+        """
+        Quarantine jobs whose lease expired on their last attempt
+
+        A job that keeps killing its worker never reaches retry() or fail();
+        it only shows up as an expired lease. After max_attempts claims it is
+        a poison job and is not handed out again.
+
+        Returns:
+            int: Number of jobs quarantined
+        """
+        now = now or datetime.utcnow()
+        quarantined = self.session.query(AnalysisRequestModel).filter(
+            AnalysisRequestModel.status == PROCESSING,
+            AnalysisRequestModel.locked_until < now,
+            AnalysisRequestModel.attempts >= max_attempts
+        ).update({
+            "status": QUARANTINED,
+            "locked_by": None,
+            "locked_until": None,
+            "lease_token": None,
+            "last_error": "Lease expired on the last attempt (worker crashed or hung)"
+        }, synchronize_session=False)
+        self.session.commit()
+        return quarantined
+
+    def claim_batch(self, worker_id: str, limit: int, lease_seconds: int, max_attempts: int) -> List[dict]:
+        """
+        Claim up to ``limit`` due jobs for this worker
+
+        The whole batch is claimed by one ``UPDATE ... WHERE id IN (SELECT ...
+        LIMIT n FOR UPDATE SKIP LOCKED)``: on PostgreSQL concurrent workers
+        skip each other's rows instead of waiting; SQL Server gets the same
+        behaviour from the ``UPDLOCK, READPAST, ROWLOCK`` table hint; on SQLite
+        (no row locks, FOR UPDATE is not rendered) the statement runs under the
+        database write lock, so claims are serialized. Every claimed row gets the same
+        new lease token, which the worker needs for heartbeat() and for
+        reporting the outcome. The claim counts as one attempt.
+
+        Returns:
+            list: Claimed jobs as dicts (with ``lease_token``)
+        """
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+        candidates = (
+            select(AnalysisRequestModel.id)
+            .where(self._claimable(now, max_attempts))
+            .order_by(AnalysisRequestModel.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            # SQL Server không render FOR UPDATE: READPAST bỏ qua row đang bị worker khác khóa
+            .with_hint(AnalysisRequestModel, "WITH (UPDLOCK, READPAST, ROWLOCK)", "mssql")
+        )
+        self.session.execute(
+            update(AnalysisRequestModel)
+            .where(AnalysisRequestModel.id.in_(candidates), self._claimable(now, max_attempts))
+            .values(
+                status=PROCESSING,
+                locked_by=worker_id,
+                locked_until=now + timedelta(seconds=lease_seconds),
+                lease_token=token,
+                started_at=now,
+                attempts=AnalysisRequestModel.attempts + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+        self.session.commit()
+
+        jobs = self.session.query(AnalysisRequestModel).filter(
+            AnalysisRequestModel.lease_token == token
+        ).order_by(AnalysisRequestModel.id).all()
+        return [self._to_dict(job) for job in jobs]
+
+    def heartbeat(self, lease_token: str, lease_seconds: int) -> int:
+        """
+        Extend the lease of every job still held with this token
+
+        Returns:
+            int: Number of jobs renewed (fewer than claimed = lease lost)
+        """
+        renewed = self.session.query(AnalysisRequestModel).filter(
+            AnalysisRequestModel.lease_token == lease_token,
+            AnalysisRequestModel.status == PROCESSING
+        ).update({
+            "locked_until": datetime.utcnow() + timedelta(seconds=lease_seconds)
+        }, synchronize_session=False)
+        self.session.commit()
+        return renewed
+
+    def complete(self, job_ids: Iterable[int], lease_token: str, commit: bool = True) -> int:
+        """
+        Mark jobs done
+
+        Args:
+            commit: False to commit together with the caller's writes
+                (e.g. the analysis_results rows)
+
+        Returns:
+            int: Number of jobs marked done (jobs whose lease was lost are skipped)
+        """
+        return self._finish(job_ids, lease_token, {
+            "status": DONE, "completed_at": datetime.utcnow(), "last_error": None
+        }, commit)
+
+    def complete_from_cache(self, job_id: int, model_version: str, commit: bool = True) -> bool:
+        """Mark a queued job done without running it (result reused from the result cache)"""
+        updated = self.session.query(AnalysisRequestModel).filter(
+            AnalysisRequestModel.id == job_id, AnalysisRequestModel.status == QUEUED
+        ).update({
+            "status": DONE, "completed_at": datetime.utcnow(), "model_version": model_version, "next_attempt_at": None
+        }, synchronize_session=False)
+        if commit:
+            self.session.commit()
+        return updated == 1
+
+    def retry(self, job_id: int, lease_token: str, error: str, next_attempt_at: datetime) -> bool:
+        """Put a failed job back in the queue for a later attempt"""
+        return self._finish([job_id], lease_token, {
+            "status": QUEUED, "next_attempt_at": next_attempt_at, "last_error": error
+        }) == 1
+
+    def fail(self, job_id: int, lease_token: str, error: str, quarantine: bool = False) -> bool:
+        """Give up on a job: failed (permanent error) or quarantined (poison job)"""
+        return self._finish([job_id], lease_token, {
+            "status": QUARANTINED if quarantine else FAILED, "completed_at": datetime.utcnow(), "last_error": error
+        }) == 1
+
+    def requeue(self, status: str = QUARANTINED, job_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Move quarantined (or failed) jobs back to the queue (after fixing the cause)
+
+        Returns:
+            int: Number of jobs requeued
+        """
+        query = self.session.query(AnalysisRequestModel).filter(AnalysisRequestModel.status == status)
+        if job_ids is not None:
+            query = query.filter(AnalysisRequestModel.id.in_(list(job_ids)))
+        requeued = query.update({
+            "status": QUEUED, "attempts": 0, "next_attempt_at": datetime.utcnow(), "completed_at": None
+        }, synchronize_session=False)
+        self.session.commit()
+        return requeued
+
+    def count_by_status(self) -> Dict[str, int]:
+        """Number of analysis requests per status"""
+        rows = self.session.query(AnalysisRequestModel.status, func.count(AnalysisRequestModel.id)).group_by(
+            AnalysisRequestModel.status
+        ).all()
+        return {status: count for status, count in rows}
+
+    def _finish(self, job_ids: Iterable[int], lease_token: str, values: dict, commit: bool = True) -> int:
+        # Chỉ worker còn giữ lease (đúng token) mới được ghi trạng thái cuối
+        job_ids = list(job_ids)
+        if not job_ids:
+            return 0
+        values.update({"locked_by": None, "locked_until": None, "lease_token": None})
+        updated = self.session.query(AnalysisRequestModel).filter(
+            AnalysisRequestModel.id.in_(job_ids),
+            AnalysisRequestModel.lease_token == lease_token,
+            AnalysisRequestModel.status == PROCESSING
+        ).update(values, synchronize_session=False)
+        if commit:
+            self.session.commit()
+        return updated
+
+    @staticmethod
+    def _to_dict(job: AnalysisRequestModel) -> dict:
+        return {
+            "id": job.id,
+            "queue_id": job.queue_id,
+            "model_version": job.model_version,
+            "profile_id": job.profile_id,
+            "patient_id": job.patient_id,
+            "clinic_id": job.clinic_id,
+            "attempts": job.attempts,
+            "lease_token": job.lease_token
+        }
@@ -0,0 +1,100 @@
+"""
+AnalysisResultCache Repository
+Handles database operations for the durable tier of the result cache
+"""
+
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from infrastructure.models.analysis_result_cache_model import AnalysisResultCacheModel
+from infrastructure.models.analysis_result_model import AnalysisResultModel
+from infrastructure.models.image_annotation_model import ImageAnnotationModel
+
+
+class AnalysisResultCacheRepository:
+    """Repository for cached analysis results"""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def get(self, cache_key: str) -> Optional[dict]:
+        """
+        Cached result for a key
+
+        Returns:
+            dict: result_id, risk_level, predicted_labels_json, model_version
+            and annotations [(annotation_type, annotation_url)], or None
+        """
+        row = self.session.query(
+            AnalysisResultModel.id, AnalysisResultModel.risk_level,
+            AnalysisResultModel.predicted_labels_json, AnalysisResultCacheModel.model_version
+        ).join(
+            AnalysisResultModel, AnalysisResultModel.id == AnalysisResultCacheModel.result_id
+        ).filter(AnalysisResultCacheModel.cache_key == cache_key).first()
+        if row is None:
+            return None
+        annotations = self.session.query(
+            ImageAnnotationModel.annotation_type, ImageAnnotationModel.annotation_url
+        ).filter(ImageAnnotationModel.result_id == row.id).order_by(ImageAnnotationModel.id).all()
+        return {
+            "result_id": row.id,
+            "risk_level": row.risk_level,
+            "predicted_labels_json": row.predicted_labels_json,
+            "model_version": row.model_version,
+            "annotations": [(a.annotation_type, a.annotation_url) for a in annotations],
+        }
+
+    def put_many(self, entries: Iterable[Tuple[str, int, str]]) -> int:
+        """
+        Add (cache_key, result_id, model_version) entries without committing
+
+        Keys already present (e.g. written by another worker) keep their
+        first result.
+
+        Returns:
+            int: Number of entries added
+        """
+        unique = {}
+        for key, result_id, version in entries:
+            unique.setdefault(key, (key, result_id, version))
+        entries = list(unique.values())
+        if not entries:
+            return 0
+        existing = set(self.session.scalars(
+            select(AnalysisResultCacheModel.cache_key).where(
+                AnalysisResultCacheModel.cache_key.in_([key for key, _, _ in entries])
+            )
+        ))
+        now = datetime.utcnow()
+        rows = [
+            {"cache_key": key, "result_id": result_id, "model_version": version, "created_at": now}
+            for key, result_id, version in entries if key not in existing
+        ]
+        if not rows:
+            return 0
+        statement = insert(AnalysisResultCacheModel)
+        dialect = self.session.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            # Hai worker cùng ghi một key giữa SELECT và INSERT: giữ row đầu tiên
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            statement = dialect_insert(AnalysisResultCacheModel).on_conflict_do_nothing(index_elements=["cache_key"])
+        self.session.execute(statement, rows)
+        return len(rows)
+
+    def purge_other_versions(self, model_version: str, commit: bool = True) -> int:
+        """Remove entries of every model version except ``model_version``"""
+        deleted = self.session.query(AnalysisResultCacheModel).filter(
+            AnalysisResultCacheModel.model_version != model_version
+        ).delete(synchronize_session=False)
+        if commit:
+            self.session.commit()
+        return deleted
+
+    def count_by_version(self) -> List[Tuple[str, int]]:
+        return self.session.query(
+            AnalysisResultCacheModel.model_version, func.count(AnalysisResultCacheModel.cache_key)
+        ).group_by(AnalysisResultCacheModel.model_version).all()
@@ -0,0 +1,173 @@
+"""
+EmailOutbox Repository
+Handles database operations for queued outgoing emails
+"""
+
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+from infrastructure.models.email_outbox_model import EmailOutboxModel
+
+
+class EmailOutboxRepository:
+    """Repository for the email outbox"""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def enqueue(self, recipient: str, subject: str, text_body: str, html_body: Optional[str] = None) -> str:
+        """
+        Queue an email for the background sender
+
+        Returns:
+            str: Outbox message id
+        """
+        message = EmailOutboxModel(
+            recipient=recipient,
+            subject=subject,
+            text_body=text_body,
+            html_body=html_body
+        )
+        self.session.add(message)
+        self.session.commit()
+        return message.id
+
+    def _claimable(self, now: datetime, max_attempts: int):
+        # Đến hạn gửi, hoặc sender trước đó đã giữ quá lease (ví dụ process bị kill) và còn lượt thử
+        return or_(
+            and_(EmailOutboxModel.status == "pending", EmailOutboxModel.next_attempt_at <= now),
+            and_(
+                EmailOutboxModel.status == "sending",
+                EmailOutboxModel.locked_until < now,
+                EmailOutboxModel.attempts < max_attempts
+            )
+        )
+
+    def dead_letter_expired(self, max_attempts: int, now: Optional[datetime] = None) -> int:
+        """
+        Dead-letter messages whose lease expired on their last attempt
+
+        A message that keeps killing its sender never reaches mark_retry() or
+        mark_dead(); it only shows up as an expired lease. After max_attempts
+        claims it is not handed out again.
+
+        Returns:
+            int: Number of messages moved to dead letter
+        """
+        now = now or datetime.utcnow()
+        dead = self.session.query(EmailOutboxModel).filter(
+            EmailOutboxModel.status == "sending",
+            EmailOutboxModel.locked_until < now,
+            EmailOutboxModel.attempts >= max_attempts
+        ).update({
+            "status": "dead",
+            "locked_until": None,
+            "lease_token": None,
+            "last_error": "Lease expired on the last attempt (sender crashed or hung)"
+        }, synchronize_session=False)
+        self.session.commit()
+        return dead
+
+    def claim_due(self, limit: int, lease_seconds: int, max_attempts: int) -> List[dict]:
+        """
+        Claim up to ``limit`` due messages for this sender
+
+        Each message is claimed with a conditional UPDATE, so two senders
+        (e.g. two gunicorn workers) never send the same message. Every claimed
+        message gets the same new lease token, which the sender needs for
+        reporting the outcome. The claim counts as one attempt.
+
+        Returns:
+            list: Claimed messages as dicts (with ``lease_token``)
+        """
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+        candidate_ids = [row.id for row in self.session.query(EmailOutboxModel.id).filter(
+            self._claimable(now, max_attempts)
+        ).order_by(EmailOutboxModel.next_attempt_at).limit(limit)]
+
+        claimed = []
+        for message_id in candidate_ids:
+            updated = self.session.query(EmailOutboxModel).filter(
+                EmailOutboxModel.id == message_id,
+                self._claimable(now, max_attempts)
+            ).update({
+                "status": "sending",
+                "locked_until": now + timedelta(seconds=lease_seconds),
+                "lease_token": token,
+                "attempts": EmailOutboxModel.attempts + 1
+            }, synchronize_session=False)
+            if updated == 1:
+                claimed.append(message_id)
+        self.session.commit()
+
+        if not claimed:
+            return []
+        messages = self.session.query(EmailOutboxModel).filter(EmailOutboxModel.id.in_(claimed)).all()
+        return [self._to_dict(message) for message in messages]
+
+    def mark_sent(self, message_id: str, lease_token: str) -> bool:
+        """Record a successful delivery"""
+        return self._finish(message_id, lease_token, {"status": "sent", "sent_at": datetime.utcnow(), "last_error": None})
+
+    def mark_retry(self, message_id: str, lease_token: str, error: str, next_attempt_at: datetime) -> bool:
+        """Put a failed message back in the queue for a later attempt"""
+        return self._finish(message_id, lease_token, {"status": "pending", "next_attempt_at": next_attempt_at, "last_error": error})
+
+    def mark_dead(self, message_id: str, lease_token: str, error: str) -> bool:
+        """Give up on a message (dead letter)"""
+        return self._finish(message_id, lease_token, {"status": "dead", "last_error": error})
+
+    def requeue_dead(self) -> int:
+        """
+        Move every dead message back to pending (after fixing the cause)
+
+        Returns:
+            int: Number of messages requeued
+        """
+        requeued = self.session.query(EmailOutboxModel).filter(
+            EmailOutboxModel.status == "dead"
+        ).update({"status": "pending", "attempts": 0, "next_attempt_at": datetime.utcnow()}, synchronize_session=False)
+        self.session.commit()
+        return requeued
+
+    def count_by_status(self) -> Dict[str, int]:
+        """Number of messages per status"""
+        rows = self.session.query(EmailOutboxModel.status, func.count(EmailOutboxModel.id)).group_by(
+            EmailOutboxModel.status
+        ).all()
+        return {status: count for status, count in rows}
+
+    def cleanup_sent(self, older_than: datetime) -> int:
+        """Delete sent messages older than a given time"""
+        deleted = self.session.query(EmailOutboxModel).filter(
+            EmailOutboxModel.status == "sent",
+            EmailOutboxModel.sent_at < older_than
+        ).delete(synchronize_session=False)
+        self.session.commit()
+        return deleted
+
+    def _finish(self, message_id: str, lease_token: str, values: dict) -> bool:
+        # Chỉ sender còn giữ lease (đúng token) mới được ghi kết quả
+        values.update({"locked_until": None, "lease_token": None})
+        updated = self.session.query(EmailOutboxModel).filter(
+            EmailOutboxModel.id == message_id,
+            EmailOutboxModel.lease_token == lease_token,
+            EmailOutboxModel.status == "sending"
+        ).update(values, synchronize_session=False)
+        self.session.commit()
+        return updated == 1
+
+    @staticmethod
+    def _to_dict(message: EmailOutboxModel) -> dict:
+        return {
+            "id": message.id,
+            "recipient": message.recipient,
+            "subject": message.subject,
+            "text_body": message.text_body,
+            "html_body": message.html_body,
+            "attempts": message.attempts,
+            "lease_token": message.lease_token
+        }
@@ -0,0 +1,108 @@
+"""
+RefreshToken Repository
+Handles database operations for refresh token families
+"""
+
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.orm import Session
+from infrastructure.models.refresh_token_model import RefreshTokenModel
+
+
+class RefreshTokenRepository:
+    """Repository for refresh tokens"""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def create(self, jti: str, family_id: str, user_id: str, expires_at: datetime,
+               commit: bool = True) -> RefreshTokenModel:
+        """
+        Store a newly issued refresh token
+
+        Args:
+            jti: Token id
+            family_id: Login session the token belongs to
+            user_id: Owner
+            expires_at: Expiry time (UTC)
+            commit: False to leave the commit to the caller
+        """
+        token = RefreshTokenModel(
+            jti=jti,
+            family_id=family_id,
+            user_id=user_id,
+            expires_at=expires_at
+        )
+        self.session.add(token)
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
+        return token
+
+    def consume(self, jti: str, commit: bool = True) -> bool:
+        """
+        Mark a token as used, only if it is still usable
+
+        This is a single conditional UPDATE, so two concurrent refreshes with
+        the same token cannot both succeed.
+
+        Args:
+            jti: Token id
+            commit: False to keep the row locked in the caller's transaction
+                (e.g. until the rotated token is stored)
+
+        Returns:
+            bool: True if this call consumed the token
+        """
+        now = datetime.utcnow()
+        updated = self.session.query(RefreshTokenModel).filter(
+            RefreshTokenModel.jti == jti,
+            RefreshTokenModel.used_at.is_(None),
+            RefreshTokenModel.revoked_at.is_(None),
+            RefreshTokenModel.expires_at > now
+        ).update({"used_at": now}, synchronize_session=False)
+        if commit:
+            self.session.commit()
+        return updated == 1
+
+    def get_by_jti(self, jti: str) -> Optional[RefreshTokenModel]:
+        """Get a token record by id"""
+        return self.session.query(RefreshTokenModel).filter_by(jti=jti).first()
+
+    def revoke_family(self, family_id: str) -> int:
+        """
+        Revoke every token of a family
+
+        Returns:
+            int: Number of tokens revoked
+        """
+        revoked = self.session.query(RefreshTokenModel).filter(
+            RefreshTokenModel.family_id == family_id,
+            RefreshTokenModel.revoked_at.is_(None)
+        ).update({"revoked_at": datetime.utcnow()}, synchronize_session=False)
+        self.session.commit()
+        return revoked
+
+    def revoke_user(self, user_id: str) -> int:
+        """
+        Revoke every token of a user (logout from all devices)
+
+        Returns:
+            int: Number of tokens revoked
+        """
+        revoked = self.session.query(RefreshTokenModel).filter(
+            RefreshTokenModel.user_id == user_id,
+            RefreshTokenModel.revoked_at.is_(None)
+        ).update({"revoked_at": datetime.utcnow()}, synchronize_session=False)
+        self.session.commit()
+        return revoked
+
+    def cleanup_expired_tokens(self):
+        """
+        Clean up expired tokens from database
+        """
+        self.session.query(RefreshTokenModel).filter(
+            RefreshTokenModel.expires_at < datetime.utcnow()
+        ).delete()
+        self.session.commit()
@@ -0,0 +1,70 @@
+"""
+RetinalImage Repository
+Handles database operations for retinal images and their checksum index
+"""
+
+from datetime import datetime
+from typing import Iterable, List, Optional
+from sqlalchemy.orm import Session
+from infrastructure.models.retinal_image_model import RetinalImageModel
+
+
+class RetinalImageRepository:
+    """Repository for retinal images"""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def create(self, image_type: str, storage_url: str, checksum: Optional[str] = None,
+               request_id: Optional[int] = None, metadata_json: Optional[str] = None,
+               commit: bool = True) -> RetinalImageModel:
+        """
+        Record an uploaded image
+
+        Args:
+            commit: False to leave the commit to the caller (e.g. together
+                with the analysis request)
+        """
+        image = RetinalImageModel(
+            image_type=image_type,
+            storage_url=storage_url,
+            checksum=checksum,
+            request_id=request_id,
+            metadata_json=metadata_json,
+        )
+        self.session.add(image)
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
+        return image
+
+    def find_by_id(self, image_id: int) -> Optional[RetinalImageModel]:
+        return self.session.get(RetinalImageModel, image_id)
+
+    def find_by_checksum(self, checksum: str) -> Optional[RetinalImageModel]:
+        """Earliest image with this content (uses the checksum index)"""
+        return self.session.query(RetinalImageModel).filter(
+            RetinalImageModel.checksum == checksum
+        ).order_by(RetinalImageModel.id).first()
+
+    def find_by_checksums(self, checksums: Iterable[str]) -> List[RetinalImageModel]:
+        checksums = list(set(checksums))
+        if not checksums:
+            return []
+        return self.session.query(RetinalImageModel).filter(
+            RetinalImageModel.checksum.in_(checksums)
+        ).order_by(RetinalImageModel.id).all()
+
+    def mark_checked(self, image_ids: Iterable[int]) -> int:
+        """Set checked_at (analysed) without committing"""
+        image_ids = list(image_ids)
+        if not image_ids:
+            return 0
+        return self.session.query(RetinalImageModel).filter(RetinalImageModel.id.in_(image_ids)).update(
+            {"checked_at": datetime.utcnow()}, synchronize_session=False
+        )
+
+    def count_by_checksum(self, checksum: str) -> int:
+        """Number of image rows sharing one stored blob"""
+        return self.session.query(RetinalImageModel).filter(RetinalImageModel.checksum == checksum).count()
@@ -1,8 +1,12 @@
-from typing import Optional
+from typing import Optional, Dict
+from sqlalchemy import func
 from infrastructure.models.user_model import UserModel
 from infrastructure.databases.mssql import SessionFactory
 from uuid import uuid4
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 class UserRepository:
     """Repository để quản lý User trong database"""
@@ -13,9 +17,7 @@ class UserRepository:
     def find_by_email(self, email: str) -> Optional[dict]:
         """Tìm user theo email"""
         try:
-            print(f"[REPO] find_by_email called for: {email}")
-            print(f"[REPO] Session object: {self.session}")
-            print(f"[REPO] Session bind: {self.session.get_bind()}")
+            logger.debug("[REPO] find_by_email called for: %s", email)
             user = self.session.query(UserModel).filter(UserModel.email == email).first()
             if user:
                 return {
@@ -29,10 +31,8 @@ class UserRepository:
                     "email_verified_at": user.email_verified_at
                 }
             return None
-        except Exception as e:
-            import traceback
-            print(f"[REPO] Error in find_by_email: {e}")
-            print(f"[REPO] Traceback: {traceback.format_exc()}")
+        except Exception:
+            logger.exception("[REPO] Error in find_by_email")
             raise
     
     def find_by_id(self, user_id: str) -> Optional[dict]:
@@ -52,7 +52,7 @@ class UserRepository:
     
     def create(self, email: str, password_hash: str, full_name: str = None) -> dict:
         """Tạo user mới"""
-        print(f"[SYSTEM LOG] Processing registration for email: {email}")
+        logger.debug("[REPO] Processing registration for email: %s", email)
         user = UserModel(
             id=str(uuid4()),
             email=email,
@@ -86,4 +86,14 @@ class UserRepository:
             user.password_hash = password_hash
             self.session.commit()
             return True
-        return False
\ No newline at end of file
+        return False
+    
+    def count_password_hash_costs(self) -> Dict[Optional[int], int]:
+        """Đếm số user theo bcrypt cost factor của password_hash ("$2b$12$..." -> 12)"""
+        cost = func.substr(UserModel.password_hash, 5, 2)
+        rows = self.session.query(cost, func.count()).group_by(cost).all()
+        distribution = {}
+        for value, count in rows:
+            key = int(value) if value and value.isdigit() else None
+            distribution[key] = distribution.get(key, 0) + count
+        return distribution
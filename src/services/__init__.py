@@ -1,3 +1,9 @@
-from .email_service import email_service
-
 __all__ = ['email_service']
+
+
+def __getattr__(name):
+    # email_service (SMTP) is imported on first use, not by every `services.*` import
+    if name == 'email_service':
+        from .email_service import email_service
+        return email_service
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
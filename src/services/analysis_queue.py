@@ -0,0 +1,296 @@
+"""
+Analysis job queue for AURA System
+Queued analysis_requests rows are the jobs. Workers claim them in batches
+with a lease (locked_until), renew the lease with a heartbeat while the
+batch runs, and record done / retry with backoff / failed / quarantined.
+A job whose lease expires (worker killed) is claimed again by another
+worker; after ANALYSIS_QUEUE_MAX_ATTEMPTS claims it is quarantined as a
+poison job.
+
+Workers run as dedicated processes, any number of them in parallel:
+    python -m services.analysis_queue --processes 4 --threads 2
+    python -m services.analysis_queue --handler package.module:function
+    python -m services.analysis_queue --once     # xử lý một batch rồi thoát
+"""
+
+import importlib
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from infrastructure.repositories.analysis_request_repository import AnalysisRequestRepository
+
+logger = logging.getLogger(__name__)
+
+# handler(session, jobs) -> một lỗi (hoặc None) cho mỗi job, cùng thứ tự
+JobHandler = Callable[[object, List[dict]], List[Optional[Exception]]]
+
+
+class PermanentJobError(Exception):
+    """Raised/returned by a handler when retrying the job cannot help (bad input)"""
+
+
+def load_handler(path: str) -> JobHandler:
+    """Import a handler from ``"package.module:function"``"""
+    module_name, _, attr = path.partition(":")
+    if not module_name or not attr:
+        raise ValueError(f"Handler must look like 'package.module:function', got {path!r}")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+class _Heartbeat:
+    """Renews the lease of a claimed batch from a side thread while it runs"""
+
+    def __init__(self, session_factory, lease_token: str, lease_seconds: int, interval: float, expected: int):
+        self.session_factory = session_factory
+        self.lease_token = lease_token
+        self.lease_seconds = lease_seconds
+        self.interval = interval
+        self.expected = expected
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="analysis-heartbeat", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            session = self.session_factory()
+            try:
+                renewed = AnalysisRequestRepository(session).heartbeat(self.lease_token, self.lease_seconds)
+                if renewed < self.expected:
+                    logger.warning(f"Lease {self.lease_token}: only {renewed}/{self.expected} jobs renewed")
+            except Exception as e:
+                logger.error(f"Heartbeat for lease {self.lease_token} failed: {e}")
+            finally:
+                session.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class AnalysisWorker:
+    """Claims and processes analysis jobs"""
+
+    def __init__(self, session_factory, handler: JobHandler, worker_id: Optional[str] = None,
+                 batch_size: int = 10, lease_seconds: int = 300, heartbeat_interval: Optional[float] = None,
+                 max_attempts: int = 5, backoff_base: float = 30, backoff_max: float = 1800,
+                 poll_interval: float = 2):
+        self.session_factory = session_factory
+        self.handler = handler
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        # Mặc định gia hạn 3 lần trong một lease: một heartbeat lỡ nhịp không làm mất job
+        self.heartbeat_interval = heartbeat_interval or lease_seconds / 3
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def backoff(self, attempts: int) -> float:
+        """Delay before the next attempt, in seconds (exponential, capped, 10% jitter)"""
+        delay = min(self.backoff_base * (2 ** max(attempts - 1, 0)), self.backoff_max)
+        return delay + random.uniform(0, delay * 0.1)
+
+    def process_once(self) -> dict:
+        """
+        Claim and process one batch
+
+        The handler writes its results into the session without committing;
+        they are committed together with the jobs' done status, so a job is
+        either done with its results or not done at all. If the lease of a
+        job was lost meanwhile (another worker reclaimed it), nothing of the
+        batch is committed and the jobs are processed again.
+
+        Returns:
+            dict: {"claimed", "done", "retried", "failed", "quarantined", "lost"} counts
+        """
+        result = {"claimed": 0, "done": 0, "retried": 0, "failed": 0, "quarantined": 0, "lost": 0}
+        session = self.session_factory()
+        try:
+            repo = AnalysisRequestRepository(session)
+            result["quarantined"] += repo.quarantine_expired(self.max_attempts)
+            jobs = repo.claim_batch(self.worker_id, self.batch_size, self.lease_seconds, self.max_attempts)
+            if not jobs:
+                return result
+            result["claimed"] = len(jobs)
+            token = jobs[0]["lease_token"]
+
+            with _Heartbeat(self.session_factory, token, self.lease_seconds, self.heartbeat_interval, len(jobs)):
+                try:
+                    errors = list(self.handler(session, jobs))
+                    if len(errors) != len(jobs):
+                        raise RuntimeError(f"Handler returned {len(errors)} results for {len(jobs)} jobs")
+                except Exception as e:
+                    logger.exception(f"Handler failed for batch {token}")
+                    session.rollback()
+                    errors = [e] * len(jobs)
+
+            done_ids = [job["id"] for job, e in zip(jobs, errors) if e is None]
+            if done_ids:
+                completed = repo.complete(done_ids, token, commit=False)
+                if completed == len(done_ids):
+                    session.commit()
+                    result["done"] = completed
+                else:
+                    session.rollback()
+                    result["lost"] = len(done_ids)
+                    logger.warning(f"Lease {token} lost for {len(done_ids) - completed} jobs; results discarded")
+
+            for job, e in zip(jobs, errors):
+                if e is None:
+                    continue
+                error = f"{type(e).__name__}: {e}"
+                if isinstance(e, PermanentJobError):
+                    logger.error(f"Analysis request {job['id']} failed: {error}")
+                    repo.fail(job["id"], token, error)
+                    result["failed"] += 1
+                elif job["attempts"] >= self.max_attempts:
+                    logger.error(f"Analysis request {job['id']} quarantined after {job['attempts']} attempts: {error}")
+                    repo.fail(job["id"], token, error, quarantine=True)
+                    result["quarantined"] += 1
+                else:
+                    retry_at = datetime.utcnow() + timedelta(seconds=self.backoff(job["attempts"]))
+                    logger.warning(f"Analysis request {job['id']} attempt {job['attempts']} failed, retry at {retry_at}: {error}")
+                    repo.retry(job["id"], token, error, retry_at)
+                    result["retried"] += 1
+        finally:
+            session.close()
+        return result
+
+    def run(self):
+        """Worker loop: process batches back to back, sleep poll_interval when the queue is empty"""
+        logger.info(f"Analysis worker {self.worker_id} started")
+        while not self._stop.is_set():
+            try:
+                result = self.process_once()
+            except Exception as e:
+                # Ví dụ SQLite "database is locked" khi nhiều process cùng claim: thử lại ở vòng sau
+                logger.error(f"Analysis worker error: {e}")
+                result = None
+            if result and result["claimed"] >= self.batch_size:
+                continue
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """Start the worker thread (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="analysis-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30):
+        """Stop after the current batch"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def worker_from_config(handler: JobHandler, session_factory=None) -> AnalysisWorker:
+    """AnalysisWorker with the ANALYSIS_QUEUE_* settings of Config"""
+    from config import Config
+
+    if session_factory is None:
+        from infrastructure.databases.mssql import SessionFactory
+        session_factory = SessionFactory
+    return AnalysisWorker(
+        session_factory,
+        handler,
+        batch_size=Config.ANALYSIS_QUEUE_BATCH_SIZE,
+        lease_seconds=Config.ANALYSIS_QUEUE_LEASE_SECONDS,
+        heartbeat_interval=Config.ANALYSIS_QUEUE_HEARTBEAT_INTERVAL or None,
+        max_attempts=Config.ANALYSIS_QUEUE_MAX_ATTEMPTS,
+        backoff_base=Config.ANALYSIS_QUEUE_BACKOFF_BASE,
+        backoff_max=Config.ANALYSIS_QUEUE_BACKOFF_MAX,
+        poll_interval=Config.ANALYSIS_QUEUE_POLL_INTERVAL,
+    )
+
+
+def prepare_handler(path: str) -> JobHandler:
+    """
+    Import a handler and run its module's ``warm_up()`` if it has one
+
+    Configuration errors (missing model, missing packages) then surface when
+    the worker starts instead of as failures of the first claimed jobs.
+    """
+    handler = load_handler(path)
+    warm_up = getattr(importlib.import_module(path.partition(":")[0]), "warm_up", None)
+    if callable(warm_up):
+        warm_up()
+    return handler
+
+
+def _run_worker_process(handler_path: str, once: bool, threads: int = 1):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(processName)s - %(levelname)s - %(message)s")
+    try:
+        handler = prepare_handler(handler_path)
+    except Exception as e:
+        # Chưa claim job nào: lỗi cấu hình không bị tính là job thất bại (retry rồi quarantine)
+        logger.error(f"Analysis worker cannot start ({handler_path}): {e}")
+        sys.exit(1)
+    if once:
+        logger.info(worker_from_config(handler).process_once())
+        return
+    # Nhiều thread claim song song trong một process: handler (vd. micro-batcher của model) dùng chung
+    workers = [worker_from_config(handler) for _ in range(max(threads, 1))]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            while worker._thread is not None and worker._thread.is_alive():
+                worker._thread.join(1)
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+    import multiprocessing
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="AURA analysis queue worker")
+    parser.add_argument("--handler", default=Config.ANALYSIS_JOB_HANDLER,
+                        help="Job handler 'package.module:function' (ANALYSIS_JOB_HANDLER)")
+    parser.add_argument("--processes", type=int, default=Config.ANALYSIS_WORKER_PROCESSES,
+                        help="Worker processes (each claims its own batches)")
+    parser.add_argument("--threads", type=int, default=Config.ANALYSIS_WORKER_THREADS,
+                        help="Claiming threads per process (sharing the handler)")
+    parser.add_argument("--once", action="store_true", help="process one batch and exit")
+    args = parser.parse_args()
+    if not args.handler:
+        parser.error("no job handler: pass --handler or set ANALYSIS_JOB_HANDLER")
+
+    if args.processes <= 1 or args.once:
+        _run_worker_process(args.handler, args.once, args.threads)
+    else:
+        # spawn: mỗi worker tạo engine/pool của riêng nó, không dùng chung connection qua fork
+        context = multiprocessing.get_context("spawn")
+        processes = [
+            context.Process(target=_run_worker_process, args=(args.handler, False, args.threads), name=f"analysis-worker-{i}")
+            for i in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
+        if any(process.exitcode for process in processes):
+            sys.exit(1)
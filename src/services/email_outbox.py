@@ -0,0 +1,246 @@
+"""
+Email Outbox for AURA System
+Routes queue emails in the email_outbox table and return immediately; a
+background sender drains the queue with retries, exponential backoff and a
+dead-letter state, so a slow SMTP relay never blocks a web worker.
+
+The sender runs as a thread in each web process (EMAIL_OUTBOX_WORKER) or as
+a dedicated process:
+    python -m services.email_outbox            # chạy liên tục
+    python -m services.email_outbox --once     # gửi một lượt rồi thoát
+"""
+
+import logging
+import random
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import after_this_request, current_app, has_request_context
+
+from infrastructure.repositories.email_outbox_repository import EmailOutboxRepository
+from services.request_profiler import span
+
+logger = logging.getLogger(__name__)
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """
+    True if retrying cannot help (5xx reply or every recipient refused)
+
+    Authentication errors are treated as temporary: they come from our own
+    configuration and the message should go out once it is fixed.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+class EmailOutbox:
+    """Queues emails and runs the background sender"""
+
+    def __init__(self, session_factory, email_service=None, batch_size: int = 20, max_attempts: int = 6,
+                 backoff_base: float = 30, backoff_max: float = 3600, lease_seconds: int = 120,
+                 poll_interval: float = 5, drain_after_request: bool = False):
+        self.session_factory = session_factory
+        self._email_service = email_service
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        # Không có sender nền: gửi sau khi response đã trả về (xem enqueue)
+        self.drain_after_request = drain_after_request
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def email_service(self):
+        # Import khi cần: module SMTP không bị load lúc worker khởi động
+        if self._email_service is None:
+            from services.email_service import email_service
+            self._email_service = email_service
+        return self._email_service
+
+    def enqueue(self, session, recipient: str, subject: str, text_body: str, html_body: Optional[str] = None) -> str:
+        """
+        Queue one email
+
+        Args:
+            session: SQLAlchemy session of the current request
+
+        Returns:
+            str: Outbox message id
+        """
+        message_id = EmailOutboxRepository(session).enqueue(recipient, subject, text_body, html_body)
+        self._wake.set()
+        if self.drain_after_request and has_request_context():
+            @after_this_request
+            def drain_when_closed(response):
+                response.call_on_close(self.drain_once)
+                return response
+        return message_id
+
+    def enqueue_verification_email(self, session, recipient_email: str, verification_token: str,
+                                   full_name: Optional[str] = None) -> str:
+        """Queue the email verification message for a user"""
+        with span("email"):
+            subject, text_body, html_body = self.email_service.compose_verification_email(
+                recipient_email, verification_token, full_name
+            )
+            return self.enqueue(session, recipient_email, subject, text_body, html_body)
+
+    def backoff(self, attempts: int) -> float:
+        """
+        Delay before the next attempt, in seconds
+
+        Exponential (base * 2^(attempts-1)), capped at backoff_max, with up to
+        10% jitter so that messages failing together don't retry together.
+        """
+        delay = min(self.backoff_base * (2 ** max(attempts - 1, 0)), self.backoff_max)
+        return delay + random.uniform(0, delay * 0.1)
+
+    def drain_once(self) -> dict:
+        """
+        Send one batch of due messages
+
+        Messages whose lease expired on their last attempt are dead-lettered
+        first; an outcome is only recorded while this sender still holds the
+        message's lease.
+
+        Returns:
+            dict: {"sent", "retried", "dead"} counts
+        """
+        result = {"sent": 0, "retried": 0, "dead": 0}
+        session = self.session_factory()
+        try:
+            repo = EmailOutboxRepository(session)
+            result["dead"] += repo.dead_letter_expired(self.max_attempts)
+            messages = repo.claim_due(self.batch_size, self.lease_seconds, self.max_attempts)
+            # Cả batch đi qua một session SMTP trong pool
+            errors = self.email_service.send_many(
+                (m["recipient"], m["subject"], m["text_body"], m["html_body"]) for m in messages
+            )
+            for message, e in zip(messages, errors):
+                token = message["lease_token"]
+                if e is None:
+                    if repo.mark_sent(message["id"], token):
+                        result["sent"] += 1
+                    else:
+                        logger.warning(f"Email {message['id']} was sent after its lease was lost; it may be sent twice")
+                    continue
+                error = f"{type(e).__name__}: {e}"
+                if is_permanent_failure(e) or message["attempts"] >= self.max_attempts:
+                    logger.error(f"Email {message['id']} to {message['recipient']} moved to dead letter: {error}")
+                    if repo.mark_dead(message["id"], token, error):
+                        result["dead"] += 1
+                else:
+                    retry_at = datetime.utcnow() + timedelta(seconds=self.backoff(message["attempts"]))
+                    logger.warning(f"Email {message['id']} attempt {message['attempts']} failed, retry at {retry_at}: {error}")
+                    if repo.mark_retry(message["id"], token, error, retry_at):
+                        result["retried"] += 1
+        finally:
+            session.close()
+        return result
+
+    def run(self):
+        """Sender loop: drain, then sleep until poll_interval or a new enqueue"""
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                result = self.drain_once()
+            except Exception as e:
+                logger.error(f"Email outbox sender error: {e}")
+                result = None
+            # Batch đầy thì gửi tiếp ngay, còn lại chờ message mới hoặc tới lượt retry
+            if result and sum(result.values()) >= self.batch_size:
+                continue
+            self.email_service.close_idle_connections()
+            self._wake.wait(self.poll_interval)
+
+    def start(self):
+        """Start the sender thread (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="email-outbox-sender", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        """Stop the sender thread"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def init_email_outbox(app) -> EmailOutbox:
+    """
+    Build the outbox from app.config and start the sender thread if enabled
+
+    With an in-memory database every thread shares one connection, so no
+    sender thread is started there; queued emails are sent once the
+    response of the enqueuing request has been returned.
+
+    Args:
+        app: Flask application instance
+    """
+    from infrastructure.databases.mssql import SessionFactory, engine
+
+    in_memory = engine.url.database in (None, "", ":memory:")
+    run_worker = app.config.get("EMAIL_OUTBOX_WORKER", True)
+
+    outbox = EmailOutbox(
+        SessionFactory,
+        batch_size=app.config.get("EMAIL_OUTBOX_BATCH_SIZE", 20),
+        max_attempts=app.config.get("EMAIL_OUTBOX_MAX_ATTEMPTS", 6),
+        backoff_base=app.config.get("EMAIL_OUTBOX_BACKOFF_BASE", 30),
+        backoff_max=app.config.get("EMAIL_OUTBOX_BACKOFF_MAX", 3600),
+        poll_interval=app.config.get("EMAIL_OUTBOX_POLL_INTERVAL", 5),
+        drain_after_request=run_worker and in_memory,
+    )
+    app.extensions["email_outbox"] = outbox
+    if run_worker and not in_memory:
+        outbox.start()
+    return outbox
+
+
+def get_email_outbox() -> EmailOutbox:
+    """EmailOutbox of the current Flask app"""
+    return current_app.extensions["email_outbox"]
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import Config
+    from infrastructure.databases.mssql import SessionFactory
+
+    parser = argparse.ArgumentParser(description="AURA email outbox sender")
+    parser.add_argument("--once", action="store_true", help="send one batch and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    outbox = EmailOutbox(
+        SessionFactory,
+        batch_size=Config.EMAIL_OUTBOX_BATCH_SIZE,
+        max_attempts=Config.EMAIL_OUTBOX_MAX_ATTEMPTS,
+        backoff_base=Config.EMAIL_OUTBOX_BACKOFF_BASE,
+        backoff_max=Config.EMAIL_OUTBOX_BACKOFF_MAX,
+        poll_interval=Config.EMAIL_OUTBOX_POLL_INTERVAL,
+    )
+    if args.once:
+        print(outbox.drain_once())
+    else:
+        try:
+            outbox.run()
+        except KeyboardInterrupt:
+            pass
@@ -3,12 +3,18 @@ Email Service Module for AURA System
 Handles sending verification emails and other email communications
 """
 
+import atexit
 import os
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional
+from typing import Iterable, List, Optional, Tuple
 import logging
+import threading
+
+from services.email_templates import EMAIL_VERIFICATION, PASSWORD_RESET, template_renderer
+from services.request_profiler import span
+from services.smtp_pool import SMTPConnectionPool, is_connection_error
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +28,30 @@ class EmailService:
         self.sender_email = os.getenv("SENDER_EMAIL", "noreply@aura-clinic.com")
         self.sender_password = os.getenv("SENDER_PASSWORD", "")
         self.frontend_url = os.getenv("FRONTEND_URL", "http://localhost:5173")
+        self.use_tls = os.getenv("SMTP_USE_TLS", "true").lower() in ("true", "1")
+        # Dry run (chỉ log, không gửi): mặc định bật khi chưa cấu hình SENDER_PASSWORD
+        dry_run = os.getenv("EMAIL_DRY_RUN")
+        self.dry_run = not self.sender_password if dry_run is None else dry_run.lower() in ("true", "1")
+        # Pool các session SMTP đã xác thực (tạo khi gửi email đầu tiên)
+        self.pool_size = int(os.getenv("SMTP_POOL_SIZE", 4))
+        self.idle_timeout = float(os.getenv("SMTP_IDLE_TIMEOUT", 60))
+        self.keepalive_interval = float(os.getenv("SMTP_KEEPALIVE_INTERVAL", 15))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+    
+    @property
+    def pool(self) -> SMTPConnectionPool:
+        """SMTP session pool, built from the current settings on first use"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = SMTPConnectionPool(
+                        self.smtp_server, self.smtp_port,
+                        username=self.sender_email, password=self.sender_password, use_tls=self.use_tls,
+                        max_size=self.pool_size, idle_timeout=self.idle_timeout,
+                        keepalive_interval=self.keepalive_interval
+                    )
+        return self._pool
     
     def send_verification_email(self, recipient_email: str, verification_token: str, full_name: Optional[str] = None) -> bool:
         """
@@ -36,72 +66,28 @@ class EmailService:
             bool: True if email was sent successfully
         """
         try:
-            verification_url = f"{self.frontend_url}/verify-email?token={verification_token}"
-            
-            subject = "AURA - Xác nhận địa chỉ email của bạn"
-            
-            name = full_name or recipient_email.split('@')[0]
-            
-            html_body = f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                        <h2 style="color: #2c3e50;">Xác nhận Email</h2>
-                        <p>Xin chào <strong>{name}</strong>,</p>
-                        <p>Cảm ơn bạn đã đăng ký tài khoản AURA. Vui lòng xác nhận địa chỉ email của bạn bằng cách click vào nút dưới đây:</p>
-                        
-                        <div style="margin: 30px 0;">
-                            <a href="{verification_url}" 
-                               style="display: inline-block; 
-                                      background-color: #3498db; 
-                                      color: white; 
-                                      padding: 12px 30px; 
-                                      text-decoration: none; 
-                                      border-radius: 5px;
-                                      font-weight: bold;">
-                                Xác nhận Email
-                            </a>
-                        </div>
-                        
-                        <p>Hoặc copy đường link này vào trình duyệt:</p>
-                        <p style="word-break: break-all; color: #7f8c8d;">{verification_url}</p>
-                        
-                        <p style="color: #7f8c8d; font-size: 12px;">
-                            <strong>Lưu ý:</strong> Link xác nhận sẽ hết hạn sau 24 giờ. 
-                            Nếu link không hoạt động, vui lòng yêu cầu gửi lại email xác nhận.
-                        </p>
-                        
-                        <hr style="border: none; border-top: 1px solid #ecf0f1; margin: 30px 0;">
-                        
-                        <p style="color: #7f8c8d; font-size: 12px;">
-                            Đây là email tự động. Vui lòng không reply email này.<br>
-                            © 2026 AURA - Hệ thống Sàng Lọc Sức Khỏe Mạch Máu Võng Mạc
-                        </p>
-                    </div>
-                </body>
-            </html>
-            """
-            
-            text_body = f"""
-            Xác nhận Email
-            
-            Xin chào {name},
-            
-            Cảm ơn bạn đã đăng ký tài khoản AURA. Vui lòng xác nhận địa chỉ email của bạn bằng cách click vào link dưới đây:
-            
-            {verification_url}
-            
-            Link xác nhận sẽ hết hạn sau 24 giờ. Nếu link không hoạt động, vui lòng yêu cầu gửi lại email xác nhận.
-            
-            © 2026 AURA - Hệ thống Sàng Lọc Sức Khỏe Mạch Máu Võng Mạc
-            """
-            
+            subject, text_body, html_body = self.compose_verification_email(recipient_email, verification_token, full_name)
             return self._send_email(recipient_email, subject, text_body, html_body)
             
         except Exception as e:
             logger.error(f"Error preparing verification email: {str(e)}")
             return False
     
+    def compose_verification_email(self, recipient_email: str, verification_token: str, full_name: Optional[str] = None,
+                                   locale: Optional[str] = None) -> Tuple[str, str, str]:
+        """
+        Build the verification email without sending it
+        
+        Returns:
+            tuple: (subject, text_body, html_body)
+        """
+        email = template_renderer.render(
+            EMAIL_VERIFICATION, locale,
+            name=full_name or recipient_email.split('@')[0],
+            verification_url=f"{self.frontend_url}/verify-email?token={verification_token}",
+        )
+        return email.subject, email.text_body, email.html_body
+    
     def send_password_reset_email(self, recipient_email: str, reset_token: str, full_name: Optional[str] = None) -> bool:
         """
         Send password reset email to user
@@ -115,72 +101,127 @@ class EmailService:
             bool: True if email was sent successfully
         """
         try:
-            reset_url = f"{self.frontend_url}/reset-password?token={reset_token}"
-            
-            subject = "AURA - Đặt lại mật khẩu"
-            
-            name = full_name or recipient_email.split('@')[0]
-            
-            html_body = f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                        <h2 style="color: #2c3e50;">Đặt lại Mật khẩu</h2>
-                        <p>Xin chào <strong>{name}</strong>,</p>
-                        <p>Chúng tôi nhận được yêu cầu đặt lại mật khẩu của bạn. Vui lòng click vào nút dưới đây:</p>
-                        
-                        <div style="margin: 30px 0;">
-                            <a href="{reset_url}" 
-                               style="display: inline-block; 
-                                      background-color: #e74c3c; 
-                                      color: white; 
-                                      padding: 12px 30px; 
-                                      text-decoration: none; 
-                                      border-radius: 5px;
-                                      font-weight: bold;">
-                                Đặt lại Mật khẩu
-                            </a>
-                        </div>
-                        
-                        <p>Hoặc copy đường link này vào trình duyệt:</p>
-                        <p style="word-break: break-all; color: #7f8c8d;">{reset_url}</p>
-                        
-                        <p style="color: #7f8c8d; font-size: 12px;">
-                            <strong>Lưu ý:</strong> Link đặt lại mật khẩu sẽ hết hạn sau 1 giờ. 
-                            Nếu bạn không yêu cầu đặt lại mật khẩu, vui lòng bỏ qua email này.
-                        </p>
-                        
-                        <hr style="border: none; border-top: 1px solid #ecf0f1; margin: 30px 0;">
-                        
-                        <p style="color: #7f8c8d; font-size: 12px;">
-                            Đây là email tự động. Vui lòng không reply email này.<br>
-                            © 2026 AURA - Hệ thống Sàng Lọc Sức Khỏe Mạch Máu Võng Mạc
-                        </p>
-                    </div>
-                </body>
-            </html>
-            """
-            
-            text_body = f"""
-            Đặt lại Mật khẩu
-            
-            Xin chào {name},
-            
-            Chúng tôi nhận được yêu cầu đặt lại mật khẩu của bạn. Vui lòng click vào link dưới đây:
-            
-            {reset_url}
-            
-            Link đặt lại mật khẩu sẽ hết hạn sau 1 giờ. Nếu bạn không yêu cầu đặt lại mật khẩu, vui lòng bỏ qua email này.
-            
-            © 2026 AURA - Hệ thống Sàng Lọc Sức Khỏe Mạch Máu Võng Mạc
-            """
-            
+            subject, text_body, html_body = self.compose_password_reset_email(recipient_email, reset_token, full_name)
             return self._send_email(recipient_email, subject, text_body, html_body)
             
         except Exception as e:
             logger.error(f"Error preparing password reset email: {str(e)}")
             return False
     
+    def compose_password_reset_email(self, recipient_email: str, reset_token: str, full_name: Optional[str] = None,
+                                     locale: Optional[str] = None) -> Tuple[str, str, str]:
+        """
+        Build the password reset email without sending it
+        
+        Returns:
+            tuple: (subject, text_body, html_body)
+        """
+        email = template_renderer.render(
+            PASSWORD_RESET, locale,
+            name=full_name or recipient_email.split('@')[0],
+            reset_url=f"{self.frontend_url}/reset-password?token={reset_token}",
+        )
+        return email.subject, email.text_body, email.html_body
+    
+    def build_message(self, recipient_email: str, subject: str, text_body: str, html_body: Optional[str] = None) -> MIMEMultipart:
+        """Build the MIME message for one recipient"""
+        message = MIMEMultipart("alternative")
+        message["Subject"] = subject
+        message["From"] = self.sender_email
+        message["To"] = recipient_email
+        
+        # Attach plain text and HTML parts
+        message.attach(MIMEText(text_body, "plain"))
+        if html_body:
+            message.attach(MIMEText(html_body, "html"))
+        return message
+    
+    def deliver(self, recipient_email: str, subject: str, text_body: str, html_body: Optional[str] = None):
+        """
+        Send one email via SMTP, raising on failure
+        
+        Used by the outbox sender (services/email_outbox.py), which decides
+        whether a failure is retried.
+        
+        Raises:
+            smtplib.SMTPException: SMTP error (see smtp_code for 4xx/5xx)
+            OSError: Connection error
+        """
+        error = self.send_many([(recipient_email, subject, text_body, html_body)])[0]
+        if error is not None:
+            raise error
+        if not self.dry_run:
+            logger.info(f"Email sent successfully to {recipient_email}")
+    
+    def send_many(self, messages: Iterable[Tuple[str, str, str, Optional[str]]]) -> List[Optional[Exception]]:
+        """
+        Send many emails over one pooled SMTP session
+        
+        If the session drops mid-batch (e.g. the server closed an idle
+        connection), the current message is retried once on a new session
+        and the batch continues. If no session can be opened at all, every
+        remaining message gets that error.
+        
+        Args:
+            messages: (recipient_email, subject, text_body, html_body) tuples
+            
+        Returns:
+            list: One entry per message, None if sent or the exception that stopped it
+        """
+        with span("email"):
+            return self._send_many(list(messages))
+    
+    def _send_many(self, messages: List[Tuple[str, str, str, Optional[str]]]) -> List[Optional[Exception]]:
+        results = [None] * len(messages)
+        if self.dry_run:
+            for recipient_email, subject, _, _ in messages:
+                logger.warning(f"Email not sent (dry run / no SENDER_PASSWORD configured). Would send to: {recipient_email}")
+                logger.debug(f"Subject: {subject}")
+            return results
+        
+        index = 0
+        retried = False
+        while index < len(messages):
+            connected = False
+            try:
+                with self.pool.connection() as server:
+                    connected = True
+                    while index < len(messages):
+                        recipient_email, subject, text_body, html_body = messages[index]
+                        message = self.build_message(recipient_email, subject, text_body, html_body)
+                        try:
+                            server.sendmail(self.sender_email, recipient_email, message.as_string())
+                        except Exception as e:
+                            if is_connection_error(e):
+                                raise
+                            # Lỗi riêng của message này (4xx/5xx), session vẫn dùng được
+                            results[index] = e
+                        index += 1
+                        retried = False
+            except Exception as e:
+                if not connected:
+                    for remaining in range(index, len(messages)):
+                        results[remaining] = e
+                    break
+                if is_connection_error(e) and not retried:
+                    retried = True
+                    continue
+                results[index] = e
+                index += 1
+                retried = False
+        return results
+    
+    def close_idle_connections(self) -> int:
+        """Close pooled SMTP sessions idle for longer than SMTP_IDLE_TIMEOUT"""
+        if self._pool is None:
+            return 0
+        return self._pool.reap_idle()
+    
+    def close(self):
+        """Close every pooled SMTP session (QUIT)"""
+        if self._pool is not None:
+            self._pool.close_all()
+    
     def _send_email(self, recipient_email: str, subject: str, text_body: str, html_body: str) -> bool:
         """
         Internal method to send email via SMTP
@@ -195,29 +236,7 @@ class EmailService:
             bool: True if email was sent successfully
         """
         try:
-            # If no sender password, log and return True (for development)
-            if not self.sender_password:
-                logger.warning(f"Email not sent (no SENDER_PASSWORD configured). Would send to: {recipient_email}")
-                logger.debug(f"Subject: {subject}")
-                return True
-            
-            # Create message
-            message = MIMEMultipart("alternative")
-            message["Subject"] = subject
-            message["From"] = self.sender_email
-            message["To"] = recipient_email
-            
-            # Attach plain text and HTML parts
-            message.attach(MIMEText(text_body, "plain"))
-            message.attach(MIMEText(html_body, "html"))
-            
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.sender_email, self.sender_password)
-                server.sendmail(self.sender_email, recipient_email, message.as_string())
-            
-            logger.info(f"Email sent successfully to {recipient_email}")
+            self.deliver(recipient_email, subject, text_body, html_body)
             return True
             
         except smtplib.SMTPAuthenticationError:
@@ -233,3 +252,4 @@ class EmailService:
 
 # Initialize the email service
 email_service = EmailService()
+atexit.register(email_service.close)
@@ -0,0 +1,310 @@
+"""
+Email Template Renderer for AURA System
+Compiles notification templates once and caches them per (template_code, locale),
+so rendering an email only substitutes the per-recipient variables.
+
+Templates come from the ``notification_templates`` table (channel "email") and
+fall back to the built-in templates below. Rows use Jinja2 syntax, e.g.
+``Xin chào {{ name }}``; the HTML part is autoescaped, subject and text are not.
+Rows are editable data, so they are compiled in Jinja2's sandbox.
+"""
+
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from jinja2 import StrictUndefined, Template
+from jinja2.sandbox import SandboxedEnvironment
+from sqlalchemy import event
+
+from infrastructure.models.notification_template_model import NotificationTemplateModel
+from services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+EMAIL_VERIFICATION = "EMAIL_VERIFICATION"
+PASSWORD_RESET = "PASSWORD_RESET"
+
+_FOOTER_VI = "© 2026 AURA - Hệ thống Sàng Lọc Sức Khỏe Mạch Máu Võng Mạc"
+_FOOTER_EN = "© 2026 AURA - Retinal Vascular Health Screening System"
+
+_HTML_LAYOUT = """<html>
+    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+            <h2 style="color: #2c3e50;">{heading}</h2>
+            <p>{greeting} <strong>{{{{ name }}}}</strong>,</p>
+            <p>{intro}</p>
+
+            <div style="margin: 30px 0;">
+                <a href="{{{{ {url_var} }}}}"
+                   style="display: inline-block;
+                          background-color: {color};
+                          color: white;
+                          padding: 12px 30px;
+                          text-decoration: none;
+                          border-radius: 5px;
+                          font-weight: bold;">
+                    {button}
+                </a>
+            </div>
+
+            <p>{copy_link}</p>
+            <p style="word-break: break-all; color: #7f8c8d;">{{{{ {url_var} }}}}</p>
+
+            <p style="color: #7f8c8d; font-size: 12px;">
+                <strong>{note_label}</strong> {note}
+            </p>
+
+            <hr style="border: none; border-top: 1px solid #ecf0f1; margin: 30px 0;">
+
+            <p style="color: #7f8c8d; font-size: 12px;">
+                {automated}<br>
+                {footer}
+            </p>
+        </div>
+    </body>
+</html>
+"""
+
+_TEXT_LAYOUT = """{heading}
+
+{greeting} {{{{ name }}}},
+
+{intro_text}
+
+{{{{ {url_var} }}}}
+
+{note}
+
+{footer}
+"""
+
+
+def _builtin(heading, greeting, intro, intro_text, button, copy_link, note_label, note, automated, footer,
+             subject, url_var, color):
+    fields = dict(heading=heading, greeting=greeting, intro=intro, intro_text=intro_text, button=button,
+                  copy_link=copy_link, note_label=note_label, note=note, automated=automated, footer=footer,
+                  url_var=url_var, color=color)
+    return subject, _TEXT_LAYOUT.format(**fields), _HTML_LAYOUT.format(**fields)
+
+
+# (template_code, locale) -> (title_tpl, body_tpl, html_tpl)
+BUILTIN_TEMPLATES: Dict[Tuple[str, str], Tuple[str, str, str]] = {
+    (EMAIL_VERIFICATION, "vi"): _builtin(
+        subject="AURA - Xác nhận địa chỉ email của bạn",
+        heading="Xác nhận Email",
+        greeting="Xin chào",
+        intro="Cảm ơn bạn đã đăng ký tài khoản AURA. Vui lòng xác nhận địa chỉ email của bạn bằng cách click vào nút dưới đây:",
+        intro_text="Cảm ơn bạn đã đăng ký tài khoản AURA. Vui lòng xác nhận địa chỉ email của bạn bằng cách click vào link dưới đây:",
+        button="Xác nhận Email",
+        copy_link="Hoặc copy đường link này vào trình duyệt:",
+        note_label="Lưu ý:",
+        note="Link xác nhận sẽ hết hạn sau 24 giờ. Nếu link không hoạt động, vui lòng yêu cầu gửi lại email xác nhận.",
+        automated="Đây là email tự động. Vui lòng không reply email này.",
+        footer=_FOOTER_VI,
+        url_var="verification_url",
+        color="#3498db",
+    ),
+    (EMAIL_VERIFICATION, "en"): _builtin(
+        subject="AURA - Confirm your email address",
+        heading="Confirm your email",
+        greeting="Hello",
+        intro="Thank you for registering an AURA account. Please confirm your email address by clicking the button below:",
+        intro_text="Thank you for registering an AURA account. Please confirm your email address by opening the link below:",
+        button="Confirm email",
+        copy_link="Or copy this link into your browser:",
+        note_label="Note:",
+        note="The confirmation link expires in 24 hours. If it does not work, please request a new confirmation email.",
+        automated="This is an automated email. Please do not reply.",
+        footer=_FOOTER_EN,
+        url_var="verification_url",
+        color="#3498db",
+    ),
+    (PASSWORD_RESET, "vi"): _builtin(
+        subject="AURA - Đặt lại mật khẩu",
+        heading="Đặt lại Mật khẩu",
+        greeting="Xin chào",
+        intro="Chúng tôi nhận được yêu cầu đặt lại mật khẩu của bạn. Vui lòng click vào nút dưới đây:",
+        intro_text="Chúng tôi nhận được yêu cầu đặt lại mật khẩu của bạn. Vui lòng click vào link dưới đây:",
+        button="Đặt lại Mật khẩu",
+        copy_link="Hoặc copy đường link này vào trình duyệt:",
+        note_label="Lưu ý:",
+        note="Link đặt lại mật khẩu sẽ hết hạn sau 1 giờ. Nếu bạn không yêu cầu đặt lại mật khẩu, vui lòng bỏ qua email này.",
+        automated="Đây là email tự động. Vui lòng không reply email này.",
+        footer=_FOOTER_VI,
+        url_var="reset_url",
+        color="#e74c3c",
+    ),
+    (PASSWORD_RESET, "en"): _builtin(
+        subject="AURA - Reset your password",
+        heading="Reset your password",
+        greeting="Hello",
+        intro="We received a request to reset your password. Please click the button below:",
+        intro_text="We received a request to reset your password. Please open the link below:",
+        button="Reset password",
+        copy_link="Or copy this link into your browser:",
+        note_label="Note:",
+        note="The reset link expires in 1 hour. If you did not request a password reset, please ignore this email.",
+        automated="This is an automated email. Please do not reply.",
+        footer=_FOOTER_EN,
+        url_var="reset_url",
+        color="#e74c3c",
+    ),
+}
+
+
+@dataclass(frozen=True)
+class RenderedEmail:
+    """Rendered subject and bodies of one email"""
+    subject: str
+    text_body: str
+    html_body: Optional[str]
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """Compiled subject/text/HTML templates of one (template_code, locale)"""
+    template_code: str
+    locale: str
+    subject: Template
+    text: Template
+    html: Optional[Template]
+    source: str  # "db" hoặc "builtin"
+
+    def render(self, **variables) -> RenderedEmail:
+        return RenderedEmail(
+            subject=self.subject.render(**variables).strip(),
+            text_body=self.text.render(**variables),
+            html_body=self.html.render(**variables) if self.html is not None else None,
+        )
+
+
+class TemplateNotFoundError(LookupError):
+    """No database row or built-in template for the requested code"""
+
+
+class EmailTemplateRenderer:
+    """
+    Cache of compiled email templates keyed by (template_code, locale).
+
+    A miss loads the active email rows of that template_code in one query and
+    compiles them; later renders reuse the compiled template. Inserting,
+    updating or deleting a NotificationTemplateModel in this process clears the
+    cache; other processes pick the change up after ``ttl`` seconds.
+    """
+
+    def __init__(self, session_factory: Optional[Callable] = None, default_locale: str = "vi",
+                 ttl: float = 300, max_size: int = 256):
+        self._session_factory = session_factory
+        self.default_locale = default_locale
+        self._cache = TTLCache(max_size=max_size, default_ttl=ttl)
+        self._lock = threading.Lock()
+        self.compiles = 0
+        # Biến thiếu trong template phải báo lỗi, không âm thầm render chuỗi rỗng.
+        # Sandbox: template sửa được trong DB không được truy cập thuộc tính nội bộ của Python (SSTI)
+        self._text_env = SandboxedEnvironment(autoescape=False, undefined=StrictUndefined, keep_trailing_newline=True)
+        self._html_env = SandboxedEnvironment(autoescape=True, undefined=StrictUndefined, keep_trailing_newline=True)
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            from infrastructure.databases.mssql import SessionFactory
+            self._session_factory = SessionFactory
+        return self._session_factory
+
+    def _compile(self, template_code, locale, title_tpl, body_tpl, html_tpl, source) -> CompiledTemplate:
+        self.compiles += 1
+        return CompiledTemplate(
+            template_code=template_code,
+            locale=locale,
+            subject=self._text_env.from_string(title_tpl),
+            text=self._text_env.from_string(body_tpl),
+            html=self._html_env.from_string(html_tpl) if html_tpl else None,
+            source=source,
+        )
+
+    def _load_rows(self, template_code: str) -> Dict[str, NotificationTemplateModel]:
+        """Active email rows of one template_code, by locale"""
+        session = self.session_factory()
+        try:
+            rows = session.query(NotificationTemplateModel).filter(
+                NotificationTemplateModel.template_code == template_code,
+                NotificationTemplateModel.channel == "email",
+                NotificationTemplateModel.active.is_(True),
+            ).all()
+            return {row.locale or self.default_locale: row for row in rows}
+        except Exception as e:
+            # DB lỗi / chưa có bảng: dùng template built-in thay vì không gửi được email
+            logger.warning(f"Could not load template {template_code} from database: {e}")
+            return {}
+        finally:
+            session.close()
+
+    def _build(self, template_code: str, locale: str) -> CompiledTemplate:
+        rows = self._load_rows(template_code)
+        for candidate in (locale, self.default_locale):
+            row = rows.get(candidate)
+            if row is not None:
+                return self._compile(template_code, candidate, row.title_tpl, row.body_tpl, row.html_tpl, "db")
+        for candidate in (locale, self.default_locale):
+            builtin = BUILTIN_TEMPLATES.get((template_code, candidate))
+            if builtin is not None:
+                return self._compile(template_code, candidate, *builtin, "builtin")
+        raise TemplateNotFoundError(f"Không tìm thấy email template {template_code} ({locale})")
+
+    def get(self, template_code: str, locale: Optional[str] = None) -> CompiledTemplate:
+        """
+        Compiled template for a code and locale
+
+        Falls back to the default locale, then to the built-in templates.
+
+        Raises:
+            TemplateNotFoundError: Unknown template_code
+        """
+        key = (template_code, locale or self.default_locale)
+        compiled = self._cache.get(key)
+        if compiled is None:
+            with self._lock:
+                compiled = self._cache.get(key)
+                if compiled is None:
+                    compiled = self._build(*key)
+                    self._cache.set(key, compiled)
+        return compiled
+
+    def render(self, template_code: str, locale: Optional[str] = None, **variables) -> RenderedEmail:
+        """
+        Render a template with per-recipient variables
+
+        Args:
+            template_code: notification_templates.template_code
+            locale: Recipient locale (default_locale if omitted)
+            **variables: Template variables, e.g. name, verification_url
+
+        Returns:
+            RenderedEmail: subject, text_body, html_body
+        """
+        return self.get(template_code, locale).render(**variables)
+
+    def invalidate(self):
+        """Drop every compiled template (next render reloads from the database)"""
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        """Cache counters for monitoring"""
+        return {**self._cache.stats(), "compiles": self.compiles}
+
+
+template_renderer = EmailTemplateRenderer(
+    default_locale=os.getenv("EMAIL_DEFAULT_LOCALE", "vi"),
+    ttl=float(os.getenv("EMAIL_TEMPLATE_CACHE_TTL", 300)),
+)
+
+
+@event.listens_for(NotificationTemplateModel, "after_insert")
+@event.listens_for(NotificationTemplateModel, "after_update")
+@event.listens_for(NotificationTemplateModel, "after_delete")
+def _invalidate_on_change(mapper, connection, target):
+    # Xóa toàn bộ: template_code/locale của row có thể vừa bị đổi
+    template_renderer.invalidate()
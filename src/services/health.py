@@ -0,0 +1,171 @@
+"""
+Health checks for AURA System
+
+/livez only proves the process answers (no I/O). /readyz and /api/health
+return the last result of the dependency checks (database, SMTP, disk),
+refreshed by a background thread every HEALTH_CHECK_INTERVAL seconds, so
+orchestrator probes from several sources never hit the database themselves.
+Without the thread (tests), a result older than HEALTH_CACHE_TTL is
+refreshed on the next probe instead.
+"""
+
+import logging
+import shutil
+import socket
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from flask import current_app
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+def database_check(engine) -> Callable[[], Optional[str]]:
+    """SELECT 1 on a pooled connection of the engine (not a request session)"""
+    def check():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    return check
+
+
+def smtp_check(timeout: float = 3) -> Callable[[], Optional[str]]:
+    """TCP connect to the configured SMTP server; no SMTP dialogue, no login"""
+    def check():
+        # Import khi chạy check: không tạo singleton email_service lúc create_app
+        from services.email_service import email_service
+        if email_service.dry_run:
+            return "skipped (dry run)"
+        with socket.create_connection((email_service.smtp_server, email_service.smtp_port), timeout=timeout):
+            pass
+    return check
+
+
+def disk_check(path: str, min_free_mb: float) -> Callable[[], Optional[str]]:
+    """Free space on the volume holding path"""
+    def check():
+        free_mb = shutil.disk_usage(path).free / (1024 * 1024)
+        if free_mb < min_free_mb:
+            raise RuntimeError(f"Chỉ còn {free_mb:.0f} MB trống (< {min_free_mb:.0f} MB)")
+        return f"{free_mb:.0f} MB free"
+    return check
+
+
+class HealthChecker:
+    """
+    Runs named checks and caches the result
+
+    A check is a callable that raises on failure; it may return a short
+    detail string. Only ``critical`` checks decide readiness; the others
+    (e.g. SMTP, since the email outbox retries) are reported as degraded.
+
+    Args:
+        checks: {name: check}
+        critical: Names of the checks that must pass for readiness
+        ttl: Seconds a result stays valid when no background thread runs
+        interval: Seconds between background refreshes
+    """
+
+    def __init__(self, checks: Dict[str, Callable], critical: Iterable[str] = ("db",),
+                 ttl: float = 10, interval: float = 5):
+        self.checks = checks
+        self.critical = set(critical)
+        self.ttl = ttl
+        self.interval = interval
+        self._result: Optional[dict] = None
+        self._checked_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_checks(self) -> dict:
+        """Run every check now and cache the result"""
+        results = {}
+        for name, check in self.checks.items():
+            start = time.perf_counter()
+            try:
+                detail = check()
+                results[name] = {"ok": True, "detail": detail}
+            except Exception as e:
+                results[name] = {"ok": False, "error": str(e)}
+            results[name]["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            results[name]["critical"] = name in self.critical
+
+        ready = all(r["ok"] for name, r in results.items() if name in self.critical)
+        degraded = ready and not all(r["ok"] for r in results.values())
+        result = {
+            "ready": ready,
+            "status": "degraded" if degraded else ("ok" if ready else "unavailable"),
+            "checks": results,
+            "checked_at": time.time(),
+        }
+        if self._result is not None and self._result["ready"] != ready:
+            logger.warning(f"Readiness changed: {self._result['status']} -> {result['status']}")
+        self._result = result
+        self._checked_at = time.monotonic()
+        return result
+
+    def status(self) -> dict:
+        """Cached result; refreshed here only if it is older than ttl (single flight)"""
+        if self._result is None or time.monotonic() - self._checked_at > self.ttl:
+            with self._refresh_lock:
+                if self._result is None or time.monotonic() - self._checked_at > self.ttl:
+                    return self.run_checks()
+        return self._result
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_checks()
+            except Exception as e:
+                logger.error(f"Health checker error: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start the background checker thread (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-checker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+
+def init_health_checker(app) -> HealthChecker:
+    """
+    Build the checker from app.config and start its thread if enabled
+
+    Args:
+        app: Flask application instance
+    """
+    from infrastructure.databases.mssql import engine
+
+    checks = {
+        "db": database_check(engine),
+        "disk": disk_check(app.config.get("HEALTH_DISK_PATH", "."), app.config.get("HEALTH_MIN_FREE_DISK_MB", 100)),
+    }
+    if app.config.get("HEALTH_CHECK_SMTP", True):
+        checks["smtp"] = smtp_check()
+
+    checker = HealthChecker(
+        checks,
+        critical=app.config.get("HEALTH_CRITICAL_CHECKS", ["db", "disk"]),
+        ttl=app.config.get("HEALTH_CACHE_TTL", 10),
+        interval=app.config.get("HEALTH_CHECK_INTERVAL", 5),
+    )
+    app.extensions["health_checker"] = checker
+    # DB in-memory: mọi thread dùng chung một connection, check chạy khi probe thay vì thread nền
+    in_memory = engine.url.database in (None, "", ":memory:")
+    if app.config.get("HEALTH_BACKGROUND_CHECKS", True) and not in_memory:
+        checker.start()
+    return checker
+
+
+def get_health_checker() -> HealthChecker:
+    return current_app.extensions["health_checker"]
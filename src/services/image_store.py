@@ -0,0 +1,404 @@
+"""
+Content-addressed retinal image store for AURA System
+
+Blobs are stored once per SHA-256 of their content:
+    <IMAGE_STORE_ROOT>/sha256/ab/cd/abcd...   (storage_url "cas://sha256/abcd...")
+
+Uploads are streamed in chunks into a temp file while hashing, then moved
+into place with an atomic rename. A second upload of the same bytes finds
+the blob already there and only drops its temp file, so re-uploaded
+screening images cost no storage; retinal_images.checksum (indexed) finds
+the earlier rows and their analyses.
+
+A scrubber re-hashes every blob in the background (rate limited) and moves
+corrupt blobs to ``quarantine/``; the next upload of the same image then
+restores the blob. Only one process per store scrubs (lock file).
+    python -m services.image_store scrub      # một lượt kiểm tra rồi thoát
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+URL_PREFIX = "cas://sha256/"
+CHECKSUM = re.compile(r"^[0-9a-f]{64}$")
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def try_lock(handle) -> bool:
+    """Non-blocking exclusive lock on an open file, released when it is closed"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            import msvcrt
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+class ImageTooLargeError(ValueError):
+    """The upload exceeded the size limit (the partial blob is discarded)"""
+
+
+class ChecksumMismatchError(ValueError):
+    """The content does not match the checksum announced by the client"""
+
+
+@dataclass(frozen=True)
+class StoredBlob:
+    checksum: str
+    size: int
+    url: str
+    # False: cùng nội dung đã có trong store (upload trùng)
+    created: bool
+
+
+class BlobWriter:
+    """
+    Incremental writer for one upload
+
+    write() chunks as they arrive (hashing on the fly), then commit() or
+    abort(). Used directly by streaming upload handlers; ImageStore.put()
+    wraps it for file-like objects.
+    """
+
+    def __init__(self, store: "ImageStore", max_size: Optional[int] = None):
+        self.store = store
+        self.max_size = max_size
+        self.size = 0
+        self._hash = hashlib.sha256()
+        fd, self._tmp_path = tempfile.mkstemp(dir=store.tmp_dir, prefix="upload-")
+        self._file = os.fdopen(fd, "wb")
+        self._closed = False
+
+    def write(self, chunk: bytes):
+        if self.max_size is not None and self.size + len(chunk) > self.max_size:
+            self.abort()
+            raise ImageTooLargeError(f"Image larger than {self.max_size} bytes")
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    @property
+    def checksum(self) -> str:
+        return self._hash.hexdigest()
+
+    def commit(self, expected_checksum: Optional[str] = None) -> StoredBlob:
+        """
+        Move the data into its content address
+
+        Args:
+            expected_checksum: SHA-256 sent by the client; on mismatch the
+                data is discarded and ChecksumMismatchError raised
+        """
+        checksum = self.checksum
+        self._file.flush()
+        if self.store.fsync:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._closed = True
+        return self.store._place(self._tmp_path, checksum, self.size, expected_checksum)
+
+    def abort(self):
+        if not self._closed:
+            self._file.close()
+            self._closed = True
+            try:
+                os.unlink(self._tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            self.abort()
+
+
+class ImageStore:
+    """
+    Content-addressed blob store on local disk
+
+    Args:
+        root: Store directory
+        chunk_size: Read size when streaming from file objects and scrubbing
+        fsync: fsync each blob before it becomes visible
+    """
+
+    def __init__(self, root: str, chunk_size: int = DEFAULT_CHUNK_SIZE, fsync: bool = True):
+        self.root = os.path.abspath(root)
+        self.chunk_size = chunk_size
+        self.fsync = fsync
+        self.blob_dir = os.path.join(self.root, "sha256")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        self.quarantine_dir = os.path.join(self.root, "quarantine")
+        for directory in (self.blob_dir, self.tmp_dir, self.quarantine_dir):
+            os.makedirs(directory, exist_ok=True)
+        self._scrub_stop = threading.Event()
+        self._scrub_thread = None
+        self.last_scrub: Optional[dict] = None
+
+    @staticmethod
+    def url_for(checksum: str) -> str:
+        return URL_PREFIX + checksum
+
+    @staticmethod
+    def checksum_from_url(storage_url: str) -> Optional[str]:
+        """Checksum of a ``cas://sha256/...`` URL, None for other URLs"""
+        if storage_url and storage_url.startswith(URL_PREFIX):
+            checksum = storage_url[len(URL_PREFIX):]
+            if CHECKSUM.match(checksum):
+                return checksum
+        return None
+
+    def path_for(self, checksum: str) -> str:
+        if not CHECKSUM.match(checksum or ""):
+            raise ValueError(f"Invalid SHA-256 checksum: {checksum!r}")
+        return os.path.join(self.blob_dir, checksum[:2], checksum[2:4], checksum)
+
+    def exists(self, checksum: str) -> bool:
+        return os.path.exists(self.path_for(checksum))
+
+    def writer(self, max_size: Optional[int] = None) -> BlobWriter:
+        return BlobWriter(self, max_size)
+
+    def put(self, stream: BinaryIO, max_size: Optional[int] = None,
+            expected_checksum: Optional[str] = None) -> StoredBlob:
+        """
+        Store a file-like object, read chunk by chunk (never whole in memory)
+
+        Raises:
+            ImageTooLargeError: More than max_size bytes
+            ChecksumMismatchError: Content does not match expected_checksum
+        """
+        with self.writer(max_size) as writer:
+            while True:
+                chunk = stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                writer.write(chunk)
+            return writer.commit(expected_checksum)
+
+    def adopt(self, path: str, expected_checksum: Optional[str] = None) -> StoredBlob:
+        """
+        Move a complete file inside the store root (e.g. an assembled
+        resumable upload) to its content address, hashing it chunk by chunk
+        """
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as f:
+            if self.fsync:
+                os.fsync(f.fileno())
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+        return self._place(path, digest.hexdigest(), size, expected_checksum)
+
+    def _place(self, tmp_path: str, checksum: str, size: int, expected_checksum: Optional[str]) -> StoredBlob:
+        if expected_checksum and expected_checksum.lower() != checksum:
+            os.unlink(tmp_path)
+            raise ChecksumMismatchError(f"Checksum mismatch: expected {expected_checksum}, got {checksum}")
+
+        path = self.path_for(checksum)
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+            return StoredBlob(checksum, size, self.url_for(checksum), created=False)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # rename nguyên tử: người đọc không bao giờ thấy blob ghi dở; hai upload trùng cùng lúc ghi cùng nội dung
+        os.replace(tmp_path, path)
+        return StoredBlob(checksum, size, self.url_for(checksum), created=True)
+
+    def open(self, checksum: str) -> BinaryIO:
+        return open(self.path_for(checksum), "rb")
+
+    def read(self, storage_url: str) -> bytes:
+        """Whole blob of a ``cas://`` URL (for the inference loader; images are a few MB)"""
+        checksum = self.checksum_from_url(storage_url)
+        if checksum is None:
+            raise ValueError(f"Not an image store URL: {storage_url}")
+        with self.open(checksum) as f:
+            return f.read()
+
+    def iter_checksums(self) -> Iterator[str]:
+        for dirpath, _, filenames in os.walk(self.blob_dir):
+            for name in filenames:
+                if CHECKSUM.match(name):
+                    yield name
+
+    def verify(self, checksum: str, rate_limit: float = 0) -> bool:
+        """
+        Re-hash a blob and compare with its address
+
+        Args:
+            rate_limit: Bytes per second to read at most (0 = unlimited)
+        """
+        digest = hashlib.sha256()
+        start = time.monotonic()
+        read = 0
+        with self.open(checksum) as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                read += len(chunk)
+                if rate_limit:
+                    ahead = read / rate_limit - (time.monotonic() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        return digest.hexdigest() == checksum
+
+    def quarantine(self, checksum: str) -> str:
+        """Move a corrupt blob out of the store; returns its new path"""
+        target = os.path.join(self.quarantine_dir, f"{checksum}.{int(time.time())}")
+        os.replace(self.path_for(checksum), target)
+        return target
+
+    def scrub(self, rate_limit: float = 0, stop: Optional[threading.Event] = None) -> dict:
+        """
+        Verify every blob, quarantining corrupt ones
+
+        Returns:
+            dict: {"checked", "corrupt", "bytes", "seconds"}
+        """
+        started = time.monotonic()
+        result = {"checked": 0, "corrupt": 0, "bytes": 0}
+        for checksum in self.iter_checksums():
+            if stop is not None and stop.is_set():
+                break
+            try:
+                ok = self.verify(checksum, rate_limit)
+                result["bytes"] += os.path.getsize(self.path_for(checksum))
+            except FileNotFoundError:
+                continue  # blob bị xoá/di chuyển trong lúc quét
+            result["checked"] += 1
+            if not ok:
+                result["corrupt"] += 1
+                target = self.quarantine(checksum)
+                logger.error(f"Image blob {checksum} is corrupt, moved to {target}")
+        result["seconds"] = round(time.monotonic() - started, 1)
+        self.last_scrub = dict(result, finished_at=time.time())
+        logger.info(f"Image store scrub: {result}")
+        return result
+
+    def cleanup_tmp(self, older_than: float = 3600) -> int:
+        """Delete temp files of uploads that never finished (process killed)"""
+        removed = 0
+        cutoff = time.time() - older_than
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _try_lock(self):
+        """Non-blocking lock so that only one process scrubs; None if held elsewhere"""
+        handle = open(os.path.join(self.root, ".scrub.lock"), "a+")
+        if not try_lock(handle):
+            handle.close()
+            return None
+        return handle
+
+    def _scrub_loop(self, interval: float, rate_limit: float):
+        lock = None
+        while not self._scrub_stop.is_set():
+            if lock is None:
+                lock = self._try_lock()
+            if lock is not None:
+                try:
+                    self.cleanup_tmp()
+                    self.scrub(rate_limit, self._scrub_stop)
+                except Exception as e:
+                    logger.error(f"Image store scrub failed: {e}")
+            self._scrub_stop.wait(interval)
+        if lock is not None:
+            lock.close()
+
+    def start_scrubber(self, interval: float, rate_limit: float = 0):
+        """Scrub every ``interval`` seconds in a background thread (idempotent)"""
+        if self._scrub_thread is not None and self._scrub_thread.is_alive():
+            return
+        self._scrub_stop.clear()
+        self._scrub_thread = threading.Thread(
+            target=self._scrub_loop, args=(interval, rate_limit), name="image-scrubber", daemon=True
+        )
+        self._scrub_thread.start()
+
+    def stop_scrubber(self):
+        self._scrub_stop.set()
+        if self._scrub_thread is not None:
+            self._scrub_thread.join(5)
+            self._scrub_thread = None
+
+
+def store_from_config(config) -> ImageStore:
+    return ImageStore(
+        config.IMAGE_STORE_ROOT,
+        chunk_size=config.IMAGE_STORE_CHUNK_SIZE,
+        fsync=config.IMAGE_STORE_FSYNC,
+    )
+
+
+def init_image_store(app) -> ImageStore:
+    """
+    Open the store from app.config and start the scrubber if enabled
+
+    Args:
+        app: Flask application instance
+    """
+    store = ImageStore(
+        app.config.get("IMAGE_STORE_ROOT"),
+        chunk_size=app.config.get("IMAGE_STORE_CHUNK_SIZE", DEFAULT_CHUNK_SIZE),
+        fsync=app.config.get("IMAGE_STORE_FSYNC", True),
+    )
+    interval = app.config.get("IMAGE_SCRUB_INTERVAL", 0)
+    if interval > 0:
+        store.start_scrubber(interval, app.config.get("IMAGE_SCRUB_RATE_MB", 20) * 1024 * 1024)
+    app.extensions["image_store"] = store
+    return store
+
+
+def get_image_store() -> ImageStore:
+    return current_app.extensions["image_store"]
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="AURA image store maintenance")
+    parser.add_argument("command", choices=["scrub", "cleanup"])
+    parser.add_argument("--rate-mb", type=float, default=Config.IMAGE_SCRUB_RATE_MB, help="Read limit in MB/s (0 = unlimited)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = store_from_config(Config)
+    if args.command == "scrub":
+        print(store.scrub(args.rate_mb * 1024 * 1024))
+    else:
+        print(f"Removed {store.cleanup_tmp()} stale temp files")
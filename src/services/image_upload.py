@@ -0,0 +1,355 @@
+"""
+Streaming image uploads for AURA System
+
+multipart/form-data bodies are decoded as a stream (werkzeug's sansio
+MultipartDecoder fed from request.stream, never request.files): each file
+part is hashed and written to the image store chunk by chunk, so memory use
+per upload is one chunk whatever the image size. Size limits are checked
+from Content-Length before anything is read and again while reading, so an
+oversized upload is cut off at the limit.
+
+Backpressure: the body is only read as fast as it is written to disk (TCP
+flow control slows the client down), and each process accepts at most
+IMAGE_UPLOAD_MAX_CONCURRENT uploads at once; beyond that the client gets
+503 + Retry-After instead of tying up a worker.
+
+Large OCT volumes use resumable uploads: create an upload with its size,
+PATCH the bytes in any number of pieces (each at the current offset, which
+survives disconnects and is shared by all processes through the store
+directory), then complete it.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from flask import current_app
+from werkzeug.exceptions import ClientDisconnected, RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from services.image_store import ChecksumMismatchError, ImageStore, ImageTooLargeError, StoredBlob, try_lock
+
+UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+# Field text (imageType, patientId...) giữ trong memory: giới hạn nhỏ
+MAX_FIELD_SIZE = 64 * 1024
+MAX_FIELDS = 32
+
+
+class UploadError(Exception):
+    """Upload rejected; ``status`` is the HTTP status for the client"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadBusy(Exception):
+    """Too many uploads in progress in this process"""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Too many concurrent uploads")
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class UploadedFile:
+    field: str
+    filename: str
+    content_type: Optional[str]
+    blob: StoredBlob
+
+
+class UploadGate:
+    """Caps concurrent uploads per process (non-blocking: excess uploads get UploadBusy)"""
+
+    def __init__(self, max_concurrent: int, retry_after: int = 1):
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.rejected = 0
+
+    @contextmanager
+    def slot(self):
+        if not self._semaphore.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise UploadBusy(self.retry_after)
+        with self._lock:
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+            self._semaphore.release()
+
+
+def receive_multipart(stream: BinaryIO, boundary: bytes, store: ImageStore, max_file_size: int,
+                      max_request_size: int, max_files: int,
+                      chunk_size: int = 64 * 1024) -> Tuple[Dict[str, str], List[UploadedFile]]:
+    """
+    Decode a multipart/form-data body, streaming file parts into the store
+
+    Args:
+        stream: Request body (request.stream)
+        boundary: Multipart boundary from the Content-Type header
+
+    Returns:
+        tuple: (form fields, stored files in body order)
+
+    Raises:
+        UploadError: Malformed body (400) or a size limit exceeded (413)
+    """
+    decoder = MultipartDecoder(boundary, max_form_memory_size=MAX_FIELD_SIZE, max_parts=max_files + MAX_FIELDS)
+    fields: Dict[str, str] = {}
+    files: List[UploadedFile] = []
+    received = 0
+    part = None
+    writer = None
+    field_data = bytearray()
+    try:
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                chunk = stream.read(chunk_size)
+                received += len(chunk)
+                if received > max_request_size:
+                    raise UploadError(f"Upload larger than {max_request_size} bytes", 413)
+                # None = hết body: decoder báo ValueError nếu body bị cắt giữa chừng
+                decoder.receive_data(chunk or None)
+                continue
+            if isinstance(event, File):
+                if len(files) >= max_files:
+                    raise UploadError(f"At most {max_files} files per upload", 413)
+                part = event
+                writer = store.writer(max_file_size)
+            elif isinstance(event, Field):
+                part = event
+                field_data = bytearray()
+            elif isinstance(event, Data):
+                if writer is not None:
+                    writer.write(event.data)
+                    if not event.more_data:
+                        blob = writer.commit()
+                        writer = None
+                        files.append(UploadedFile(part.name, part.filename, part.headers.get("Content-Type"), blob))
+                else:
+                    field_data += event.data
+                    if len(field_data) > MAX_FIELD_SIZE:
+                        raise UploadError(f"Form field {part.name!r} too large", 413)
+                    if not event.more_data:
+                        fields[part.name] = field_data.decode("utf-8", "replace")
+            elif isinstance(event, Epilogue):
+                return fields, files
+    except ImageTooLargeError:
+        raise UploadError(f"Image larger than {max_file_size} bytes", 413)
+    except RequestEntityTooLarge:
+        raise UploadError("Too many parts or form field too large", 413)
+    except ValueError as e:
+        # Body multipart sai định dạng
+        raise UploadError(f"Invalid multipart body: {e}")
+    finally:
+        if writer is not None:
+            writer.abort()
+
+
+class ResumableUploads:
+    """
+    Resumable uploads kept in ``<store root>/uploads``
+
+    ``<id>.part`` holds the bytes received so far (its size is the offset),
+    ``<id>.json`` the declared size, checksum and owner. Uploads idle for
+    longer than ``ttl`` seconds are removed.
+    """
+
+    def __init__(self, store: ImageStore, max_size: int, ttl: float = 24 * 3600, chunk_size: int = 64 * 1024):
+        self.store = store
+        self.max_size = max_size
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self.directory = os.path.join(store.root, "uploads")
+        os.makedirs(self.directory, exist_ok=True)
+        self._last_cleanup = 0.0
+
+    def _paths(self, upload_id: str) -> Tuple[str, str]:
+        if not UPLOAD_ID.match(upload_id or ""):
+            raise UploadError("Upload not found", 404)
+        base = os.path.join(self.directory, upload_id)
+        return base + ".part", base + ".json"
+
+    def _meta(self, upload_id: str, owner: str) -> dict:
+        part_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise UploadError("Upload not found", 404)
+        # Upload của người khác cũng trả 404: không lộ id tồn tại
+        if meta.get("owner") != str(owner) or not os.path.exists(part_path):
+            raise UploadError("Upload not found", 404)
+        return meta
+
+    @contextmanager
+    def _locked(self, upload_id: str, mode: str = "r+b"):
+        part_path, _ = self._paths(upload_id)
+        with open(part_path, mode) as handle:
+            if not try_lock(handle):
+                raise UploadError("Another request is writing this upload", 409)
+            yield handle
+
+    def create(self, size: int, owner: str, checksum: Optional[str] = None) -> dict:
+        """
+        Start a resumable upload
+
+        Args:
+            size: Total size in bytes
+            checksum: Optional SHA-256, verified on completion
+        """
+        if size <= 0:
+            raise UploadError("size must be positive")
+        if size > self.max_size:
+            raise UploadError(f"Upload larger than {self.max_size} bytes", 413)
+        if time.time() - self._last_cleanup > 600:
+            self.cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._paths(upload_id)
+        open(part_path, "wb").close()
+        with open(meta_path, "w") as f:
+            json.dump({"size": size, "checksum": checksum, "owner": str(owner), "created_at": time.time()}, f)
+        return {"uploadId": upload_id, "offset": 0, "size": size}
+
+    def status(self, upload_id: str, owner: str) -> dict:
+        meta = self._meta(upload_id, owner)
+        part_path, _ = self._paths(upload_id)
+        return {"uploadId": upload_id, "offset": os.path.getsize(part_path), "size": meta["size"]}
+
+    def append(self, upload_id: str, owner: str, offset: int, stream: BinaryIO) -> int:
+        """
+        Append bytes at ``offset`` (must equal the current size)
+
+        Bytes received before a disconnect are kept, so the client resumes
+        from the offset returned by status().
+
+        Returns:
+            int: New offset
+        """
+        meta = self._meta(upload_id, owner)
+        with self._locked(upload_id) as handle:
+            handle.seek(0, os.SEEK_END)
+            current = handle.tell()
+            if offset != current:
+                raise UploadError(f"Offset mismatch: upload is at {current}", 409)
+            try:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    if current + len(chunk) > meta["size"]:
+                        handle.truncate(offset)
+                        raise UploadError(f"Data beyond the declared size of {meta['size']} bytes", 413)
+                    handle.write(chunk)
+                    current += len(chunk)
+            except ClientDisconnected:
+                pass
+            finally:
+                handle.flush()
+                if self.store.fsync:
+                    os.fsync(handle.fileno())
+        return current
+
+    def complete(self, upload_id: str, owner: str) -> StoredBlob:
+        """Move the finished upload into the store (checksum verified if declared)"""
+        meta = self._meta(upload_id, owner)
+        part_path, meta_path = self._paths(upload_id)
+        with self._locked(upload_id, "rb"):
+            received = os.path.getsize(part_path)
+            if received != meta["size"]:
+                raise UploadError(f"Upload incomplete: {received} of {meta['size']} bytes", 409)
+            try:
+                blob = self.store.adopt(part_path, meta.get("checksum"))
+            except ChecksumMismatchError as e:
+                os.unlink(meta_path)
+                raise UploadError(str(e))
+        os.unlink(meta_path)
+        return blob
+
+    def abort(self, upload_id: str, owner: str):
+        self._meta(upload_id, owner)
+        with self._locked(upload_id):
+            for path in self._paths(upload_id):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def cleanup_expired(self) -> int:
+        """Remove uploads without activity for ``ttl`` seconds"""
+        self._last_cleanup = time.time()
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for name in os.listdir(self.directory):
+            upload_id, ext = os.path.splitext(name)
+            if ext != ".json":
+                continue
+            part_path, meta_path = self._paths(upload_id)
+            try:
+                if os.path.getmtime(part_path if os.path.exists(part_path) else meta_path) >= cutoff:
+                    continue
+                for path in (part_path, meta_path):
+                    if os.path.exists(path):
+                        os.unlink(path)
+                removed += 1
+            except (FileNotFoundError, UploadError):
+                pass
+        return removed
+
+
+class ImageUploads:
+    """Upload limits, concurrency gate and resumable uploads of one app"""
+
+    def __init__(self, store: ImageStore, max_file_size: int, max_request_size: int, max_files: int,
+                 max_concurrent: int, resumable_max_size: int, resumable_ttl: float):
+        self.store = store
+        self.max_file_size = max_file_size
+        self.max_request_size = max_request_size
+        self.max_files = max_files
+        self.gate = UploadGate(max_concurrent)
+        self.resumable = ResumableUploads(store, resumable_max_size, resumable_ttl)
+
+    def receive_multipart(self, stream: BinaryIO, boundary: bytes):
+        return receive_multipart(stream, boundary, self.store, self.max_file_size,
+                                 self.max_request_size, self.max_files)
+
+
+def init_image_uploads(app) -> ImageUploads:
+    """
+    Create the upload service (after init_image_store)
+
+    Args:
+        app: Flask application instance
+    """
+    mb = 1024 * 1024
+    uploads = ImageUploads(
+        app.extensions["image_store"],
+        max_file_size=int(app.config.get("IMAGE_UPLOAD_MAX_FILE_MB", 50) * mb),
+        max_request_size=int(app.config.get("IMAGE_UPLOAD_MAX_REQUEST_MB", 200) * mb),
+        max_files=app.config.get("IMAGE_UPLOAD_MAX_FILES", 10),
+        max_concurrent=app.config.get("IMAGE_UPLOAD_MAX_CONCURRENT", 8),
+        resumable_max_size=int(app.config.get("IMAGE_UPLOAD_RESUMABLE_MAX_MB", 4096) * mb),
+        resumable_ttl=app.config.get("IMAGE_UPLOAD_RESUMABLE_TTL", 24 * 3600),
+    )
+    app.extensions["image_uploads"] = uploads
+    return uploads
+
+
+def get_image_uploads() -> ImageUploads:
+    return current_app.extensions["image_uploads"]
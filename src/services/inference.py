@@ -0,0 +1,541 @@
+"""
+Retinal image inference for AURA System
+
+Analysis jobs (services.analysis_queue) hand their retinal images to one
+process-wide InferencePipeline. Images of all jobs in flight go through a
+MicroBatcher: it groups them into batches of up to INFERENCE_MAX_BATCH_SIZE,
+waiting at most INFERENCE_MAX_WAIT_MS for a batch to fill, so the model runs
+on full batches (throughput per core) instead of one image at a time. Run
+the queue worker with several threads per process (ANALYSIS_WORKER_THREADS)
+so that more than one claimed batch feeds the batcher.
+
+Backends:
+    onnx   ONNX Runtime on CPU (optional dependencies: onnxruntime, numpy, pillow)
+    stub   deterministic scores derived from the image bytes, for tests and dev
+
+Results are written as analysis_results rows in bulk, in the transaction
+that marks the jobs done. Jobs whose images were already analysed with the
+same model and thresholds are answered from the result cache
+(services/result_cache.py) without running the model.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import insert, update
+
+from infrastructure.models.analysis_request_model import AnalysisRequestModel
+from infrastructure.models.analysis_result_model import AnalysisResultModel
+from infrastructure.models.retinal_image_model import RetinalImageModel
+from infrastructure.repositories.ai_model_repository import AIModelRepository
+from services.analysis_queue import PermanentJobError
+from services.result_cache import CachedResult, ResultCache, cache_from_config, load_thresholds, result_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LABELS = ("diabetic_retinopathy", "hypertensive_retinopathy", "glaucoma_suspect", "macular_degeneration")
+STUB_VERSION = "stub-1"
+
+
+class StubBackend:
+    """
+    Deterministic fake model: each label's score is taken from the SHA-256
+    of the label and the image bytes, so the same image always gets the
+    same scores. Never use it for real screenings.
+    """
+
+    def __init__(self, labels: Sequence[str] = DEFAULT_LABELS, version: str = STUB_VERSION):
+        self.labels = tuple(labels)
+        self.version = version
+
+    def prepare(self, image_bytes: bytes, image_type: str = "FUNDUS") -> bytes:
+        if not image_bytes:
+            raise PermanentJobError("Empty image")
+        return image_bytes
+
+    def predict(self, items: List[bytes]) -> List[Dict[str, float]]:
+        results = []
+        for data in items:
+            digest = hashlib.sha256(data).digest()
+            results.append({
+                label: int.from_bytes(hashlib.sha256(label.encode() + digest).digest()[:4], "big") / 0xFFFFFFFF
+                for label in self.labels
+            })
+        return results
+
+
+class OnnxBackend:
+    """
+    ONNX Runtime CPU backend
+
+    The model takes a float32 NCHW batch (RGB, ImageNet normalization) and
+    returns one row of per-label probabilities (or logits) per image.
+
+    Args:
+        model_path: .onnx file
+        labels: Label of each output column
+        version: Model version recorded on the analysis requests
+        input_size: Square input size in pixels
+        intra_op_threads: Threads per inference (0 = ONNX Runtime default);
+            with several worker processes, cores / processes
+        output_logits: Apply a sigmoid to the outputs
+    """
+
+    MEAN = (0.485, 0.456, 0.406)
+    STD = (0.229, 0.224, 0.225)
+
+    def __init__(self, model_path: str, labels: Sequence[str] = DEFAULT_LABELS, version: Optional[str] = None,
+                 input_size: int = 512, intra_op_threads: int = 0, output_logits: bool = False):
+        try:
+            import numpy as np
+            import onnxruntime as ort
+            from PIL import Image
+        except ImportError as e:
+            raise RuntimeError(
+                f"ONNX backend cần onnxruntime, numpy và pillow ({e}); cài thêm hoặc đặt INFERENCE_BACKEND=stub"
+            ) from e
+        self._np = np
+        self._image = Image
+        self.labels = tuple(labels)
+        self.version = version or os.path.splitext(os.path.basename(model_path))[0]
+        self.input_size = input_size
+        self.output_logits = output_logits
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self._mean = np.array(self.MEAN, dtype=np.float32).reshape(3, 1, 1)
+        self._std = np.array(self.STD, dtype=np.float32).reshape(3, 1, 1)
+
+    def prepare(self, image_bytes: bytes, image_type: str = "FUNDUS"):
+        """Decode, resize and normalize one image (runs in the job thread, not the batcher)"""
+        import io
+        np = self._np
+        try:
+            with self._image.open(io.BytesIO(image_bytes)) as image:
+                image = image.convert("RGB").resize((self.input_size, self.input_size), self._image.BILINEAR)
+                array = np.asarray(image, dtype=np.float32) / 255.0
+        except (OSError, ValueError) as e:
+            raise PermanentJobError(f"Cannot decode image: {e}") from e
+        return (array.transpose(2, 0, 1) - self._mean) / self._std
+
+    def predict(self, items: list) -> List[Dict[str, float]]:
+        np = self._np
+        outputs = self.session.run(None, {self.input_name: np.stack(items).astype(np.float32, copy=False)})[0]
+        if self.output_logits:
+            outputs = 1.0 / (1.0 + np.exp(-outputs))
+        return [dict(zip(self.labels, map(float, row))) for row in outputs]
+
+
+class MicroBatcher:
+    """
+    Groups single items from many threads into model batches
+
+    A batch is run as soon as it has ``max_batch_size`` items or its first
+    item has waited ``max_wait_ms``. The input queue is bounded, so
+    producers block when the model falls behind.
+
+    Args:
+        predict: Function running one batch (list of items -> list of results)
+        max_batch_size: Items per batch
+        max_wait_ms: Longest wait for a batch to fill
+        max_queue: Items waiting before submit() blocks
+    """
+
+    def __init__(self, predict: Callable[[list], list], max_batch_size: int = 16, max_wait_ms: float = 25,
+                 max_queue: int = 1024):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item) -> Future:
+        """Queue one item; the future resolves to its result"""
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def run_batch(self, batch: list):
+        items = [item for item, _ in batch]
+        try:
+            results = self.predict(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"Backend returned {len(results)} results for {len(items)} images")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if first is None:  # stop()
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    break
+                batch.append(item)
+            self.run_batch(batch)
+
+    def start(self):
+        """Start the batching thread (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        try:
+            self._queue.put_nowait(None)  # đánh thức thread đang chờ item
+        except queue.Full:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+
+def read_local_image(storage_url: str, root: str = "", store=None) -> bytes:
+    """
+    Read an image stored on local disk
+
+    Args:
+        storage_url: ``cas://sha256/...`` (image store), ``file://`` URL,
+            absolute or root-relative path
+        store: ImageStore resolving ``cas://`` URLs
+    """
+    if store is not None and store.checksum_from_url(storage_url):
+        try:
+            return store.read(storage_url)
+        except FileNotFoundError as e:
+            # Blob bị scrubber cách ly: upload lại cùng ảnh sẽ khôi phục
+            raise PermanentJobError(f"Image not found: {storage_url}") from e
+    path = storage_url[len("file://"):] if storage_url.startswith("file://") else storage_url
+    if root and not os.path.isabs(path):
+        path = os.path.join(root, path)
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError as e:
+        raise PermanentJobError(f"Image not found: {storage_url}") from e
+
+
+class InferencePipeline:
+    """
+    Analysis job handler: images -> micro-batched model -> analysis_results
+
+    A job's per-label score is the highest score over its images. A label is
+    predicted when its score reaches the threshold of the request's
+    threshold profile (``{"<label>": 0.6, ...}``, optional ``"high_risk"``),
+    else the defaults. Risk level: high if any score reaches high_risk,
+    medium if any label is predicted, otherwise low.
+
+    Args:
+        backend: StubBackend, OnnxBackend or any object with labels, version,
+            prepare(bytes, image_type) and predict(items)
+        batcher: MicroBatcher over backend.predict (one is created if None)
+        image_loader: storage_url -> image bytes
+        default_threshold: Threshold for labels missing from the profile
+        high_risk_threshold: Score from which the risk level is high
+        result_cache: ResultCache; jobs whose images (by checksum) were
+            already analysed with this model and thresholds reuse that result
+    """
+
+    def __init__(self, backend, batcher: Optional[MicroBatcher] = None,
+                 image_loader: Callable[[str], bytes] = read_local_image,
+                 default_threshold: float = 0.5, high_risk_threshold: float = 0.8,
+                 result_cache: Optional[ResultCache] = None):
+        self.backend = backend
+        self.batcher = batcher or MicroBatcher(backend.predict)
+        self.image_loader = image_loader
+        self.default_threshold = default_threshold
+        self.high_risk_threshold = high_risk_threshold
+        self.result_cache = result_cache
+        self.batcher.start()
+
+    def _thresholds(self, session, jobs: List[dict]) -> Dict[int, dict]:
+        return load_thresholds(session, (job.get("profile_id") for job in jobs))
+
+    def classify(self, scores: Dict[str, float], thresholds: Optional[dict] = None) -> dict:
+        """Labels and risk level for one job's aggregated scores"""
+        thresholds = thresholds or {}
+        labels = [
+            label for label, score in scores.items()
+            if score >= float(thresholds.get(label, self.default_threshold))
+        ]
+        high_risk = float(thresholds.get("high_risk", self.high_risk_threshold))
+        if any(score >= high_risk for score in scores.values()):
+            risk_level = "high"
+        elif labels:
+            risk_level = "medium"
+        else:
+            risk_level = "low"
+        return {"labels": labels, "risk_level": risk_level}
+
+    def _cached(self, session, jobs: List[dict], images, thresholds) -> Tuple[Dict[int, str], Dict[int, CachedResult]]:
+        """Cache key of each job whose images all have a checksum, and the jobs found in the cache"""
+        checksums: Dict[int, list] = {}
+        for _, request_id, _, _, checksum in images:
+            checksums.setdefault(request_id, []).append(checksum)
+        keys, hits = {}, {}
+        for job in jobs:
+            job_checksums = checksums.get(job["id"])
+            if not job_checksums or not all(job_checksums):
+                continue
+            keys[job["id"]] = key = result_key(
+                job_checksums, self.backend.version, thresholds.get(job.get("profile_id")),
+                self.default_threshold, self.high_risk_threshold,
+            )
+            cached = self.result_cache.lookup(session, key)
+            if cached is not None:
+                hits[job["id"]] = cached
+        return keys, hits
+
+    def handle_batch(self, session, jobs: List[dict]) -> List[Optional[Exception]]:
+        """
+        AnalysisWorker handler: run every image of the jobs and add the results
+
+        Writes into ``session`` without committing (the worker commits them
+        with the done status). Jobs found in the result cache get a copy of
+        the cached result without running the model.
+
+        Returns:
+            list: None or the error of each job
+        """
+        job_ids = [job["id"] for job in jobs]
+        images = session.query(
+            RetinalImageModel.id, RetinalImageModel.request_id, RetinalImageModel.image_type,
+            RetinalImageModel.storage_url, RetinalImageModel.checksum
+        ).filter(RetinalImageModel.request_id.in_(job_ids)).order_by(RetinalImageModel.id).all()
+        thresholds = self._thresholds(session, jobs)
+        keys, hits = self._cached(session, jobs, images, thresholds) if self.result_cache else ({}, {})
+
+        errors: Dict[int, Exception] = {}
+        pending: Dict[int, list] = {job_id: [] for job_id in job_ids}
+        # Đọc + tiền xử lý ở thread của job; batcher chỉ chạy model
+        for image_id, request_id, image_type, storage_url, _ in images:
+            if request_id in errors:
+                continue
+            if request_id in hits:
+                pending[request_id].append((image_id, None))
+                continue
+            try:
+                item = self.backend.prepare(self.image_loader(storage_url), image_type)
+            except Exception as e:
+                errors[request_id] = e
+                continue
+            pending[request_id].append((image_id, self.batcher.submit(item)))
+
+        now = datetime.utcnow()
+        rows, computed, done_ids, checked_image_ids = [], [], [], []
+        for job in jobs:
+            job_id = job["id"]
+            if job_id in errors:
+                continue
+            if not pending[job_id]:
+                errors[job_id] = PermanentJobError("Analysis request has no images")
+                continue
+            if job_id in hits:
+                done_ids.append(job_id)
+                checked_image_ids += [image_id for image_id, _ in pending[job_id]]
+                continue
+            try:
+                per_image = [future.result() for _, future in pending[job_id]]
+            except Exception as e:
+                errors[job_id] = e
+                continue
+            scores = {label: round(max(s[label] for s in per_image), 4) for label in self.backend.labels}
+            outcome = self.classify(scores, thresholds.get(job.get("profile_id")))
+            rows.append({
+                "request_id": job_id,
+                "risk_level": outcome["risk_level"],
+                "predicted_labels_json": json.dumps({
+                    "labels": outcome["labels"],
+                    "scores": scores,
+                    "model_version": self.backend.version,
+                    "images": len(per_image),
+                }),
+                "generated_at": now,
+                "status": "created",
+            })
+            computed.append(job_id)
+            done_ids.append(job_id)
+            checked_image_ids += [image_id for image_id, _ in pending[job_id]]
+
+        if rows:
+            if self.result_cache is None:
+                session.execute(insert(AnalysisResultModel), rows)
+            else:
+                result_ids = session.execute(
+                    insert(AnalysisResultModel).returning(AnalysisResultModel.id, sort_by_parameter_order=True), rows
+                ).scalars().all()
+                self.result_cache.store(session, [
+                    (keys[job_id], CachedResult(result_id, row["risk_level"], row["predicted_labels_json"], self.backend.version))
+                    for job_id, result_id, row in zip(computed, result_ids, rows) if job_id in keys
+                ])
+        if hits:
+            self.result_cache.apply(session, [(job_id, hits[job_id]) for job_id in job_ids if job_id in hits])
+        if done_ids:
+            session.execute(
+                update(RetinalImageModel).where(RetinalImageModel.id.in_(checked_image_ids)).values(checked_at=now)
+            )
+            # Ghi lại version model thực sự tạo ra kết quả
+            session.execute(
+                update(AnalysisRequestModel).where(AnalysisRequestModel.id.in_(done_ids))
+                .values(model_version=self.backend.version)
+            )
+        return [errors.get(job_id) for job_id in job_ids]
+
+    def close(self):
+        self.batcher.stop()
+
+
+def configured_model_version(backend: str, model_path: str, version: str = "") -> Optional[str]:
+    """
+    Version of the configured model when none is deployed in ai_models
+
+    INFERENCE_MODEL_VERSION, else the model file name (OnnxBackend's
+    default), so the upload routes build the same result cache keys as the
+    workers without loading the model.
+    """
+    if version:
+        return version
+    if backend == "stub":
+        return STUB_VERSION
+    if model_path:
+        return os.path.splitext(os.path.basename(model_path))[0]
+    return None
+
+
+def resolve_model_version(session_factory, config) -> Optional[str]:
+    """
+    Version the worker records and caches results under
+
+    The deployed ai_models version, the same one ResultCache.model_version()
+    gives the upload routes, else configured_model_version(). Read once when
+    the pipeline is built: restart the workers after deploying a model.
+    """
+    session = session_factory()
+    try:
+        deployed = AIModelRepository(session).deployed_version()
+    except Exception as e:
+        logger.warning(f"Could not read the deployed model version: {e}")
+        deployed = None
+    finally:
+        session.close()
+    return deployed or configured_model_version(
+        config.INFERENCE_BACKEND, config.INFERENCE_MODEL_PATH, config.INFERENCE_MODEL_VERSION
+    )
+
+
+def create_backend(config, version: Optional[str] = None):
+    """
+    Backend from INFERENCE_* settings
+
+    Args:
+        version: Model version to record (default: INFERENCE_MODEL_VERSION,
+            else the backend's own default)
+    """
+    labels = [label.strip() for label in config.INFERENCE_LABELS.split(",") if label.strip()]
+    version = version or config.INFERENCE_MODEL_VERSION or None
+    if config.INFERENCE_BACKEND == "stub":
+        logger.warning("INFERENCE_BACKEND=stub: analysis results are NOT real model predictions")
+        return StubBackend(labels, version or STUB_VERSION)
+    if config.INFERENCE_BACKEND == "onnx":
+        if not config.INFERENCE_MODEL_PATH:
+            raise RuntimeError("INFERENCE_MODEL_PATH is required for INFERENCE_BACKEND=onnx")
+        return OnnxBackend(
+            config.INFERENCE_MODEL_PATH,
+            labels,
+            version=version,
+            input_size=config.INFERENCE_INPUT_SIZE,
+            intra_op_threads=config.INFERENCE_THREADS,
+            output_logits=config.INFERENCE_OUTPUT_LOGITS,
+        )
+    raise RuntimeError(f"Unknown INFERENCE_BACKEND: {config.INFERENCE_BACKEND}")
+
+
+def create_pipeline(config, session_factory=None) -> InferencePipeline:
+    """InferencePipeline from INFERENCE_* settings"""
+    from services.image_store import store_from_config
+
+    if session_factory is None:
+        from infrastructure.databases.mssql import SessionFactory
+        session_factory = SessionFactory
+    backend = create_backend(config, resolve_model_version(session_factory, config))
+    store = store_from_config(config)
+    return InferencePipeline(
+        backend,
+        MicroBatcher(backend.predict, config.INFERENCE_MAX_BATCH_SIZE, config.INFERENCE_MAX_WAIT_MS),
+        image_loader=lambda url: read_local_image(url, config.INFERENCE_IMAGE_ROOT, store),
+        default_threshold=config.INFERENCE_DEFAULT_THRESHOLD,
+        high_risk_threshold=config.INFERENCE_HIGH_RISK_THRESHOLD,
+        result_cache=cache_from_config(config),
+    )
+
+
+_pipeline: Optional[InferencePipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> InferencePipeline:
+    """Process-wide pipeline, created on first use (one model per worker process)"""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                from config import Config
+                _pipeline = create_pipeline(Config)
+    return _pipeline
+
+
+def warm_up():
+    """Build the pipeline (load the model) before the worker claims any job"""
+    get_pipeline()
+
+
+def handle_batch(session, jobs: List[dict]) -> List[Optional[Exception]]:
+    """Default ANALYSIS_JOB_HANDLER"""
+    return get_pipeline().handle_batch(session, jobs)
@@ -0,0 +1,447 @@
+"""
+Prometheus metrics for AURA System
+
+Request counters and latency histograms are recorded into per-thread shards
+(no lock on the request path) and merged when /metrics is scraped. Gauges
+(DB pool, bcrypt queue, JWT cache, email outbox, analysis queue) are read at
+scrape time, as are counters kept by other components (JWT and result cache hits/misses).
+
+With several gunicorn workers, set METRICS_MULTIPROC_DIR: every worker
+writes its snapshot to ``<dir>/worker-<pid>.json`` and /metrics, whichever
+worker answers it, sums the counters/histograms of all workers. Gauges of
+workers that are no longer running are dropped; their counters are kept so
+totals never go backwards.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app, g, request
+
+logger = logging.getLogger(__name__)
+
+# Bucket latency (giây), theo mặc định của client Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS_TOTAL = "aura_http_requests_total"
+REQUEST_DURATION = "aura_http_request_duration_seconds"
+
+HELP = {
+    REQUESTS_TOTAL: ("counter", "HTTP requests by blueprint, endpoint, method and status"),
+    REQUEST_DURATION: ("histogram", "HTTP request latency in seconds"),
+    "aura_db_pool_size": ("gauge", "Connections kept in the SQLAlchemy pool"),
+    "aura_db_pool_checked_out": ("gauge", "SQLAlchemy connections currently checked out"),
+    "aura_db_pool_overflow": ("gauge", "SQLAlchemy connections opened beyond pool_size"),
+    "aura_password_hash_in_flight": ("gauge", "bcrypt jobs running or waiting"),
+    "aura_password_hash_capacity": ("gauge", "Maximum bcrypt jobs running or waiting"),
+    "aura_jwt_cache_hits_total": ("counter", "Verified-JWT cache hits"),
+    "aura_jwt_cache_misses_total": ("counter", "Verified-JWT cache misses"),
+    "aura_jwt_cache_hit_ratio": ("gauge", "Verified-JWT cache hit ratio"),
+    "aura_email_outbox_messages": ("gauge", "Email outbox messages by status"),
+    "aura_analysis_requests": ("gauge", "Analysis requests (job queue) by status"),
+    "aura_result_cache_hits_total": ("counter", "Analysis result cache hits by tier (memory, db)"),
+    "aura_result_cache_misses_total": ("counter", "Analysis result cache misses"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Shard:
+    """Counters and histograms written by one thread only"""
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], list] = {}  # [bucket counts..., sum, count]
+
+
+class MetricsRegistry:
+    """
+    In-process metrics of one worker
+
+    Each thread writes to its own shard, so recording needs no lock;
+    collect() merges the shards. Gauge callbacks are evaluated at collect time.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+        self._gauges: List[Callable[[], Iterable[Tuple[str, Labels, float]]]] = []
+        self._counters: List[Callable[[], Iterable[Tuple[str, Labels, float]]]] = []
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: Labels, value: float):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        data = histograms.get(key)
+        if data is None:
+            data = histograms[key] = [0] * (len(self.buckets) + 3)
+        # Bucket không cộng dồn ở đây; render() cộng dồn theo chuẩn "le"
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        data[index] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def observe_request(self, blueprint: str, endpoint: str, method: str, status: int, seconds: float):
+        self.inc(REQUESTS_TOTAL, (("blueprint", blueprint), ("endpoint", endpoint),
+                                  ("method", method), ("status", str(status))))
+        self.observe(REQUEST_DURATION, (("blueprint", blueprint), ("endpoint", endpoint)), seconds)
+
+    def register_gauge(self, callback: Callable[[], Iterable[Tuple[str, Labels, float]]]):
+        """Add a callback returning (name, labels, value) samples at scrape time"""
+        self._gauges.append(callback)
+
+    def register_counter(self, callback: Callable[[], Iterable[Tuple[str, Labels, float]]]):
+        """
+        Add a callback returning (name, labels, total) samples of a counter kept elsewhere
+
+        The totals must only grow for the life of the process; they are exported
+        as counters, so the samples of a dead worker stay in the multiprocess sum.
+        """
+        self._counters.append(callback)
+
+    def collect(self) -> dict:
+        """
+        Snapshot of this worker
+
+        Returns:
+            dict: {"counters": {key: value}, "histograms": {key: [...]}, "gauges": {key: value}}
+        """
+        counters, histograms, gauges = {}, {}, {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # Copy trước khi đọc: thread chủ của shard có thể đang ghi
+            for key, value in list(shard.counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, data in list(shard.histograms.items()):
+                merged = histograms.setdefault(key, [0] * len(data))
+                for i, value in enumerate(list(data)):
+                    merged[i] += value
+        for callback in self._counters:
+            try:
+                for name, labels, value in callback():
+                    counters[(name, labels)] = counters.get((name, labels), 0) + value
+            except Exception as e:
+                logger.warning(f"Metrics counter callback failed: {e}")
+        for callback in self._gauges:
+            try:
+                for name, labels, value in callback():
+                    gauges[(name, labels)] = value
+            except Exception as e:
+                logger.warning(f"Metrics gauge callback failed: {e}")
+        return {"counters": counters, "histograms": histograms, "gauges": gauges}
+
+
+def _encode(samples: dict) -> list:
+    return [[name, [list(pair) for pair in labels], value] for (name, labels), value in samples.items()]
+
+
+def _decode(items: list) -> dict:
+    return {(name, tuple(tuple(pair) for pair in labels)): value for name, labels, value in items}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MultiprocessStore:
+    """Snapshot files of every worker in one directory (METRICS_MULTIPROC_DIR)"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, snapshot: dict, pid: Optional[int] = None):
+        pid = pid or os.getpid()
+        path = os.path.join(self.directory, f"worker-{pid}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        payload = {
+            "pid": pid,
+            "counters": _encode(snapshot["counters"]),
+            "histograms": _encode(snapshot["histograms"]),
+            "gauges": _encode(snapshot["gauges"]),
+        }
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)  # ghi nguyên tử: reader không thấy file dở
+
+    def read_all(self) -> dict:
+        """Sum counters/histograms of every file; gauges of live workers get a pid label"""
+        counters, histograms, gauges = {}, {}, {}
+        for name in os.listdir(self.directory):
+            if not (name.startswith("worker-") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    payload = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for key, value in _decode(payload["counters"]).items():
+                counters[key] = counters.get(key, 0) + value
+            for key, data in _decode(payload["histograms"]).items():
+                merged = histograms.setdefault(key, [0] * len(data))
+                for i, value in enumerate(data):
+                    merged[i] += value
+            if _pid_alive(payload["pid"]):
+                for (metric, labels), value in _decode(payload["gauges"]).items():
+                    gauges[(metric, labels + (("pid", str(payload["pid"])),))] = value
+        return {"counters": counters, "histograms": histograms, "gauges": gauges}
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render(snapshot: dict, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, extra_gauges: Optional[dict] = None) -> str:
+    """Prometheus text exposition format (version 0.0.4)"""
+    samples: Dict[str, List[str]] = {}
+
+    for (name, labels), value in sorted(snapshot["counters"].items()):
+        samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    for (name, labels), data in sorted(snapshot["histograms"].items()):
+        lines = samples.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(buckets + (float("inf"),), data[:-2]):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {int(cumulative)}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(data[-2])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {int(data[-1])}")
+
+    for (name, labels), value in sorted({**snapshot["gauges"], **(extra_gauges or {})}.items()):
+        samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    output = []
+    for name in sorted(samples):
+        kind, help_text = HELP.get(name, ("untyped", name))
+        output.append(f"# HELP {name} {help_text}")
+        output.append(f"# TYPE {name} {kind}")
+        output.extend(samples[name])
+    return "\n".join(output) + "\n"
+
+
+class Metrics:
+    """
+    Metrics of the app: registry, optional multiprocess store and flush thread
+
+    Args:
+        multiproc_dir: Shared directory for gunicorn workers (None = single process)
+        flush_interval: Seconds between snapshot writes in multiprocess mode
+    """
+
+    def __init__(self, multiproc_dir: Optional[str] = None, flush_interval: float = 5):
+        self.registry = MetricsRegistry()
+        self.store = MultiprocessStore(multiproc_dir) if multiproc_dir else None
+        self.flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._global_gauges: List[Callable[[], Iterable[Tuple[str, Labels, float]]]] = []
+
+    def register_global_gauge(self, callback):
+        """Gauge that is the same for every worker (e.g. read from the DB); not labelled by pid"""
+        self._global_gauges.append(callback)
+
+    def flush(self):
+        if self.store is not None:
+            self.store.write(self.registry.collect())
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Metrics flush failed: {e}")
+
+    def start(self):
+        """Start the flush thread (multiprocess mode only, idempotent)"""
+        if self.store is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def render(self) -> str:
+        if self.store is not None:
+            self.flush()  # số liệu mới nhất của worker đang trả lời
+            snapshot = self.store.read_all()
+        else:
+            snapshot = self.registry.collect()
+        extra = {}
+        for callback in self._global_gauges:
+            try:
+                for name, labels, value in callback():
+                    extra[(name, labels)] = value
+            except Exception as e:
+                logger.warning(f"Metrics gauge callback failed: {e}")
+        return render(snapshot, self.registry.buckets, extra)
+
+
+def _pool_gauges(engines: Dict[str, object]):
+    def collect():
+        for role, bound in engines.items():
+            pool = bound.pool
+            labels = (("engine", role),)
+            for name, method in (("aura_db_pool_size", "size"), ("aura_db_pool_checked_out", "checkedout"),
+                                 ("aura_db_pool_overflow", "overflow")):
+                fn = getattr(pool, method, None)
+                if fn is not None:
+                    yield name, labels, max(fn(), 0)
+    return collect
+
+
+def _password_hasher_gauges():
+    from services.password_hasher import password_hasher
+    yield "aura_password_hash_in_flight", (), password_hasher.in_flight
+    yield "aura_password_hash_capacity", (), password_hasher.capacity
+
+
+def _jwt_cache_counters(app):
+    def collect():
+        cache = app.extensions["token_service"].cache
+        yield "aura_jwt_cache_hits_total", (), cache.hits
+        yield "aura_jwt_cache_misses_total", (), cache.misses
+    return collect
+
+
+def _jwt_cache_gauges(app):
+    def collect():
+        cache = app.extensions["token_service"].cache
+        total = cache.hits + cache.misses
+        yield "aura_jwt_cache_hit_ratio", (), cache.hits / total if total else 0.0
+    return collect
+
+
+def _result_cache_counters(app):
+    def collect():
+        cache = app.extensions["result_cache"]
+        stats = cache.stats()
+        yield "aura_result_cache_hits_total", (("tier", "memory"),), stats["memory_hits"]
+        yield "aura_result_cache_hits_total", (("tier", "db"),), stats["db_hits"]
+        yield "aura_result_cache_misses_total", (), stats["misses"]
+    return collect
+
+
+def _email_outbox_gauges(session_factory):
+    def collect():
+        from infrastructure.repositories.email_outbox_repository import EmailOutboxRepository
+        session = session_factory()
+        try:
+            counts = EmailOutboxRepository(session).count_by_status()
+        finally:
+            session.close()
+        for status in ("pending", "sending", "sent", "dead"):
+            yield "aura_email_outbox_messages", (("status", status),), counts.get(status, 0)
+    return collect
+
+
+def _analysis_queue_gauges(session_factory):
+    def collect():
+        from infrastructure.repositories.analysis_request_repository import AnalysisRequestRepository, STATUSES
+        session = session_factory()
+        try:
+            counts = AnalysisRequestRepository(session).count_by_status()
+        finally:
+            session.close()
+        for status in STATUSES:
+            yield "aura_analysis_requests", (("status", status),), counts.get(status, 0)
+    return collect
+
+
+def init_metrics(app) -> Metrics:
+    """
+    Record request metrics and register the built-in gauges
+
+    Args:
+        app: Flask application instance (after init_db_app/init_token_service)
+    """
+    from infrastructure.databases.mssql import SessionFactory, engine, read_engines
+
+    metrics = Metrics(
+        multiproc_dir=app.config.get("METRICS_MULTIPROC_DIR") or None,
+        flush_interval=app.config.get("METRICS_FLUSH_INTERVAL", 5),
+    )
+    engines = {"writer": engine}
+    for i, reader in enumerate(r for r in read_engines if r is not engine):
+        engines[f"reader{i}"] = reader
+    metrics.registry.register_gauge(_pool_gauges(engines))
+    metrics.registry.register_gauge(_password_hasher_gauges)
+    if "token_service" in app.extensions:
+        metrics.registry.register_counter(_jwt_cache_counters(app))
+        metrics.registry.register_gauge(_jwt_cache_gauges(app))
+    if app.extensions.get("result_cache") is not None:
+        metrics.registry.register_counter(_result_cache_counters(app))
+    metrics.register_global_gauge(_email_outbox_gauges(SessionFactory))
+    metrics.register_global_gauge(_analysis_queue_gauges(SessionFactory))
+
+    @app.before_request
+    def start_metrics_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.get("metrics_start")
+        if start is not None:
+            endpoint = request.endpoint or "unmatched"
+            metrics.registry.observe_request(
+                request.blueprint or "", endpoint, request.method, response.status_code,
+                time.perf_counter() - start,
+            )
+        return response
+
+    metrics.start()
+    app.extensions["metrics"] = metrics
+    return metrics
+
+
+def get_metrics() -> Metrics:
+    return current_app.extensions["metrics"]
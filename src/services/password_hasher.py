@@ -0,0 +1,181 @@
+"""
+Password Hashing Executor for AURA System
+Runs bcrypt hashing/verification in a bounded process pool so that CPU-heavy
+password work cannot starve the web workers serving the rest of the API.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from domain.security import password as password_security
+from services.request_profiler import span
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full (or a job timed out) and the request should be retried later"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(f"Password hasher is busy, retry after {retry_after}s")
+
+
+class PasswordHasher:
+    """
+    Bounded executor for bcrypt work.
+
+    At most ``max_workers`` jobs run at once and at most ``queue_size`` more may
+    wait for a free worker. Anything beyond that is rejected immediately with
+    ``PasswordHasherBusy`` instead of queueing without limit.
+
+    ``max_workers=0`` runs bcrypt inline on the calling thread (testing/dev).
+    """
+
+    def __init__(self):
+        self.max_workers = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+        self.queue_size = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 32))
+        self.timeout = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+        self.retry_after = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", 1))
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def configure(self, max_workers: int = None, queue_size: int = None,
+                  timeout: float = None, retry_after: int = None):
+        """
+        Override the limits (called from create_app with values from app.config)
+
+        Args:
+            max_workers: Number of worker processes (0 = run inline)
+            queue_size: Number of jobs allowed to wait for a worker
+            timeout: Seconds to wait for a job before giving up
+            retry_after: Value of the Retry-After header when busy
+        """
+        with self._lock:
+            if max_workers is not None and max_workers != self.max_workers:
+                self._shutdown_executor()
+                self.max_workers = max_workers
+            if queue_size is not None:
+                self.queue_size = queue_size
+            if timeout is not None:
+                self.timeout = timeout
+            if retry_after is not None:
+                self.retry_after = retry_after
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of jobs running or waiting at the same time"""
+        return self.max_workers + self.queue_size
+
+    @property
+    def in_flight(self) -> int:
+        """Number of jobs currently running or waiting"""
+        return self._in_flight
+
+    def hash_password(self, password: str, rounds: int = password_security.DEFAULT_HASH_ROUNDS) -> str:
+        """
+        Hash a password with bcrypt
+
+        Args:
+            password: Plain text password
+            rounds: bcrypt cost factor
+
+        Raises:
+            PasswordHasherBusy: If the queue is full or the job timed out
+        """
+        return self._run(password_security.hash_password, password, rounds)
+
+    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Check a password against a bcrypt hash
+
+        Raises:
+            PasswordHasherBusy: If the queue is full or the job timed out
+        """
+        return self._run(password_security.verify_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            self._shutdown_executor()
+
+    def _run(self, fn, *args):
+        # Span "bcrypt" gồm cả thời gian chờ trong hàng đợi của pool
+        with span("bcrypt"):
+            if self.max_workers <= 0:
+                return fn(*args)
+
+            future = self._submit(fn, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                logger.warning(f"Password hashing job timed out after {self.timeout}s")
+                raise PasswordHasherBusy(self.retry_after)
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                logger.warning(f"Password hasher queue full ({self._in_flight}/{self.capacity}), rejecting request")
+                raise PasswordHasherBusy(self.retry_after)
+            self._in_flight += 1
+
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died (OOM kill...). Start a fresh pool and try once more.
+                logger.error("Password hashing pool is broken, restarting it")
+                self._shutdown_executor()
+                try:
+                    future = self._get_executor().submit(fn, *args)
+                except Exception:
+                    self._in_flight -= 1
+                    raise
+            except Exception:
+                self._in_flight -= 1
+                raise
+
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Worker processes are created lazily so importing this module stays cheap
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            logger.info(f"Password hashing pool started ({self.max_workers} workers, queue {self.queue_size})")
+        return self._executor
+
+    def _shutdown_executor(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def init_password_hasher(app):
+    """
+    Apply PASSWORD_HASH_* settings from the Flask config to the shared hasher
+
+    Args:
+        app: Flask application instance
+    """
+    password_hasher.configure(
+        max_workers=app.config.get("PASSWORD_HASH_WORKERS"),
+        queue_size=app.config.get("PASSWORD_HASH_QUEUE_SIZE"),
+        timeout=app.config.get("PASSWORD_HASH_TIMEOUT"),
+        retry_after=app.config.get("PASSWORD_HASH_RETRY_AFTER"),
+    )
+
+
+# Initialize the password hasher
+password_hasher = PasswordHasher()
+atexit.register(password_hasher.shutdown)
@@ -0,0 +1,234 @@
+"""
+Password Hash Policy for AURA System
+Chooses the bcrypt cost factor for this host and detects hashes that need
+to be upgraded (or downgraded) to it.
+
+Run ``python -m services.password_policy`` to print the chosen cost and the
+cost distribution of the stored ``users.password_hash`` values.
+"""
+
+import json
+import logging
+import os
+import stat
+import time
+from typing import Dict, Optional
+
+import bcrypt
+
+from domain.security.password import DEFAULT_HASH_ROUNDS, get_hash_rounds
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARGET_MS = 250.0  # Ngân sách thời gian cho một lần băm
+DEFAULT_MAX_ROUNDS = 15
+
+# bcrypt cost dùng để đo tốc độ máy; cost cao hơn được ngoại suy (mỗi +1 gấp đôi thời gian)
+PROBE_ROUNDS = 8
+PROBE_SAMPLES = 3
+CALIBRATION_MAX_AGE = 24 * 3600
+# Mặc định: data/ của project (cạnh kho ảnh), không phải thư mục temp dùng chung
+DEFAULT_CALIBRATION_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "bcrypt_calibration.json"
+)
+
+
+class PasswordHashPolicy:
+    """
+    Decides which bcrypt cost factor new hashes use.
+
+    The cost is either fixed (``rounds``) or calibrated: the host is
+    benchmarked once and the highest cost between ``min_rounds`` and
+    ``max_rounds`` whose estimated hash time fits ``target_ms`` is used.
+    ``min_rounds`` is a security floor and is kept even on slow hosts.
+    """
+
+    def __init__(self):
+        self.target_ms = DEFAULT_TARGET_MS
+        self.min_rounds = DEFAULT_HASH_ROUNDS
+        self.max_rounds = DEFAULT_MAX_ROUNDS
+        self.rounds = DEFAULT_HASH_ROUNDS
+        self.calibrated = False
+
+    def configure(self, rounds: Optional[int] = None, target_ms: Optional[float] = None,
+                  min_rounds: Optional[int] = None, max_rounds: Optional[int] = None,
+                  calibration_file: Optional[str] = None) -> int:
+        """
+        Apply settings and pick the cost factor
+
+        Args:
+            rounds: Fixed cost factor (skips the benchmark)
+            target_ms: Latency budget for one hash in milliseconds
+            min_rounds: Lowest cost the benchmark may choose
+            max_rounds: Highest cost the benchmark may choose
+            calibration_file: Where the benchmark result is shared between workers
+
+        Returns:
+            int: The cost factor in use
+        """
+        if target_ms is not None:
+            self.target_ms = target_ms
+        if min_rounds is not None:
+            self.min_rounds = min_rounds
+        if max_rounds is not None:
+            self.max_rounds = max(max_rounds, self.min_rounds)
+
+        if rounds:
+            self.rounds = rounds
+            self.calibrated = False
+        else:
+            self.rounds = self._load_or_calibrate(calibration_file)
+            self.calibrated = True
+
+        logger.info(f"Password hash policy: bcrypt cost {self.rounds} "
+                    f"({'calibrated' if self.calibrated else 'fixed'}, target {self.target_ms}ms)")
+        return self.rounds
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """
+        Check whether a stored hash uses a different cost than the policy
+
+        Args:
+            hashed_password: Stored bcrypt hash
+
+        Returns:
+            bool: True if the hash should be replaced after a successful login
+        """
+        cost = get_hash_rounds(hashed_password)
+        return cost is not None and cost != self.rounds
+
+    def calibrate(self) -> int:
+        """
+        Benchmark bcrypt on this host and choose the cost factor
+
+        Returns:
+            int: Highest cost in [min_rounds, max_rounds] that fits target_ms
+        """
+        probe_ms = self.measure_ms(PROBE_ROUNDS)
+        chosen = self.min_rounds
+        for rounds in range(self.min_rounds, self.max_rounds + 1):
+            estimated_ms = probe_ms * (2 ** (rounds - PROBE_ROUNDS))
+            if estimated_ms <= self.target_ms:
+                chosen = rounds
+            else:
+                break
+
+        logger.info(f"bcrypt benchmark: cost {PROBE_ROUNDS} took {probe_ms:.1f}ms, "
+                    f"chose cost {chosen} for target {self.target_ms}ms")
+        return chosen
+
+    @staticmethod
+    def measure_ms(rounds: int, samples: int = PROBE_SAMPLES) -> float:
+        """Best-of-N time (ms) of one bcrypt hash at the given cost"""
+        salt = bcrypt.gensalt(rounds=rounds)
+        best = float("inf")
+        for _ in range(samples):
+            start = time.perf_counter()
+            bcrypt.hashpw(b"aura-calibration-password", salt)
+            best = min(best, time.perf_counter() - start)
+        return best * 1000
+
+    def _load_or_calibrate(self, calibration_file: Optional[str]) -> int:
+        # Mọi gunicorn worker trên cùng host phải chọn cùng một cost, nếu không
+        # mỗi lần đăng nhập ở worker khác sẽ băm lại mật khẩu.
+        path = calibration_file or DEFAULT_CALIBRATION_FILE
+        settings = {"target_ms": self.target_ms, "min_rounds": self.min_rounds, "max_rounds": self.max_rounds}
+
+        cached = self._read_calibration(path)
+        if cached is not None:
+            try:
+                fresh = time.time() - cached.get("created_at", 0) < CALIBRATION_MAX_AGE
+                rounds = int(cached["rounds"])
+                # Cost ngoài [min_rounds, max_rounds] (file bị sửa) thì đo lại, không bao giờ dưới mức sàn
+                if fresh and cached.get("settings") == settings and self.min_rounds <= rounds <= self.max_rounds:
+                    return rounds
+            except (AttributeError, ValueError, KeyError, TypeError):
+                pass
+
+        rounds = self.calibrate()
+        try:
+            os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"rounds": rounds, "settings": settings, "created_at": time.time()}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save bcrypt calibration to {path}: {e}")
+        return rounds
+
+    @staticmethod
+    def _read_calibration(path: str) -> Optional[dict]:
+        """Saved calibration, or None if missing, unreadable or not a regular file owned by this user"""
+        try:
+            info = os.lstat(path)
+            if not stat.S_ISREG(info.st_mode):
+                return None
+            if hasattr(os, "getuid") and info.st_uid != os.getuid():
+                logger.warning(f"Ignoring bcrypt calibration {path}: not owned by the current user")
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+def get_cost_distribution(session) -> Dict[int, int]:
+    """
+    Count stored password hashes per bcrypt cost factor
+
+    Args:
+        session: SQLAlchemy session
+
+    Returns:
+        dict: {cost: number_of_users}
+    """
+    from infrastructure.repositories.user_repository import UserRepository
+    return UserRepository(session).count_password_hash_costs()
+
+
+def init_password_policy(app):
+    """
+    Apply PASSWORD_HASH_* cost settings from the Flask config to the shared policy
+
+    Args:
+        app: Flask application instance
+    """
+    password_policy.configure(
+        rounds=app.config.get("PASSWORD_HASH_ROUNDS"),
+        target_ms=app.config.get("PASSWORD_HASH_TARGET_MS"),
+        min_rounds=app.config.get("PASSWORD_HASH_MIN_ROUNDS"),
+        max_rounds=app.config.get("PASSWORD_HASH_MAX_ROUNDS"),
+        calibration_file=app.config.get("PASSWORD_HASH_CALIBRATION_FILE"),
+    )
+
+
+# Initialize the password policy
+password_policy = PasswordHashPolicy()
+
+
+if __name__ == "__main__":
+    from config import Config
+    from infrastructure.databases.mssql import SessionFactory
+
+    logging.basicConfig(level=logging.INFO)
+    password_policy.configure(
+        rounds=Config.PASSWORD_HASH_ROUNDS,
+        target_ms=Config.PASSWORD_HASH_TARGET_MS,
+        min_rounds=Config.PASSWORD_HASH_MIN_ROUNDS,
+        max_rounds=Config.PASSWORD_HASH_MAX_ROUNDS,
+        calibration_file=Config.PASSWORD_HASH_CALIBRATION_FILE,
+    )
+    print(f"Policy cost: {password_policy.rounds}")
+
+    session = SessionFactory()
+    try:
+        distribution = get_cost_distribution(session)
+    finally:
+        session.close()
+
+    total = sum(distribution.values())
+    print(f"Stored hashes: {total}")
+    for cost, count in sorted(distribution.items(), key=lambda item: (item[0] is None, item[0])):
+        label = "unknown" if cost is None else f"cost {cost}"
+        marker = "" if cost == password_policy.rounds else "  (rehash on next login)"
+        print(f"  {label:>8}: {count}{marker}")
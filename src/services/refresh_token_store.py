@@ -0,0 +1,165 @@
+"""
+Refresh Token Store for AURA System
+Server-side refresh token families with rotation on use, reuse detection
+and revocation (per family on logout, per user for "all devices").
+
+The database (refresh_tokens table) is the source of truth. An in-memory
+front remembers families/users revoked by this worker so that a revoked
+token is rejected without a query; the normal refresh path costs one
+conditional UPDATE (consume) plus one INSERT (the rotated token), committed
+together, and no user lookup.
+"""
+
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import current_app
+
+from infrastructure.repositories.refresh_token_repository import RefreshTokenRepository
+from services.cache import TTLCache
+from services.token_service import TokenService
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshTokenError(Exception):
+    """Base error for refresh tokens that must not be accepted"""
+
+
+class RefreshTokenInvalid(RefreshTokenError):
+    """Token is unknown to the store (e.g. issued before the store existed)"""
+
+
+class RefreshTokenRevoked(RefreshTokenError):
+    """Token family (or every family of the user) was revoked"""
+
+
+class RefreshTokenReused(RefreshTokenError):
+    """An already rotated token was presented again; the family is now revoked"""
+
+
+class RefreshTokenStore:
+    """Issues, rotates and revokes refresh tokens"""
+
+    def __init__(self, token_service: TokenService, front_size: int = 100000):
+        self.token_service = token_service
+        # ("family", id) -> True, ("user", id) -> thời điểm revoke (epoch)
+        self._revoked = TTLCache(max_size=front_size, default_ttl=token_service.refresh_token_ttl)
+
+    def issue(self, session, user_id: str, email: str, family_id: Optional[str] = None, commit: bool = True) -> str:
+        """
+        Issue a refresh token and store it
+
+        Args:
+            session: SQLAlchemy session
+            user_id: Owner
+            email: Owner email (kept in the payload for compatibility)
+            family_id: Existing family when rotating, None for a new login
+            commit: False to leave the commit to the caller
+
+        Returns:
+            str: Encoded refresh token
+        """
+        jti = str(uuid.uuid4())
+        family_id = family_id or str(uuid.uuid4())
+        token = self.token_service.issue_refresh_token(user_id, email, jti=jti, fam=family_id)
+
+        expires_at = datetime.utcnow() + timedelta(seconds=self.token_service.refresh_token_ttl)
+        RefreshTokenRepository(session).create(jti, family_id, user_id, expires_at, commit=commit)
+        return token
+
+    def rotate(self, session, payload: dict) -> str:
+        """
+        Exchange a verified refresh token payload for a new token of the same family
+
+        Args:
+            session: SQLAlchemy session
+            payload: Claims of a refresh token already verified by TokenService
+
+        Returns:
+            str: The new refresh token
+
+        Raises:
+            RefreshTokenInvalid: Unknown token
+            RefreshTokenRevoked: Family/user revoked
+            RefreshTokenReused: Token was already rotated (family gets revoked)
+        """
+        jti = payload.get("jti")
+        family_id = payload.get("fam")
+        user_id = payload.get("user_id")
+        if not jti or not family_id:
+            raise RefreshTokenInvalid("Refresh token has no jti/family")
+
+        if self.is_revoked_locally(payload):
+            raise RefreshTokenRevoked("Refresh token family revoked")
+
+        repo = RefreshTokenRepository(session)
+        # Consume token cũ và lưu token mới trong cùng một transaction: lỗi giữa chừng không làm mất phiên đăng nhập
+        if repo.consume(jti, commit=False):
+            try:
+                token = self.issue(session, user_id, payload.get("email"), family_id=family_id, commit=False)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            return token
+
+        # consume() thất bại: token không tồn tại, đã bị revoke, hết hạn hoặc đã dùng rồi
+        record = repo.get_by_jti(jti)
+        if record is None:
+            raise RefreshTokenInvalid("Unknown refresh token")
+        if record.revoked_at is not None:
+            self._remember_family(family_id)
+            raise RefreshTokenRevoked("Refresh token family revoked")
+        if record.used_at is not None:
+            logger.warning(f"Refresh token reuse detected for user {user_id}, revoking family {family_id}")
+            self.revoke_family(session, family_id)
+            raise RefreshTokenReused("Refresh token already used")
+        raise RefreshTokenInvalid("Refresh token expired")
+
+    def revoke_family(self, session, family_id: str) -> int:
+        """Revoke one login session (logout)"""
+        self._remember_family(family_id)
+        return RefreshTokenRepository(session).revoke_family(family_id)
+
+    def revoke_user(self, session, user_id: str) -> int:
+        """Revoke every login session of a user (logout from all devices)"""
+        self._revoked.set(("user", user_id), time.time())
+        return RefreshTokenRepository(session).revoke_user(user_id)
+
+    def is_revoked_locally(self, payload: dict) -> bool:
+        """
+        Check the in-memory front only (no DB access)
+
+        A False answer is not authoritative; rotate() still checks the database.
+        """
+        if self._revoked.get(("family", payload.get("fam"))):
+            return True
+        revoked_at = self._revoked.get(("user", payload.get("user_id")))
+        return revoked_at is not None and payload.get("iat", 0) <= revoked_at
+
+    def _remember_family(self, family_id: str):
+        self._revoked.set(("family", family_id), True)
+
+
+def init_refresh_token_store(app) -> RefreshTokenStore:
+    """
+    Build the RefreshTokenStore on top of the app's TokenService
+
+    Args:
+        app: Flask application instance (init_token_service must run first)
+    """
+    store = RefreshTokenStore(
+        app.extensions["token_service"],
+        front_size=app.config.get("REFRESH_TOKEN_REVOCATION_CACHE_SIZE", 100000),
+    )
+    app.extensions["refresh_token_store"] = store
+    return store
+
+
+def get_refresh_token_store() -> RefreshTokenStore:
+    """RefreshTokenStore of the current Flask app"""
+    return current_app.extensions["refresh_token_store"]
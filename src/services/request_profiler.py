@@ -0,0 +1,195 @@
+"""
+Per-request performance instrumentation for AURA System
+
+Every request records its total time, database time and query count (from
+infrastructure/databases/timing.py) and named spans such as bcrypt, jwt and
+email. The numbers are returned in a ``Server-Timing`` header (visible in the
+browser devtools) and aggregated into a rolling per-endpoint latency histogram,
+so N+1 queries and slow auth paths show up without attaching a profiler.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence
+
+from flask import current_app, g, has_request_context, request
+
+from infrastructure.databases.timing import request_db_stats
+
+logger = logging.getLogger(__name__)
+
+# Cận trên các bucket latency (ms); bucket cuối là +Inf
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time a block and add it to the current request's span ``name``
+
+    Outside a request (CLI, background threads) this is a no-op.
+    """
+    if not has_request_context():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans = g.setdefault("perf_spans", {})
+        spans[name] = spans.get(name, 0.0) + time.perf_counter() - start
+
+
+class _Window:
+    __slots__ = ("epoch", "counts", "total_ms", "db_ms", "queries", "max_queries")
+
+    def __init__(self, epoch: int, bucket_count: int):
+        self.epoch = epoch
+        self.counts = [0] * bucket_count
+        self.total_ms = 0.0
+        self.db_ms = 0.0
+        self.queries = 0
+        self.max_queries = 0
+
+
+class RollingHistogram:
+    """
+    Latency histogram per endpoint over the last ``window_seconds``
+
+    The window is split into ``slots`` sub-windows; a sub-window older than
+    the window is reset when its slot comes round again, so old traffic ages
+    out without a background thread.
+    """
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS, window_seconds: float = 300, slots: int = 10):
+        self.buckets_ms = tuple(buckets_ms)
+        self.slot_seconds = window_seconds / slots
+        self.slots = slots
+        self._endpoints: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def _epoch(self, now: Optional[float] = None) -> int:
+        return int((time.monotonic() if now is None else now) / self.slot_seconds)
+
+    def record(self, endpoint: str, total_ms: float, db_ms: float = 0.0, queries: int = 0, now: Optional[float] = None):
+        epoch = self._epoch(now)
+        bucket = bisect.bisect_left(self.buckets_ms, total_ms)
+        with self._lock:
+            windows = self._endpoints.get(endpoint)
+            if windows is None:
+                windows = self._endpoints[endpoint] = [None] * self.slots
+            window = windows[epoch % self.slots]
+            if window is None or window.epoch != epoch:
+                window = windows[epoch % self.slots] = _Window(epoch, len(self.buckets_ms) + 1)
+            window.counts[bucket] += 1
+            window.total_ms += total_ms
+            window.db_ms += db_ms
+            window.queries += queries
+            window.max_queries = max(window.max_queries, queries)
+
+    def _quantile(self, counts, count, q) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf for the last bucket)"""
+        rank = q * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets_ms + (float("inf"),), counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, dict]:
+        """
+        Aggregated stats per endpoint for the current window
+
+        Returns:
+            dict: {endpoint: {count, mean_ms, p50_ms, p95_ms, p99_ms, mean_db_ms,
+                   mean_queries, max_queries, buckets}}
+        """
+        oldest = self._epoch(now) - self.slots + 1
+        result = {}
+        with self._lock:
+            for endpoint, windows in self._endpoints.items():
+                live = [w for w in windows if w is not None and w.epoch >= oldest]
+                count = sum(sum(w.counts) for w in live)
+                if not count:
+                    continue
+                counts = [sum(column) for column in zip(*(w.counts for w in live))]
+                result[endpoint] = {
+                    "count": count,
+                    "mean_ms": round(sum(w.total_ms for w in live) / count, 2),
+                    "p50_ms": self._quantile(counts, count, 0.50),
+                    "p95_ms": self._quantile(counts, count, 0.95),
+                    "p99_ms": self._quantile(counts, count, 0.99),
+                    "mean_db_ms": round(sum(w.db_ms for w in live) / count, 2),
+                    "mean_queries": round(sum(w.queries for w in live) / count, 2),
+                    "max_queries": max(w.max_queries for w in live),
+                    "buckets": dict(zip([str(b) for b in self.buckets_ms] + ["+Inf"], counts)),
+                }
+        return result
+
+
+class RequestProfiler:
+    """
+    Collects the per-request numbers and feeds the histogram
+
+    Args:
+        server_timing: Add the Server-Timing response header
+        query_warn_threshold: Log a warning when a request runs more queries
+            than this (likely N+1); 0 disables it
+    """
+
+    def __init__(self, server_timing: bool = True, query_warn_threshold: int = 0,
+                 window_seconds: float = 300):
+        self.server_timing = server_timing
+        self.query_warn_threshold = query_warn_threshold
+        self.histogram = RollingHistogram(window_seconds=window_seconds)
+
+    def start(self):
+        g.perf_start = time.perf_counter()
+
+    def finish(self, response):
+        start = g.get("perf_start")
+        if start is None:
+            return response
+        total_ms = (time.perf_counter() - start) * 1000
+        queries, db_time = request_db_stats()
+        db_ms = db_time * 1000
+        spans = g.get("perf_spans", {})
+        endpoint = request.endpoint or "unmatched"
+
+        self.histogram.record(endpoint, total_ms, db_ms, queries)
+
+        if self.query_warn_threshold and queries > self.query_warn_threshold:
+            logger.warning("%s ran %d queries (%.1fms in DB), possible N+1", endpoint, queries, db_ms)
+
+        if self.server_timing:
+            metrics = [f'db;dur={db_ms:.2f};desc="{queries} queries"']
+            metrics += [f"{name};dur={seconds * 1000:.2f}" for name, seconds in spans.items()]
+            metrics.append(f"total;dur={total_ms:.2f}")
+            response.headers.add("Server-Timing", ", ".join(metrics))
+        return response
+
+
+def init_request_profiler(app) -> RequestProfiler:
+    """
+    Register the profiling hooks on the app
+
+    Args:
+        app: Flask application instance
+    """
+    profiler = RequestProfiler(
+        server_timing=app.config.get("PERF_SERVER_TIMING", False),
+        query_warn_threshold=app.config.get("PERF_QUERY_WARN_THRESHOLD", 0),
+        window_seconds=app.config.get("PERF_HISTOGRAM_WINDOW", 300),
+    )
+    app.before_request(profiler.start)
+    app.after_request(profiler.finish)
+    app.extensions["request_profiler"] = profiler
+    return profiler
+
+
+def get_request_profiler() -> RequestProfiler:
+    return current_app.extensions["request_profiler"]
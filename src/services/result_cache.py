@@ -0,0 +1,283 @@
+"""
+Analysis result cache for AURA System
+
+An analysis is determined by the content of its images (checksums from the
+image store), the model version and the thresholds it was classified with.
+The cache maps SHA-256 of those to the analysis_results row computed for
+them, so a re-screening of the same images is answered from that row
+instead of running the model again:
+
+- at upload (/api/images): the request is created done, with a copy of the
+  cached result and its image_annotations, and never queued
+- in the worker (services/inference.py): cached jobs skip inference
+
+Two tiers: an in-process LRU (TTLCache) in front of the
+analysis_result_cache table. New entries reach the LRU only once their
+transaction commits. Keys contain the model version, so results of an old
+model are never returned. Both sides take the version from the deployed
+ai_models row (else INFERENCE_MODEL_VERSION / the model file name, see
+services.inference.configured_model_version); AIModelRepository.deploy()
+purges the rows of other versions, upload routes pick up the new version
+within RESULT_CACHE_VERSION_TTL seconds and workers when restarted.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import current_app
+from sqlalchemy import event, insert
+
+from infrastructure.models.ai_threshold_profile_model import AIThresholdProfileModel
+from infrastructure.models.analysis_result_model import AnalysisResultModel
+from infrastructure.models.image_annotation_model import ImageAnnotationModel
+from infrastructure.repositories.ai_model_repository import AIModelRepository
+from infrastructure.repositories.analysis_result_cache_repository import AnalysisResultCacheRepository
+from services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Entry trong LRU không bao giờ sai (key chứa mọi input); TTL chỉ để dọn dần
+LRU_TTL = 24 * 3600
+
+# session.info: entry (cache, key, CachedResult) chờ commit trước khi vào LRU
+_PENDING = "result_cache_pending"
+
+
+def _publish_pending(session):
+    for cache, key, cached in session.info.pop(_PENDING, ()):
+        cache._lru.set(key, cached)
+
+
+def _discard_pending(session):
+    session.info.pop(_PENDING, None)
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    result_id: int
+    risk_level: Optional[str]
+    predicted_labels_json: Optional[str]
+    model_version: str
+    annotations: Tuple[Tuple[str, str], ...] = ()
+
+
+def result_key(checksums: Iterable[str], model_version: str, thresholds: Optional[dict],
+               default_threshold: float, high_risk_threshold: float) -> str:
+    """
+    Cache key of an analysis
+
+    Args:
+        checksums: SHA-256 of the request's images (order and repeats ignored:
+            the result takes the highest score per label)
+        thresholds: Threshold profile content (not its id, so an edited
+            profile gets new keys)
+    """
+    material = json.dumps({
+        "images": sorted(set(checksums)),
+        "model": model_version,
+        "thresholds": thresholds or {},
+        "default": default_threshold,
+        "high_risk": high_risk_threshold,
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def load_thresholds(session, profile_ids: Iterable[int]) -> Dict[int, dict]:
+    """Parsed thresholds_json of the given threshold profiles (invalid JSON -> {})"""
+    profile_ids = {profile_id for profile_id in profile_ids if profile_id}
+    if not profile_ids:
+        return {}
+    profiles = session.query(AIThresholdProfileModel.id, AIThresholdProfileModel.thresholds_json).filter(
+        AIThresholdProfileModel.id.in_(profile_ids)
+    ).all()
+    thresholds = {}
+    for profile_id, thresholds_json in profiles:
+        try:
+            thresholds[profile_id] = json.loads(thresholds_json or "{}")
+        except ValueError:
+            logger.error(f"Threshold profile {profile_id} has invalid JSON; using defaults")
+            thresholds[profile_id] = {}
+    return thresholds
+
+
+class ResultCache:
+    """
+    Two-tier result cache
+
+    Args:
+        max_size: Entries in the in-process LRU
+        version_ttl: Seconds the deployed model version is cached
+        default_threshold, high_risk_threshold: Classification defaults
+            (INFERENCE_*), part of the key of upload lookups
+        fallback_version: Model version when no AI model is deployed, the
+            one the workers use (None: upload lookups are skipped until one is)
+    """
+
+    def __init__(self, max_size: int = 4096, version_ttl: float = 30, default_threshold: float = 0.5,
+                 high_risk_threshold: float = 0.8, fallback_version: Optional[str] = None):
+        self.default_threshold = default_threshold
+        self.high_risk_threshold = high_risk_threshold
+        self.fallback_version = fallback_version
+        self._lru = TTLCache(max_size, LRU_TTL)
+        self._version = TTLCache(1, version_ttl)
+        self._lock = threading.Lock()
+        self.db_hits = 0
+        self.misses = 0
+
+    def lookup(self, session, key: str) -> Optional[CachedResult]:
+        """Cached result for a key: LRU first, then the analysis_result_cache table"""
+        cached = self._lru.get(key)
+        if cached is not None:
+            return cached
+        row = AnalysisResultCacheRepository(session).get(key)
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        cached = CachedResult(
+            row["result_id"], row["risk_level"], row["predicted_labels_json"], row["model_version"],
+            tuple(row["annotations"]),
+        )
+        self._lru.set(key, cached)
+        with self._lock:
+            self.db_hits += 1
+        return cached
+
+    def store(self, session, entries: Sequence[Tuple[str, CachedResult]]) -> int:
+        """
+        Add freshly computed results without committing (the caller commits
+        them with the analysis_results rows)
+
+        The LRU is filled when the session commits: after a rollback (e.g.
+        lost lease) the result_id would point at a row that does not exist.
+        """
+        added = AnalysisResultCacheRepository(session).put_many(
+            (key, cached.result_id, cached.model_version) for key, cached in entries
+        )
+        if not event.contains(session, "after_commit", _publish_pending):
+            event.listen(session, "after_commit", _publish_pending)
+            event.listen(session, "after_rollback", _discard_pending)
+        session.info.setdefault(_PENDING, []).extend((self, key, cached) for key, cached in entries)
+        return added
+
+    def apply(self, session, hits: Sequence[Tuple[int, CachedResult]]) -> List[int]:
+        """
+        Add a copy of each cached result (and its annotations) to its request
+
+        Args:
+            hits: (analysis request id, CachedResult)
+
+        Returns:
+            list: New analysis_results ids, in the order of ``hits``
+        """
+        if not hits:
+            return []
+        now = datetime.utcnow()
+        rows = []
+        for request_id, cached in hits:
+            try:
+                payload = json.loads(cached.predicted_labels_json or "{}")
+            except ValueError:
+                payload = {}
+            payload["cached_from"] = cached.result_id
+            rows.append({
+                "request_id": request_id,
+                "risk_level": cached.risk_level,
+                "predicted_labels_json": json.dumps(payload),
+                "generated_at": now,
+                "status": "created",
+            })
+        result_ids = session.execute(
+            insert(AnalysisResultModel).returning(AnalysisResultModel.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        annotations = [
+            {"annotation_type": annotation_type, "annotation_url": annotation_url, "result_id": result_id, "created_at": now}
+            for result_id, (_, cached) in zip(result_ids, hits)
+            for annotation_type, annotation_url in cached.annotations
+        ]
+        if annotations:
+            session.execute(insert(ImageAnnotationModel), annotations)
+        return list(result_ids)
+
+    def model_version(self, session) -> Optional[str]:
+        """Deployed model version (cached for version_ttl seconds)"""
+        version = self._version.get("deployed")
+        if version is None:
+            version = AIModelRepository(session).deployed_version() or self.fallback_version or ""
+            self._version.set("deployed", version)
+        return version or None
+
+    def lookup_upload(self, session, checksums: Sequence[str], profile_id: Optional[int] = None) -> Optional[CachedResult]:
+        """Cached result for new images under the deployed model, None on miss"""
+        if not checksums or not all(checksums):
+            return None
+        model_version = self.model_version(session)
+        if model_version is None:
+            return None
+        thresholds = load_thresholds(session, [profile_id]).get(profile_id) if profile_id else None
+        key = result_key(checksums, model_version, thresholds, self.default_threshold, self.high_risk_threshold)
+        return self.lookup(session, key)
+
+    def invalidate(self):
+        """Forget every entry and the deployed version (after a deploy in this process)"""
+        self._lru.clear()
+        self._version.clear()
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self._lru.hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "size": len(self._lru),
+        }
+
+
+def cache_from_config(config) -> Optional[ResultCache]:
+    """ResultCache from RESULT_CACHE_* settings, None if disabled"""
+    from services.inference import configured_model_version
+
+    if not config.RESULT_CACHE_ENABLED:
+        return None
+    return ResultCache(
+        max_size=config.RESULT_CACHE_SIZE,
+        version_ttl=config.RESULT_CACHE_VERSION_TTL,
+        default_threshold=config.INFERENCE_DEFAULT_THRESHOLD,
+        high_risk_threshold=config.INFERENCE_HIGH_RISK_THRESHOLD,
+        fallback_version=configured_model_version(
+            config.INFERENCE_BACKEND, config.INFERENCE_MODEL_PATH, config.INFERENCE_MODEL_VERSION
+        ),
+    )
+
+
+def init_result_cache(app) -> Optional[ResultCache]:
+    """
+    Create the result cache used by the upload routes
+
+    Args:
+        app: Flask application instance
+    """
+    from services.inference import configured_model_version
+
+    cache = None
+    if app.config.get("RESULT_CACHE_ENABLED", True):
+        cache = ResultCache(
+            max_size=app.config.get("RESULT_CACHE_SIZE", 4096),
+            version_ttl=app.config.get("RESULT_CACHE_VERSION_TTL", 30),
+            default_threshold=app.config.get("INFERENCE_DEFAULT_THRESHOLD", 0.5),
+            high_risk_threshold=app.config.get("INFERENCE_HIGH_RISK_THRESHOLD", 0.8),
+            fallback_version=configured_model_version(
+                app.config.get("INFERENCE_BACKEND", "onnx"), app.config.get("INFERENCE_MODEL_PATH", ""),
+                app.config.get("INFERENCE_MODEL_VERSION", ""),
+            ),
+        )
+    app.extensions["result_cache"] = cache
+    return cache
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    return current_app.extensions.get("result_cache")
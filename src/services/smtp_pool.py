@@ -0,0 +1,152 @@
+"""
+SMTP Connection Pool for AURA System
+Keeps a few authenticated SMTP sessions open so that sending an email does
+not pay a TCP connect + STARTTLS + AUTH every time. Idle sessions are
+checked with NOOP before reuse and closed after SMTP_IDLE_TIMEOUT.
+"""
+
+import logging
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def is_connection_error(error: Exception) -> bool:
+    """
+    True if the session is broken (disconnect, socket error)
+
+    SMTP replies such as 4xx/5xx (SMTPResponseException) leave the session
+    usable. smtplib.SMTPException derives from OSError, hence the extra check.
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPConnectionPool:
+    """
+    Bounded pool of SMTP sessions.
+
+    At most ``max_size`` sessions exist at once; callers wait for a free one.
+    A session idle for more than ``keepalive_interval`` is probed with NOOP
+    before reuse, and one idle for more than ``idle_timeout`` is closed.
+    """
+
+    def __init__(self, host: str, port: int, username: str = "", password: str = "", use_tls: bool = True,
+                 max_size: int = 4, idle_timeout: float = 60, keepalive_interval: float = 15,
+                 timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+
+        self._idle = []  # [(smtp, last_used)], LIFO: session dùng gần nhất còn "ấm" nhất
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.connects = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        with self._lock:
+            self.connects += 1
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _is_alive(self, server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _take_idle(self):
+        """Most recently used idle session that is still usable, or None"""
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                server, last_used = self._idle.pop()
+            idle_for = now - last_used
+            if idle_for > self.idle_timeout:
+                self._close(server)
+                continue
+            if idle_for > self.keepalive_interval and not self._is_alive(server):
+                self._close(server)
+                continue
+            return server
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a session
+
+        A session that raised a connection error is discarded instead of
+        being returned to the pool.
+        """
+        self._slots.acquire()
+        server = None
+        try:
+            server = self._take_idle() or self._connect()
+            yield server
+        except Exception as e:
+            if server is not None and is_connection_error(e):
+                self._close(server)
+                server = None
+            raise
+        finally:
+            if server is not None:
+                with self._lock:
+                    self._idle.append((server, time.monotonic()))
+            self._slots.release()
+
+    def reap_idle(self) -> int:
+        """
+        Close sessions idle for longer than idle_timeout
+
+        Returns:
+            int: Number of sessions closed
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [server for server, last_used in self._idle if now - last_used > self.idle_timeout]
+            self._idle = [(server, last_used) for server, last_used in self._idle if now - last_used <= self.idle_timeout]
+        for server in expired:
+            self._close(server)
+        return len(expired)
+
+    def close_all(self):
+        """Close every idle session (e.g. at shutdown)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+    @property
+    def idle_count(self) -> int:
+        with self._lock:
+            return len(self._idle)
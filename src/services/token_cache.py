@@ -0,0 +1,82 @@
+"""
+Verified JWT Cache for AURA System
+Remembers the payload of bearer tokens that were already verified so that
+hot endpoints (/api/auth/me, /api/auth/verify) skip the full JWT decode.
+Owned by TokenService (services/token_service.py).
+"""
+
+import hashlib
+import os
+import time
+from typing import Optional
+
+from services.cache import TTLCache
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU/TTL cache of verified token payloads.
+
+    Keys are SHA-256 digests of the raw token (the token itself is never kept
+    as a key). An entry never outlives the token's own ``exp`` claim.
+    Only successful verifications are cached.
+    """
+
+    def __init__(self, max_size: int = None, ttl: float = None):
+        self._cache = TTLCache(
+            max_size=int(os.getenv("JWT_CACHE_SIZE", 4096)) if max_size is None else max_size,
+            default_ttl=float(os.getenv("JWT_CACHE_TTL", 300)) if ttl is None else ttl,
+        )
+
+    def configure(self, max_size: int = None, ttl: float = None):
+        """Change the limits and drop current entries"""
+        if max_size is not None:
+            self._cache.max_size = max_size
+        if ttl is not None:
+            self._cache.default_ttl = ttl
+        self._cache.clear()
+
+    @staticmethod
+    def digest(token: str) -> str:
+        """Cache key for a raw token"""
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """
+        Get the cached payload of a token
+
+        Returns:
+            A copy of the payload, or None on miss
+        """
+        payload = self._cache.get(self.digest(token))
+        return dict(payload) if payload is not None else None
+
+    def put(self, token: str, payload: dict):
+        """
+        Cache a verified payload until min(now + ttl, exp)
+
+        Args:
+            token: Raw JWT
+            payload: Decoded and verified claims
+        """
+        ttl = self._cache.default_ttl
+        exp = payload.get("exp")
+        if exp is not None:
+            ttl = min(ttl, float(exp) - time.time())
+        self._cache.set(self.digest(token), dict(payload), ttl=ttl)
+
+    def clear(self):
+        """Drop every cached token"""
+        self._cache.clear()
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring"""
+        return self._cache.stats()
@@ -0,0 +1,180 @@
+"""
+JWT Token Service for AURA System
+Owns the signing keys, algorithm and token lifetimes. Built once in
+create_app (app.extensions["token_service"]) so routes never re-read the
+environment per request.
+"""
+
+import logging
+import time
+from typing import Dict, Optional
+
+import jwt
+from flask import current_app
+
+from services.request_profiler import span
+from services.token_cache import VerifiedTokenCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KID = "default"
+# kid của JWT_SECRET_KEY khi nó khác SECRET_KEY
+JWT_SECRET_KID = "jwt"
+
+
+class TokenService:
+    """
+    Issues and verifies JWTs.
+
+    Several signing keys can be active at once, identified by the ``kid``
+    header. New tokens are signed with ``active_kid``; tokens signed with any
+    other configured key stay valid until they expire, which allows key
+    rotation without logging everybody out. Tokens without a ``kid`` header
+    (issued before rotation was introduced) are checked with the
+    ``default`` key.
+    """
+
+    def __init__(self, signing_keys: Dict[str, str], active_kid: str, algorithm: str = "HS256",
+                 access_token_ttl: int = 24 * 3600, refresh_token_ttl: int = 7 * 24 * 3600,
+                 cache: Optional[VerifiedTokenCache] = None):
+        if not signing_keys:
+            raise ValueError("At least one JWT signing key is required")
+        if active_kid not in signing_keys:
+            raise ValueError(f"Active JWT key id '{active_kid}' is not among the configured keys")
+
+        self.signing_keys = dict(signing_keys)
+        self.active_kid = active_kid
+        self.algorithm = algorithm
+        self.access_token_ttl = access_token_ttl
+        self.refresh_token_ttl = refresh_token_ttl
+        self.cache = cache if cache is not None else VerifiedTokenCache(max_size=0)
+
+        # Encoder/decoder và header được dựng sẵn một lần
+        self._jwt = jwt.PyJWT()
+        self._jws = jwt.PyJWS()
+        self._algorithms = [algorithm]
+        self._active_key = self.signing_keys[active_kid]
+        self._headers = {"kid": active_kid}
+
+    @classmethod
+    def from_config(cls, config) -> "TokenService":
+        """
+        Build the service from a Flask config mapping
+
+        Keys come from JWT_SIGNING_KEYS ("kid1:secret1,kid2:secret2") plus
+        SECRET_KEY registered as the ``default`` key, the key every token was
+        signed with before rotation. A JWT_SECRET_KEY that differs from it is
+        registered as ``jwt`` and signs new tokens (unless JWT_ACTIVE_KID says
+        otherwise); SECRET_KEY then only verifies tokens issued before, until
+        JWT_ACCEPT_SECRET_KEY is turned off.
+
+        Raises:
+            ValueError: If no secret is configured (e.g. SECRET_KEY missing in production)
+        """
+        signing_keys = {}
+        for item in (config.get("JWT_SIGNING_KEYS") or "").split(","):
+            kid, sep, secret = item.strip().partition(":")
+            if sep and kid and secret:
+                signing_keys[kid] = secret
+
+        secret_key = config.get("SECRET_KEY")
+        jwt_secret = config.get("JWT_SECRET_KEY")
+        rotated_kid = None
+        if jwt_secret and jwt_secret != secret_key:
+            rotated_kid = JWT_SECRET_KID if secret_key else DEFAULT_KID
+            signing_keys.setdefault(rotated_kid, jwt_secret)
+        # Chỉ bỏ SECRET_KEY khi đã có key khác để ký
+        if secret_key and (config.get("JWT_ACCEPT_SECRET_KEY", True) or not signing_keys):
+            signing_keys.setdefault(DEFAULT_KID, secret_key)
+
+        if not signing_keys:
+            raise ValueError("SECRET_KEY must be set in environment for production")
+
+        active_kid = config.get("JWT_ACTIVE_KID") or rotated_kid or next(iter(signing_keys))
+
+        return cls(
+            signing_keys=signing_keys,
+            active_kid=active_kid,
+            algorithm=config.get("JWT_ALGORITHM", "HS256"),
+            access_token_ttl=int(config.get("JWT_EXPIRATION_HOURS", 24)) * 3600,
+            refresh_token_ttl=int(config.get("JWT_REFRESH_TOKEN_EXPIRES_DAYS", 7)) * 24 * 3600,
+            cache=VerifiedTokenCache(
+                max_size=config.get("JWT_CACHE_SIZE"),
+                ttl=config.get("JWT_CACHE_TTL"),
+            ),
+        )
+
+    def issue_access_token(self, user_id: str, email: str) -> str:
+        """Create a signed access token"""
+        return self.encode({"user_id": user_id, "email": email}, self.access_token_ttl)
+
+    def issue_refresh_token(self, user_id: str, email: str, **claims) -> str:
+        """Create a signed refresh token (extra claims are added to the payload)"""
+        return self.encode({"user_id": user_id, "email": email, **claims}, self.refresh_token_ttl)
+
+    def encode(self, claims: dict, ttl: int) -> str:
+        """
+        Sign claims with the active key
+
+        Args:
+            claims: Payload claims
+            ttl: Lifetime in seconds (sets iat/exp)
+
+        Returns:
+            str: Encoded JWT
+        """
+        now = time.time()
+        payload = {**claims, "iat": now, "exp": now + ttl}
+        with span("jwt"):
+            return self._jwt.encode(payload, self._active_key, algorithm=self.algorithm, headers=self._headers)
+
+    def decode(self, token: str) -> dict:
+        """
+        Verify a token and return its payload (always does the full check)
+
+        Raises:
+            jwt.ExpiredSignatureError: If the token has expired
+            jwt.InvalidTokenError: If the signature, kid or format is invalid
+        """
+        with span("jwt"):
+            kid = self._jws.get_unverified_header(token).get("kid", DEFAULT_KID)
+            key = self.signing_keys.get(kid)
+            if key is None:
+                raise jwt.InvalidTokenError(f"Unknown key id: {kid}")
+            return self._jwt.decode(token, key, algorithms=self._algorithms)
+
+    def verify(self, token: str) -> dict:
+        """
+        Verify an access token, using the verified-token cache
+
+        Raises:
+            jwt.ExpiredSignatureError: If the token has expired
+            jwt.InvalidTokenError: If the token is invalid
+        """
+        payload = self.cache.get(token)
+        if payload is not None:
+            return payload
+        payload = self.decode(token)
+        self.cache.put(token, payload)
+        return payload
+
+
+def init_token_service(app) -> TokenService:
+    """
+    Build the TokenService from app.config and attach it to the app
+
+    Args:
+        app: Flask application instance
+
+    Returns:
+        TokenService instance
+    """
+    service = TokenService.from_config(app.config)
+    app.extensions["token_service"] = service
+    logger.info(f"Token service ready (kid={service.active_kid}, {len(service.signing_keys)} key(s), {service.algorithm})")
+    return service
+
+
+def get_token_service() -> TokenService:
+    """TokenService of the current Flask app"""
+    return current_app.extensions["token_service"]
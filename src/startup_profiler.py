@@ -0,0 +1,149 @@
+"""
+Startup Profiler for AURA System
+Measures per-module import cost and the time spent in each create_app phase.
+
+Enable with `python run_app.py --profile-startup` or AURA_PROFILE_STARTUP=1
+(wsgi.py / gunicorn). When disabled, phase() only costs a flag check.
+"""
+
+import importlib.abc
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps a real loader and times exec_module"""
+
+    def __init__(self, loader, fullname, profiler):
+        self._loader = loader
+        self._fullname = fullname
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._enter_import()
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._exit_import(self._fullname, time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        # get_resource_reader, is_package, get_code, ... của loader gốc
+        return getattr(self._loader, name)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """Meta path finder that asks the other finders and wraps their loader"""
+
+    def __init__(self, profiler):
+        self._profiler = profiler
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, fullname, self._profiler)
+        return spec
+
+
+class StartupProfiler:
+    """Collects import timings and create_app phase timings"""
+
+    def __init__(self):
+        self.enabled = False
+        self.imports = {}  # module -> (cumulative_s, self_s)
+        self.phases = []  # (name, seconds)
+        self._finder = None
+        self._local = threading.local()
+        self._started = None
+
+    def enable(self):
+        """Start recording (install the import hook)"""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._started = time.perf_counter()
+        self._finder = _TimingFinder(self)
+        sys.meta_path.insert(0, self._finder)
+
+    def disable(self):
+        """Stop recording imports (collected data is kept for report())"""
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        self._finder = None
+        self.enabled = False
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter_import(self):
+        # Thời gian import các module con được trừ ra khỏi self time của module cha
+        self._stack().append(0.0)
+
+    def _exit_import(self, fullname, elapsed):
+        stack = self._stack()
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        self.imports[fullname] = (elapsed, elapsed - children)
+
+    @contextmanager
+    def phase(self, name):
+        """Time one startup phase (no-op unless enabled)"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def report(self, top=25) -> str:
+        """
+        Human-readable summary
+
+        Args:
+            top: Number of modules to list (by self time)
+        """
+        lines = []
+        if self._started is not None:
+            lines.append(f"Startup profile: {(time.perf_counter() - self._started) * 1000:.1f} ms since profiler enabled")
+
+        lines.append("create_app phases:")
+        for name, seconds in self.phases:
+            lines.append(f"  {seconds * 1000:9.1f} ms  {name}")
+
+        total_imports = sum(self_s for _, self_s in self.imports.values())
+        lines.append(f"Imports: {len(self.imports)} modules, {total_imports * 1000:.1f} ms")
+        lines.append(f"  {'self ms':>9}  {'cumul ms':>9}  module")
+        ranked = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        for module, (cumulative, self_s) in ranked:
+            lines.append(f"  {self_s * 1000:9.1f}  {cumulative * 1000:9.1f}  {module}")
+        return "\n".join(lines)
+
+
+def profiling_requested(argv=None) -> bool:
+    """True if --profile-startup was passed or AURA_PROFILE_STARTUP is set"""
+    argv = sys.argv if argv is None else argv
+    return "--profile-startup" in argv or os.environ.get("AURA_PROFILE_STARTUP", "").lower() in ("1", "true")
+
+
+# Initialize the profiler
+startup_profiler = StartupProfiler()
@@ -0,0 +1,342 @@
+"""
+Static asset serving for the frontend bundle (Vite ``dist/``)
+
+The ``dist/`` tree is indexed once at startup: content type, size, mtime and a
+content-hash ETag for every file, plus its pre-built ``.br``/``.gz`` variants.
+Requests are answered from that index (no stat/path joining per request):
+the best variant the client accepts, ``304`` on a matching ``If-None-Match``,
+and ``Cache-Control: immutable`` for Vite's fingerprinted build files such as
+``assets/index-BTePKapA.js``. Small files are held in memory; larger ones are
+streamed with the server's ``wsgi.file_wrapper`` (sendfile under gunicorn).
+Client-side routes that are not files (``/dashboard``) get ``index.html``.
+
+Pre-build the compressed variants after ``npm run build``:
+    python -m static_assets "Web Interface for AURA Clinic (1)/dist"
+"""
+
+import argparse
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+
+from flask import current_app, request
+from werkzeug.wsgi import wrap_file
+
+try:
+    import brotli
+except ImportError:  # brotli là tùy chọn: không có thì chỉ dùng gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Vite đặt file build vào assets/ với hash nội dung 8 ký tự (base64url) ngay trước đuôi: assets/index-BTePKapA.js.
+# File khác trong dist/ (logo-transparent.png, favicon-original.ico) có thể đổi nội dung mà giữ tên.
+HASHED_ASSET = re.compile(r"^assets/(?:[^/]+/)*[^/]+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$")
+
+# Thứ tự ưu tiên khi client chấp nhận nhiều encoding
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript", "text/javascript", "text/css", "text/html", "text/plain",
+    "application/json", "image/svg+xml", "application/manifest+json", "text/xml", "application/xml",
+}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+SPA_INDEX = "index.html"
+
+
+@dataclass(frozen=True)
+class AssetFile:
+    """One representation of an asset on disk (identity, br or gzip)"""
+    path: str
+    size: int
+    etag: str
+    data: Optional[bytes] = None  # nội dung, chỉ giữ cho file nhỏ
+
+
+@dataclass(frozen=True)
+class StaticAsset:
+    """Indexed static file and its pre-compressed variants"""
+    url_path: str
+    content_type: str
+    mtime: float
+    immutable: bool
+    files: Dict[str, AssetFile] = field(default_factory=dict)  # encoding -> file ("identity" luôn có)
+
+
+def _file_etag(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=12)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _content_type(path: str) -> str:
+    content_type, _ = mimetypes.guess_type(path)
+    return content_type or "application/octet-stream"
+
+
+def _read_small(path: str, size: int, memory_max_size: int) -> Optional[bytes]:
+    if size > memory_max_size:
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def scan_directory(root: str, memory_max_size: int = 0) -> Dict[str, StaticAsset]:
+    """
+    Index every file under root by URL path (posix, relative to root)
+
+    ``.br``/``.gz`` files are attached as variants of the file they compress.
+    The ETag is a hash of the content, so every worker and deployment of the
+    same build agrees on it. Files up to memory_max_size bytes are loaded.
+    """
+    index = {}
+    if not os.path.isdir(root):
+        return index
+    for dirpath, _, filenames in os.walk(root):
+        names = set(filenames)
+        for name in filenames:
+            if any(name.endswith(suffix) and name[:-len(suffix)] in names for _, suffix in ENCODINGS):
+                continue
+            path = os.path.join(dirpath, name)
+            url_path = os.path.relpath(path, root).replace(os.sep, "/")
+            stat = os.stat(path)
+            etag = _file_etag(path)
+            files = {"identity": AssetFile(path, stat.st_size, etag, _read_small(path, stat.st_size, memory_max_size))}
+            for encoding, suffix in ENCODINGS:
+                if name + suffix in names:
+                    variant = path + suffix
+                    size = os.path.getsize(variant)
+                    files[encoding] = AssetFile(variant, size, f"{etag}-{encoding}",
+                                                _read_small(variant, size, memory_max_size))
+            index[url_path] = StaticAsset(
+                url_path=url_path,
+                content_type=_content_type(name),
+                mtime=stat.st_mtime,
+                immutable=bool(HASHED_ASSET.match(url_path)),
+                files=files,
+            )
+    return index
+
+
+class StaticAssets:
+    """
+    Serves files of one build directory from an in-memory index
+
+    The index is a read-only mapping that is replaced as a whole by scan(),
+    so requests never see a half-built index and need no lock.
+
+    Args:
+        root: Build directory (``dist/``)
+        max_age: Cache-Control max-age for non-fingerprinted files such as
+            index.html (0 = ``no-cache``, browser revalidates with the ETag)
+        memory_max_size: Files up to this size (bytes) are served from memory
+        spa_fallback: Serve index.html for paths without a file extension
+    """
+
+    def __init__(self, root: str, max_age: int = 0, memory_max_size: int = 64 * 1024, spa_fallback: bool = True):
+        self.root = root
+        self.max_age = max_age
+        self.memory_max_size = memory_max_size
+        self.spa_fallback = spa_fallback
+        self._index: Mapping[str, StaticAsset] = MappingProxyType({})
+        self._fallback: Optional[StaticAsset] = None
+        self._signature = None
+        self._watch_stop = threading.Event()
+        self._watch_thread = None
+
+    def scan(self) -> int:
+        """(Re)build the index; returns the number of files"""
+        self._signature = self._tree_signature()
+        index = scan_directory(self.root, self.memory_max_size)
+        self._index = MappingProxyType(index)
+        self._fallback = index.get(SPA_INDEX) if self.spa_fallback else None
+        logger.info(f"Indexed {len(index)} static files from {self.root}")
+        return len(index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def lookup(self, url_path: str) -> Optional[StaticAsset]:
+        """
+        Asset for a URL path
+
+        A miss on a path whose last segment has no extension is a client-side
+        route and resolves to index.html; a missing ``/app.js`` stays a 404.
+        """
+        asset = self._index.get(url_path.lstrip("/"))
+        if asset is None and "." not in url_path.rsplit("/", 1)[-1]:
+            return self._fallback
+        return asset
+
+    def _tree_signature(self):
+        """Cheap fingerprint of the tree (paths, sizes, mtimes) for the watcher"""
+        signature = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                try:
+                    stat = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                signature.append((dirpath, name, stat.st_size, stat.st_mtime_ns))
+        return frozenset(signature)
+
+    def reload_if_changed(self) -> bool:
+        """Rescan when a file was added, removed or modified"""
+        if self._tree_signature() == self._signature:
+            return False
+        self.scan()
+        return True
+
+    def _watch(self, interval: float):
+        while not self._watch_stop.wait(interval):
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                logger.error(f"Static assets watcher error: {e}")
+
+    def start_watcher(self, interval: float = 1.0):
+        """Poll dist/ and reload the index on change (dev: `npm run build` while running)"""
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=self._watch, args=(interval,),
+                                              name="static-assets-watcher", daemon=True)
+        self._watch_thread.start()
+
+    def stop_watcher(self):
+        self._watch_stop.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join(5)
+            self._watch_thread = None
+
+    @staticmethod
+    def negotiate(asset: StaticAsset) -> str:
+        """Best encoding of the asset that the current request accepts"""
+        accepted = request.accept_encodings
+        for encoding, _ in ENCODINGS:
+            if encoding in asset.files and accepted[encoding] > 0:
+                return encoding
+        return "identity"
+
+    def _cache_control(self, asset: StaticAsset) -> str:
+        if asset.immutable:
+            return IMMUTABLE_CACHE_CONTROL
+        if self.max_age > 0:
+            return f"public, max-age={self.max_age}"
+        return "no-cache"
+
+    def response(self, url_path: str):
+        """
+        Response for a URL path, or None if it is not in the index
+
+        Conditional GETs are answered with 304 before any file is opened.
+        """
+        asset = self.lookup(url_path)
+        if asset is None:
+            return None
+
+        encoding = self.negotiate(asset)
+        asset_file = asset.files[encoding]
+        response_class = current_app.response_class
+
+        if request.if_none_match.contains(asset_file.etag):
+            response = response_class(status=304)
+        else:
+            if asset_file.data is not None:
+                body = asset_file.data
+            else:
+                # wsgi.file_wrapper: gunicorn dùng sendfile(), không copy qua Python
+                body = wrap_file(request.environ, open(asset_file.path, "rb"), buffer_size=64 * 1024)
+            response = response_class(body, mimetype=asset.content_type, direct_passthrough=True)
+            response.content_length = asset_file.size
+            if encoding != "identity":
+                response.content_encoding = encoding
+
+        response.set_etag(asset_file.etag)
+        response.last_modified = asset.mtime
+        response.headers["Cache-Control"] = self._cache_control(asset)
+        if len(asset.files) > 1:
+            response.vary.add("Accept-Encoding")
+        return response
+
+
+def compress_directory(root: str, min_size: int = 1024) -> int:
+    """
+    Write ``.gz`` (and ``.br`` when brotli is installed) next to every
+    compressible file larger than min_size whose variant is missing or stale
+
+    Returns:
+        int: Number of variant files written
+    """
+    written = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith((".gz", ".br")) or _content_type(name) not in COMPRESSIBLE_TYPES:
+                continue
+            path = os.path.join(dirpath, name)
+            stat = os.stat(path)
+            if stat.st_size < min_size:
+                continue
+            compressors = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                compressors.append((".br", lambda data: brotli.compress(data, quality=11)))
+            data = None
+            for suffix, compress in compressors:
+                variant = path + suffix
+                if os.path.exists(variant) and os.path.getmtime(variant) >= stat.st_mtime:
+                    continue
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                compressed = compress(data)
+                if len(compressed) >= len(data):
+                    continue
+                with open(variant, "wb") as f:
+                    f.write(compressed)
+                written += 1
+    return written
+
+
+def init_static_assets(app, root: str) -> StaticAssets:
+    """
+    Index the frontend build and keep it in app.extensions
+
+    Args:
+        app: Flask application instance
+        root: Build directory (``dist/``)
+    """
+    assets = StaticAssets(
+        root,
+        max_age=app.config.get("STATIC_MAX_AGE", 0),
+        memory_max_size=app.config.get("STATIC_MEMORY_MAX_SIZE", 64 * 1024),
+        spa_fallback=app.config.get("STATIC_SPA_FALLBACK", True),
+    )
+    assets.scan()
+    if app.config.get("STATIC_WATCH"):
+        assets.start_watcher(app.config.get("STATIC_WATCH_INTERVAL", 1.0))
+    app.extensions["static_assets"] = assets
+    return assets
+
+
+def get_static_assets() -> StaticAssets:
+    return current_app.extensions["static_assets"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-compress a frontend build (gzip, brotli if installed)")
+    parser.add_argument("root", help="Build directory, e.g. 'Web Interface for AURA Clinic (1)/dist'")
+    parser.add_argument("--min-size", type=int, default=1024, help="Skip files smaller than this (bytes)")
+    args = parser.parse_args()
+    count = compress_directory(args.root, args.min_size)
+    print(f"Wrote {count} compressed files{'' if brotli else ' (brotli not installed: gzip only)'}")
@@ -0,0 +1,91 @@
+"""
+Minimal local SMTP server for tests (stand-in for aiosmtpd / a debugging relay)
+No TLS or AUTH: use SMTP_USE_TLS=false and no SENDER_PASSWORD against it.
+"""
+
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self._reply("220 stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().split(" ")[0].upper()
+            if command == "EHLO":
+                self._reply("250-stub")
+                self._reply("250 8BITMIME")
+            elif command in ("HELO", "RSET", "NOOP", "RCPT"):
+                self._reply("250 OK")
+            elif command == "MAIL":
+                with server.lock:
+                    if server.fail_next > 0:
+                        server.fail_next -= 1
+                        self._reply("451 Temporary failure")
+                        continue
+                if server.reject:
+                    self._reply("550 Mailbox unavailable")
+                else:
+                    self._reply("250 OK")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line in (b".\r\n", b""):
+                        break
+                    data.append(data_line)
+                with server.lock:
+                    server.messages.append(b"".join(data).decode(errors="replace"))
+                self._reply("250 Queued")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Not implemented")
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """
+    SMTP server on 127.0.0.1 (random port) that records received messages
+
+    Attributes:
+        messages: Raw DATA of each accepted message
+        connections: Number of TCP connections opened
+        fail_next: Reply 451 to the next N MAIL commands
+        reject: Reply 550 to every MAIL command
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.fail_next = 0
+        self.reject = False
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
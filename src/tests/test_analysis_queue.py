@@ -0,0 +1,239 @@
+"""
+Analysis Queue - Integration Tests
+Tests for batch claims, leases, heartbeats, retries and poison-job quarantine on analysis_requests
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects import mssql, postgresql
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from infrastructure.databases.base import Base
+from infrastructure.databases.mssql import create_engines, create_session_factory
+from infrastructure.databases.schema import import_all_models
+from infrastructure.models.analysis_request_model import AnalysisRequestModel
+from infrastructure.repositories.analysis_request_repository import AnalysisRequestRepository
+from services.analysis_queue import AnalysisWorker, PermanentJobError
+
+
+def _factory(tmp_path, create=False):
+    writer, readers = create_engines(f"sqlite:///{tmp_path / 'queue.db'}")
+    if create:
+        import_all_models()
+        Base.metadata.create_all(bind=writer)
+    return create_session_factory(writer, readers)
+
+
+def _enqueue(factory, count):
+    session = factory()
+    try:
+        repo = AnalysisRequestRepository(session)
+        return [repo.enqueue(model_version="v1") for _ in range(count)]
+    finally:
+        session.close()
+
+
+def _job(factory, job_id):
+    session = factory()
+    try:
+        return session.get(AnalysisRequestModel, job_id)
+    finally:
+        session.close()
+
+
+def _ok_handler(processed):
+    def handler(session, jobs):
+        processed.extend(job["id"] for job in jobs)
+        return [None] * len(jobs)
+    return handler
+
+
+class TestAnalysisRequestRepository:
+    """Test claims and leases at the repository level"""
+
+    def test_claim_batch_is_exclusive(self, tmp_path):
+        factory = _factory(tmp_path, create=True)
+        ids = _enqueue(factory, 5)
+        session = factory()
+        repo = AnalysisRequestRepository(session)
+
+        first = repo.claim_batch("w1", 3, 60, 5)
+        second = repo.claim_batch("w2", 3, 60, 5)
+        assert [job["id"] for job in first] == ids[:3]
+        assert [job["id"] for job in second] == ids[3:]
+        assert first[0]["lease_token"] != second[0]["lease_token"]
+        assert first[0]["attempts"] == 1
+        assert repo.claim_batch("w3", 3, 60, 5) == []
+        session.close()
+
+    def test_expired_lease_is_reclaimed_and_old_holder_loses(self, tmp_path):
+        factory = _factory(tmp_path, create=True)
+        [job_id] = _enqueue(factory, 1)
+        session = factory()
+        repo = AnalysisRequestRepository(session)
+
+        old = repo.claim_batch("w1", 1, 60, 5)[0]
+        session.query(AnalysisRequestModel).update({"locked_until": datetime.utcnow() - timedelta(seconds=1)})
+        session.commit()
+        new = repo.claim_batch("w2", 1, 60, 5)[0]
+        assert new["id"] == job_id
+        assert new["attempts"] == 2
+
+        # Worker cũ (mất lease) không được ghi kết quả
+        assert repo.complete([job_id], old["lease_token"]) == 0
+        assert repo.heartbeat(old["lease_token"], 60) == 0
+        assert repo.complete([job_id], new["lease_token"]) == 1
+        assert _job(factory, job_id).status == "done"
+        session.close()
+
+    def test_heartbeat_extends_lease(self, tmp_path):
+        factory = _factory(tmp_path, create=True)
+        [job_id] = _enqueue(factory, 1)
+        session = factory()
+        repo = AnalysisRequestRepository(session)
+
+        token = repo.claim_batch("w1", 1, 10, 5)[0]["lease_token"]
+        before = _job(factory, job_id).locked_until
+        assert repo.heartbeat(token, 600) == 1
+        assert _job(factory, job_id).locked_until > before + timedelta(seconds=500)
+        session.close()
+
+    def test_poison_job_quarantined_after_expired_leases(self, tmp_path):
+        factory = _factory(tmp_path, create=True)
+        [job_id] = _enqueue(factory, 1)
+        session = factory()
+        repo = AnalysisRequestRepository(session)
+
+        for _ in range(2):
+            assert repo.claim_batch("w", 1, 60, 2)
+            # Worker "chết": lease hết hạn mà không báo kết quả
+            session.query(AnalysisRequestModel).update({"locked_until": datetime.utcnow() - timedelta(seconds=1)})
+            session.commit()
+
+        assert repo.claim_batch("w", 1, 60, 2) == []
+        assert repo.quarantine_expired(2) == 1
+        assert _job(factory, job_id).status == "quarantined"
+
+        assert repo.requeue() == 1
+        job = _job(factory, job_id)
+        assert job.status == "queued"
+        assert job.attempts == 0
+        session.close()
+
+
+    def test_claim_skips_locked_rows_on_each_dialect(self, tmp_path, monkeypatch):
+        session = _factory(tmp_path, create=True)()
+        statements = []
+        execute = session.execute
+
+        def recording_execute(statement, *args, **kwargs):
+            statements.append(statement)
+            return execute(statement, *args, **kwargs)
+
+        monkeypatch.setattr(session, "execute", recording_execute)
+        try:
+            AnalysisRequestRepository(session).claim_batch("w1", limit=5, lease_seconds=60, max_attempts=3)
+        finally:
+            session.close()
+
+        assert "WITH (UPDLOCK, READPAST, ROWLOCK)" in str(statements[0].compile(dialect=mssql.dialect()))
+        assert "FOR UPDATE SKIP LOCKED" in str(statements[0].compile(dialect=postgresql.dialect()))
+
+
+class TestAnalysisWorker:
+    """Test the worker outcomes and parallel draining"""
+
+    def test_batch_done(self, tmp_path):
+        factory = _factory(tmp_path, create=True)
+        ids = _enqueue(factory, 4)
+        processed = []
+        worker = AnalysisWorker(factory, _ok_handler(processed), batch_size=10)
+
+        result = worker.process_once()
+        assert result["claimed"] == 4
+        assert result["done"] == 4
+        assert processed == ids
+        job = _job(factory, ids[0])
+        assert job.status == "done"
+        assert job.completed_at is not None
+        assert job.lease_token is None
+
+    def test_errors_retry_then_quarantine(self, tmp_path):
+        factory = _factory(tmp_path, create=True)
+        [job_id] = _enqueue(factory, 1)
+
+        def handler(session, jobs):
+            return [RuntimeError("model crashed")] * len(jobs)
+
+        worker = AnalysisWorker(factory, handler, max_attempts=2, backoff_base=60)
+        assert worker.process_once()["retried"] == 1
+        job = _job(factory, job_id)
+        assert job.status == "queued"
+        assert "model crashed" in job.last_error
+        assert job.next_attempt_at > datetime.utcnow() + timedelta(seconds=50)
+        assert worker.process_once()["claimed"] == 0
+
+        session = factory()
+        session.query(AnalysisRequestModel).update({"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)})
+        session.commit()
+        session.close()
+        assert worker.process_once()["quarantined"] == 1
+        assert _job(factory, job_id).status == "quarantined"
+
+    def test_permanent_error_fails_without_retry(self, tmp_path):
+        factory = _factory(tmp_path, create=True)
+        ok_id, bad_id = _enqueue(factory, 2)
+
+        def handler(session, jobs):
+            return [None if job["id"] == ok_id else PermanentJobError("unreadable image") for job in jobs]
+
+        result = AnalysisWorker(factory, handler).process_once()
+        assert result["done"] == 1
+        assert result["failed"] == 1
+        assert _job(factory, ok_id).status == "done"
+        assert _job(factory, bad_id).status == "failed"
+
+    def test_handler_exception_retries_whole_batch(self, tmp_path):
+        factory = _factory(tmp_path, create=True)
+        _enqueue(factory, 3)
+
+        def handler(session, jobs):
+            raise RuntimeError("backend unavailable")
+
+        result = AnalysisWorker(factory, handler).process_once()
+        assert result["retried"] == 3
+
+    def test_parallel_workers_never_double_process(self, tmp_path):
+        _factory(tmp_path, create=True)
+        ids = _enqueue(_factory(tmp_path), 200)
+        processed = []
+        lock = threading.Lock()
+
+        def handler(session, jobs):
+            with lock:
+                processed.extend(job["id"] for job in jobs)
+            return [None] * len(jobs)
+
+        def drain():
+            # Mỗi worker có engine riêng, như một process riêng
+            worker = AnalysisWorker(_factory(tmp_path), handler, batch_size=7)
+            idle = 0
+            while idle < 3:
+                try:
+                    idle = idle + 1 if worker.process_once()["claimed"] == 0 else 0
+                except Exception:
+                    idle = 0
+
+        threads = [threading.Thread(target=drain) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+
+        assert sorted(processed) == ids
+        session = _factory(tmp_path)()
+        assert AnalysisRequestRepository(session).count_by_status() == {"done": 200}
+        session.close()
@@ -0,0 +1,64 @@
+"""
+Read/Write Split - Integration Tests
+Primary + read replica routing, using two SQLite files as primary and replica
+"""
+
+from infrastructure.databases.mssql import create_engines, create_session_factory
+from infrastructure.models.user_model import UserModel
+from infrastructure.repositories.user_repository import UserRepository
+
+
+class TestReplicaRouting:
+    """Test that reads go to replicas and writes (plus later reads) to the primary"""
+
+    def _make(self, tmp_path, replicas=1):
+        primary_uri = f"sqlite:///{tmp_path / 'primary.db'}"
+        replica_uris = [f"sqlite:///{tmp_path / f'replica{i}.db'}" for i in range(replicas)]
+        writer, readers = create_engines(primary_uri, replica_uris)
+        for engine in [writer, *readers]:
+            UserModel.__table__.create(bind=engine, checkfirst=True)
+        factory = create_session_factory(writer, readers, sticky_session=True)
+        return writer, readers, factory
+
+    def test_reads_go_to_replica(self, tmp_path):
+        writer, readers, factory = self._make(tmp_path)
+        session = factory()
+        UserRepository(session).create("primary@example.com", "hash")
+        session.close()
+
+        # Replica chưa nhận được bản ghi (giả lập replication lag)
+        session = factory()
+        assert session.get_bind() is readers[0]
+        assert UserRepository(session).find_by_email("primary@example.com") is None
+        session.close()
+
+    def test_read_your_writes_within_request(self, tmp_path):
+        writer, readers, factory = self._make(tmp_path)
+        session = factory()
+        repo = UserRepository(session)
+        user = repo.create("sticky@example.com", "hash")
+
+        # Sau khi commit, cùng session (= cùng request) vẫn đọc từ primary
+        assert session.get_bind() is writer
+        assert repo.find_by_id(user["id"])["email"] == "sticky@example.com"
+        assert repo.find_by_email("sticky@example.com") is not None
+
+        # Session mới (request mới) lại đọc từ replica
+        session.close()
+        assert session.get_bind() is readers[0]
+
+    def test_round_robin_between_replicas(self, tmp_path):
+        writer, readers, factory = self._make(tmp_path, replicas=2)
+        binds = []
+        for _ in range(4):
+            session = factory()
+            binds.append(session.get_bind())
+            session.close()
+        assert binds == [readers[0], readers[1], readers[0], readers[1]]
+
+    def test_single_database_uses_plain_session(self):
+        writer, readers = create_engines("sqlite:///:memory:")
+        assert readers == [writer]
+        session = create_session_factory(writer, readers)()
+        assert session.get_bind() is writer
+        session.close()
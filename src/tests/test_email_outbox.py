@@ -0,0 +1,197 @@
+"""
+Email Outbox - Integration Tests
+Tests for queueing, retry with backoff and dead letters, against a local SMTP stub
+"""
+
+import os
+import uuid
+from datetime import datetime
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from create_app import create_app
+from infrastructure.databases.schema import import_all_models
+from infrastructure.databases.mssql import create_engines, create_session_factory, SessionFactory
+from infrastructure.models.email_outbox_model import EmailOutboxModel
+from infrastructure.repositories.email_outbox_repository import EmailOutboxRepository
+from services.email_outbox import EmailOutbox
+from smtp_stub import SMTPStub
+
+
+def _email_service(port):
+    # Import trong hàm: test_email_verification cần tạo singleton email_service sau khi set env
+    from services.email_service import EmailService
+    service = EmailService()
+    service.smtp_server = "127.0.0.1"
+    service.smtp_port = port
+    service.sender_password = ""
+    service.use_tls = False
+    service.dry_run = False
+    return service
+
+
+class TestEmailOutbox:
+    """Test EmailOutbox against the SMTP stub"""
+
+    def _make(self, tmp_path, smtp, **kwargs):
+        import_all_models()  # mapper cần mọi model khi file test chạy riêng
+        writer, readers = create_engines(f"sqlite:///{tmp_path / 'outbox.db'}")
+        EmailOutboxModel.__table__.create(bind=writer)
+        factory = create_session_factory(writer, readers)
+        outbox = EmailOutbox(factory, email_service=_email_service(smtp.port), **kwargs)
+        return outbox, factory
+
+    def _status(self, factory, message_id):
+        session = factory()
+        try:
+            return session.get(EmailOutboxModel, message_id)
+        finally:
+            session.close()
+
+    def _enqueue(self, outbox, factory):
+        session = factory()
+        try:
+            return outbox.enqueue(session, "patient@example.com", "Subject", "Text body", "<p>Html</p>")
+        finally:
+            session.close()
+
+    def test_enqueue_and_send(self, tmp_path):
+        with SMTPStub() as smtp:
+            outbox, factory = self._make(tmp_path, smtp)
+            message_id = self._enqueue(outbox, factory)
+            assert smtp.messages == []
+
+            assert outbox.drain_once() == {"sent": 1, "retried": 0, "dead": 0}
+            assert len(smtp.messages) == 1
+            assert "Subject: Subject" in smtp.messages[0]
+            message = self._status(factory, message_id)
+            assert message.status == "sent"
+            assert message.sent_at is not None
+
+            # Message đã gửi không bị gửi lại
+            assert outbox.drain_once() == {"sent": 0, "retried": 0, "dead": 0}
+
+    def test_temporary_failure_is_retried_with_backoff(self, tmp_path):
+        with SMTPStub() as smtp:
+            smtp.fail_next = 1
+            outbox, factory = self._make(tmp_path, smtp, backoff_base=60)
+            message_id = self._enqueue(outbox, factory)
+
+            assert outbox.drain_once()["retried"] == 1
+            message = self._status(factory, message_id)
+            assert message.status == "pending"
+            assert message.attempts == 1
+            assert "451" in message.last_error
+            assert (message.next_attempt_at - datetime.utcnow()).total_seconds() > 50
+
+            # Chưa tới lượt retry
+            assert outbox.drain_once()["sent"] == 0
+
+            session = factory()
+            session.query(EmailOutboxModel).filter(EmailOutboxModel.id == message_id).update(
+                {"next_attempt_at": datetime.utcnow()}
+            )
+            session.commit()
+            session.close()
+            assert outbox.drain_once()["sent"] == 1
+            assert self._status(factory, message_id).attempts == 2
+
+    def test_permanent_failure_goes_to_dead_letter(self, tmp_path):
+        with SMTPStub() as smtp:
+            smtp.reject = True
+            outbox, factory = self._make(tmp_path, smtp)
+            message_id = self._enqueue(outbox, factory)
+
+            assert outbox.drain_once()["dead"] == 1
+            assert self._status(factory, message_id).status == "dead"
+
+    def test_dead_letter_after_max_attempts(self, tmp_path):
+        with SMTPStub() as smtp:
+            smtp.fail_next = 10
+            outbox, factory = self._make(tmp_path, smtp, max_attempts=2, backoff_base=0)
+            message_id = self._enqueue(outbox, factory)
+
+            assert outbox.drain_once()["retried"] == 1
+            assert outbox.drain_once()["dead"] == 1
+            message = self._status(factory, message_id)
+            assert message.status == "dead"
+            assert message.attempts == 2
+
+            session = factory()
+            assert EmailOutboxRepository(session).requeue_dead() == 1
+            session.close()
+            smtp.fail_next = 0
+            assert outbox.drain_once()["sent"] == 1
+
+    def test_expired_lease_on_last_attempt_is_dead_lettered(self, tmp_path):
+        with SMTPStub() as smtp:
+            outbox, factory = self._make(tmp_path, smtp, max_attempts=2)
+            message_id = self._enqueue(outbox, factory)
+
+            # Sender bị kill sau mỗi lần claim: lease hết hạn mà không có kết quả
+            session = factory()
+            repo = EmailOutboxRepository(session)
+            for _ in range(2):
+                [message] = repo.claim_due(10, lease_seconds=-1, max_attempts=2)
+            assert repo.claim_due(10, lease_seconds=-1, max_attempts=2) == []
+            session.close()
+
+            assert outbox.drain_once() == {"sent": 0, "retried": 0, "dead": 1}
+            message = self._status(factory, message_id)
+            assert message.status == "dead"
+            assert message.attempts == 2
+            assert "Lease expired" in message.last_error
+            assert smtp.messages == []
+
+    def test_outcome_needs_the_current_lease(self, tmp_path):
+        with SMTPStub() as smtp:
+            outbox, factory = self._make(tmp_path, smtp)
+            message_id = self._enqueue(outbox, factory)
+
+            session = factory()
+            repo = EmailOutboxRepository(session)
+            [stale] = repo.claim_due(10, lease_seconds=-1, max_attempts=6)
+            [current] = repo.claim_due(10, lease_seconds=60, max_attempts=6)
+            assert stale["lease_token"] != current["lease_token"]
+
+            # Sender cũ (mất lease) không được ghi đè kết quả của sender đang giữ message
+            assert repo.mark_sent(message_id, stale["lease_token"]) is False
+            assert repo.mark_dead(message_id, stale["lease_token"], "late") is False
+            assert self._status(factory, message_id).status == "sending"
+            assert repo.mark_sent(message_id, current["lease_token"]) is True
+            session.close()
+            assert self._status(factory, message_id).status == "sent"
+
+    def test_backoff_grows_and_is_capped(self, tmp_path):
+        outbox = EmailOutbox(None, backoff_base=10, backoff_max=100)
+        assert 10 <= outbox.backoff(1) <= 11
+        assert 40 <= outbox.backoff(3) <= 44
+        assert 100 <= outbox.backoff(10) <= 110
+
+
+class TestEmailRoutesUseOutbox:
+    """Test that the email routes only queue the message"""
+
+    def test_resend_verification_email_is_queued(self, monkeypatch):
+        monkeypatch.setenv('FLASK_ENV', 'testing')
+        app = create_app()
+        client = app.test_client()
+        email = f"outbox-{uuid.uuid4().hex[:8]}@example.com"
+        resp = client.post('/api/auth/register', json={
+            "email": email,
+            "password": "Password123",
+            "fullName": "Outbox User"
+        })
+        assert resp.status_code == 201
+
+        resp = client.post('/api/auth/resend-verification-email', json={"email": email})
+        assert resp.status_code == 200
+
+        session = SessionFactory()
+        try:
+            queued = session.query(EmailOutboxModel).filter_by(recipient=email).all()
+            assert len(queued) == 1
+            assert queued[0].status == "pending"
+            assert "verify-email?token=" in queued[0].text_body
+        finally:
+            session.close()
@@ -0,0 +1,98 @@
+"""
+Email Template Renderer - Unit Tests
+Tests for compiled template caching, locale fallback and invalidation
+"""
+
+import pytest
+from jinja2.exceptions import SecurityError
+
+from infrastructure.databases.mssql import create_engines, create_session_factory
+from infrastructure.models.notification_template_model import NotificationTemplateModel
+from services.email_templates import (
+    EMAIL_VERIFICATION, PASSWORD_RESET, EmailTemplateRenderer, TemplateNotFoundError,
+)
+
+
+class TestEmailTemplateRenderer:
+    """Test EmailTemplateRenderer against a SQLite notification_templates table"""
+
+    def _make(self, tmp_path, **kwargs):
+        writer, readers = create_engines(f"sqlite:///{tmp_path / 'templates.db'}")
+        NotificationTemplateModel.__table__.create(bind=writer)
+        factory = create_session_factory(writer, readers)
+        return EmailTemplateRenderer(factory, **kwargs), factory
+
+    def _add(self, factory, **values):
+        session = factory()
+        try:
+            row = NotificationTemplateModel(channel="email", **values)
+            session.add(row)
+            session.commit()
+            return row.id
+        finally:
+            session.close()
+
+    def test_builtin_template_when_no_row(self, tmp_path):
+        renderer, _ = self._make(tmp_path)
+        email = renderer.render(EMAIL_VERIFICATION, name="Lan", verification_url="http://x/verify-email?token=abc")
+        assert email.subject == "AURA - Xác nhận địa chỉ email của bạn"
+        assert "Xin chào Lan" in email.text_body
+        assert 'href="http://x/verify-email?token=abc"' in email.html_body
+        assert renderer.get(EMAIL_VERIFICATION).source == "builtin"
+
+    def test_compiled_once_per_code_and_locale(self, tmp_path):
+        renderer, _ = self._make(tmp_path)
+        for i in range(50):
+            renderer.render(PASSWORD_RESET, name=f"user{i}", reset_url="http://x")
+        renderer.render(PASSWORD_RESET, "en", name="user", reset_url="http://x")
+        assert renderer.compiles == 2
+
+    def test_unknown_locale_falls_back_to_default(self, tmp_path):
+        renderer, _ = self._make(tmp_path)
+        assert renderer.get(PASSWORD_RESET, "fr").locale == "vi"
+        assert renderer.render(PASSWORD_RESET, "en", name="Ann", reset_url="http://x").subject == "AURA - Reset your password"
+
+    def test_database_row_is_sandboxed(self, tmp_path):
+        renderer, factory = self._make(tmp_path)
+        self._add(factory, template_code=PASSWORD_RESET, locale="vi", title_tpl="{{ name }}",
+                  body_tpl="{{ name.__class__.__mro__[1].__subclasses__() }}")
+        with pytest.raises(SecurityError):
+            renderer.render(PASSWORD_RESET, name="Lan", reset_url="http://x")
+
+    def test_database_row_overrides_builtin(self, tmp_path):
+        renderer, factory = self._make(tmp_path)
+        self._add(factory, template_code=EMAIL_VERIFICATION, locale="vi", title_tpl="Chào {{ name }}",
+                  body_tpl="Mở {{ verification_url }}", html_tpl="<b>{{ name }}</b>")
+        email = renderer.render(EMAIL_VERIFICATION, name="<Lan>", verification_url="http://x")
+        assert email.subject == "Chào <Lan>"
+        assert email.text_body == "Mở http://x"
+        assert email.html_body == "<b>&lt;Lan&gt;</b>"
+
+    def test_row_change_invalidates_cache(self, tmp_path):
+        renderer, factory = self._make(tmp_path)
+        # Listener xóa cache của singleton template_renderer, gắn cùng listener cho renderer test
+        from services import email_templates
+        original = email_templates.template_renderer
+        email_templates.template_renderer = renderer
+        try:
+            row_id = self._add(factory, template_code="RESULT_READY", title_tpl="v1", body_tpl="{{ name }}")
+            assert renderer.render("RESULT_READY", name="a").subject == "v1"
+
+            session = factory()
+            session.get(NotificationTemplateModel, row_id).title_tpl = "v2"
+            session.commit()
+            session.close()
+            assert renderer.render("RESULT_READY", name="a").subject == "v2"
+        finally:
+            email_templates.template_renderer = original
+
+    def test_inactive_row_is_ignored(self, tmp_path):
+        renderer, factory = self._make(tmp_path)
+        self._add(factory, template_code="RESULT_READY", title_tpl="t", body_tpl="b", active=False)
+        with pytest.raises(TemplateNotFoundError):
+            renderer.get("RESULT_READY")
+
+    def test_missing_variable_raises(self, tmp_path):
+        renderer, _ = self._make(tmp_path)
+        with pytest.raises(Exception):
+            renderer.render(EMAIL_VERIFICATION, name="Lan")
@@ -16,3 +16,69 @@ def test_healthcheck_returns_ok():
     assert data.get('data', {}).get('status') == 'ok'
     # db_status may be True/False depending on environment; ensure key exists
     assert 'db_status' in data.get('data', {})
+
+
+def test_livez_and_readyz():
+    os.environ['FLASK_ENV'] = 'testing'
+    client = create_app().test_client()
+
+    assert client.get('/livez').get_json() == {"status": "ok"}
+    resp = client.get('/readyz')
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["ready"] is True
+    assert set(data["checks"]) >= {"db", "disk"}
+
+
+def test_readyz_result_is_cached():
+    os.environ['FLASK_ENV'] = 'testing'
+    app = create_app()
+    client = app.test_client()
+    calls = []
+    checker = app.extensions["health_checker"]
+    checker.checks = {"db": lambda: calls.append(1)}
+
+    checker.run_checks()
+    for _ in range(5):
+        client.get('/readyz')
+        client.get('/api/health')
+    assert len(calls) == 1
+
+    # Hết TTL: probe kế tiếp chạy lại check
+    checker.ttl = 0
+    client.get('/readyz')
+    assert len(calls) == 2
+
+
+def test_not_ready_returns_503():
+    os.environ['FLASK_ENV'] = 'testing'
+    app = create_app()
+    client = app.test_client()
+    checker = app.extensions["health_checker"]
+
+    def db_down():
+        raise ConnectionError("database is down")
+
+    checker.checks = {"db": db_down}
+    checker.run_checks()
+
+    resp = client.get('/readyz')
+    assert resp.status_code == 503
+    assert resp.get_json()["checks"]["db"]["error"] == "database is down"
+
+    resp = client.get('/api/health')
+    assert resp.status_code == 503
+    assert resp.get_json()["success"] is False
+    assert client.get('/livez').status_code == 200
+
+
+def test_non_critical_failure_is_degraded():
+    from services.health import HealthChecker
+
+    def smtp_down():
+        raise OSError("connection refused")
+
+    checker = HealthChecker({"db": lambda: None, "smtp": smtp_down}, critical=["db"])
+    result = checker.status()
+    assert result["ready"] is True
+    assert result["status"] == "degraded"
@@ -0,0 +1,171 @@
+"""
+Image Store - Unit Tests
+Tests for content-addressed blobs, upload dedup, the checksum index and the integrity scrubber
+"""
+
+import hashlib
+import io
+import os
+
+import pytest
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from infrastructure.databases.base import Base
+from infrastructure.databases.mssql import create_engines, create_session_factory
+from infrastructure.databases.schema import import_all_models
+from infrastructure.repositories.retinal_image_repository import RetinalImageRepository
+from services.analysis_queue import PermanentJobError
+from services.image_store import ChecksumMismatchError, ImageStore, ImageTooLargeError
+from services.inference import read_local_image
+
+
+class _ChunkedStream(io.BytesIO):
+    """File object that records the size of every read"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+def _store(tmp_path, **kwargs):
+    return ImageStore(str(tmp_path / "images"), fsync=False, **kwargs)
+
+
+class TestImageStore:
+    """Test writes, dedup and reads"""
+
+    def test_put_streams_into_content_address(self, tmp_path):
+        store = _store(tmp_path, chunk_size=1024)
+        data = os.urandom(10 * 1024 + 7)
+        stream = _ChunkedStream(data)
+
+        blob = store.put(stream)
+        checksum = hashlib.sha256(data).hexdigest()
+        assert blob.checksum == checksum
+        assert blob.size == len(data)
+        assert blob.created
+        assert blob.url == f"cas://sha256/{checksum}"
+        assert store.path_for(checksum).endswith(os.path.join("sha256", checksum[:2], checksum[2:4], checksum))
+        assert store.read(blob.url) == data
+        # Đọc theo chunk, không bao giờ đọc cả file
+        assert set(stream.reads) == {1024}
+        assert os.listdir(store.tmp_dir) == []
+
+    def test_duplicate_upload_keeps_one_blob(self, tmp_path):
+        store = _store(tmp_path)
+        first = store.put(io.BytesIO(b"fundus"))
+        second = store.put(io.BytesIO(b"fundus"))
+        assert second.checksum == first.checksum
+        assert not second.created
+        assert list(store.iter_checksums()) == [first.checksum]
+        assert os.listdir(store.tmp_dir) == []
+
+    def test_size_limit_discards_partial_blob(self, tmp_path):
+        store = _store(tmp_path, chunk_size=4)
+        with pytest.raises(ImageTooLargeError):
+            store.put(io.BytesIO(b"x" * 20), max_size=10)
+        assert list(store.iter_checksums()) == []
+        assert os.listdir(store.tmp_dir) == []
+
+    def test_expected_checksum_mismatch(self, tmp_path):
+        store = _store(tmp_path)
+        with pytest.raises(ChecksumMismatchError):
+            store.put(io.BytesIO(b"fundus"), expected_checksum="0" * 64)
+        assert list(store.iter_checksums()) == []
+
+        checksum = hashlib.sha256(b"fundus").hexdigest()
+        assert store.put(io.BytesIO(b"fundus"), expected_checksum=checksum.upper()).checksum == checksum
+
+    def test_incremental_writer(self, tmp_path):
+        store = _store(tmp_path)
+        with store.writer() as writer:
+            for chunk in (b"ab", b"cd", b"ef"):
+                writer.write(chunk)
+            blob = writer.commit()
+        assert blob.checksum == hashlib.sha256(b"abcdef").hexdigest()
+
+        writer = store.writer()
+        writer.write(b"never committed")
+        writer.abort()
+        assert os.listdir(store.tmp_dir) == []
+
+    def test_rejects_invalid_addresses(self, tmp_path):
+        store = _store(tmp_path)
+        with pytest.raises(ValueError):
+            store.path_for("../../etc/passwd")
+        assert ImageStore.checksum_from_url("cas://sha256/../x") is None
+        assert ImageStore.checksum_from_url("/data/image.jpg") is None
+
+
+class TestImageScrubber:
+    """Test integrity verification"""
+
+    def test_scrub_quarantines_corrupt_blob(self, tmp_path):
+        store = _store(tmp_path)
+        good = store.put(io.BytesIO(b"good image"))
+        bad = store.put(io.BytesIO(b"bad image"))
+        with open(store.path_for(bad.checksum), "r+b") as f:
+            f.write(b"X")
+
+        result = store.scrub()
+        assert result["checked"] == 2
+        assert result["corrupt"] == 1
+        assert not store.exists(bad.checksum)
+        assert store.exists(good.checksum)
+        assert len(os.listdir(store.quarantine_dir)) == 1
+
+        # Upload lại cùng ảnh khôi phục blob
+        assert store.put(io.BytesIO(b"bad image")).created
+        assert store.verify(bad.checksum)
+
+    def test_only_one_scrubber_holds_the_lock(self, tmp_path):
+        store = _store(tmp_path)
+        lock = store._try_lock()
+        try:
+            assert lock is not None
+            assert ImageStore(store.root)._try_lock() is None
+        finally:
+            lock.close()
+
+    def test_cleanup_removes_stale_temp_files(self, tmp_path):
+        store = _store(tmp_path)
+        stale = os.path.join(store.tmp_dir, "upload-stale")
+        open(stale, "wb").close()
+        os.utime(stale, (0, 0))
+        open(os.path.join(store.tmp_dir, "upload-active"), "wb").close()
+        assert store.cleanup_tmp() == 1
+        assert os.listdir(store.tmp_dir) == ["upload-active"]
+
+
+class TestChecksumIndex:
+    """Test retinal_images lookups and cas:// reads by the inference loader"""
+
+    def test_find_by_checksum(self, tmp_path):
+        writer, readers = create_engines(f"sqlite:///{tmp_path / 'images.db'}")
+        import_all_models()
+        Base.metadata.create_all(bind=writer)
+        session = create_session_factory(writer, readers)()
+        store = _store(tmp_path)
+        try:
+            repo = RetinalImageRepository(session)
+            blob = store.put(io.BytesIO(b"fundus"))
+            first = repo.create("FUNDUS", blob.url, blob.checksum)
+            repo.create("FUNDUS", blob.url, blob.checksum)
+            assert repo.find_by_checksum(blob.checksum).id == first.id
+            assert repo.count_by_checksum(blob.checksum) == 2
+            assert repo.find_by_checksum("0" * 64) is None
+            assert [image.id for image in repo.find_by_checksums([blob.checksum])] == [first.id, first.id + 1]
+        finally:
+            session.close()
+
+    def test_inference_loader_reads_cas_urls(self, tmp_path):
+        store = _store(tmp_path)
+        blob = store.put(io.BytesIO(b"fundus"))
+        assert read_local_image(blob.url, store=store) == b"fundus"
+        with pytest.raises(PermanentJobError):
+            read_local_image(ImageStore.url_for("0" * 64), store=store)
@@ -0,0 +1,236 @@
+"""
+Image Upload - Integration Tests
+Tests for streamed multipart uploads, size limits, backpressure and resumable uploads on /api/images
+"""
+
+import hashlib
+import io
+import os
+import uuid
+
+import pytest
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from create_app import create_app
+from infrastructure.databases.mssql import get_db_session
+from infrastructure.models.analysis_request_model import AnalysisRequestModel
+from infrastructure.models.retinal_image_model import RetinalImageModel
+from services.image_store import ImageStore, init_image_store
+from services.image_upload import UploadError, init_image_uploads, receive_multipart
+
+BOUNDARY = "aura-test-boundary"
+
+
+def _multipart(fields, files):
+    """Encode a multipart/form-data body by hand (no request.files on either side)"""
+    body = b""
+    for name, value in fields.items():
+        body += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n').encode()
+    for name, filename, content in files:
+        body += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                 f'Content-Type: image/jpeg\r\n\r\n').encode() + content + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+class _ChunkedStream(io.BytesIO):
+    """Request body that records how much was read"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.read_bytes += len(chunk)
+        return chunk
+
+
+class TestReceiveMultipart:
+    """Test the streaming decoder on its own"""
+
+    def test_fields_and_files(self, tmp_path):
+        store = ImageStore(str(tmp_path), fsync=False)
+        body = _multipart({"imageType": "OCT"}, [("images", "left.jpg", b"L" * 5000), ("images", "right.jpg", b"R")])
+        fields, files = receive_multipart(io.BytesIO(body), BOUNDARY.encode(), store, 10_000, 100_000, 5, chunk_size=512)
+        assert fields == {"imageType": "OCT"}
+        assert [f.filename for f in files] == ["left.jpg", "right.jpg"]
+        assert files[0].blob.checksum == hashlib.sha256(b"L" * 5000).hexdigest()
+        assert store.read(files[1].blob.url) == b"R"
+
+    def test_oversized_file_is_cut_off_early(self, tmp_path):
+        store = ImageStore(str(tmp_path), fsync=False)
+        stream = _ChunkedStream(_multipart({}, [("images", "big.jpg", b"x" * 1_000_000)]))
+        with pytest.raises(UploadError) as exc:
+            receive_multipart(stream, BOUNDARY.encode(), store, 10_000, 10_000_000, 5, chunk_size=1024)
+        assert exc.value.status == 413
+        assert stream.read_bytes < 20_000
+        assert list(store.iter_checksums()) == []
+        assert os.listdir(store.tmp_dir) == []
+
+    def test_truncated_body(self, tmp_path):
+        store = ImageStore(str(tmp_path), fsync=False)
+        body = _multipart({}, [("images", "a.jpg", b"data")])[:-40]
+        with pytest.raises(UploadError) as exc:
+            receive_multipart(io.BytesIO(body), BOUNDARY.encode(), store, 10_000, 100_000, 5)
+        assert exc.value.status == 400
+        assert os.listdir(store.tmp_dir) == []
+
+
+class TestUploadRoutes:
+    """Test /api/images end to end"""
+
+    @pytest.fixture(autouse=True)
+    def _app(self, tmp_path):
+        self.app = create_app()
+        self.app.config["IMAGE_STORE_ROOT"] = str(tmp_path / "images")
+        self.app.config["IMAGE_UPLOAD_MAX_FILE_MB"] = 0.01
+        self.app.config["IMAGE_UPLOAD_RESUMABLE_MAX_MB"] = 1
+        init_image_store(self.app)
+        self.uploads = init_image_uploads(self.app)
+        self.client = self.app.test_client()
+        self.headers = {"Authorization": f"Bearer {self._token()}"}
+
+    def _token(self):
+        resp = self.client.post('/api/auth/register', json={
+            "email": f"upload-{uuid.uuid4().hex[:8]}@example.com",
+            "password": "Password123",
+            "fullName": "Upload User"
+        })
+        assert resp.status_code == 201
+        return resp.get_json()['data']['accessToken']
+
+    def _upload(self, fields, files, headers=None):
+        return self.client.post(
+            '/api/images',
+            data=_multipart(fields, files),
+            content_type=f"multipart/form-data; boundary={BOUNDARY}",
+            headers=self.headers if headers is None else headers,
+        )
+
+    def test_upload_creates_request_and_images(self):
+        resp = self._upload({"imageType": "fundus"}, [("images", "l.jpg", b"left"), ("images", "r.jpg", b"right")])
+        assert resp.status_code == 201
+        data = resp.get_json()['data']
+        assert data['status'] == "queued"
+        assert [image['duplicate'] for image in data['images']] == [False, False]
+
+        with self.app.app_context():
+            session = get_db_session()
+            request = session.get(AnalysisRequestModel, data['requestId'])
+            assert request.status == "queued"
+            images = session.query(RetinalImageModel).filter_by(request_id=data['requestId']).all()
+            assert [image.checksum for image in images] == [hashlib.sha256(b"left").hexdigest(),
+                                                            hashlib.sha256(b"right").hexdigest()]
+            assert all(image.image_type == "FUNDUS" and image.storage_url.startswith("cas://") for image in images)
+
+    def test_duplicate_upload_shares_blob(self):
+        first = self._upload({}, [("images", "a.jpg", b"same image")]).get_json()['data']
+        second = self._upload({}, [("images", "b.jpg", b"same image")]).get_json()['data']
+        assert second['images'][0]['duplicate'] is True
+        assert second['images'][0]['checksum'] == first['images'][0]['checksum']
+        assert second['requestId'] != first['requestId']
+        assert len(list(self.uploads.store.iter_checksums())) == 1
+
+    def test_content_type_warning(self, caplog):
+        def warned(path, content_type, data):
+            caplog.clear()
+            with caplog.at_level("WARNING", logger="api.middleware"):
+                self.client.post(path, data=data, content_type=content_type)
+            return any("Invalid Content-Type" in r.getMessage() for r in caplog.records)
+
+        login = b'{"email": "nobody@example.com", "password": "x"}'
+        for json_type in ("application/json", "application/json-patch+json", "application/merge-patch+json"):
+            assert not warned('/api/auth/login', json_type, login)
+        # Content-Type upload chỉ hợp lệ dưới /api/images
+        assert not warned('/api/images', f"multipart/form-data; boundary={BOUNDARY}", _multipart({}, []))
+        assert warned('/api/auth/login', f"multipart/form-data; boundary={BOUNDARY}", _multipart({}, []))
+        assert warned('/api/auth/login', "application/offset+octet-stream", b"x")
+
+    def test_rejections(self):
+        with self.app.app_context():
+            images_before = get_db_session().query(RetinalImageModel).count()
+        assert self._upload({}, [("images", "a.jpg", b"x")], headers={}).status_code == 401
+        resp = self.client.post('/api/images', json={"imageType": "FUNDUS"}, headers=self.headers)
+        assert resp.status_code == 415
+        assert self._upload({}, []).status_code == 400
+        assert self._upload({"imageType": "XRAY"}, [("images", "a.jpg", b"x")]).status_code == 400
+        assert self._upload({}, [("images", "big.jpg", b"x" * 20_000)]).status_code == 413
+
+        # Content-Length vượt giới hạn: từ chối trước khi đọc body
+        self.uploads.max_request_size = 100
+        assert self._upload({}, [("images", "a.jpg", b"x" * 200)]).status_code == 413
+        with self.app.app_context():
+            assert get_db_session().query(RetinalImageModel).count() == images_before
+
+    def test_busy_gate_returns_503(self):
+        gate = self.uploads.gate
+        for _ in range(gate.max_concurrent):
+            gate._semaphore.acquire()
+        try:
+            resp = self._upload({}, [("images", "a.jpg", b"x")])
+        finally:
+            for _ in range(gate.max_concurrent):
+                gate._semaphore.release()
+        assert resp.status_code == 503
+        assert resp.headers['Retry-After'] == "1"
+        assert gate.rejected == 1
+        assert self._upload({}, [("images", "a.jpg", b"x")]).status_code == 201
+
+    def _patch(self, upload_id, offset, data, headers=None):
+        return self.client.patch(
+            f'/api/images/uploads/{upload_id}',
+            data=data,
+            content_type="application/offset+octet-stream",
+            headers=dict(headers or self.headers, **{"Upload-Offset": str(offset)}),
+        )
+
+    def test_resumable_upload(self):
+        volume = os.urandom(300_000)
+        resp = self.client.post('/api/images/uploads', json={
+            "size": len(volume), "checksum": hashlib.sha256(volume).hexdigest()
+        }, headers=self.headers)
+        assert resp.status_code == 201
+        upload_id = resp.get_json()['data']['uploadId']
+
+        assert self._patch(upload_id, 0, volume[:100_000]).headers['Upload-Offset'] == "100000"
+        # Offset sai (client gửi lại phần đã nhận): 409, không ghi
+        assert self._patch(upload_id, 0, volume[:100_000]).status_code == 409
+        status = self.client.get(f'/api/images/uploads/{upload_id}', headers=self.headers)
+        assert status.get_json()['data']['offset'] == 100_000
+
+        incomplete = self.client.post(f'/api/images/uploads/{upload_id}/complete', json={"imageType": "OCT"},
+                                      headers=self.headers)
+        assert incomplete.status_code == 409
+
+        assert self._patch(upload_id, 100_000, volume[100_000:]).get_json()['data']['offset'] == len(volume)
+        resp = self.client.post(f'/api/images/uploads/{upload_id}/complete', json={
+            "imageType": "OCT", "filename": "volume.dcm"
+        }, headers=self.headers)
+        assert resp.status_code == 201
+        data = resp.get_json()['data']
+        assert data['images'][0]['checksum'] == hashlib.sha256(volume).hexdigest()
+        assert self.uploads.store.read(f"cas://sha256/{data['images'][0]['checksum']}") == volume
+        assert self.client.get(f'/api/images/uploads/{upload_id}', headers=self.headers).status_code == 404
+
+    def test_resumable_upload_limits_and_owner(self):
+        resp = self.client.post('/api/images/uploads', json={"size": 10, "checksum": "0" * 64}, headers=self.headers)
+        upload_id = resp.get_json()['data']['uploadId']
+
+        other = {"Authorization": f"Bearer {self._token()}"}
+        assert self._patch(upload_id, 0, b"0123456789", headers=other).status_code == 404
+        assert self._patch(upload_id, 0, b"0123456789ABC").status_code == 413
+        assert self._patch(upload_id, 0, b"0123456789").status_code == 200
+        # Checksum khai báo không khớp: upload bị huỷ
+        assert self.client.post(f'/api/images/uploads/{upload_id}/complete', json={},
+                                headers=self.headers).status_code == 400
+        assert list(self.uploads.store.iter_checksums()) == []
+
+        too_big = self.client.post('/api/images/uploads', json={"size": 2 * 1024 * 1024}, headers=self.headers)
+        assert too_big.status_code == 413
+        assert self.client.post('/api/images/uploads', json={"size": "10"}, headers=self.headers).status_code == 400
+
+        upload_id = self.client.post('/api/images/uploads', json={"size": 5},
+                                     headers=self.headers).get_json()['data']['uploadId']
+        assert self.client.delete(f'/api/images/uploads/{upload_id}', headers=self.headers).status_code == 200
+        assert self._patch(upload_id, 0, b"abcde").status_code == 404
@@ -0,0 +1,211 @@
+"""
+Inference Pipeline - Integration Tests
+Tests for micro-batching, the stub backend and analysis_results written through the job queue
+"""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from config import Config
+from infrastructure.databases.base import Base
+from infrastructure.databases.mssql import create_engines, create_session_factory
+from infrastructure.databases.schema import import_all_models
+from infrastructure.models.ai_threshold_profile_model import AIThresholdProfileModel
+from infrastructure.models.analysis_request_model import AnalysisRequestModel
+from infrastructure.models.analysis_result_model import AnalysisResultModel
+from infrastructure.models.retinal_image_model import RetinalImageModel
+from infrastructure.repositories.analysis_request_repository import AnalysisRequestRepository
+from services import analysis_queue, inference
+from services.analysis_queue import AnalysisWorker
+from services.inference import InferencePipeline, MicroBatcher, StubBackend
+
+
+def _factory(tmp_path):
+    writer, readers = create_engines(f"sqlite:///{tmp_path / 'inference.db'}")
+    import_all_models()
+    Base.metadata.create_all(bind=writer)
+    return create_session_factory(writer, readers)
+
+
+def _request(factory, tmp_path, images, profile_id=None):
+    """Queue one analysis request with the given image contents (None = missing file)"""
+    session = factory()
+    try:
+        request_id = AnalysisRequestRepository(session).enqueue(profile_id=profile_id, commit=False)
+        for i, content in enumerate(images):
+            path = tmp_path / f"req{request_id}-{i}.jpg"
+            if content is not None:
+                path.write_bytes(content)
+            session.add(RetinalImageModel(image_type="FUNDUS", storage_url=str(path), request_id=request_id))
+        session.commit()
+        return request_id
+    finally:
+        session.close()
+
+
+class TestMicroBatcher:
+    """Test batch formation"""
+
+    def test_full_batches_and_partial_flush(self):
+        sizes = []
+
+        def predict(items):
+            sizes.append(len(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=200)
+        # Đưa đủ 10 item vào queue trước khi thread batch chạy
+        futures = [batcher.submit(i) for i in range(10)]
+        batcher.start()
+        try:
+            assert [f.result(timeout=5) for f in futures] == [i * 2 for i in range(10)]
+        finally:
+            batcher.stop()
+        assert sizes == [4, 4, 2]
+        assert batcher.stats()["mean_batch_size"] == 3.33
+
+    def test_max_wait_bounds_latency(self):
+        batcher = MicroBatcher(lambda items: items, max_batch_size=64, max_wait_ms=20)
+        batcher.start()
+        try:
+            start = time.monotonic()
+            assert batcher.submit("x").result(timeout=5) == "x"
+            assert time.monotonic() - start < 1
+        finally:
+            batcher.stop()
+
+    def test_backend_error_reaches_every_future(self):
+        def predict(items):
+            raise RuntimeError("backend down")
+
+        batcher = MicroBatcher(predict, max_batch_size=2, max_wait_ms=5)
+        batcher.start()
+        try:
+            futures = [batcher.submit(i) for i in range(2)]
+            for future in futures:
+                assert isinstance(future.exception(timeout=5), RuntimeError)
+        finally:
+            batcher.stop()
+
+    def test_concurrent_producers_share_batches(self):
+        sizes = []
+        lock = threading.Lock()
+
+        def predict(items):
+            with lock:
+                sizes.append(len(items))
+            return items
+
+        batcher = MicroBatcher(predict, max_batch_size=8, max_wait_ms=50)
+        batcher.start()
+        try:
+            results = []
+
+            def produce(offset):
+                futures = [batcher.submit(offset + i) for i in range(8)]
+                results.extend(f.result(timeout=5) for f in futures)
+
+            threads = [threading.Thread(target=produce, args=(n * 100,)) for n in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            batcher.stop()
+        assert len(results) == 32
+        assert sum(sizes) == 32
+        assert len(sizes) < 32
+
+
+class TestInferencePipeline:
+    """Test results written by the pipeline through AnalysisWorker"""
+
+    def test_stub_is_deterministic(self):
+        backend = StubBackend()
+        first, second = backend.predict([b"image-a", b"image-a"])
+        assert first == second
+        assert set(first) == set(backend.labels)
+        assert all(0 <= score <= 1 for score in first.values())
+        assert backend.predict([b"image-b"])[0] != first
+
+    def test_classify_uses_profile_thresholds(self):
+        pipeline = InferencePipeline(StubBackend(labels=("a", "b")))
+        try:
+            assert pipeline.classify({"a": 0.3, "b": 0.2}) == {"labels": [], "risk_level": "low"}
+            assert pipeline.classify({"a": 0.6, "b": 0.2}) == {"labels": ["a"], "risk_level": "medium"}
+            assert pipeline.classify({"a": 0.3, "b": 0.2}, {"a": 0.25})["labels"] == ["a"]
+            assert pipeline.classify({"a": 0.85, "b": 0.2})["risk_level"] == "high"
+            assert pipeline.classify({"a": 0.85, "b": 0.2}, {"high_risk": 0.9})["risk_level"] == "medium"
+        finally:
+            pipeline.close()
+
+    def test_jobs_write_results_in_bulk(self, tmp_path):
+        factory = _factory(tmp_path)
+        session = factory()
+        profile = AIThresholdProfileModel(name="strict", thresholds_json=json.dumps({"high_risk": 0.99}))
+        session.add(profile)
+        session.commit()
+        profile_id = profile.id
+        session.close()
+
+        ok_id = _request(factory, tmp_path, [b"fundus-left", b"fundus-right"], profile_id=profile_id)
+        other_id = _request(factory, tmp_path, [b"fundus-3"])
+        missing_id = _request(factory, tmp_path, [None])
+
+        backend = StubBackend()
+        pipeline = InferencePipeline(backend, MicroBatcher(backend.predict, max_batch_size=8, max_wait_ms=5))
+        try:
+            result = AnalysisWorker(factory, pipeline.handle_batch).process_once()
+        finally:
+            pipeline.close()
+        assert result["done"] == 2
+        assert result["failed"] == 1
+
+        session = factory()
+        try:
+            rows = {r.request_id: r for r in session.query(AnalysisResultModel).all()}
+            assert set(rows) == {ok_id, other_id}
+            payload = json.loads(rows[ok_id].predicted_labels_json)
+            assert payload["images"] == 2
+            assert payload["model_version"] == "stub-1"
+            expected = {
+                label: round(max(s[label] for s in backend.predict([b"fundus-left", b"fundus-right"])), 4)
+                for label in backend.labels
+            }
+            assert payload["scores"] == expected
+            assert rows[ok_id].risk_level in ("low", "medium")
+
+            request = session.get(AnalysisRequestModel, ok_id)
+            assert request.status == "done"
+            assert request.model_version == "stub-1"
+            images = session.query(RetinalImageModel).filter_by(request_id=ok_id).all()
+            assert all(image.checked_at is not None for image in images)
+
+            missing = session.get(AnalysisRequestModel, missing_id)
+            assert missing.status == "failed"
+            assert "Image not found" in missing.last_error
+        finally:
+            session.close()
+
+
+class TestWorkerStartup:
+    """Test that a misconfigured model stops the worker before it claims jobs"""
+
+    def test_missing_model_exits_without_claiming(self, monkeypatch):
+        monkeypatch.setattr(Config, "INFERENCE_BACKEND", "onnx")
+        monkeypatch.setattr(Config, "INFERENCE_MODEL_PATH", "")
+        monkeypatch.setattr(inference, "_pipeline", None)
+        claimed = []
+        monkeypatch.setattr(analysis_queue, "worker_from_config", lambda handler: claimed.append(handler))
+
+        with pytest.raises(SystemExit) as exc:
+            analysis_queue._run_worker_process("services.inference:handle_batch", once=True)
+        assert exc.value.code == 1
+        assert claimed == []
+        assert inference._pipeline is None
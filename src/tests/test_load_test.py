@@ -0,0 +1,69 @@
+"""
+Load Test Harness - Unit Tests
+Tests for the benchmark harness: a tiny run against the test app and baseline comparison
+"""
+
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from benchmarks.load_test import (
+    SCENARIOS, compare, parse_db_queries, percentile, run_load, serve_app, verification_token_lookup,
+)
+from create_app import create_app
+
+
+def _scenario(p95=10.0, rps=100.0, queries=2.0, errors=0):
+    return {"count": 10, "errors": errors, "rps": rps, "mean_ms": p95 / 2, "p50_ms": p95 / 2,
+            "p95_ms": p95, "p99_ms": p95, "db_queries": queries}
+
+
+def _report(**scenario):
+    return {"targets": {"sqlite-file": {"scenarios": {"login": _scenario(**scenario)}}}}
+
+
+class TestLoadTestHarness:
+    """Test the load test against a live test server"""
+
+    def test_small_run_covers_every_scenario(self):
+        app = create_app()
+        with serve_app(app) as base_url:
+            # concurrency 1: DB in-memory dùng chung một connection
+            report = run_load(base_url, concurrency=1, users=2, me_calls=2,
+                              token_lookup=verification_token_lookup)
+        scenarios = report["scenarios"]
+        assert set(scenarios) == set(SCENARIOS)
+        assert report["total"]["errors"] == 0
+        assert scenarios["me"]["count"] == 4
+        assert scenarios["me"]["db_queries"] == 1
+        assert scenarios["static"]["db_queries"] == 0
+        assert report["total"]["rps"] > 0
+
+
+class TestBaselineComparison:
+    """Test percentile and regression checks"""
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        assert percentile(values, 0.50) == 50
+        assert percentile(values, 0.99) == 99
+        assert percentile([], 0.95) == 0.0
+
+    def test_parse_db_queries(self):
+        assert parse_db_queries('db;dur=1.50;desc="3 queries", bcrypt;dur=2.00, total;dur=9.00') == 3
+        assert parse_db_queries(None) is None
+
+    def test_within_tolerance_passes(self):
+        assert compare(_report(p95=11.0, rps=90.0), _report(), tolerance=0.2) == []
+
+    def test_latency_and_throughput_regressions(self):
+        regressions = compare(_report(p95=15.0, rps=70.0), _report(), tolerance=0.2)
+        assert len(regressions) == 2
+        assert regressions[0].startswith("sqlite-file/login: p95")
+
+    def test_extra_queries_and_errors_regress(self):
+        regressions = compare(_report(queries=3.0, errors=1), _report(), tolerance=0.2)
+        assert len(regressions) == 2
+
+    def test_missing_target_is_ignored(self):
+        assert compare(_report(p95=100.0), {"targets": {}}) == []
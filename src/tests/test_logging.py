@@ -0,0 +1,92 @@
+"""
+Logging Pipeline - Unit Tests
+Tests for JSON records, the queue listener, request log fields and sampling
+"""
+
+import json
+import logging
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from app_logging import JsonFormatter, RequestLogSampler, setup_logging, shutdown_logging
+from create_app import create_app
+
+
+class TestJsonLogging:
+    """Test JsonFormatter and the QueueHandler pipeline"""
+
+    def test_json_record_includes_extra_fields(self):
+        record = logging.LogRecord("aura.request", logging.INFO, __file__, 1, "GET %s", ("/api/health",), None)
+        record.request_id = "abc"
+        record.status = 200
+        payload = json.loads(JsonFormatter().format(record))
+        assert payload["message"] == "GET /api/health"
+        assert payload["request_id"] == "abc"
+        assert payload["status"] == 200
+        assert payload["level"] == "INFO"
+
+    def test_queue_listener_writes_json_file(self, tmp_path):
+        log_file = tmp_path / "app.log"
+        setup_logging(log_file=str(log_file), json_format=True)
+        try:
+            logger = logging.getLogger("aura.test")
+            logger.info("hello %s", "world", extra={"route": "/x"})
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("failed")
+        finally:
+            shutdown_logging()  # dừng listener: flush hàng đợi
+
+        lines = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+        ours = [line for line in lines if line["logger"] == "aura.test"]
+        assert ours[0]["message"] == "hello world"
+        assert ours[0]["route"] == "/x"
+        assert "ValueError: boom" in ours[1]["exc"]
+
+
+class TestRequestLogSampler:
+    """Test per-route sampling rates"""
+
+    def test_rates_by_endpoint_then_blueprint(self):
+        sampler = RequestLogSampler(0.5, RequestLogSampler.parse_rates("health=0,auth.login=1"))
+        assert sampler.rate_for("auth.login") == 1
+        assert sampler.rate_for("health.health_check") == 0
+        assert sampler.rate_for("auth.register") == 0.5
+        assert sampler.rate_for(None) == 0.5
+
+    def test_errors_and_slow_requests_always_logged(self):
+        sampler = RequestLogSampler(0.0, slow_ms=500)
+        assert not sampler.should_log("auth.login", 200, 10)
+        assert sampler.should_log("auth.login", 503, 10)
+        assert sampler.should_log("auth.login", 200, 800)
+
+
+class TestRequestLogging:
+    """Test the request log record written by the middleware"""
+
+    def test_request_record_fields(self, caplog):
+        app = create_app()
+        client = app.test_client()
+        with caplog.at_level(logging.INFO, logger="aura.request"):
+            resp = client.get('/api/auth/me', headers={"X-Request-ID": "req-123"})
+        assert resp.headers["X-Request-ID"] == "req-123"
+        records = [r for r in caplog.records if r.name == "aura.request"]
+        assert len(records) == 1
+        record = records[0]
+        assert record.request_id == "req-123"
+        assert record.endpoint == "auth.get_current_user"
+        assert record.route == "/api/auth/me"
+        assert record.status == resp.status_code
+        assert record.latency_ms >= 0
+        assert record.db_queries >= 0
+
+    def test_sampled_out_route_not_logged(self, caplog):
+        app = create_app()
+        app.extensions["request_log_sampler"] = RequestLogSampler(1.0, {"auth": 0.0})
+        client = app.test_client()
+        with caplog.at_level(logging.INFO, logger="aura.request"):
+            resp = client.get('/api/auth/me')
+        assert resp.headers["X-Request-ID"]
+        assert not [r for r in caplog.records if r.name == "aura.request"]
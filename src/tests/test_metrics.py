@@ -0,0 +1,112 @@
+"""
+Metrics - Unit Tests
+Tests for the Prometheus text output, per-thread shards and multiprocess aggregation
+"""
+
+import os
+import threading
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from create_app import create_app
+from services.metrics import MetricsRegistry, MultiprocessStore, render, _pool_gauges
+from infrastructure.databases.mssql import create_engines
+
+DEAD_PID = 2 ** 22 + 12345  # vượt pid_max mặc định: không process nào có pid này
+
+
+def _lines(text):
+    return [line for line in text.splitlines() if not line.startswith("#")]
+
+
+class TestMetricsRegistry:
+    """Test recording and rendering in one process"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.5, 5):
+            registry.observe_request("auth", "auth.login", "POST", 200, seconds)
+        text = render(registry.collect(), registry.buckets)
+        labels = 'blueprint="auth",endpoint="auth.login"'
+        assert f'aura_http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1' in text
+        assert f'aura_http_request_duration_seconds_bucket{{{labels},le="1.0"}} 2' in text
+        assert f'aura_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+        assert f'aura_http_request_duration_seconds_count{{{labels}}} 3' in text
+        assert '# TYPE aura_http_request_duration_seconds histogram' in text
+
+    def test_threads_write_separate_shards(self):
+        registry = MetricsRegistry()
+
+        def work():
+            for _ in range(1000):
+                registry.inc("aura_http_requests_total", (("endpoint", "x"),))
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert registry.collect()["counters"][("aura_http_requests_total", (("endpoint", "x"),))] == 4000
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.inc("aura_http_requests_total", (("endpoint", 'a"b\\c'),))
+        assert 'endpoint="a\\"b\\\\c"' in render(registry.collect())
+
+    def test_pool_gauges(self, tmp_path):
+        writer, _ = create_engines(f"sqlite:///{tmp_path / 'pool.db'}")
+        with writer.connect():
+            samples = {name: value for name, _, value in _pool_gauges({"writer": writer})()}
+            assert samples["aura_db_pool_checked_out"] == 1
+            assert samples["aura_db_pool_size"] == 1
+
+
+class TestMultiprocessStore:
+    """Test aggregation across gunicorn workers"""
+
+    def test_counters_summed_and_dead_worker_gauges_dropped(self, tmp_path):
+        store = MultiprocessStore(str(tmp_path))
+        for pid in (os.getpid(), DEAD_PID):
+            registry = MetricsRegistry()
+            registry.observe_request("health", "health.health_check", "GET", 200, 0.01)
+            registry.register_gauge(lambda: [("aura_password_hash_in_flight", (), 1)])
+            store.write(registry.collect(), pid=pid)
+
+        text = render(store.read_all())
+        assert 'aura_http_requests_total{blueprint="health",endpoint="health.health_check",method="GET",status="200"} 2' in text
+        gauges = [line for line in _lines(text) if line.startswith("aura_password_hash_in_flight")]
+        assert gauges == [f'aura_password_hash_in_flight{{pid="{os.getpid()}"}} 1']
+
+    def test_callback_counters_of_dead_worker_kept(self, tmp_path):
+        store = MultiprocessStore(str(tmp_path))
+        for pid, hits in ((os.getpid(), 3), (DEAD_PID, 5)):
+            registry = MetricsRegistry()
+            registry.register_counter(lambda hits=hits: [("aura_jwt_cache_hits_total", (), hits)])
+            store.write(registry.collect(), pid=pid)
+
+        text = render(store.read_all())
+        assert "# TYPE aura_jwt_cache_hits_total counter" in text
+        assert "aura_jwt_cache_hits_total 8" in _lines(text)
+
+
+class TestMetricsEndpoint:
+    """Test GET /metrics"""
+
+    def test_metrics_endpoint(self):
+        app = create_app()
+        client = app.test_client()
+        client.get('/api/health')
+        resp = client.get('/metrics')
+        assert resp.status_code == 200
+        assert resp.mimetype == "text/plain"
+        text = resp.get_data(as_text=True)
+        assert 'endpoint="health.health_check"' in text
+        assert 'aura_email_outbox_messages{status="pending"}' in text
+        assert "aura_jwt_cache_hit_ratio" in text
+
+    def test_metrics_token(self):
+        app = create_app()
+        app.config["METRICS_TOKEN"] = "secret"
+        client = app.test_client()
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={"Authorization": "Bearer secret"}).status_code == 200
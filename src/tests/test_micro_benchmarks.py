@@ -0,0 +1,41 @@
+"""
+Micro-benchmarks - Unit Tests
+Tests for the timing helper and a tiny run of the repository/serialization suite
+"""
+
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from benchmarks.micro import Benchmark, measure, run_suite
+
+
+class TestMeasure:
+    """Test the timing helper"""
+
+    def test_counts_timed_calls_only(self):
+        calls = []
+        resets = []
+        summary = measure(Benchmark("noop", calls.append, lambda: resets.append(1)), iterations=5, warmup=3)
+        assert calls == list(range(8))
+        assert len(resets) == 8
+        assert summary["count"] == 5
+        assert summary["db_queries"] is None
+        assert summary["rps"] > 0
+
+
+class TestMicroSuite:
+    """Test a small seeded run"""
+
+    def test_small_suite(self):
+        result = run_suite(200, iterations=5, warmup=2)
+        scenarios = result["scenarios"]
+        assert scenarios["repo.find_by_email"]["db_queries"] == 1
+        assert scenarios["repo.find_by_id"]["db_queries"] == 1
+        assert scenarios["token.verify_token"]["count"] == 5
+        assert scenarios["jwt.decode"]["db_queries"] == 0
+        assert all(s["errors"] == 0 for s in scenarios.values())
+
+    def test_only_filters_by_prefix(self):
+        result = run_suite(50, iterations=2, warmup=1, only=["jwt."])
+        assert set(result["scenarios"]) == {"jwt.encode", "jwt.decode"}
@@ -0,0 +1,68 @@
+"""
+Password Hashing Executor - Unit Tests
+Tests for the bounded bcrypt pool and the 503 admission control
+"""
+
+import os
+import time
+
+import pytest
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from create_app import create_app
+from services.password_hasher import PasswordHasher, PasswordHasherBusy, password_hasher
+
+
+class TestPasswordHasher:
+    """Test hashing through the executor"""
+
+    def test_inline_hash_and_verify(self):
+        hasher = PasswordHasher()
+        hasher.configure(max_workers=0)
+        hashed = hasher.hash_password("Password123")
+        assert hasher.verify_password("Password123", hashed) is True
+        assert hasher.verify_password("WrongPassword1", hashed) is False
+
+    def test_pool_hash_and_verify(self):
+        hasher = PasswordHasher()
+        hasher.configure(max_workers=1, queue_size=2)
+        try:
+            hashed = hasher.hash_password("Password123")
+            assert hasher.verify_password("Password123", hashed) is True
+            # _release là done-callback của Future, có thể chạy sau khi result() đã trả về
+            deadline = time.monotonic() + 2
+            while hasher.in_flight and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert hasher.in_flight == 0
+        finally:
+            hasher.shutdown()
+
+    def test_rejects_when_queue_full(self):
+        hasher = PasswordHasher()
+        hasher.configure(max_workers=1, queue_size=0, retry_after=7)
+        hasher._in_flight = hasher.capacity
+        with pytest.raises(PasswordHasherBusy) as exc_info:
+            hasher.hash_password("Password123")
+        assert exc_info.value.retry_after == 7
+
+
+class TestPasswordHasherBusyResponse:
+    """Test that auth endpoints shed load with 503 + Retry-After"""
+
+    def test_register_returns_503_when_busy(self, monkeypatch):
+        app = create_app()
+        client = app.test_client()
+
+        def busy(*args):
+            raise PasswordHasherBusy(3)
+
+        monkeypatch.setattr(password_hasher, "hash_password", busy)
+        resp = client.post('/api/auth/register', json={
+            "email": "busy@example.com",
+            "password": "Password123",
+            "fullName": "Busy User"
+        })
+        assert resp.status_code == 503
+        assert resp.headers.get('Retry-After') == '3'
+        assert resp.get_json()['success'] is False
@@ -0,0 +1,91 @@
+"""
+Password Hash Policy - Unit Tests
+Tests for bcrypt cost calibration and rehash detection
+"""
+
+import json
+import os
+import time
+
+import bcrypt
+
+from domain.security.password import get_hash_rounds
+from services.password_policy import PasswordHashPolicy
+
+
+class TestHashRounds:
+    """Test reading the cost factor from a stored hash"""
+
+    def test_reads_cost(self):
+        hashed = bcrypt.hashpw(b"Password123", bcrypt.gensalt(rounds=5)).decode('utf-8')
+        assert get_hash_rounds(hashed) == 5
+
+    def test_invalid_hash(self):
+        assert get_hash_rounds("not-a-hash") is None
+        assert get_hash_rounds(None) is None
+
+
+class TestPasswordHashPolicy:
+    """Test cost selection and rehash decisions"""
+
+    def test_fixed_rounds(self):
+        policy = PasswordHashPolicy()
+        assert policy.configure(rounds=6) == 6
+        assert policy.calibrated is False
+
+    def test_needs_rehash(self):
+        policy = PasswordHashPolicy()
+        policy.configure(rounds=5)
+        assert policy.needs_rehash("$2b$04$" + "a" * 53) is True
+        assert policy.needs_rehash("$2b$05$" + "a" * 53) is False
+
+    def test_calibrate_picks_highest_cost_within_budget(self, monkeypatch):
+        policy = PasswordHashPolicy()
+        policy.target_ms = 250
+        policy.min_rounds = 10
+        policy.max_rounds = 15
+        # cost 8 = 1ms -> 12 = 16ms, 15 = 128ms
+        monkeypatch.setattr(PasswordHashPolicy, "measure_ms", staticmethod(lambda rounds: 1.0))
+        assert policy.calibrate() == 15
+        # cost 8 = 20ms -> 11 = 160ms, 12 = 320ms
+        monkeypatch.setattr(PasswordHashPolicy, "measure_ms", staticmethod(lambda rounds: 20.0))
+        assert policy.calibrate() == 11
+
+    def test_calibrate_keeps_security_floor(self, monkeypatch):
+        policy = PasswordHashPolicy()
+        policy.min_rounds = 12
+        monkeypatch.setattr(PasswordHashPolicy, "measure_ms", staticmethod(lambda rounds: 500.0))
+        assert policy.calibrate() == 12
+
+    def test_calibration_is_shared_through_file(self, monkeypatch, tmp_path):
+        calibration_file = str(tmp_path / "calibration.json")
+        monkeypatch.setattr(PasswordHashPolicy, "measure_ms", staticmethod(lambda rounds: 1.0))
+        first = PasswordHashPolicy()
+        assert first.configure(min_rounds=10, max_rounds=13, calibration_file=calibration_file) == 13
+
+        # A second worker reuses the saved result instead of benchmarking again
+        monkeypatch.setattr(PasswordHashPolicy, "measure_ms", staticmethod(lambda rounds: 1000.0))
+        second = PasswordHashPolicy()
+        assert second.configure(min_rounds=10, max_rounds=13, calibration_file=calibration_file) == 13
+
+    def test_calibration_outside_bounds_is_recomputed(self, monkeypatch, tmp_path):
+        calibration_file = tmp_path / "calibration.json"
+        settings = {"target_ms": 250, "min_rounds": 12, "max_rounds": 14}
+        calibration_file.write_text(json.dumps({"rounds": 4, "settings": settings, "created_at": time.time()}))
+        monkeypatch.setattr(PasswordHashPolicy, "measure_ms", staticmethod(lambda rounds: 1.0))
+
+        policy = PasswordHashPolicy()
+        assert policy.configure(target_ms=250, min_rounds=12, max_rounds=14,
+                                calibration_file=str(calibration_file)) == 14
+        assert json.loads(calibration_file.read_text())["rounds"] == 14
+
+    def test_calibration_of_other_user_is_ignored(self, monkeypatch, tmp_path):
+        calibration_file = tmp_path / "calibration.json"
+        settings = {"target_ms": 250, "min_rounds": 12, "max_rounds": 14}
+        calibration_file.write_text(json.dumps({"rounds": 12, "settings": settings, "created_at": time.time()}))
+        monkeypatch.setattr(PasswordHashPolicy, "measure_ms", staticmethod(lambda rounds: 1.0))
+        monkeypatch.setattr(os, "getuid", lambda: os.stat(calibration_file).st_uid + 1, raising=False)
+
+        policy = PasswordHashPolicy()
+        assert policy.configure(target_ms=250, min_rounds=12, max_rounds=14,
+                                calibration_file=str(calibration_file)) == 14
@@ -0,0 +1,111 @@
+"""
+Refresh Token Store - Integration Tests
+Tests for rotation, reuse detection and logout revocation
+"""
+
+import os
+import uuid
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from create_app import create_app
+from infrastructure.databases.mssql import get_db_session
+from infrastructure.models.user_model import UserModel
+from infrastructure.repositories.refresh_token_repository import RefreshTokenRepository
+
+
+def _register(client):
+    resp = client.post('/api/auth/register', json={
+        "email": f"refresh-{uuid.uuid4().hex[:8]}@example.com",
+        "password": "Password123",
+        "fullName": "Refresh User"
+    })
+    assert resp.status_code == 201
+    return resp.get_json()['data']
+
+
+class TestRefreshTokenRotation:
+    """Test /api/auth/refresh and /api/auth/logout with the server-side store"""
+
+    def setup_method(self):
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+    def test_refresh_rotates_token(self):
+        tokens = _register(self.client)
+        resp = self.client.post('/api/auth/refresh', json={"refreshToken": tokens['refreshToken']})
+        assert resp.status_code == 200
+        data = resp.get_json()['data']
+        assert data['accessToken']
+        assert data['refreshToken'] != tokens['refreshToken']
+
+        # The rotated token keeps working
+        resp = self.client.post('/api/auth/refresh', json={"refreshToken": data['refreshToken']})
+        assert resp.status_code == 200
+
+    def test_reuse_revokes_family(self):
+        tokens = _register(self.client)
+        first = self.client.post('/api/auth/refresh', json={"refreshToken": tokens['refreshToken']})
+        rotated = first.get_json()['data']['refreshToken']
+
+        reused = self.client.post('/api/auth/refresh', json={"refreshToken": tokens['refreshToken']})
+        assert reused.status_code == 401
+
+        # The whole family is revoked, including the token issued by the legitimate rotation
+        resp = self.client.post('/api/auth/refresh', json={"refreshToken": rotated})
+        assert resp.status_code == 401
+
+    def test_failed_rotation_keeps_old_token(self, monkeypatch):
+        tokens = _register(self.client)
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("insert failed")
+
+        monkeypatch.setattr(RefreshTokenRepository, "create", fail)
+        resp = self.client.post('/api/auth/refresh', json={"refreshToken": tokens['refreshToken']})
+        assert resp.status_code == 500
+
+        # consume đã bị rollback cùng với insert: token cũ vẫn dùng được
+        monkeypatch.undo()
+        resp = self.client.post('/api/auth/refresh', json={"refreshToken": tokens['refreshToken']})
+        assert resp.status_code == 200
+
+    def test_password_change_and_reset_revoke_refresh_tokens(self):
+        tokens = _register(self.client)
+        headers = {"Authorization": f"Bearer {tokens['accessToken']}"}
+        resp = self.client.post('/api/auth/change-password', headers=headers, json={
+            "currentPassword": "Password123", "newPassword": "Password456", "confirmPassword": "Password456"
+        })
+        assert resp.status_code == 200
+        resp = self.client.post('/api/auth/refresh', json={"refreshToken": tokens['refreshToken']})
+        assert resp.status_code == 401
+
+        tokens = _register(self.client)
+        resp = self.client.post('/api/auth/reset-password', json={
+            "email": tokens['user']['email'], "newPassword": "Password789", "confirmPassword": "Password789"
+        })
+        assert resp.status_code == 200
+        resp = self.client.post('/api/auth/refresh', json={"refreshToken": tokens['refreshToken']})
+        assert resp.status_code == 401
+
+    def test_refresh_rejects_inactive_user(self):
+        tokens = _register(self.client)
+        with self.app.app_context():
+            session = get_db_session()
+            session.get(UserModel, tokens['user']['id']).is_active = False
+            session.commit()
+        resp = self.client.post('/api/auth/refresh', json={"refreshToken": tokens['refreshToken']})
+        assert resp.status_code == 403
+
+    def test_logout_revokes_refresh_token(self):
+        tokens = _register(self.client)
+        resp = self.client.post('/api/auth/logout', json={"refreshToken": tokens['refreshToken']})
+        assert resp.status_code == 200
+
+        resp = self.client.post('/api/auth/refresh', json={"refreshToken": tokens['refreshToken']})
+        assert resp.status_code == 401
+
+    def test_logout_without_token_still_succeeds(self):
+        resp = self.client.post('/api/auth/logout')
+        assert resp.status_code == 200
+        assert resp.get_json()['success'] is True
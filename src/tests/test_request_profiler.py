@@ -0,0 +1,100 @@
+"""
+Request Profiler - Unit Tests
+Tests for Server-Timing headers, query counting, spans and the rolling histogram
+"""
+
+import os
+import uuid
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from create_app import create_app
+from services.request_profiler import RollingHistogram, span
+
+
+def _unknown_login(client):
+    # Một query (find_by_email), không băm bcrypt
+    return client.post('/api/auth/login', json={"email": "nobody@example.com", "password": "Password123"})
+
+
+def _server_timing(resp):
+    metrics = {}
+    for item in resp.headers["Server-Timing"].split(", "):
+        name, *params = item.split(";")
+        metrics[name] = dict(param.split("=", 1) for param in params)
+    return metrics
+
+
+class TestRequestProfiler:
+    """Test the profiling middleware through the app"""
+
+    def test_server_timing_counts_queries(self):
+        client = create_app().test_client()
+        resp = _unknown_login(client)
+        metrics = _server_timing(resp)
+        assert metrics["db"]["desc"] == '"1 queries"'
+        assert float(metrics["total"]["dur"]) >= float(metrics["db"]["dur"])
+
+    def test_bcrypt_and_jwt_spans(self):
+        client = create_app().test_client()
+        email = f"perf-{uuid.uuid4().hex[:8]}@example.com"
+        client.post('/api/auth/register', json={"email": email, "password": "Password123", "fullName": "Perf"})
+        resp = client.post('/api/auth/login', json={"email": email, "password": "Password123"})
+        assert resp.status_code == 200
+        metrics = _server_timing(resp)
+        assert "bcrypt" in metrics
+        assert "jwt" in metrics
+
+    def test_histogram_endpoint(self):
+        app = create_app()
+        client = app.test_client()
+        for _ in range(3):
+            _unknown_login(client)
+        data = client.get('/api/health/perf').get_json()["data"]
+        assert data["auth.login"]["count"] == 3
+        assert data["auth.login"]["mean_queries"] == 1
+
+    def test_histogram_endpoint_requires_metrics_token(self):
+        app = create_app()
+        client = app.test_client()
+        app.config["METRICS_TOKEN"] = "perf-token"
+        assert client.get('/api/health/perf').status_code == 401
+        assert client.get('/api/health/perf', headers={"Authorization": "Bearer perf-token"}).status_code == 200
+
+        # Không có token: chỉ mở khi PERF_SERVER_TIMING bật (dev/test)
+        app.config["METRICS_TOKEN"] = ""
+        app.config["PERF_SERVER_TIMING"] = False
+        assert client.get('/api/health/perf').status_code == 404
+
+    def test_server_timing_can_be_disabled(self):
+        app = create_app()
+        app.extensions["request_profiler"].server_timing = False
+        assert "Server-Timing" not in app.test_client().get('/api/health').headers
+
+    def test_span_outside_request_is_noop(self):
+        with span("jwt"):
+            pass
+
+
+class TestRollingHistogram:
+    """Test bucket counts, quantiles and window expiry"""
+
+    def test_quantiles_and_means(self):
+        histogram = RollingHistogram(buckets_ms=(10, 100), window_seconds=60, slots=6)
+        for _ in range(9):
+            histogram.record("auth.login", 5, db_ms=1, queries=2, now=0)
+        histogram.record("auth.login", 50, queries=30, now=0)
+        stats = histogram.snapshot(now=0)["auth.login"]
+        assert stats["count"] == 10
+        assert stats["p50_ms"] == 10
+        assert stats["p99_ms"] == 100
+        assert stats["max_queries"] == 30
+        assert stats["buckets"] == {"10": 9, "100": 1, "+Inf": 0}
+
+    def test_old_windows_age_out(self):
+        histogram = RollingHistogram(window_seconds=60, slots=6)
+        histogram.record("auth.me", 5, now=0)
+        histogram.record("auth.me", 5, now=30)
+        assert histogram.snapshot(now=30)["auth.me"]["count"] == 2
+        assert histogram.snapshot(now=65)["auth.me"]["count"] == 1
+        assert "auth.me" not in histogram.snapshot(now=200)
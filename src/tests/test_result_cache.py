@@ -0,0 +1,307 @@
+"""
+Result Cache - Integration Tests
+Tests for result reuse by image checksum, model version and thresholds, in the worker and at upload
+"""
+
+import hashlib
+import json
+import os
+import uuid
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from config import TestingConfig
+from create_app import create_app
+from infrastructure.databases.base import Base
+from infrastructure.databases.mssql import create_engines, create_session_factory, get_db_session
+from infrastructure.databases.schema import import_all_models
+from infrastructure.models.ai_threshold_profile_model import AIThresholdProfileModel
+from infrastructure.models.analysis_request_model import AnalysisRequestModel
+from infrastructure.models.analysis_result_cache_model import AnalysisResultCacheModel
+from infrastructure.models.analysis_result_model import AnalysisResultModel
+from infrastructure.models.image_annotation_model import ImageAnnotationModel
+from infrastructure.models.retinal_image_model import RetinalImageModel
+from infrastructure.repositories.ai_model_repository import AIModelRepository
+from infrastructure.repositories.analysis_request_repository import AnalysisRequestRepository
+from services.analysis_queue import AnalysisWorker
+from services.inference import (InferencePipeline, MicroBatcher, StubBackend, configured_model_version,
+                                create_pipeline)
+from services.result_cache import CachedResult, ResultCache, result_key
+from tests.test_image_upload import BOUNDARY, _multipart
+
+
+class _CountingBackend(StubBackend):
+    def __init__(self):
+        super().__init__()
+        self.predicted = 0
+
+    def predict(self, items):
+        self.predicted += len(items)
+        return super().predict(items)
+
+
+def _factory(tmp_path):
+    writer, readers = create_engines(f"sqlite:///{tmp_path / 'cache.db'}")
+    import_all_models()
+    Base.metadata.create_all(bind=writer)
+    return create_session_factory(writer, readers)
+
+
+def _request(factory, tmp_path, images, profile_id=None):
+    """Queue a request whose images carry the checksum of their content"""
+    session = factory()
+    try:
+        request_id = AnalysisRequestRepository(session).enqueue(profile_id=profile_id, commit=False)
+        for content in images:
+            path = tmp_path / f"{uuid.uuid4().hex}.jpg"
+            path.write_bytes(content)
+            session.add(RetinalImageModel(image_type="FUNDUS", storage_url=str(path), request_id=request_id,
+                                          checksum=hashlib.sha256(content).hexdigest()))
+        session.commit()
+        return request_id
+    finally:
+        session.close()
+
+
+def _results(factory):
+    session = factory()
+    try:
+        return {r.request_id: r for r in session.query(AnalysisResultModel).all()}
+    finally:
+        session.close()
+
+
+class TestResultKey:
+    """Test what identifies an analysis"""
+
+    def test_key_inputs(self):
+        base = result_key(["a", "b"], "v1", {"glaucoma_suspect": 0.6}, 0.5, 0.8)
+        assert result_key(["b", "a", "a"], "v1", {"glaucoma_suspect": 0.6}, 0.5, 0.8) == base
+        assert result_key(["a", "b"], "v2", {"glaucoma_suspect": 0.6}, 0.5, 0.8) != base
+        assert result_key(["a", "b"], "v1", {"glaucoma_suspect": 0.7}, 0.5, 0.8) != base
+        assert result_key(["a", "b"], "v1", {"glaucoma_suspect": 0.6}, 0.4, 0.8) != base
+        assert result_key(["a"], "v1", {"glaucoma_suspect": 0.6}, 0.5, 0.8) != base
+
+
+class TestWorkerCache:
+    """Test that re-screenings skip inference in the worker"""
+
+    def _pipeline(self, backend, cache):
+        return InferencePipeline(backend, MicroBatcher(backend.predict, max_batch_size=8, max_wait_ms=5),
+                                 result_cache=cache)
+
+    def test_rescreening_reuses_result_and_annotations(self, tmp_path):
+        factory = _factory(tmp_path)
+        backend = _CountingBackend()
+        pipeline = self._pipeline(backend, ResultCache())
+        try:
+            first = _request(factory, tmp_path, [b"left eye", b"right eye"])
+            assert AnalysisWorker(factory, pipeline.handle_batch).process_once()["done"] == 1
+            assert backend.predicted == 2
+
+            session = factory()
+            original = session.query(AnalysisResultModel).filter_by(request_id=first).one()
+            session.add(ImageAnnotationModel(annotation_type="heatmap", annotation_url="cas://sha256/" + "a" * 64,
+                                             result_id=original.id))
+            session.commit()
+            original_id = original.id
+            session.close()
+
+            # Cùng ảnh, khác thứ tự, pipeline mới (LRU trống): lấy từ bảng cache
+            pipeline.result_cache = ResultCache()
+            second = _request(factory, tmp_path, [b"right eye", b"left eye"])
+            assert AnalysisWorker(factory, pipeline.handle_batch).process_once()["done"] == 1
+            assert backend.predicted == 2
+            assert pipeline.result_cache.stats()["db_hits"] == 1
+        finally:
+            pipeline.close()
+
+        results = _results(factory)
+        copied = json.loads(results[second].predicted_labels_json)
+        assert copied.pop("cached_from") == original_id
+        assert copied == json.loads(results[first].predicted_labels_json)
+        assert results[second].risk_level == results[first].risk_level
+
+        session = factory()
+        try:
+            annotations = session.query(ImageAnnotationModel).filter_by(result_id=results[second].id).all()
+            assert [a.annotation_type for a in annotations] == ["heatmap"]
+            request = session.get(AnalysisRequestModel, second)
+            assert request.status == "done"
+            assert request.model_version == "stub-1"
+            assert all(i.checked_at for i in session.query(RetinalImageModel).filter_by(request_id=second))
+            assert session.query(AnalysisResultCacheModel).count() == 1
+        finally:
+            session.close()
+
+    def test_other_thresholds_or_model_run_inference(self, tmp_path):
+        factory = _factory(tmp_path)
+        session = factory()
+        profile = AIThresholdProfileModel(name="strict", thresholds_json=json.dumps({"high_risk": 0.99}))
+        session.add(profile)
+        session.commit()
+        profile_id = profile.id
+        session.close()
+
+        backend = _CountingBackend()
+        cache = ResultCache()
+        pipeline = self._pipeline(backend, cache)
+        try:
+            _request(factory, tmp_path, [b"fundus"])
+            _request(factory, tmp_path, [b"fundus"], profile_id=profile_id)
+            AnalysisWorker(factory, pipeline.handle_batch, batch_size=1).process_once()
+            AnalysisWorker(factory, pipeline.handle_batch, batch_size=1).process_once()
+            assert backend.predicted == 2
+
+            # Model mới: kết quả cũ không được dùng
+            backend.version = "stub-2"
+            _request(factory, tmp_path, [b"fundus"])
+            AnalysisWorker(factory, pipeline.handle_batch).process_once()
+            assert backend.predicted == 3
+
+            backend.version = "stub-1"
+            _request(factory, tmp_path, [b"fundus"])
+            AnalysisWorker(factory, pipeline.handle_batch).process_once()
+            assert backend.predicted == 3
+            assert cache.stats()["memory_hits"] == 1
+        finally:
+            pipeline.close()
+
+    def test_deploy_purges_other_versions(self, tmp_path):
+        factory = _factory(tmp_path)
+        backend = _CountingBackend()
+        pipeline = self._pipeline(backend, ResultCache())
+        try:
+            _request(factory, tmp_path, [b"fundus"])
+            AnalysisWorker(factory, pipeline.handle_batch).process_once()
+        finally:
+            pipeline.close()
+
+        session = factory()
+        try:
+            repo = AIModelRepository(session)
+            repo.deploy("stub-1")
+            assert session.query(AnalysisResultCacheModel).count() == 1
+            repo.deploy("stub-2")
+            assert repo.deployed_version() == "stub-2"
+            assert session.query(AnalysisResultCacheModel).count() == 0
+        finally:
+            session.close()
+
+
+    def test_lru_filled_only_after_commit(self, tmp_path):
+        factory = _factory(tmp_path)
+        cache = ResultCache()
+        session = factory()
+        try:
+            cache.store(session, [("lost", CachedResult(999, "low", "{}", "stub-1"))])
+            # Lease mất: worker rollback, result 999 không tồn tại
+            session.rollback()
+            assert cache.lookup(session, "lost") is None
+
+            request_id = AnalysisRequestRepository(session).enqueue(commit=False)
+            result = AnalysisResultModel(request_id=request_id, risk_level="low", predicted_labels_json="{}")
+            session.add(result)
+            session.flush()
+            cache.store(session, [("kept", CachedResult(result.id, "low", "{}", "stub-1"))])
+            assert cache.stats()["size"] == 0
+            session.commit()
+            assert cache.lookup(session, "kept").result_id == result.id
+            assert cache.stats()["memory_hits"] == 1
+        finally:
+            session.close()
+
+
+class TestModelVersion:
+    """Test that workers and upload routes key results by the same model version"""
+
+    def test_configured_version_matches_onnx_default(self):
+        assert configured_model_version("onnx", "/models/retina_v3.onnx") == "retina_v3"
+        assert configured_model_version("onnx", "/models/retina_v3.onnx", "retina-2024.1") == "retina-2024.1"
+        assert configured_model_version("stub", "") == "stub-1"
+
+    def test_worker_uses_deployed_version(self, tmp_path):
+        factory = _factory(tmp_path)
+        session = factory()
+        AIModelRepository(session).deploy("retina-2024.1")
+        session.close()
+
+        class _Config(TestingConfig):
+            INFERENCE_MODEL_PATH = "/models/retina_v3.onnx"
+            IMAGE_STORE_ROOT = str(tmp_path / "images")
+
+        pipeline = create_pipeline(_Config, factory)
+        try:
+            assert pipeline.backend.version == "retina-2024.1"
+            _request(factory, tmp_path, [b"fundus"])
+            AnalysisWorker(factory, pipeline.handle_batch).process_once()
+        finally:
+            pipeline.close()
+
+        # Upload route (process khác, LRU trống) tìm thấy kết quả worker đã ghi
+        session = factory()
+        try:
+            upload_cache = ResultCache(fallback_version=configured_model_version("stub", "/models/retina_v3.onnx"))
+            assert upload_cache.lookup_upload(session, [hashlib.sha256(b"fundus").hexdigest()]) is not None
+            AIModelRepository(session).deploy("retina-2024.1")
+            assert session.query(AnalysisResultCacheModel).count() == 1
+        finally:
+            session.close()
+
+
+class TestUploadCache:
+    """Test that an upload of already analysed images is answered at once"""
+
+    def test_upload_hit_completes_request(self, tmp_path):
+        app = create_app()
+        client = app.test_client()
+        resp = client.post('/api/auth/register', json={
+            "email": f"cache-{uuid.uuid4().hex[:8]}@example.com",
+            "password": "Password123",
+            "fullName": "Cache User"
+        })
+        headers = {"Authorization": f"Bearer {resp.get_json()['data']['accessToken']}"}
+        content = uuid.uuid4().bytes * 64
+
+        with app.app_context():
+            session = get_db_session()
+            # Kết quả đã có cho ảnh này (như worker đã ghi)
+            request_id = AnalysisRequestRepository(session).enqueue(commit=False)
+            result = AnalysisResultModel(request_id=request_id, risk_level="medium",
+                                         predicted_labels_json=json.dumps({"labels": ["glaucoma_suspect"]}))
+            session.add(result)
+            session.flush()
+            session.add(ImageAnnotationModel(annotation_type="heatmap", annotation_url="/h.png", result_id=result.id))
+            key = result_key([hashlib.sha256(content).hexdigest()], "stub-1", None,
+                             app.config["INFERENCE_DEFAULT_THRESHOLD"], app.config["INFERENCE_HIGH_RISK_THRESHOLD"])
+            session.add(AnalysisResultCacheModel(cache_key=key, result_id=result.id, model_version="stub-1"))
+            session.commit()
+            AIModelRepository(session).deploy("stub-1")
+
+        def upload(fields):
+            return client.post('/api/images', data=_multipart(fields, [("images", "eye.jpg", content)]),
+                               content_type=f"multipart/form-data; boundary={BOUNDARY}", headers=headers)
+
+        data = upload({}).get_json()['data']
+        assert data['cached'] is True
+        assert data['status'] == "done"
+
+        with app.app_context():
+            session = get_db_session()
+            request = session.get(AnalysisRequestModel, data['requestId'])
+            assert request.status == "done"
+            assert request.model_version == "stub-1"
+            copy = session.get(AnalysisResultModel, data['resultId'])
+            assert copy.request_id == data['requestId']
+            assert copy.risk_level == "medium"
+            assert [a.annotation_url for a in copy.annotations] == ["/h.png"]
+            profile = AIThresholdProfileModel(name=f"p-{uuid.uuid4().hex[:6]}", thresholds_json=json.dumps({"glaucoma_suspect": 0.9}))
+            session.add(profile)
+            session.commit()
+            profile_id = profile.id
+
+        # Profile ngưỡng khác: phải phân tích lại
+        other = upload({"profileId": profile_id}).get_json()['data']
+        assert other['cached'] is False
+        assert other['status'] == "queued"
+        assert app.extensions["result_cache"].stats()["memory_hits"] == 0
@@ -0,0 +1,163 @@
+"""
+Schema Manager - Unit Tests
+Tests for the version stamp, the boot check and column migrations
+"""
+
+import pytest
+from sqlalchemy import Boolean, Column, Integer, MetaData, String, Table, Text, UniqueConstraint, create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from infrastructure.databases import schema
+from infrastructure.databases.base import Base
+
+
+def _file_engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'schema.db'}")
+
+
+def _items_metadata(*extra_columns):
+    metadata = MetaData()
+    Table("items", metadata, Column("id", Integer, primary_key=True), Column("name", String(50)), *extra_columns)
+    return metadata
+
+
+def _baseline_metadata():
+    """Current models, with notification_templates as it was before locales (unique code, VARCHAR body)"""
+    schema.import_all_models()
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        if table.name != "notification_templates":
+            table.to_metadata(metadata)
+    Table(
+        "notification_templates", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("template_code", String(100), unique=True, nullable=False),
+        Column("title_tpl", String(255), nullable=False),
+        Column("body_tpl", String(255), nullable=False),
+        Column("channel", String(50), nullable=False),
+        Column("active", Boolean, default=True),
+    )
+    return metadata
+
+
+class TestSchemaManager:
+    """Test upgrade() and ensure_schema()"""
+
+    def setup_method(self):
+        schema._verified.clear()
+
+    def test_upgrade_creates_tables_and_stamp(self, tmp_path):
+        engine = _file_engine(tmp_path)
+        result = schema.upgrade(engine)
+
+        assert result["changed"] is True
+        assert schema.current_version(engine) == schema.models_version()
+        tables = set(inspect(engine).get_table_names())
+        assert {"users", "refresh_tokens", "schema_version"} <= tables
+
+    def test_second_upgrade_is_noop(self, tmp_path):
+        engine = _file_engine(tmp_path)
+        schema.upgrade(engine)
+        schema._verified.clear()
+        assert schema.upgrade(engine)["changed"] is False
+
+    def test_boot_check_does_not_run_ddl(self, tmp_path):
+        engine = _file_engine(tmp_path)
+        assert schema.ensure_schema(engine, auto_upgrade=False) is False
+        assert inspect(engine).get_table_names() == []
+
+        schema.upgrade(engine)
+        schema._verified.clear()
+        assert schema.ensure_schema(engine, auto_upgrade=False) is True
+
+    def test_boot_check_auto_upgrade(self, tmp_path):
+        engine = _file_engine(tmp_path)
+        assert schema.ensure_schema(engine, auto_upgrade=True) is True
+        assert schema.current_version(engine) == schema.models_version()
+
+    def test_version_changes_with_columns(self):
+        assert schema.expected_version(_items_metadata()) != schema.expected_version(
+            _items_metadata(Column("status", String(20)))
+        )
+
+    def test_migration_adds_missing_column(self, tmp_path):
+        engine = _file_engine(tmp_path)
+        _items_metadata().create_all(engine)
+
+        failed = schema._migrate_tables(engine, _items_metadata(Column("status", String(20))))
+
+        assert failed == []
+        columns = {column["name"] for column in inspect(engine).get_columns("items")}
+        assert "status" in columns
+
+    def test_type_and_unique_changes_are_detected(self, tmp_path):
+        engine = _file_engine(tmp_path)
+        _items_metadata(Column("code", String(20), unique=True)).create_all(engine)
+
+        assert schema._detect_unmigrated(engine, _items_metadata(Column("code", String(20), unique=True))) == []
+        changes = schema._detect_unmigrated(engine, _items_metadata(
+            Column("code", Text), UniqueConstraint("code", "name")
+        ))
+        assert changes == [
+            "items.code: type VARCHAR(20) -> TEXT",
+            "items: missing unique (code, name)",
+            "items: unique (code) no longer in the model",
+        ]
+
+    def test_failed_upgrade_is_not_stamped(self, tmp_path, monkeypatch):
+        engine = _file_engine(tmp_path)
+        monkeypatch.setattr(schema, "_detect_unmigrated", lambda engine, metadata: ["users.email: type"])
+
+        with pytest.raises(schema.SchemaUpgradeError) as exc:
+            schema.upgrade(engine)
+        assert exc.value.failed == ["users.email: type"]
+        assert schema.current_version(engine) is None
+        with pytest.raises(schema.SchemaUpgradeError):
+            schema.ensure_schema(engine, auto_upgrade=True)
+
+        monkeypatch.undo()
+        assert schema.upgrade(engine)["changed"] is True
+
+
+class TestNotificationTemplatesMigration:
+    """Test the explicit migration of a notification_templates table created from the baseline model"""
+
+    def setup_method(self):
+        schema._verified.clear()
+
+    def test_upgrade_baseline_database(self, tmp_path):
+        engine = _file_engine(tmp_path)
+        _baseline_metadata().create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO notification_templates (id, template_code, title_tpl, body_tpl, channel, active) "
+                "VALUES (1, 'verify_email', 'Xác thực', 'Xin chào', 'email', 1)"
+            ))
+            conn.execute(text("INSERT INTO notifications (id, title, user_id, template_id) VALUES (1, 't', 1, 1)"))
+
+        assert schema.upgrade(engine)["changed"] is True
+        assert schema.current_version(engine) == schema.models_version()
+
+        inspector = inspect(engine)
+        assert schema._reflected_unique_sets(inspector, "notification_templates") == {("locale", "template_code")}
+        body_type = {c["name"]: c["type"] for c in inspector.get_columns("notification_templates")}["body_tpl"]
+        assert isinstance(body_type, Text)
+        assert [fk["referred_table"] for fk in inspector.get_foreign_keys("notifications")
+                if fk["constrained_columns"] == ["template_id"]] == ["notification_templates"]
+
+        with engine.begin() as conn:
+            row = conn.execute(text("SELECT template_code, locale, body_tpl FROM notification_templates")).one()
+            assert tuple(row) == ("verify_email", "vi", "Xin chào")
+            conn.execute(text(
+                "INSERT INTO notification_templates (template_code, locale, title_tpl, body_tpl, channel, active) "
+                "VALUES ('verify_email', 'en', 'Verify', :body, 'email', 1)"
+            ), {"body": "x" * 1000})
+        with pytest.raises(IntegrityError):
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "INSERT INTO notification_templates (template_code, locale, title_tpl, body_tpl, channel, active) "
+                    "VALUES ('verify_email', 'en', 'Verify', 'again', 'email', 1)"
+                ))
+
+        # Chạy lại: database đã khớp model, không đổi gì
+        assert schema._migrate_notification_templates_locale(engine) is False
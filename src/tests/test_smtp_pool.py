@@ -0,0 +1,103 @@
+"""
+SMTP Connection Pool - Integration Tests
+Tests for session reuse, send_many and reconnects, against a local SMTP stub
+"""
+
+import smtplib
+import socket
+
+from services.smtp_pool import SMTPConnectionPool
+from smtp_stub import SMTPStub
+
+
+def _email_service(port):
+    # Import trong hàm: test_email_verification cần tạo singleton email_service sau khi set env
+    from services.email_service import EmailService
+    service = EmailService()
+    service.smtp_server = "127.0.0.1"
+    service.smtp_port = port
+    service.sender_password = ""
+    service.use_tls = False
+    service.dry_run = False
+    return service
+
+
+def _messages(count):
+    return [(f"user{i}@example.com", f"Notice {i}", "Text body", "<p>Html</p>") for i in range(count)]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestSMTPPool:
+    """Test pooled SMTP sessions in EmailService"""
+
+    def test_deliver_reuses_one_session(self):
+        with SMTPStub() as smtp:
+            service = _email_service(smtp.port)
+            for i in range(3):
+                service.deliver(f"user{i}@example.com", "Subject", "Text body")
+            assert len(smtp.messages) == 3
+            assert smtp.connections == 1
+            service.pool.close_all()
+
+    def test_send_many_over_one_session(self):
+        with SMTPStub() as smtp:
+            service = _email_service(smtp.port)
+            results = service.send_many(_messages(200))
+            assert results == [None] * 200
+            assert len(smtp.messages) == 200
+            assert smtp.connections == 1
+            service.pool.close_all()
+
+    def test_send_many_keeps_going_after_rejected_message(self):
+        with SMTPStub() as smtp:
+            smtp.fail_next = 1
+            service = _email_service(smtp.port)
+            results = service.send_many(_messages(3))
+            assert isinstance(results[0], smtplib.SMTPResponseException)
+            assert results[1:] == [None, None]
+            assert smtp.connections == 1
+            service.pool.close_all()
+
+    def test_reconnects_when_session_dropped(self):
+        with SMTPStub() as smtp:
+            service = _email_service(smtp.port)
+            service.deliver("first@example.com", "Subject", "Text body")
+
+            # Server đóng kết nối idle: session trong pool đã hỏng
+            service.pool._idle[0][0].sock.shutdown(socket.SHUT_RDWR)
+
+            service.deliver("second@example.com", "Subject", "Text body")
+            assert len(smtp.messages) == 2
+            assert smtp.connections == 2
+            service.pool.close_all()
+
+    def test_keepalive_probe_discards_dead_session(self):
+        with SMTPStub() as smtp:
+            pool = SMTPConnectionPool("127.0.0.1", smtp.port, use_tls=False, keepalive_interval=0)
+            with pool.connection() as server:
+                server.noop()
+            pool._idle[0][0].sock.shutdown(socket.SHUT_RDWR)
+
+            with pool.connection() as server:
+                assert server.noop()[0] == 250
+            assert pool.connects == 2
+            pool.close_all()
+
+    def test_reap_idle(self):
+        with SMTPStub() as smtp:
+            pool = SMTPConnectionPool("127.0.0.1", smtp.port, use_tls=False, idle_timeout=0)
+            with pool.connection():
+                pass
+            assert pool.idle_count == 1
+            assert pool.reap_idle() == 1
+            assert pool.idle_count == 0
+
+    def test_connect_failure_fails_every_message(self):
+        service = _email_service(_free_port())
+        results = service.send_many(_messages(3))
+        assert all(isinstance(error, OSError) for error in results)
@@ -0,0 +1,85 @@
+"""
+SQLite connection strategy - Unit Tests
+Tests for the WAL writer/reader engines and the routing session
+"""
+
+import threading
+
+from sqlalchemy import Column, Integer, String, text
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from infrastructure.databases.mssql import create_sqlite_engines
+from infrastructure.databases.routing import RoutingSession
+
+ItemsBase = declarative_base()
+
+
+class Item(ItemsBase):
+    __tablename__ = "items"
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+
+
+class TestSqliteEngines:
+    """Test create_sqlite_engines and RoutingSession on a database file"""
+
+    def _make(self, tmp_path):
+        writer, reader = create_sqlite_engines(f"sqlite:///{tmp_path / 'aura.db'}", read_pool_size=2)
+        ItemsBase.metadata.create_all(bind=writer)
+        factory = sessionmaker(class_=RoutingSession, writer=writer, readers=[reader])
+        return writer, reader, factory
+
+    def test_pragmas_applied(self, tmp_path):
+        writer, reader, _ = self._make(tmp_path)
+        with reader.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() > 0
+
+    def test_writer_has_single_connection(self, tmp_path):
+        writer, reader, _ = self._make(tmp_path)
+        assert writer.pool.size() == 1
+        assert writer.pool._max_overflow == 0
+        assert reader.pool.size() == 2
+
+    def test_writes_use_writer_and_reads_use_reader(self, tmp_path):
+        writer, reader, factory = self._make(tmp_path)
+        session = factory()
+        assert session.get_bind() is reader
+
+        session.add(Item(name="a"))
+        session.flush()
+        # Trong transaction đã ghi: đọc cũng đi qua writer để thấy dữ liệu chưa commit
+        assert session.get_bind() is writer
+        assert session.query(Item).count() == 1
+
+        session.commit()
+        assert session.get_bind() is reader
+        assert session.query(Item).count() == 1
+        session.close()
+
+    def test_reads_not_blocked_by_open_write(self, tmp_path):
+        writer, reader, factory = self._make(tmp_path)
+        seed = factory()
+        seed.add(Item(name="committed"))
+        seed.commit()
+        seed.close()
+
+        writing = factory()
+        writing.add(Item(name="pending"))
+        writing.flush()  # giữ transaction ghi đang mở
+
+        result = {}
+
+        def read():
+            session = factory()
+            result["count"] = session.query(Item).count()
+            session.close()
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join(timeout=5)
+        assert result == {"count": 1}
+
+        writing.commit()
+        writing.close()
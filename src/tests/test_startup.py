@@ -0,0 +1,71 @@
+"""
+Startup - Unit Tests
+Tests for the startup profiler and lazy route registration
+"""
+
+import os
+import sys
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from create_app import create_app
+from api.routes.lazy import LazyView
+from startup_profiler import StartupProfiler, profiling_requested
+
+
+class TestStartupProfiler:
+    """Test import timing and create_app phases"""
+
+    def test_records_imports_and_phases(self, tmp_path):
+        (tmp_path / "aura_profiled_parent.py").write_text("import aura_profiled_child\n")
+        (tmp_path / "aura_profiled_child.py").write_text("import time\ntime.sleep(0.01)\n")
+        sys.path.insert(0, str(tmp_path))
+        profiler = StartupProfiler()
+        try:
+            profiler.enable()
+            with profiler.phase("import"):
+                import aura_profiled_parent  # noqa: F401
+        finally:
+            profiler.disable()
+            sys.path.remove(str(tmp_path))
+
+        parent_cumulative, parent_self = profiler.imports["aura_profiled_parent"]
+        child_cumulative, _ = profiler.imports["aura_profiled_child"]
+        assert child_cumulative >= 0.01
+        # Thời gian của module con không tính vào self time của module cha
+        assert parent_self < child_cumulative <= parent_cumulative
+        assert profiler.phases[0][0] == "import"
+        assert "aura_profiled_child" in profiler.report()
+
+    def test_phase_is_noop_when_disabled(self):
+        profiler = StartupProfiler()
+        with profiler.phase("ignored"):
+            pass
+        assert profiler.phases == []
+
+    def test_profiling_requested(self, monkeypatch):
+        monkeypatch.delenv("AURA_PROFILE_STARTUP", raising=False)
+        assert profiling_requested(["run_app.py", "--profile-startup"]) is True
+        assert profiling_requested(["run_app.py"]) is False
+        monkeypatch.setenv("AURA_PROFILE_STARTUP", "1")
+        assert profiling_requested(["wsgi"]) is True
+
+
+class TestLazyRoutes:
+    """Test that lazily registered routes import their module on first use"""
+
+    def test_lazy_view_imports_on_first_call(self):
+        view = LazyView("json:dumps")
+        assert view._view is None
+        assert view([1]) == "[1]"
+        assert view._view is not None
+
+    def test_email_routes_registered(self):
+        app = create_app()
+        rules = {rule.rule: rule.endpoint for rule in app.url_map.iter_rules()}
+        assert rules["/api/auth/verify-email"] == "email.verify_email_endpoint"
+        assert rules["/api/auth/send-verification-email"] == "email.send_verification_email_endpoint"
+
+        resp = app.test_client().post('/api/auth/verify-email', json={"token": "x" * 32})
+        assert resp.status_code == 400
+        assert resp.get_json()["success"] is False
@@ -0,0 +1,140 @@
+"""
+Static Assets - Unit Tests
+Tests for the dist/ index, pre-compressed variants, caching headers, 304s and SPA fallback
+"""
+
+import gzip
+
+import pytest
+from flask import Flask
+
+from static_assets import StaticAssets, compress_directory, scan_directory, IMMUTABLE_CACHE_CONTROL
+
+JS = b"console.log('aura');\n" * 200
+
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_bytes(b"<html><script src='/assets/index-BTePKapA.js'></script></html>")
+    (tmp_path / "assets" / "index-BTePKapA.js").write_bytes(JS)
+    return tmp_path
+
+
+def _client(root):
+    assets = StaticAssets(str(root))
+    assets.scan()
+    return _client_for(assets)
+
+
+def _client_for(assets):
+    app = Flask(__name__, static_folder=None)
+
+    @app.route('/<path:filename>')
+    def serve(filename):
+        return assets.response(filename) or ("not found", 404)
+
+    return app.test_client()
+
+
+class TestStaticAssets:
+    """Test serving from the static index"""
+
+    def test_scan_indexes_files_and_variants(self, dist):
+        compress_directory(str(dist))
+        index = scan_directory(str(dist))
+        assert set(index) == {"index.html", "assets/index-BTePKapA.js"}
+        js = index["assets/index-BTePKapA.js"]
+        assert js.immutable
+        assert "gzip" in js.files
+        assert not index["index.html"].immutable
+
+    def test_only_hashed_vite_assets_are_immutable(self, dist):
+        names = ["logo-transparent.png", "favicon-original.ico", "robots.default.txt", "logo-BTePKapA.png",
+                 "assets/logo-transparent.png", "assets/logo.3f9a1c2e.svg", "assets/vendor-Ab_9-xYz.js"]
+        for name in names:
+            (dist / name).write_bytes(b"x")
+        index = scan_directory(str(dist))
+        assert {name for name in names if index[name].immutable} == {"assets/vendor-Ab_9-xYz.js"}
+
+    def test_serves_gzip_variant_when_accepted(self, dist):
+        compress_directory(str(dist))
+        client = _client(dist)
+        resp = client.get('/assets/index-BTePKapA.js', headers={"Accept-Encoding": "gzip"})
+        assert resp.status_code == 200
+        assert resp.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in resp.headers["Vary"]
+        assert resp.headers["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
+        assert gzip.decompress(resp.data) == JS
+
+    def test_identity_without_accept_encoding(self, dist):
+        compress_directory(str(dist))
+        resp = _client(dist).get('/assets/index-BTePKapA.js', headers={"Accept-Encoding": "identity"})
+        assert "Content-Encoding" not in resp.headers
+        assert resp.data == JS
+        assert int(resp.headers["Content-Length"]) == len(JS)
+
+    def test_if_none_match_returns_304(self, dist):
+        client = _client(dist)
+        etag = client.get('/index.html').headers["ETag"]
+        resp = client.get('/index.html', headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.data == b""
+        assert resp.headers["Cache-Control"] == "no-cache"
+
+    def test_unknown_and_outside_paths_not_served(self, dist):
+        client = _client(dist)
+        assert client.get('/missing.js').status_code == 404
+        assert client.get('/../secret.txt').status_code == 404
+
+    def test_compress_skips_small_and_binary_files(self, dist):
+        (dist / "tiny.css").write_bytes(b"a{}")
+        (dist / "logo.png").write_bytes(b"\x89PNG" * 1000)
+        compress_directory(str(dist))
+        assert not (dist / "tiny.css.gz").exists()
+        assert not (dist / "logo.png.gz").exists()
+        # File đã nén và chưa đổi thì không nén lại
+        assert compress_directory(str(dist)) == 0
+
+
+class TestStaticIndex:
+    """Test the in-memory index: small-file cache, SPA fallback and reloads"""
+
+    def test_small_files_served_from_memory(self, dist):
+        assets = StaticAssets(str(dist), memory_max_size=1024)
+        assets.scan()
+        assert assets.lookup("index.html").files["identity"].data is not None
+        assert assets.lookup("assets/index-BTePKapA.js").files["identity"].data is None
+
+        # File trong RAM vẫn phục vụ được sau khi bị xóa khỏi đĩa
+        (dist / "index.html").unlink()
+        client = _client_for(assets)
+        assert b"index-BTePKapA.js" in client.get('/index.html').data
+
+    def test_large_file_streamed(self, dist):
+        assets = StaticAssets(str(dist), memory_max_size=0)
+        assets.scan()
+        resp = _client_for(assets).get('/assets/index-BTePKapA.js')
+        assert resp.is_streamed
+        assert resp.data == JS
+
+    def test_client_route_falls_back_to_index(self, dist):
+        client = _client(dist)
+        resp = client.get('/patients/42/results')
+        assert resp.status_code == 200
+        assert b"<html>" in resp.data
+        assert client.get('/assets/missing.js').status_code == 404
+
+    def test_fallback_can_be_disabled(self, dist):
+        assets = StaticAssets(str(dist), spa_fallback=False)
+        assets.scan()
+        assert assets.lookup("dashboard") is None
+
+    def test_reload_if_changed(self, dist):
+        assets = StaticAssets(str(dist))
+        assets.scan()
+        assert assets.reload_if_changed() is False
+
+        (dist / "assets" / "index-NEWHASH1.js").write_bytes(b"new")
+        assert assets.reload_if_changed() is True
+        assert assets.lookup("assets/index-NEWHASH1.js") is not None
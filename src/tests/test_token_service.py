@@ -0,0 +1,128 @@
+"""
+Token Service - Unit Tests
+Tests for JWT issuing/verification, key rotation and the verified-token cache
+"""
+
+import time
+
+import jwt
+import pytest
+
+from services.cache import TTLCache
+from services.token_cache import VerifiedTokenCache
+from services.token_service import TokenService
+
+
+class TestTTLCache:
+    """Test the generic LRU/TTL cache"""
+
+    def test_hit_and_miss_counters(self):
+        cache = TTLCache(max_size=4, default_ttl=60)
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.hits == 1
+        assert cache.misses == 1
+        assert cache.hit_ratio == 0.5
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(max_size=2, default_ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_entry_expires(self):
+        cache = TTLCache(max_size=2, default_ttl=60)
+        cache.set("a", 1, ttl=0.01)
+        time.sleep(0.02)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+class TestVerifiedTokenCache:
+    """Test token payload caching"""
+
+    def test_returns_cached_payload(self):
+        cache = VerifiedTokenCache(max_size=8, ttl=60)
+        payload = {"user_id": "1", "exp": time.time() + 3600}
+        cache.put("token-1", payload)
+        assert cache.get("token-1") == payload
+        assert cache.get("token-2") is None
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_capped_at_token_exp(self):
+        cache = VerifiedTokenCache(max_size=8, ttl=60)
+        cache.put("expired", {"user_id": "1", "exp": time.time() - 1})
+        assert cache.get("expired") is None
+
+    def test_keys_are_digests(self):
+        cache = VerifiedTokenCache(max_size=8, ttl=60)
+        cache.put("secret-token", {"user_id": "1"})
+        assert "secret-token" not in cache._cache._data
+        assert VerifiedTokenCache.digest("secret-token") in cache._cache._data
+
+
+class TestTokenService:
+    """Test token issuing, verification and key rotation"""
+
+    def test_issue_and_verify(self):
+        service = TokenService({"k1": "secret-1-0123456789abcdef0123456789abcdef"}, active_kid="k1")
+        token = service.issue_access_token("user-1", "user@example.com")
+        payload = service.verify(token)
+        assert payload["user_id"] == "user-1"
+        assert payload["exp"] - payload["iat"] == service.access_token_ttl
+        assert jwt.get_unverified_header(token)["kid"] == "k1"
+
+    def test_rotation_keeps_old_tokens_valid(self):
+        old_service = TokenService({"k1": "secret-1-0123456789abcdef0123456789abcdef"}, active_kid="k1")
+        old_token = old_service.issue_access_token("user-1", "user@example.com")
+
+        rotated = TokenService({"k1": "secret-1-0123456789abcdef0123456789abcdef", "k2": "secret-2-0123456789abcdef0123456789abcdef"}, active_kid="k2")
+        new_token = rotated.issue_access_token("user-1", "user@example.com")
+        assert jwt.get_unverified_header(new_token)["kid"] == "k2"
+        assert rotated.decode(old_token)["user_id"] == "user-1"
+        assert rotated.decode(new_token)["user_id"] == "user-1"
+
+    def test_unknown_kid_is_rejected(self):
+        token = TokenService({"k9": "secret-9-0123456789abcdef0123456789abcdef"}, active_kid="k9").issue_access_token("u", "e@example.com")
+        with pytest.raises(jwt.InvalidTokenError):
+            TokenService({"k1": "secret-1-0123456789abcdef0123456789abcdef"}, active_kid="k1").decode(token)
+
+    def test_token_without_kid_uses_default_key(self):
+        legacy = jwt.encode({"user_id": "u", "exp": time.time() + 60}, "legacy-secret-0123456789abcdef0123456789abcdef", algorithm="HS256")
+        service = TokenService.from_config({"SECRET_KEY": "legacy-secret-0123456789abcdef0123456789abcdef", "JWT_SIGNING_KEYS": "k2:secret-2",
+                                            "JWT_ACTIVE_KID": "k2"})
+        assert service.decode(legacy)["user_id"] == "u"
+
+    def test_jwt_secret_key_rotates_from_secret_key(self):
+        secret = "flask-secret-0123456789abcdef0123456789abcdef"
+        issued = TokenService.from_config({"SECRET_KEY": secret}).issue_access_token("u", "e@example.com")
+        assert jwt.get_unverified_header(issued)["kid"] == "default"
+
+        config = {"SECRET_KEY": secret, "JWT_SECRET_KEY": "jwt-secret-0123456789abcdef0123456789abcdef"}
+        rotated = TokenService.from_config(config)
+        assert rotated.active_kid == "jwt"
+        assert rotated.signing_keys["default"] == secret
+        assert rotated.decode(issued)["user_id"] == "u"
+        assert jwt.get_unverified_header(rotated.issue_access_token("u", "e@example.com"))["kid"] == "jwt"
+
+        # Hết cửa sổ xoay vòng: token ký bằng SECRET_KEY không còn hợp lệ
+        closed = TokenService.from_config({**config, "JWT_ACCEPT_SECRET_KEY": False})
+        assert "default" not in closed.signing_keys
+        with pytest.raises(jwt.InvalidTokenError):
+            closed.decode(issued)
+
+    def test_same_jwt_secret_key_keeps_default_kid(self):
+        secret = "flask-secret-0123456789abcdef0123456789abcdef"
+        service = TokenService.from_config({"SECRET_KEY": secret, "JWT_SECRET_KEY": secret})
+        assert service.signing_keys == {"default": secret}
+        assert service.active_kid == "default"
+
+    def test_from_config_requires_a_secret(self):
+        with pytest.raises(ValueError):
+            TokenService.from_config({"SECRET_KEY": None})
@@ -1,5 +1,14 @@
 #export app object
+# AURA_PROFILE_STARTUP=1: in thời gian import từng module và từng phase của create_app
+from startup_profiler import startup_profiler, profiling_requested
+
+if profiling_requested():
+    startup_profiler.enable()
+
 from create_app import create_app
 
 app = create_app()
- 
\ No newline at end of file
+
+if startup_profiler.enabled:
+    startup_profiler.disable()
+    print(startup_profiler.report())